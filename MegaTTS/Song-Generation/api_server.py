@@ -1,23 +1,35 @@
+import io
 import os
 import sys
 import time
 import json
 import uuid
+import queue
+import struct
+import asyncio
 import tempfile
+import threading
+import concurrent.futures
+from contextlib import nullcontext
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Optional, List
+from typing import Optional, List, Dict, Any
 import torch
 import torchaudio
 import numpy as np
 from omegaconf import OmegaConf
 
-from fastapi import FastAPI, File, UploadFile, HTTPException, BackgroundTasks
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import BaseModel
 import uvicorn
 
 from codeclm.trainer.codec_song_pl import CodecLM_PL
 from codeclm.models import CodecLM
+from codeclm.utils.inference import (
+    resolve_device, configure_cpu_threads, quantize_dynamic_int8,
+    inference_autocast, set_cpu_autocast, cpu_autocast_enabled, cpu_supports_bf16,
+)
 from tools.gradio.separator import Separator
 
 # 设置环境变量
@@ -35,6 +47,7 @@ separator = None
 auto_prompt = None
 cfg = None
 device = None
+lm_quantized = False
 
 class SongRequest(BaseModel):
     lyrics: str
@@ -43,6 +56,7 @@ class SongRequest(BaseModel):
     cfg_coef: Optional[float] = 1.5
     temperature: Optional[float] = 0.9
     top_k: Optional[int] = 50
+    n_samples: int = 1  # 候选数量：默认1与旧接口一致，上限为 SONG_MAX_SAMPLES
 
 class SongResponse(BaseModel):
     success: bool
@@ -50,10 +64,466 @@ class SongResponse(BaseModel):
     file_id: Optional[str] = None
     file_path: Optional[str] = None
     generation_time: Optional[float] = None
+    file_ids: Optional[List[str]] = None
+
+class JobSubmitResponse(BaseModel):
+    job_id: str
+    status: str
+    queue_position: int
+    status_url: str
+    result_url: str
 
 # 支持的自动提示类型
 AUTO_PROMPT_TYPES = ['Pop', 'R&B', 'Dance', 'Jazz', 'Folk', 'Rock', 'Chinese Style', 'Chinese Tradition', 'Metal', 'Reggae', 'Chinese Opera', 'Auto']
 
+OUTPUT_DIR = "output/api_generated"
+MAX_QUEUE_SIZE = int(os.getenv("SONG_MAX_QUEUE_SIZE", "8"))
+JOB_RETENTION_SECONDS = int(os.getenv("SONG_JOB_RETENTION_SECONDS", "3600"))
+MAX_SAMPLES = int(os.getenv("SONG_MAX_SAMPLES", "4"))
+
+# 运行设备：auto 有GPU用GPU，否则CPU；CPU模式下的线程数、int8动态量化、bf16 autocast
+SONG_DEVICE = os.getenv("SONG_DEVICE", "auto")
+CPU_THREADS = int(os.getenv("SONG_CPU_THREADS", "0"))              # 0 = 物理核心数
+CPU_QUANTIZE = os.getenv("SONG_CPU_QUANTIZE", "0").lower() in ("1", "true", "int8")
+CPU_BF16 = os.getenv("SONG_CPU_BF16", "auto").lower()               # auto / 1 / 0
+
+# ---------------------------------------------------------------------------
+# 任务队列：单个推理线程消费有界队列，HTTP处理函数只负责入队和查询，不阻塞事件循环
+# ---------------------------------------------------------------------------
+
+class JobStatus:
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+    FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+@dataclass
+class GenerationJob:
+    """一次歌曲生成任务"""
+    job_id: str
+    lyrics: str
+    descriptions: Optional[str] = None
+    auto_prompt_audio_type: Optional[str] = None
+    prompt_audio_path: Optional[str] = None
+    cfg_coef: float = 1.5
+    temperature: float = 0.9
+    top_k: int = 50
+    n_samples: int = 1
+    # 流式任务：推理线程把解码出的PCM块 [C, T] 放入该队列，结束时放入None
+    chunks: Optional["queue.Queue[Optional[torch.Tensor]]"] = None
+    status: str = JobStatus.QUEUED
+    stage: str = "queued"
+    generated_tokens: int = 0
+    total_tokens: int = 0
+    lm_started_at: Optional[float] = None
+    lm_seconds: Optional[float] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    file_paths: List[str] = field(default_factory=list)
+    error: Optional[str] = None
+    future: concurrent.futures.Future = field(default_factory=concurrent.futures.Future)
+
+    @property
+    def file_path(self) -> Optional[str]:
+        return self.file_paths[0] if self.file_paths else None
+
+    @property
+    def file_ids(self) -> List[str]:
+        return [Path(path).stem for path in self.file_paths]
+
+    @property
+    def progress(self) -> float:
+        """token生成占 5%-90%，解码与保存占剩余部分"""
+        if self.status == JobStatus.SUCCEEDED:
+            return 1.0
+        if self.stage == "separating":
+            return 0.02
+        if self.stage == "generating" and self.total_tokens:
+            return 0.05 + 0.85 * min(1.0, self.generated_tokens / self.total_tokens)
+        if self.stage in ("decoding", "saving"):
+            return 0.92 if self.stage == "decoding" else 0.98
+        return 0.0
+
+    @property
+    def tokens_per_second(self) -> Optional[float]:
+        """LM解码速度（每个候选每秒生成的帧数，25帧=1秒音频）"""
+        if self.lm_started_at is None:
+            return None
+        elapsed = self.lm_seconds if self.lm_seconds is not None else time.time() - self.lm_started_at
+        return round(self.generated_tokens / elapsed, 2) if elapsed > 0 else None
+
+    def to_dict(self, queue_position: int = 0) -> Dict[str, Any]:
+        generation_time = None
+        if self.started_at:
+            generation_time = (self.finished_at or time.time()) - self.started_at
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "stage": self.stage,
+            "progress": round(self.progress, 4),
+            "generated_tokens": self.generated_tokens,
+            "total_tokens": self.total_tokens,
+            "tokens_per_second": self.tokens_per_second,
+            "queue_position": queue_position,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "generation_time": generation_time,
+            "error": self.error,
+            "n_samples": self.n_samples,
+            "result_url": f"/jobs/{self.job_id}/result" if self.status == JobStatus.SUCCEEDED else None,
+            "result_urls": [f"/jobs/{self.job_id}/result?index={i}" for i in range(len(self.file_paths))]
+                           if self.status == JobStatus.SUCCEEDED else [],
+        }
+
+class GenerationQueue:
+    """有界任务队列 + 单推理线程（模型不可并发调用）"""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._queue: "queue.Queue[GenerationJob]" = queue.Queue(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self.jobs: Dict[str, GenerationJob] = {}
+        self.current: Optional[GenerationJob] = None
+        self.counters = {"submitted": 0, "succeeded": 0, "failed": 0, "cancelled": 0, "rejected": 0}
+        self.total_generation_time = 0.0
+        self.total_lm_tokens = 0
+        self.total_lm_seconds = 0.0
+        self._worker: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._run, name="song-inference", daemon=True)
+            self._worker.start()
+
+    def submit(self, job: GenerationJob) -> int:
+        """入队，队列已满时抛出 queue.Full；返回排队位置"""
+        with self._lock:
+            self._prune()
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                self.counters["rejected"] += 1
+                raise
+            self.jobs[job.job_id] = job
+            self.counters["submitted"] += 1
+        return self.position(job.job_id)
+
+    def position(self, job_id: str) -> int:
+        """排队位置：1 表示下一个执行，0 表示已不在队列中"""
+        with self._queue.mutex:
+            pending = [j.job_id for j in self._queue.queue if j.status == JobStatus.QUEUED]
+        return pending.index(job_id) + 1 if job_id in pending else 0
+
+    def get(self, job_id: str) -> Optional[GenerationJob]:
+        return self.jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        """只能取消尚未开始的任务"""
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if not job or job.status != JobStatus.QUEUED:
+                return False
+            # 从队列中移除，释放容量
+            with self._queue.mutex:
+                try:
+                    self._queue.queue.remove(job)
+                    self._queue.unfinished_tasks -= 1
+                    self._queue.not_full.notify()
+                except ValueError:
+                    pass
+            self._finish(job, JobStatus.CANCELLED, error="任务已取消")
+            if job.prompt_audio_path and os.path.exists(job.prompt_audio_path):
+                os.unlink(job.prompt_audio_path)
+            return True
+
+    def depth(self) -> int:
+        with self._queue.mutex:
+            return sum(1 for j in self._queue.queue if j.status == JobStatus.QUEUED)
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._queue.mutex:
+            waiting = [j for j in self._queue.queue if j.status == JobStatus.QUEUED]
+        current = self.current
+        succeeded = self.counters["succeeded"]
+        return {
+            "queue_depth": len(waiting),
+            "queue_capacity": self.maxsize,
+            "oldest_wait_seconds": round(time.time() - min(j.created_at for j in waiting), 1) if waiting else 0.0,
+            "running": current.to_dict() if current else None,
+            "jobs_tracked": len(self.jobs),
+            **self.counters,
+            "avg_generation_time": round(self.total_generation_time / succeeded, 2) if succeeded else None,
+            "avg_tokens_per_second": round(self.total_lm_tokens / self.total_lm_seconds, 2) if self.total_lm_seconds else None,
+        }
+
+    def _finish(self, job: GenerationJob, status: str, error: Optional[str] = None):
+        job.status = status
+        job.error = error
+        job.finished_at = time.time()
+        self.counters[status] += 1
+        if status == JobStatus.SUCCEEDED and job.started_at:
+            self.total_generation_time += job.finished_at - job.started_at
+            if job.lm_seconds:
+                self.total_lm_tokens += job.generated_tokens
+                self.total_lm_seconds += job.lm_seconds
+        if not job.future.done():
+            if status == JobStatus.SUCCEEDED:
+                job.future.set_result(job)
+            else:
+                job.future.set_exception(RuntimeError(error or status))
+            # 未被等待的Future不应触发未取回异常的告警
+            job.future.exception()
+        if job.chunks is not None:
+            job.chunks.put(None)
+
+    def _prune(self):
+        """清理过期的已完成任务及其文件"""
+        cutoff = time.time() - JOB_RETENTION_SECONDS
+        for job_id, job in list(self.jobs.items()):
+            if job.status in JobStatus.FINISHED and job.finished_at and job.finished_at < cutoff:
+                del self.jobs[job_id]
+                for path in job.file_paths:
+                    if not os.path.exists(path):
+                        continue
+                    try:
+                        os.unlink(path)
+                        print(f"🗑️ 已清理文件: {path}")
+                    except Exception as e:
+                        print(f"⚠️ 清理文件失败: {e}")
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            try:
+                if job.status != JobStatus.QUEUED:
+                    continue
+                self.current = job
+                job.status = JobStatus.RUNNING
+                job.started_at = time.time()
+                try:
+                    run_generation_job(job)
+                    with self._lock:
+                        self._finish(job, JobStatus.SUCCEEDED)
+                    print(f"✅ 歌曲生成完成 (ID: {job.job_id}), 耗时: {job.finished_at - job.started_at:.2f}秒")
+                except Exception as e:
+                    print(f"❌ 生成歌曲时出错 (ID: {job.job_id}): {str(e)}")
+                    with self._lock:
+                        self._finish(job, JobStatus.FAILED, error=str(e))
+            finally:
+                self.current = None
+                if job.prompt_audio_path and os.path.exists(job.prompt_audio_path):
+                    os.unlink(job.prompt_audio_path)
+                self._queue.task_done()
+
+generation_queue = GenerationQueue(MAX_QUEUE_SIZE)
+
+def _pick_auto_prompt(prompt_type: str) -> torch.Tensor:
+    if prompt_type == "Auto":
+        merge_prompt = [item for sublist in auto_prompt.values() for item in sublist]
+        return merge_prompt[np.random.randint(0, len(merge_prompt))]
+    return auto_prompt[prompt_type][np.random.randint(0, len(auto_prompt[prompt_type]))]
+
+def run_generation_job(job: GenerationJob):
+    """
+    在推理线程中执行一次完整的生成：分离提示音频 → 生成tokens → 解码 → 保存
+    n_samples > 1 时所有候选在同一批次中生成
+    """
+    pmt_wav = None
+    vocal_wav = None
+    bgm_wav = None
+    melody_is_wav = True
+
+    if job.prompt_audio_path:
+        job.stage = "separating"
+        pmt_wav, vocal_wav, bgm_wav = separator.run(job.prompt_audio_path)
+    elif job.auto_prompt_audio_type:
+        # 每个候选各自抽取提示，增加候选之间的差异
+        prompt_token = torch.cat([_pick_auto_prompt(job.auto_prompt_audio_type) for _ in range(job.n_samples)], dim=0)
+
+        pmt_wav = prompt_token[:,[0],:]
+        vocal_wav = prompt_token[:,[1],:]
+        bgm_wav = prompt_token[:,[2],:]
+        melody_is_wav = False
+
+    # 设置生成参数
+    model.set_generation_params(
+        duration=cfg.max_dur,
+        extend_stride=5,
+        temperature=job.temperature,
+        cfg_coef=job.cfg_coef,
+        top_k=job.top_k,
+        top_p=0.0,
+        record_tokens=True,
+        record_window=50
+    )
+
+    def on_progress(generated_tokens: int, total_tokens: int):
+        job.generated_tokens = generated_tokens
+        job.total_tokens = total_tokens
+
+    model.set_custom_progress_callback(on_progress)
+
+    # 准备生成输入
+    generate_inp = {
+        'lyrics': [job.lyrics.replace("  ", " ")] * job.n_samples,
+        'descriptions': [job.descriptions] * job.n_samples,
+        'melody_wavs': pmt_wav,
+        'vocal_wavs': vocal_wav,
+        'bgm_wavs': bgm_wav,
+        'melody_is_wav': melody_is_wav,
+    }
+
+    print(f"🎵 开始生成歌曲 (ID: {job.job_id}, 候选数: {job.n_samples})...")
+    job.stage = "generating"
+    job.lm_started_at = time.time()
+    try:
+        # 生成tokens（int8量化后的LM直接以fp32激活运行，不再套bf16 autocast）
+        with inference_autocast(device) if not lm_quantized else nullcontext():
+            tokens = model.generate(**generate_inp, return_tokens=True)
+    finally:
+        model.set_custom_progress_callback(None)
+        job.lm_seconds = time.time() - job.lm_started_at
+    print(f"🎼 tokens生成完成 (ID: {job.job_id}): {job.generated_tokens} 帧, {job.tokens_per_second} tokens/s")
+
+    # 逐个候选解码（各自截断到自己的EOS）并保存，第一个候选沿用 {job_id}.flac 以兼容 /download
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    prompts = (pmt_wav, vocal_wav, bgm_wav) if melody_is_wav else ()
+    for index, sample_tokens in enumerate(model.split_tokens(tokens)):
+        job.stage = "decoding"
+        if job.chunks is not None:
+            # 流式：每个窗口解码完成即推送给客户端，同时拼接用于保存
+            pieces = []
+            for chunk in model.generate_audio_stream(sample_tokens, *prompts):
+                chunk = chunk[0].cpu().float()
+                pieces.append(chunk)
+                job.chunks.put(chunk)
+            wav = torch.cat(pieces, dim=-1)
+        else:
+            with torch.no_grad():
+                wav = model.generate_audio(sample_tokens, *prompts)[0].cpu().float()
+
+        job.stage = "saving"
+        file_id = job.job_id if index == 0 else f"{job.job_id}_{index}"
+        target_wav_path = f"{OUTPUT_DIR}/{file_id}.flac"
+        torchaudio.save(target_wav_path, wav, cfg.sample_rate)
+        job.file_paths.append(target_wav_path)
+    job.stage = "done"
+
+STREAM_FORMATS = {"wav": "audio/wav", "flac": "audio/flac"}
+
+class AudioStreamEncoder:
+    """把PCM块编码为可边生成边发送的 WAV / FLAC 字节流（总长度未知）"""
+
+    def __init__(self, fmt: str, sample_rate: int, channels: int):
+        self.fmt = fmt
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self._flac = None
+        self._buffer = None
+        self._sent = 0
+
+    def header(self) -> bytes:
+        if self.fmt == "wav":
+            # RIFF/data 长度未知，按流式WAV惯例写 0xFFFFFFFF
+            byte_rate = self.sample_rate * self.channels * 2
+            return (b"RIFF" + struct.pack("<I", 0xFFFFFFFF) + b"WAVE"
+                    + b"fmt " + struct.pack("<IHHIIHH", 16, 1, self.channels, self.sample_rate, byte_rate, self.channels * 2, 16)
+                    + b"data" + struct.pack("<I", 0xFFFFFFFF))
+        import soundfile
+        self._buffer = io.BytesIO()
+        self._flac = soundfile.SoundFile(self._buffer, mode="w", samplerate=self.sample_rate,
+                                         channels=self.channels, format="FLAC", subtype="PCM_16")
+        return self._drain()
+
+    def encode(self, chunk: torch.Tensor) -> bytes:
+        samples = chunk.clamp(-1.0, 1.0).t().contiguous()
+        if self.fmt == "wav":
+            return (samples * 32767).round().short().numpy().tobytes()
+        self._flac.write(samples.numpy())
+        return self._drain()
+
+    def close(self) -> bytes:
+        if self._flac is None:
+            return b""
+        # 关闭时libsndfile会回写STREAMINFO头，已发送的头保持"总样本数未知"，FLAC解码器可正常处理
+        self._flac.close()
+        return self._drain()
+
+    def _drain(self) -> bytes:
+        data = bytes(self._buffer.getbuffer()[self._sent:])
+        self._sent += len(data)
+        return data
+
+async def _stream_job_audio(job: GenerationJob, fmt: str, first_chunk: torch.Tensor):
+    encoder = AudioStreamEncoder(fmt, cfg.sample_rate, first_chunk.shape[0])
+    yield encoder.header()
+    chunk = first_chunk
+    while chunk is not None:
+        yield encoder.encode(chunk)
+        chunk = await asyncio.to_thread(job.chunks.get)
+    yield encoder.close()
+    if job.status != JobStatus.SUCCEEDED:
+        print(f"❌ 流式生成未完成 (ID: {job.job_id}): {job.error}")
+
+def _enqueue(job: GenerationJob) -> int:
+    try:
+        return generation_queue.submit(job)
+    except queue.Full:
+        if job.prompt_audio_path and os.path.exists(job.prompt_audio_path):
+            os.unlink(job.prompt_audio_path)
+        raise HTTPException(
+            status_code=429,
+            detail=f"生成队列已满（{generation_queue.maxsize}），请稍后重试",
+            headers={"Retry-After": "30"}
+        )
+
+def _validate_song_request(request: SongRequest):
+    if not request.lyrics.strip():
+        raise HTTPException(status_code=400, detail="歌词不能为空")
+    if request.auto_prompt_audio_type and request.auto_prompt_audio_type not in AUTO_PROMPT_TYPES:
+        raise HTTPException(status_code=400, detail=f"不支持的音乐风格: {request.auto_prompt_audio_type}")
+    _validate_n_samples(request.n_samples)
+
+def _validate_n_samples(n_samples: int):
+    if not 1 <= n_samples <= MAX_SAMPLES:
+        raise HTTPException(status_code=400, detail=f"n_samples 需在 1-{MAX_SAMPLES} 之间")
+
+async def _save_prompt_audio(audio_file: UploadFile) -> str:
+    if not audio_file.content_type or not audio_file.content_type.startswith('audio/'):
+        raise HTTPException(status_code=400, detail="请上传音频文件")
+    with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as temp_audio:
+        temp_audio.write(await audio_file.read())
+        return temp_audio.name
+
+def _submit_response(job: GenerationJob, position: int) -> JobSubmitResponse:
+    return JobSubmitResponse(
+        job_id=job.job_id,
+        status=job.status,
+        queue_position=position,
+        status_url=f"/jobs/{job.job_id}",
+        result_url=f"/jobs/{job.job_id}/result"
+    )
+
+async def _wait_for_job(job: GenerationJob) -> SongResponse:
+    """兼容旧接口：异步等待任务完成，不占用事件循环"""
+    try:
+        await asyncio.wrap_future(job.future)
+    except Exception:
+        raise HTTPException(status_code=500, detail=f"生成失败: {job.error}")
+    return SongResponse(
+        success=True,
+        message="歌曲生成成功",
+        file_id=job.job_id,
+        file_path=job.file_path,
+        generation_time=job.finished_at - job.started_at,
+        file_ids=job.file_ids
+    )
+
 def initialize_model(ckpt_path: str):
     """初始化模型"""
     global model, separator, auto_prompt, cfg
@@ -74,16 +544,27 @@ def initialize_model(ckpt_path: str):
     cfg.mode = 'inference'
     max_duration = cfg.max_dur
     
+    # 选择设备：SONG_DEVICE=auto/cuda/cpu
+    global device, lm_quantized
+    device = resolve_device(SONG_DEVICE).type
+    print(f"🖥️  使用设备: {device}")
+    if device == 'cpu':
+        # flash-attn 只有CUDA实现，CPU上使用普通注意力
+        cfg.lm.use_flash_attn_2 = False
+        threads = configure_cpu_threads(CPU_THREADS or None)
+        if CPU_BF16 != "auto":
+            set_cpu_autocast(CPU_BF16 in ("1", "true"))
+        print(f"🧵 CPU线程数: {threads}, bf16 autocast: {cpu_autocast_enabled()} (硬件支持: {cpu_supports_bf16()})")
+    
     # 初始化模型
     model_light = CodecLM_PL(cfg, model_path)
     
-    # 自动检测设备（支持CPU/GPU兼容）
-    global device
-    device = 'cuda' if torch.cuda.is_available() else 'cpu'
-    print(f"🖥️  使用设备: {device}")
-    
     model_light = model_light.eval().to(device)
     model_light.audiolm.cfg = cfg
+    if device == 'cpu' and CPU_QUANTIZE:
+        quantize_dynamic_int8(model_light.audiolm)
+        lm_quantized = True
+        print("🔢 LM线性层已转换为int8动态量化")
     
     model = CodecLM(
         name="song_generation_api",
@@ -100,6 +581,7 @@ def initialize_model(ckpt_path: str):
     auto_prompt = torch.load('ckpt/ckpt/prompt.pt')
     
     print("✅ 模型初始化完成!")
+    generation_queue.start()
 
 @app.on_event("startup")
 async def startup_event():
@@ -144,13 +626,13 @@ async def health_check():
     system_info = {
         "platform": platform.system(),
         "python_version": platform.python_version(),
-        "cpu_percent": psutil.cpu_percent(interval=1),
+        "cpu_percent": psutil.cpu_percent(interval=None),
         "memory_percent": psutil.virtual_memory().percent,
         "disk_usage": psutil.disk_usage('/').percent if platform.system() != 'Windows' else psutil.disk_usage('C:').percent
     }
     
-    # 整体状态
-    overall_status = "healthy" if model_status and torch.cuda.is_available() else "degraded"
+    # 整体状态：CPU模式是正式支持的运行方式，不视为降级
+    overall_status = "healthy" if model_status and (device == 'cpu' or torch.cuda.is_available()) else "degraded"
     
     return {
         "status": overall_status,
@@ -160,11 +642,28 @@ async def health_check():
             "ready": model_status
         },
         "gpu": gpu_info,
+        "device": {
+            "type": device,
+            "threads": torch.get_num_threads(),
+            "int8_quantized": lm_quantized,
+            "bf16_autocast": device == 'cpu' and cpu_autocast_enabled() and not lm_quantized,
+        },
         "system": system_info,
+        "queue": {
+            "depth": generation_queue.depth(),
+            "capacity": generation_queue.maxsize,
+            "running": generation_queue.current.job_id if generation_queue.current else None
+        },
         "api_version": "1.0.0",
         "endpoints": {
             "generate": "/generate",
             "generate_with_audio": "/generate_with_audio", 
+            "generate_stream": "/generate_stream?format=wav|flac",
+            "submit_job": "/jobs",
+            "submit_job_with_audio": "/jobs/with_audio",
+            "job_status": "/jobs/{job_id}",
+            "job_result": "/jobs/{job_id}/result",
+            "metrics": "/metrics",
             "download": "/download/{file_id}",
             "supported_genres": "/supported_genres"
         }
@@ -175,108 +674,158 @@ async def get_supported_genres():
     """获取支持的音乐风格"""
     return {"genres": AUTO_PROMPT_TYPES}
 
+@app.post("/jobs", response_model=JobSubmitResponse, status_code=202)
+async def submit_job(request: SongRequest):
+    """提交生成任务，立即返回任务ID"""
+    if model is None:
+        raise HTTPException(status_code=503, detail="模型未初始化")
+    _validate_song_request(request)
+
+    job = GenerationJob(
+        job_id=str(uuid.uuid4()),
+        lyrics=request.lyrics,
+        descriptions=request.descriptions,
+        auto_prompt_audio_type=request.auto_prompt_audio_type,
+        cfg_coef=request.cfg_coef,
+        temperature=request.temperature,
+        top_k=request.top_k,
+        n_samples=request.n_samples
+    )
+    return _submit_response(job, _enqueue(job))
+
+@app.post("/jobs/with_audio", response_model=JobSubmitResponse, status_code=202)
+async def submit_job_with_audio(
+    lyrics: str,
+    descriptions: Optional[str] = None,
+    audio_file: UploadFile = File(...),
+    cfg_coef: float = 1.5,
+    temperature: float = 0.9,
+    top_k: int = 50,
+    n_samples: int = 1
+):
+    """提交带音频提示的生成任务"""
+    if model is None:
+        raise HTTPException(status_code=503, detail="模型未初始化")
+    if not lyrics.strip():
+        raise HTTPException(status_code=400, detail="歌词不能为空")
+    _validate_n_samples(n_samples)
+
+    job = GenerationJob(
+        job_id=str(uuid.uuid4()),
+        lyrics=lyrics,
+        descriptions=descriptions,
+        prompt_audio_path=await _save_prompt_audio(audio_file),
+        cfg_coef=cfg_coef,
+        temperature=temperature,
+        top_k=top_k,
+        n_samples=n_samples
+    )
+    return _submit_response(job, _enqueue(job))
+
+@app.get("/jobs/{job_id}")
+async def get_job_status(job_id: str):
+    """查询任务状态与进度"""
+    job = generation_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="任务不存在或已过期")
+    return job.to_dict(generation_queue.position(job_id))
+
+@app.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str, index: int = 0):
+    """下载任务结果（index 为候选序号）；未完成时返回409"""
+    job = generation_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="任务不存在或已过期")
+    if job.status == JobStatus.FAILED:
+        raise HTTPException(status_code=500, detail=f"生成失败: {job.error}")
+    if job.status != JobStatus.SUCCEEDED:
+        raise HTTPException(status_code=409, detail=f"任务尚未完成: {job.status}")
+    if not 0 <= index < len(job.file_paths):
+        raise HTTPException(status_code=404, detail=f"候选序号超出范围: {index}")
+    file_path = job.file_paths[index]
+    if not os.path.exists(file_path):
+        raise HTTPException(status_code=410, detail="结果文件已清理")
+    return FileResponse(
+        path=file_path,
+        filename=f"song_{Path(file_path).stem}.flac",
+        media_type="audio/flac"
+    )
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """取消排队中的任务"""
+    job = generation_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="任务不存在或已过期")
+    if not generation_queue.cancel(job_id):
+        raise HTTPException(status_code=409, detail=f"任务状态为 {job.status}，无法取消")
+    return job.to_dict()
+
+@app.get("/metrics")
+async def get_metrics():
+    """队列深度与吞吐指标"""
+    return generation_queue.metrics()
+
+@app.post("/generate_stream")
+async def generate_song_stream(request: SongRequest, format: str = "wav"):
+    """
+    流式生成：入队后边解码边返回 WAV/FLAC 字节，首段音频在整首歌解码完成前即可播放
+    任务ID见响应头 X-Job-Id，完成后同样可通过 /jobs/{job_id}/result 下载
+    """
+    if model is None:
+        raise HTTPException(status_code=503, detail="模型未初始化")
+    _validate_song_request(request)
+    fmt = format.lower()
+    if fmt not in STREAM_FORMATS:
+        raise HTTPException(status_code=400, detail=f"不支持的流格式: {format}，可选: {', '.join(STREAM_FORMATS)}")
+    if request.n_samples != 1:
+        raise HTTPException(status_code=400, detail="流式生成仅支持 n_samples=1")
+    if fmt == "flac":
+        try:
+            import soundfile  # noqa: F401
+        except ImportError:
+            raise HTTPException(status_code=400, detail="FLAC流需要安装 soundfile，请使用 format=wav")
+
+    job = GenerationJob(
+        job_id=str(uuid.uuid4()),
+        lyrics=request.lyrics,
+        descriptions=request.descriptions,
+        auto_prompt_audio_type=request.auto_prompt_audio_type,
+        cfg_coef=request.cfg_coef,
+        temperature=request.temperature,
+        top_k=request.top_k,
+        chunks=queue.Queue()
+    )
+    _enqueue(job)
+    # 等到首段音频（或任务失败）再返回响应头：首段之前失败时返回5xx，而不是200加空响应体
+    first_chunk = await asyncio.to_thread(job.chunks.get)
+    if first_chunk is None:
+        raise HTTPException(status_code=500, detail=f"生成失败: {job.error or job.status}")
+    return StreamingResponse(
+        _stream_job_audio(job, fmt, first_chunk),
+        media_type=STREAM_FORMATS[fmt],
+        headers={"X-Job-Id": job.job_id, "Cache-Control": "no-store"}
+    )
+
 @app.post("/generate", response_model=SongResponse)
-async def generate_song(request: SongRequest, background_tasks: BackgroundTasks):
-    """生成歌曲"""
+async def generate_song(request: SongRequest):
+    """生成歌曲（兼容接口：入队后等待完成，生成期间不阻塞其他请求）"""
     if model is None:
         raise HTTPException(status_code=503, detail="模型未初始化")
-    
-    try:
-        start_time = time.time()
-        
-        # 验证输入
-        if not request.lyrics.strip():
-            raise HTTPException(status_code=400, detail="歌词不能为空")
-        
-        if request.auto_prompt_audio_type and request.auto_prompt_audio_type not in AUTO_PROMPT_TYPES:
-            raise HTTPException(status_code=400, detail=f"不支持的音乐风格: {request.auto_prompt_audio_type}")
-        
-        # 生成唯一文件ID
-        file_id = str(uuid.uuid4())
-        output_dir = "output/api_generated"
-        os.makedirs(output_dir, exist_ok=True)
-        target_wav_path = f"{output_dir}/{file_id}.flac"
-        
-        # 准备生成参数
-        lyric = request.lyrics.replace("  ", " ")
-        descriptions = request.descriptions
-        
-        # 处理音频提示
-        pmt_wav = None
-        vocal_wav = None
-        bgm_wav = None
-        melody_is_wav = True
-        
-        if request.auto_prompt_audio_type:
-            merge_prompt = [item for sublist in auto_prompt.values() for item in sublist]
-            if request.auto_prompt_audio_type == "Auto":
-                prompt_token = merge_prompt[np.random.randint(0, len(merge_prompt))]
-            else:
-                prompt_token = auto_prompt[request.auto_prompt_audio_type][np.random.randint(0, len(auto_prompt[request.auto_prompt_audio_type]))]
-            
-            pmt_wav = prompt_token[:,[0],:]
-            vocal_wav = prompt_token[:,[1],:]
-            bgm_wav = prompt_token[:,[2],:]
-            melody_is_wav = False
-        
-        # 设置生成参数
-        model.set_generation_params(
-            duration=cfg.max_dur,
-            extend_stride=5,
-            temperature=request.temperature,
-            cfg_coef=request.cfg_coef,
-            top_k=request.top_k,
-            top_p=0.0,
-            record_tokens=True,
-            record_window=50
-        )
-        
-        # 准备生成输入
-        generate_inp = {
-            'lyrics': [lyric],
-            'descriptions': [descriptions],
-            'melody_wavs': pmt_wav,
-            'vocal_wavs': vocal_wav,
-            'bgm_wavs': bgm_wav,
-            'melody_is_wav': melody_is_wav,
-        }
-        
-        print(f"🎵 开始生成歌曲 (ID: {file_id})...")
-        
-        # 生成tokens
-        if device == 'cuda':
-            with torch.autocast(device_type="cuda", dtype=torch.float16):
-                tokens = model.generate(**generate_inp, return_tokens=True)
-        else:
-            tokens = model.generate(**generate_inp, return_tokens=True)
-        
-        # 生成音频
-        with torch.no_grad():
-            if melody_is_wav:
-                wav_seperate = model.generate_audio(tokens, pmt_wav, vocal_wav, bgm_wav)
-            else:
-                wav_seperate = model.generate_audio(tokens)
-        
-        # 保存音频文件
-        torchaudio.save(target_wav_path, wav_seperate[0].cpu().float(), cfg.sample_rate)
-        
-        generation_time = time.time() - start_time
-        print(f"✅ 歌曲生成完成 (ID: {file_id}), 耗时: {generation_time:.2f}秒")
-        
-        # 添加后台任务清理临时文件（1小时后）
-        background_tasks.add_task(cleanup_file, target_wav_path, delay=3600)
-        
-        return SongResponse(
-            success=True,
-            message="歌曲生成成功",
-            file_id=file_id,
-            file_path=target_wav_path,
-            generation_time=generation_time
-        )
-        
-    except Exception as e:
-        print(f"❌ 生成歌曲时出错: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"生成失败: {str(e)}")
+    _validate_song_request(request)
+
+    job = GenerationJob(
+        job_id=str(uuid.uuid4()),
+        lyrics=request.lyrics,
+        descriptions=request.descriptions,
+        auto_prompt_audio_type=request.auto_prompt_audio_type,
+        cfg_coef=request.cfg_coef,
+        temperature=request.temperature,
+        top_k=request.top_k,
+        n_samples=request.n_samples
+    )
+    _enqueue(job)
+    return await _wait_for_job(job)
 
 @app.post("/generate_with_audio", response_model=SongResponse)
 async def generate_song_with_audio(
@@ -286,102 +835,32 @@ async def generate_song_with_audio(
     cfg_coef: float = 1.5,
     temperature: float = 0.9,
     top_k: int = 50,
-    background_tasks: BackgroundTasks = BackgroundTasks()
+    n_samples: int = 1
 ):
-    """使用音频提示生成歌曲"""
+    """使用音频提示生成歌曲（兼容接口）"""
     if model is None:
         raise HTTPException(status_code=503, detail="模型未初始化")
-    
-    try:
-        start_time = time.time()
-        
-        # 验证音频文件
-        if not audio_file.content_type.startswith('audio/'):
-            raise HTTPException(status_code=400, detail="请上传音频文件")
-        
-        # 保存上传的音频文件
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as temp_audio:
-            content = await audio_file.read()
-            temp_audio.write(content)
-            temp_audio_path = temp_audio.name
-        
-        try:
-            # 分离音频
-            pmt_wav, vocal_wav, bgm_wav = separator.run(temp_audio_path)
-            melody_is_wav = True
-            
-            # 生成唯一文件ID
-            file_id = str(uuid.uuid4())
-            output_dir = "output/api_generated"
-            os.makedirs(output_dir, exist_ok=True)
-            target_wav_path = f"{output_dir}/{file_id}.flac"
-            
-            # 设置生成参数
-            model.set_generation_params(
-                duration=cfg.max_dur,
-                extend_stride=5,
-                temperature=temperature,
-                cfg_coef=cfg_coef,
-                top_k=top_k,
-                top_p=0.0,
-                record_tokens=True,
-                record_window=50
-            )
-            
-            # 准备生成输入
-            generate_inp = {
-                'lyrics': [lyrics.replace("  ", " ")],
-                'descriptions': [descriptions],
-                'melody_wavs': pmt_wav,
-                'vocal_wavs': vocal_wav,
-                'bgm_wavs': bgm_wav,
-                'melody_is_wav': melody_is_wav,
-            }
-            
-            print(f"🎵 开始生成歌曲 (ID: {file_id}), 使用音频提示...")
-            
-            # 生成tokens
-            if device == 'cuda':
-                with torch.autocast(device_type="cuda", dtype=torch.float16):
-                    tokens = model.generate(**generate_inp, return_tokens=True)
-            else:
-                tokens = model.generate(**generate_inp, return_tokens=True)
-            
-            # 生成音频
-            with torch.no_grad():
-                wav_seperate = model.generate_audio(tokens, pmt_wav, vocal_wav, bgm_wav)
-            
-            # 保存音频文件
-            torchaudio.save(target_wav_path, wav_seperate[0].cpu().float(), cfg.sample_rate)
-            
-            generation_time = time.time() - start_time
-            print(f"✅ 歌曲生成完成 (ID: {file_id}), 耗时: {generation_time:.2f}秒")
-            
-            # 添加后台任务清理文件
-            background_tasks.add_task(cleanup_file, target_wav_path, delay=3600)
-            background_tasks.add_task(cleanup_file, temp_audio_path, delay=10)
-            
-            return SongResponse(
-                success=True,
-                message="歌曲生成成功",
-                file_id=file_id,
-                file_path=target_wav_path,
-                generation_time=generation_time
-            )
-            
-        finally:
-            # 清理临时音频文件
-            if os.path.exists(temp_audio_path):
-                os.unlink(temp_audio_path)
-                
-    except Exception as e:
-        print(f"❌ 生成歌曲时出错: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"生成失败: {str(e)}")
+    if not lyrics.strip():
+        raise HTTPException(status_code=400, detail="歌词不能为空")
+    _validate_n_samples(n_samples)
+
+    job = GenerationJob(
+        job_id=str(uuid.uuid4()),
+        lyrics=lyrics,
+        descriptions=descriptions,
+        prompt_audio_path=await _save_prompt_audio(audio_file),
+        cfg_coef=cfg_coef,
+        temperature=temperature,
+        top_k=top_k,
+        n_samples=n_samples
+    )
+    _enqueue(job)
+    return await _wait_for_job(job)
 
 @app.get("/download/{file_id}")
 async def download_song(file_id: str):
     """下载生成的歌曲"""
-    file_path = f"output/api_generated/{file_id}.flac"
+    file_path = f"{OUTPUT_DIR}/{Path(file_id).name}.flac"
     
     if not os.path.exists(file_path):
         raise HTTPException(status_code=404, detail="文件不存在")
@@ -392,21 +871,7 @@ async def download_song(file_id: str):
         media_type="audio/flac"
     )
 
-async def cleanup_file(file_path: str, delay: int = 0):
-    """清理文件的后台任务"""
-    if delay > 0:
-        await asyncio.sleep(delay)
-    
-    try:
-        if os.path.exists(file_path):
-            os.unlink(file_path)
-            print(f"🗑️ 已清理文件: {file_path}")
-    except Exception as e:
-        print(f"⚠️ 清理文件失败: {e}")
-
 if __name__ == "__main__":
-    import asyncio
-    
     if len(sys.argv) < 2:
         print("用法: python api_server.py <ckpt_path> [port]")
         print("示例: python api_server.py ckpt/songgeneration_base 8000")
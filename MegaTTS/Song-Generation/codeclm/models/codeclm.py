@@ -12,6 +12,7 @@ from codeclm.tokenizer.audio_tokenizer import AudioTokenizer
 from .lm_levo import LmModel
 from ..modules.conditioners import ConditioningAttributes, AudioCondition
 from ..utils.autocast import TorchAutocast
+from ..utils.inference import module_device
 import torch
 from torch.nn import functional as F
 import torchaudio
@@ -51,7 +52,8 @@ class CodecLM:
         assert max_duration is not None
 
         self.max_duration: float = max_duration
-        self.device = torch.device("cuda")
+        # follow wherever the LM weights were placed (CUDA or CPU)
+        self.device = module_device(lm)
         self.generation_params: dict = {}
         # self.set_generation_params(duration=15)  # 15 seconds by default
         self.set_generation_params(duration=15, extend_stride=self.max_duration // 2)
@@ -110,7 +112,13 @@ class CodecLM:
                  ) -> tp.Union[torch.Tensor, tp.Tuple[torch.Tensor, torch.Tensor]]:
         """Generate samples conditioned on text and melody.
 
+        All samples are generated in one batched run: `lyrics` and `descriptions` hold one entry per
+        sample, and the prompt wavs/tokens either have one entry per sample or a single entry shared by
+        every sample. With more than one sample, the returned tokens are trimmed to the longest sample;
+        use `split_tokens` to cut each sample at its own EOS.
+
         Args:
+            lyrics (list of str): Lyrics of each sample.
             descriptions (list of str): A list of strings used as text conditioning.
             melody_wavs: (torch.Tensor or list of Tensor): A batch of waveforms used as
                 melody conditioning. Should have shape [B, C, T] with B matching the description length,
@@ -141,15 +149,24 @@ class CodecLM:
         texts, audio_qt_embs = self._prepare_tokens_and_attributes(lyrics=lyrics, melody_wavs=melody_wavs, vocal_wavs=vocal_wavs, bgm_wavs=bgm_wavs, melody_is_wav=melody_is_wav)
         tokens = self._generate_tokens(texts, descriptions, audio_qt_embs)
 
-        if (tokens == self.lm.eos_token_id).any():
-            length = torch.nonzero(torch.eq(tokens, self.lm.eos_token_id))[:,-1].min()
-            tokens = tokens[...,:length] 
+        tokens = tokens[..., :max(self._eos_lengths(tokens))]
 
         if return_tokens:
             return tokens
-        else:
-            out = self.generate_audio(tokens)
-            return out
+        if tokens.shape[0] == 1:
+            return self.generate_audio(tokens)
+        return [self.generate_audio(sample_tokens) for sample_tokens in self.split_tokens(tokens)]
+
+    def _eos_lengths(self, tokens: torch.Tensor) -> tp.List[int]:
+        """Per-sample length up to the first EOS on any codebook (full length without EOS)."""
+        is_eos = torch.eq(tokens, self.lm.eos_token_id).any(dim=1)  # [B, T]
+        first_eos = torch.where(is_eos.any(dim=-1), is_eos.int().argmax(dim=-1),
+                                torch.full_like(is_eos[:, 0], tokens.shape[-1], dtype=torch.long))
+        return first_eos.tolist()
+
+    def split_tokens(self, tokens: torch.Tensor) -> tp.List[torch.Tensor]:
+        """Split batched tokens [B, K, T] into per-sample tensors [1, K, T_i] cut at each sample's EOS."""
+        return [tokens[[b], :, :length] for b, length in enumerate(self._eos_lengths(tokens))]
 
 
     @torch.no_grad()
@@ -169,19 +186,18 @@ class CodecLM:
             melody_wavs (torch.Tensor, optional): A batch of waveforms
                 used as melody conditioning. Defaults to None.
         """
-        assert len(lyrics) == 1
         texts = [lyric for lyric in lyrics]
-        audio_qt_embs = []
+        batch_size = len(texts)
         target_melody_token_len = self.lm.cfg.prompt_len * self.frame_rate
         # import pdb; pdb.set_trace()
         if melody_wavs is None:
-            melody_tokens = torch.full((1,1,target_melody_token_len), 16385, device=self.device).long()
+            melody_tokens = torch.full((batch_size,1,target_melody_token_len), 16385, device=self.device).long()
         elif melody_wavs is not None:
             if 'prompt_audio' not in self.lm.condition_provider.conditioners:
                 raise RuntimeError("This model doesn't support melody conditioning. "
                                    "Use the `melody` model.")
-            assert len(melody_wavs) == len(texts), \
-                f"number of melody wavs must match number of descriptions! " \
+            assert len(melody_wavs) in (1, len(texts)), \
+                f"number of melody wavs must be 1 or match number of descriptions! " \
                 f"got melody len={len(melody_wavs)}, and descriptions len={len(texts)}"
             if type(melody_wavs) == list:
                 melody_wavs = torch.stack(melody_wavs, dim=0)
@@ -190,15 +206,12 @@ class CodecLM:
                 melody_tokens, scale = self.audiotokenizer.encode(melody_wavs)
             else:
                 melody_tokens = melody_wavs
-            if melody_tokens.shape[-1] > target_melody_token_len:
-                melody_tokens = melody_tokens[...,:target_melody_token_len]
-            elif melody_tokens.shape[-1] < target_melody_token_len:
-                melody_tokens = torch.cat([melody_tokens, torch.full((1,1,target_melody_token_len - melody_tokens.shape[-1]), 16385, device=self.device).long()], dim=-1)
+            melody_tokens = self._fit_prompt_tokens(melody_tokens, batch_size, target_melody_token_len)
 
         if bgm_wavs is None:
             assert vocal_wavs is None, "vocal_wavs is not None when bgm_wavs is None"
-            bgm_tokens = torch.full((1,1,target_melody_token_len), 16385, device=self.device).long()
-            vocal_tokens = torch.full((1,1,target_melody_token_len), 16385, device=self.device).long()
+            bgm_tokens = torch.full((batch_size,1,target_melody_token_len), 16385, device=self.device).long()
+            vocal_tokens = torch.full((batch_size,1,target_melody_token_len), 16385, device=self.device).long()
         else:
             assert vocal_wavs is not None, "vocal_wavs is None when bgm_wavs is not None"
             if type(vocal_wavs) == list:
@@ -218,19 +231,24 @@ class CodecLM:
             assert vocal_tokens.shape[-1] == bgm_tokens.shape[-1], \
                 f"vocal and bgm tokens should have the same length! " \
                 f"got vocal len={vocal_tokens.shape[-1]}, and bgm len={bgm_tokens.shape[-1]}"
-            if bgm_tokens.shape[-1] > target_melody_token_len:
-                bgm_tokens = bgm_tokens[...,:target_melody_token_len]
-            elif bgm_tokens.shape[-1] < target_melody_token_len:
-                bgm_tokens = torch.cat([bgm_tokens, torch.full((1,1,target_melody_token_len - bgm_tokens.shape[-1]), 16385, device=self.device).long()], dim=-1)
-            if vocal_tokens.shape[-1] > target_melody_token_len:
-                vocal_tokens = vocal_tokens[...,:target_melody_token_len]
-            elif vocal_tokens.shape[-1] < target_melody_token_len:
-                vocal_tokens = torch.cat([vocal_tokens, torch.full((1,1,target_melody_token_len - vocal_tokens.shape[-1]), 16385, device=self.device).long()], dim=-1)
+            bgm_tokens = self._fit_prompt_tokens(bgm_tokens, batch_size, target_melody_token_len)
+            vocal_tokens = self._fit_prompt_tokens(vocal_tokens, batch_size, target_melody_token_len)
         melody_tokens = torch.cat([melody_tokens, vocal_tokens, bgm_tokens], dim=1)
         assert melody_tokens.shape[-1] == target_melody_token_len
         audio_qt_embs = melody_tokens.long()
         return texts, audio_qt_embs
 
+    def _fit_prompt_tokens(self, tokens: torch.Tensor, batch_size: int, length: int) -> torch.Tensor:
+        """Crop or pad prompt tokens [B, 1, T] to `length`, broadcasting a single shared prompt to `batch_size`."""
+        if tokens.shape[-1] > length:
+            tokens = tokens[..., :length]
+        elif tokens.shape[-1] < length:
+            pad = torch.full((tokens.shape[0], 1, length - tokens.shape[-1]), 16385, device=self.device).long()
+            tokens = torch.cat([tokens, pad], dim=-1)
+        if tokens.shape[0] == 1 and batch_size > 1:
+            tokens = tokens.expand(batch_size, -1, -1)
+        return tokens
+
 
 
     def _generate_tokens(self, 
@@ -265,6 +283,7 @@ class CodecLM:
                                               descriptions=descriptions, 
                                               audio_qt_embs=audio_qt_embs, 
                                               max_gen_len=total_gen_len, 
+                                              callback=_progress_callback,
                                               **self.generation_params)
         else:
             raise NotImplementedError(f"duration {self.duration} < max duration {self.max_duration}")
@@ -284,3 +303,14 @@ class CodecLM:
         else:
             gen_audio = self.audiotokenizer.decode(gen_tokens, prompt)
             return gen_audio
+
+    @torch.no_grad()
+    def generate_audio_stream(self, gen_tokens: torch.Tensor, prompt=None, vocal_prompt=None, bgm_prompt=None, chunked=False):
+        """Generate audio from tokens progressively, yielding [B, C, T] chunks that concatenate to `generate_audio`."""
+        assert gen_tokens.dim() == 3
+        if self.seperate_tokenizer is not None and hasattr(self.seperate_tokenizer, 'decode_stream'):
+            gen_tokens_vocal = gen_tokens[:, [1], :]
+            gen_tokens_bgm = gen_tokens[:, [2], :]
+            yield from self.seperate_tokenizer.decode_stream([gen_tokens_vocal, gen_tokens_bgm], vocal_prompt, bgm_prompt, chunked=chunked)
+        else:
+            yield self.generate_audio(gen_tokens, prompt, vocal_prompt, bgm_prompt, chunked=chunked)
@@ -1,5 +1,5 @@
 
-from .llama.modeling_llama import LlamaConfig, CausalLMOutputWithPast, BaseModelOutputWithPast, LlamaDecoderLayer, LlamaRMSNorm
+from .llama.modeling_llama import LlamaConfig, CausalLMOutputWithPast, BaseModelOutputWithPast, LlamaDecoderLayer, LlamaRMSNorm, StaticKVCache
 from .llama.modeling_llama import LlamaForCausalLM as LlamaForCausalLM_base
 from .llama.modeling_llama import LlamaModel as LlamaModel_base
 import torch
@@ -139,7 +139,11 @@ class LmModel(LlamaModel_base):
         seq_length_with_past = seq_length
         past_key_values_length = 0
 
-        if past_key_values is not None:
+        static_cache = past_key_values if isinstance(past_key_values, StaticKVCache) else None
+        if static_cache is not None:
+            past_key_values_length = static_cache.seq_length
+            seq_length_with_past = seq_length_with_past + past_key_values_length
+        elif past_key_values is not None:
             past_key_values_length = past_key_values[0][0].shape[2]
             seq_length_with_past = seq_length_with_past + past_key_values_length
 
@@ -153,13 +157,17 @@ class LmModel(LlamaModel_base):
             position_ids = position_ids.view(-1, seq_length).long()
 
         # embed positions
-        if attention_mask is None:
-            attention_mask = torch.ones(
-                (batch_size, seq_length_with_past), dtype=torch.bool, device=inputs_embeds.device
+        if attention_mask is None and static_cache is not None and seq_length == 1:
+            # single-token decode step without padding: every cached position is visible, no mask needed
+            attention_mask = None
+        else:
+            if attention_mask is None:
+                attention_mask = torch.ones(
+                    (batch_size, seq_length_with_past), dtype=torch.bool, device=inputs_embeds.device
+                )
+            attention_mask = self._prepare_decoder_attention_mask(
+                attention_mask, (batch_size, seq_length), inputs_embeds, past_key_values_length
             )
-        attention_mask = self._prepare_decoder_attention_mask(
-            attention_mask, (batch_size, seq_length), inputs_embeds, past_key_values_length
-        )
 
         hidden_states = inputs_embeds
 
@@ -176,7 +184,10 @@ class LmModel(LlamaModel_base):
             if output_hidden_states:
                 all_hidden_states += (hidden_states,)
 
-            past_key_value = past_key_values[idx] if past_key_values is not None else None
+            if static_cache is not None:
+                past_key_value = static_cache.layer(idx)
+            else:
+                past_key_value = past_key_values[idx] if past_key_values is not None else None
 
             layer_args = (hidden_states, attention_mask, position_ids,)
 
@@ -213,6 +224,9 @@ class LmModel(LlamaModel_base):
             all_hidden_states += (hidden_states,)
 
         next_cache = next_decoder_cache if use_cache else None
+        if static_cache is not None:
+            static_cache.advance(seq_length)
+            next_cache = static_cache if use_cache else None
         if not return_dict:
             return tuple(v for v in [hidden_states, next_cache, all_hidden_states, all_self_attns] if v is not None)
         return BaseModelOutputWithPast(
@@ -102,6 +102,89 @@ def _expand_mask(mask: torch.Tensor, dtype: torch.dtype, tgt_len: Optional[int]
     return inverted_mask.masked_fill(inverted_mask.to(torch.bool), torch.finfo(dtype).min)
 
 
+class StaticKVCache:
+    """
+    Preallocated, fixed-capacity key/value cache for autoregressive decoding.
+
+    Each layer owns a `[bsz, num_kv_heads, max_cache_len, head_dim]` buffer that is allocated on first use
+    (so dtype/device follow the projected keys, e.g. under autocast) and written in place by index. Attention
+    reads only the valid prefix `[:, :, :seq_length]`, so decoding never reallocates or copies the history the
+    way `torch.cat([past_key_value[0], key_states], dim=2)` does.
+
+    All layers write at the same offset during one forward pass; the owning model calls `advance()` once the
+    pass is complete.
+    """
+
+    def __init__(self, num_layers: int, max_cache_len: int):
+        self.num_layers = num_layers
+        self.max_cache_len = max_cache_len
+        self.seq_length = 0
+        self.key_cache: List[Optional[torch.Tensor]] = [None] * num_layers
+        self.value_cache: List[Optional[torch.Tensor]] = [None] * num_layers
+
+    def layer(self, layer_idx: int) -> "StaticKVCacheLayer":
+        return StaticKVCacheLayer(self, layer_idx)
+
+    def update(
+        self, layer_idx: int, key_states: torch.Tensor, value_states: torch.Tensor
+    ) -> Tuple[torch.Tensor, torch.Tensor]:
+        start = self.seq_length
+        end = start + key_states.shape[-2]
+        if end > self.max_cache_len:
+            raise ValueError(f"StaticKVCache overflow: {end} > max_cache_len {self.max_cache_len}")
+
+        if self.key_cache[layer_idx] is None:
+            bsz, num_heads, _, head_dim = key_states.shape
+            shape = (bsz, num_heads, self.max_cache_len, head_dim)
+            self.key_cache[layer_idx] = torch.zeros(shape, dtype=key_states.dtype, device=key_states.device)
+            self.value_cache[layer_idx] = torch.zeros(shape, dtype=value_states.dtype, device=value_states.device)
+
+        key_cache = self.key_cache[layer_idx]
+        value_cache = self.value_cache[layer_idx]
+        key_cache[:, :, start:end].copy_(key_states)
+        value_cache[:, :, start:end].copy_(value_states)
+        return key_cache[:, :, :end], value_cache[:, :, :end]
+
+    def advance(self, num_tokens: int):
+        self.seq_length += num_tokens
+
+    def reset(self):
+        self.seq_length = 0
+
+
+class StaticKVCacheLayer:
+    """Per-layer handle passed to the attention module in place of a `(key, value)` tuple."""
+
+    def __init__(self, cache: StaticKVCache, layer_idx: int):
+        self.cache = cache
+        self.layer_idx = layer_idx
+
+    @property
+    def seq_length(self) -> int:
+        return self.cache.seq_length
+
+    def update(self, key_states: torch.Tensor, value_states: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+        return self.cache.update(self.layer_idx, key_states, value_states)
+
+
+def _past_length(past_key_value) -> int:
+    if isinstance(past_key_value, StaticKVCacheLayer):
+        return past_key_value.seq_length
+    return past_key_value[0].shape[-2]
+
+
+def _update_past_key_value(past_key_value, key_states, value_states, use_cache):
+    """Append the new keys/values to the cache; returns (key_states, value_states, present_key_value)."""
+    if isinstance(past_key_value, StaticKVCacheLayer):
+        key_states, value_states = past_key_value.update(key_states, value_states)
+        return key_states, value_states, (past_key_value if use_cache else None)
+    if past_key_value is not None:
+        # reuse k, v, self_attention
+        key_states = torch.cat([past_key_value[0], key_states], dim=2)
+        value_states = torch.cat([past_key_value[1], value_states], dim=2)
+    return key_states, value_states, ((key_states, value_states) if use_cache else None)
+
+
 class LlamaRMSNorm(nn.Module):
     def __init__(self, hidden_size, eps=1e-6):
         """
@@ -362,16 +445,13 @@ class LlamaAttention(nn.Module):
 
         kv_seq_len = key_states.shape[-2]
         if past_key_value is not None:
-            kv_seq_len += past_key_value[0].shape[-2]
+            kv_seq_len += _past_length(past_key_value)
         cos, sin = self.rotary_emb(value_states, seq_len=kv_seq_len)
         query_states, key_states = apply_rotary_pos_emb(query_states, key_states, cos, sin, position_ids)
 
-        if past_key_value is not None:
-            # reuse k, v, self_attention
-            key_states = torch.cat([past_key_value[0], key_states], dim=2)
-            value_states = torch.cat([past_key_value[1], value_states], dim=2)
-
-        past_key_value = (key_states, value_states) if use_cache else None
+        key_states, value_states, past_key_value = _update_past_key_value(
+            past_key_value, key_states, value_states, use_cache
+        )
 
         key_states = repeat_kv(key_states, self.num_key_value_groups)
         value_states = repeat_kv(value_states, self.num_key_value_groups)
@@ -453,18 +533,15 @@ class LlamaFlashAttention2(LlamaAttention):
 
         kv_seq_len = key_states.shape[-2]
         if past_key_value is not None:
-            kv_seq_len += past_key_value[0].shape[-2]
+            kv_seq_len += _past_length(past_key_value)
 
         cos, sin = self.rotary_emb(value_states, seq_len=kv_seq_len)
 
         query_states, key_states = apply_rotary_pos_emb(query_states, key_states, cos, sin, position_ids)
 
-        if past_key_value is not None:
-            # reuse k, v, self_attention
-            key_states = torch.cat([past_key_value[0], key_states], dim=2)
-            value_states = torch.cat([past_key_value[1], value_states], dim=2)
-
-        past_key_value = (key_states, value_states) if use_cache else None
+        key_states, value_states, past_key_value = _update_past_key_value(
+            past_key_value, key_states, value_states, use_cache
+        )
 
         query_states = query_states.transpose(1, 2)
         key_states = key_states.transpose(1, 2)
@@ -864,7 +941,11 @@ class LlamaModel(LlamaPreTrainedModel):
         seq_length_with_past = seq_length
         past_key_values_length = 0
 
-        if past_key_values is not None:
+        static_cache = past_key_values if isinstance(past_key_values, StaticKVCache) else None
+        if static_cache is not None:
+            past_key_values_length = static_cache.seq_length
+            seq_length_with_past = seq_length_with_past + past_key_values_length
+        elif past_key_values is not None:
             past_key_values_length = past_key_values[0][0].shape[2]
             seq_length_with_past = seq_length_with_past + past_key_values_length
 
@@ -913,7 +994,10 @@ class LlamaModel(LlamaPreTrainedModel):
             if output_hidden_states:
                 all_hidden_states += (hidden_states,)
 
-            past_key_value = past_key_values[idx] if past_key_values is not None else None
+            if static_cache is not None:
+                past_key_value = static_cache.layer(idx)
+            else:
+                past_key_value = past_key_values[idx] if past_key_values is not None else None
 
             if self.gradient_checkpointing and self.training:
 
@@ -953,6 +1037,9 @@ class LlamaModel(LlamaPreTrainedModel):
             all_hidden_states += (hidden_states,)
 
         next_cache = next_decoder_cache if use_cache else None
+        if static_cache is not None:
+            static_cache.advance(seq_length)
+            next_cache = static_cache if use_cache else None
         if not return_dict:
             return tuple(v for v in [hidden_states, next_cache, all_hidden_states, all_self_attns] if v is not None)
         return BaseModelOutputWithPast(
@@ -2,12 +2,14 @@
 import torch
 import math
 import random
+import hashlib
 import torch.nn as nn
 import typing as tp
 import torch.nn.functional as F
 from tqdm import tqdm
+from collections import OrderedDict
 from dataclasses import dataclass
-from codeclm.models.levo import CausalLM, LlamaConfig
+from codeclm.models.levo import CausalLM, LlamaConfig, StaticKVCache
 from codeclm.modules.streaming import StreamingModule
 from codeclm.modules.conditioners import (
     ConditioningAttributes,
@@ -31,6 +33,51 @@ class LMOutput:
     mask: torch.Tensor  # [B, K, T]
 
 
+class RepetitionPenaltyWindow:
+    """Rolling record of the last `window` sampled tokens, used to penalize repetitions.
+
+    Tokens are kept in a circular buffer [B, K, W] next to a per-codebook count tensor
+    [B, K, card + 1], so each step only adds the new token and subtracts the one leaving
+    the window. Tokens >= `card` (EOS / special tokens) are counted in a spare last slot
+    and never penalized. Logits of every token present in the window are divided by
+    `penalty` in a single batched op over [B, K, card].
+
+    Args:
+        batch_size (int): Number of samples B (without the CFG duplication).
+        code_depth (int): Number of codebooks K.
+        card (int): Number of penalizable token ids.
+        window (int): Number of most recent steps taken into account.
+        penalty (float): Divisor applied to the logits of recently sampled tokens.
+    """
+    def __init__(self, batch_size: int, code_depth: int, card: int, window: int,
+                 penalty: float = 1.1, device: tp.Optional[torch.device] = None):
+        assert window > 0, "window must be positive"
+        self.card = card
+        self.window = window
+        self.penalty = penalty
+        self.length = 0
+        self.tokens = torch.full((batch_size, code_depth, window), card, dtype=torch.long, device=device)
+        self.counts = torch.zeros((batch_size, code_depth, card + 1), dtype=torch.long, device=device)
+        self._ones = torch.ones((batch_size, code_depth, 1), dtype=torch.long, device=device)
+
+    def append(self, token: torch.Tensor):
+        """Record the sampled token of shape [B, K, 1]."""
+        token = token.clamp(max=self.card)
+        slot = self.length % self.window
+        if self.length >= self.window:
+            self.counts.scatter_add_(-1, self.tokens[..., slot:slot + 1], -self._ones)
+        self.tokens[..., slot:slot + 1] = token
+        self.counts.scatter_add_(-1, token, self._ones)
+        self.length += 1
+
+    def apply(self, logits: torch.Tensor) -> torch.Tensor:
+        """Penalize logits [B, K, card'] in place (card' >= card) and return them."""
+        if self.length > 0:
+            present = (self.counts[..., :self.card] > 0).long()
+            logits[..., :self.card] /= torch.pow(self.penalty, present)
+        return logits
+
+
 class LmModel(StreamingModule):
     """Transformer-based language model on multiple streams of codes.
 
@@ -77,10 +124,17 @@ class LmModel(StreamingModule):
                  num_layers_sub: int = 12,
                  cfg = None,
                  use_flash_attn_2: bool = True,
+                 use_static_kv_cache: bool = True,
+                 condition_cache_size: int = 64,
                  **kwargs):
         super().__init__()
 
         self.cfg_coef = cfg_coef
+        # decode with a preallocated KV cache instead of growing past_key_values with torch.cat
+        self.use_static_kv_cache = use_static_kv_cache
+        # LRU of per-sample inference conditions (type_info, prompt_audio, null conditions); 0 disables it
+        self.condition_cache_size = condition_cache_size
+        self._condition_cache: tp.OrderedDict[tp.Any, ConditionType] = OrderedDict()
     
         self.cfg_dropout = ClassifierFreeGuidanceDropout(p=cfg_dropout,seed=random.randint(0, 9999))
         self.att_dropout = AttributeDropout(p=attribute_dropout,seed=random.randint(0, 9999))
@@ -211,6 +265,9 @@ class LmModel(StreamingModule):
             attributes = self.att_dropout(attributes)   # selectively drop some attributes (text, wav, or more fine-grained)
             tokenized = self.condition_provider.tokenize(attributes)
             condition_tensors = self.condition_provider(tokenized)
+        elif self._can_cache_conditions():
+            condition_tensors = self._prepare_cached_condition_tensors(
+                batch_size, text, descriptions, audio_qt_emb, prepare_null_condition)
         else:
             conditions = []
             for i in range(batch_size):
@@ -220,12 +277,9 @@ class LmModel(StreamingModule):
                     if text is not None:
                         attr["text"]["description"] = text[i]
                 if 'prompt_audio' in self.condition_provider.conditioners:
-                    mask = (audio_qt_emb[[i], :, 0] == 16385).bool().unsqueeze(-1)
-                    audio_qt_seq = torch.cat([torch.full_like(audio_qt_emb[i][None][:,:,0], self.eos_token_id).unsqueeze(-1), audio_qt_emb[i][None]], dim=-1)    
-                    mask = mask.repeat(1, 1, audio_qt_seq.shape[-1])
-                    audio_qt_seq[mask] = 16385
+                    audio_qt_seq = self._prompt_audio_sequence(audio_qt_emb, i)
                     attr["audio"]['prompt_audio'] = AudioCondition(
-                        wav=audio_qt_seq.long().cuda(), 
+                        wav=audio_qt_seq.long().to(self._condition_device()),
                         length=torch.Tensor([audio_qt_seq.shape[-1]]).long(),
                         sample_rate=[self.cfg.sample_rate],)
                 if 'type_info' in self.condition_provider.conditioners:
@@ -233,7 +287,6 @@ class LmModel(StreamingModule):
                     if descriptions is not None:
                         attr["text"]["type_info"] = descriptions[i]
                 conditions.append(attr)
-                print("conditions", conditions)
             if prepare_null_condition:
                 cfg_inference = ClassifierFreeGuidanceDropoutInference() 
                 null_conditions = cfg_inference(conditions, condition_types=["audio", "text"], 
@@ -243,6 +296,106 @@ class LmModel(StreamingModule):
             condition_tensors = self.condition_provider(tokenized_conditions)
         return condition_tensors
         
+    def _condition_device(self) -> torch.device:
+        return next(self.condition_provider.parameters()).device
+
+    def _prompt_audio_sequence(self, audio_qt_emb: torch.Tensor, i: int) -> torch.Tensor:
+        """Prompt codes of sample `i` with a leading EOS, fully masked when the prompt is empty: [1, K, T+1]."""
+        mask = (audio_qt_emb[[i], :, 0] == 16385).bool().unsqueeze(-1)
+        audio_qt_seq = torch.cat([torch.full_like(audio_qt_emb[i][None][:,:,0], self.eos_token_id).unsqueeze(-1), audio_qt_emb[i][None]], dim=-1)
+        mask = mask.repeat(1, 1, audio_qt_seq.shape[-1])
+        audio_qt_seq[mask] = 16385
+        return audio_qt_seq
+
+    def _can_cache_conditions(self) -> bool:
+        """Per-sample conditions can only be concatenated when every conditioner pads to a fixed length."""
+        conditioners = self.condition_provider.conditioners
+        return (self.condition_cache_size > 0
+                and set(conditioners) <= {'description', 'prompt_audio', 'type_info'}
+                and all(getattr(c, 'max_len', None) is not None for c in conditioners.values()))
+
+    def clear_condition_cache(self):
+        self._condition_cache.clear()
+
+    def train(self, mode: bool = True):
+        # cached conditions are stale once the conditioner weights can change
+        self.clear_condition_cache()
+        return super().train(mode)
+
+    def _cached_condition(self, key: tp.Any, compute: tp.Callable[[], ConditionType]) -> ConditionType:
+        cached = self._condition_cache.get(key)
+        if cached is not None:
+            self._condition_cache.move_to_end(key)
+            return cached
+        cached = compute()
+        self._condition_cache[key] = cached
+        while len(self._condition_cache) > self.condition_cache_size:
+            self._condition_cache.popitem(last=False)
+        return cached
+
+    def _prepare_cached_condition_tensors(self,
+                                          batch_size: int,
+                                          text: tp.Optional[tp.List[str]],
+                                          descriptions: tp.Optional[tp.List[str]],
+                                          audio_qt_emb: tp.Optional[torch.Tensor],
+                                          prepare_null_condition: bool) -> ConditionTensors:
+        """Inference conditions assembled from per-sample rows.
+
+        Only the lyrics ('description') are conditioned for every call; the 'type_info' description,
+        the prompt audio and all null (CFG) conditions repeat across requests and are served from an
+        LRU cache. Every conditioner pads its output to a fixed `max_len` (the text tokenizer pads on
+        the right), so concatenating single-sample rows gives the same tensors as conditioning the
+        whole batch at once. Rows are ordered [conditions..., null conditions...] like the batched path.
+        """
+        conditioners = self.condition_provider.conditioners
+        device = self._condition_device()
+
+        def text_condition(name: str, values: tp.List[tp.Optional[str]]) -> ConditionType:
+            conditioner = conditioners[name]
+            return conditioner(conditioner.tokenize(values))
+
+        def audio_condition(name: str, wav: torch.Tensor, length: int) -> ConditionType:
+            # same layout as ConditionerProvider._collate_audios for a single sample
+            return conditioners[name](AudioCondition(
+                wav=wav.reshape(1, 1, -1).long().to(device),
+                length=torch.LongTensor([length]),
+                sample_rate=[self.cfg.sample_rate],))
+
+        rows: tp.Dict[str, tp.List[ConditionType]] = {}
+        for name in conditioners:
+            if name == 'description':
+                lyrics = [text[i] if text is not None else "" for i in range(batch_size)]
+                rows[name] = [text_condition(name, lyrics)]
+                if prepare_null_condition:
+                    null = self._cached_condition((name, None), lambda: text_condition(name, [None]))
+                    rows[name] += [null] * batch_size
+            elif name == 'prompt_audio':
+                rows[name] = []
+                null_wav = None
+                for i in range(batch_size):
+                    audio_qt_seq = self._prompt_audio_sequence(audio_qt_emb, i)
+                    digest = hashlib.sha1(audio_qt_seq.long().cpu().numpy().tobytes()).hexdigest()
+                    key = (name, tuple(audio_qt_seq.shape), digest)
+                    rows[name].append(self._cached_condition(
+                        key, lambda: audio_condition(name, audio_qt_seq, audio_qt_seq.shape[-1])))
+                    null_wav = audio_qt_seq
+                if prepare_null_condition:
+                    # ClassifierFreeGuidanceDropout.get_null_wav: all-16385 codes with length 0
+                    key = (name, tuple(null_wav.shape), None)
+                    null = self._cached_condition(
+                        key, lambda: audio_condition(name, torch.full_like(null_wav, 16385), 0))
+                    rows[name] += [null] * batch_size
+            else:
+                values = [descriptions[i] if descriptions is not None else "" for i in range(batch_size)]
+                rows[name] = [self._cached_condition((name, value), lambda: text_condition(name, [value]))
+                              for value in values]
+                if prepare_null_condition:
+                    null = self._cached_condition((name, None), lambda: text_condition(name, [None]))
+                    rows[name] += [null] * batch_size
+
+        return {name: tuple(torch.cat([row[j] for row in parts], dim=0) for j in range(3))
+                for name, parts in rows.items()}
+
     def forward(self, 
                 sequence: torch.Tensor,
                 condition_tensors: ConditionTensors) -> torch.Tensor:
@@ -266,7 +419,7 @@ class LmModel(StreamingModule):
         fused_input1, fused_input2 = self.fuser(input_1, input_2, condition_tensors)
         output = self.transformer(inputs_embeds=fused_input1, 
                                   use_cache=self._is_streaming, 
-                                  past_key_values=self._streaming_state.get('past_key_values_1', None))
+                                  past_key_values=self._get_past_key_values('past_key_values_1', self.transformer, fused_input1))
         if self._is_streaming:
             self._streaming_state['past_key_values_1'] = output.past_key_values
         logits = output.logits # [B, S, card]
@@ -279,7 +432,7 @@ class LmModel(StreamingModule):
             fused_input2 = self.mlp(fused_input2)
             output2 = self.transformer2(inputs_embeds=fused_input2, 
                                            use_cache=self._is_streaming, 
-                                           past_key_values=self._streaming_state.get('past_key_values_2', None))
+                                           past_key_values=self._get_past_key_values('past_key_values_2', self.transformer2, fused_input2))
             if self._is_streaming:
                 self._streaming_state['past_key_values_2'] = output2.past_key_values
             
@@ -292,6 +445,20 @@ class LmModel(StreamingModule):
 
         return logits  # [B, K, S, card]
 
+    def _get_past_key_values(self, key: str, transformer: CausalLM, inputs_embeds: torch.Tensor):
+        """Return the streaming KV cache for `transformer`, creating a StaticKVCache on the first decode step.
+
+        The cache is sized to the first (prompt) step plus the remaining decode budget set by `generate`
+        in `_streaming_state['kv_cache_len']`; without a budget the legacy tuple cache is used.
+        """
+        past_key_values = self._streaming_state.get(key, None)
+        if past_key_values is None and self._is_streaming and 'kv_cache_len' in self._streaming_state:
+            past_key_values = StaticKVCache(
+                transformer.config.num_hidden_layers,
+                inputs_embeds.shape[1] + self._streaming_state['kv_cache_len'],
+            )
+        return past_key_values
+
     def compute_predictions(self, 
                             codes: torch.Tensor,
                             condition_tensors: tp.Optional[ConditionTensors] = None,
@@ -350,7 +517,8 @@ class LmModel(StreamingModule):
                  cfg_coef: tp.Optional[float] = None,
                  check: bool = False,        
                  record_tokens: bool = True,
-                 record_window: int = 150
+                 record_window: int = 150,
+                 callback: tp.Optional[tp.Callable[[int, int], None]] = None
                  ) -> torch.Tensor:
         """Generate tokens sampling from the model given a prompt or unconditionally. Generation can
         be perform in a greedy fashion or using sampling with top K and top P strategies.
@@ -378,19 +546,22 @@ class LmModel(StreamingModule):
         possible_num_samples = []
         if num_samples is not None:
             possible_num_samples.append(num_samples)
-        elif texts:            
+        if texts:
             possible_num_samples.append(len(texts))
-        elif audio_qt_embs:            
+        if descriptions:
+            possible_num_samples.append(len(descriptions))
+        if audio_qt_embs is not None:
             possible_num_samples.append(len(audio_qt_embs))
-        else:
+        if not possible_num_samples:
             possible_num_samples.append(1)
-        assert [x == possible_num_samples[0] for x in possible_num_samples], "Inconsistent inputs shapes"
+        assert all(x == possible_num_samples[0] for x in possible_num_samples), "Inconsistent inputs shapes"
         num_samples = possible_num_samples[0]
-        condition_tensors = self.prepare_condition_tensors(batch_size=1, text=texts, descriptions=descriptions, audio_qt_emb=audio_qt_embs, prepare_null_condition=True)
-        # 3) Prepare token pool
+        condition_tensors = self.prepare_condition_tensors(batch_size=num_samples, text=texts, descriptions=descriptions, audio_qt_emb=audio_qt_embs, prepare_null_condition=True)
+        # 3) Prepare the repetition penalty window
         record_token_pool = None
         if record_tokens:
-            record_token_pool = []
+            record_token_pool = RepetitionPenaltyWindow(num_samples, self.code_depth, self.eos_token_id,
+                                                        record_window, device=device)
             
         # 4) set up startoff patterns
         start_offset = 0
@@ -410,11 +581,16 @@ class LmModel(StreamingModule):
         start_offset_sequence = pattern.get_first_step_with_timesteps(start_offset)
         assert start_offset_sequence is not None
         is_end = torch.zeros((B, self.code_depth, 1)).bool().to(device)
-        ignore_tokens = audio_qt_embs[0][0]
-        ignore_tokens = ignore_tokens[ignore_tokens < 16384]
+        # per-sample mask of the prompt's mixed-track tokens, which must not be sampled on the first codebook
+        ignore_mask = torch.zeros((B, self.code_size), dtype=torch.bool, device=device)
+        for b in range(B):
+            prompt_tokens = audio_qt_embs[b][0]
+            ignore_mask[b, prompt_tokens[prompt_tokens < 16384].to(device)] = True
         # 5) auto-regressive sampling
         with self.streaming():
             gen_sequence_len = gen_sequence.shape[-1]  # gen_sequence shape is [B, K, S]
+            if self.use_static_kv_cache:
+                self._streaming_state['kv_cache_len'] = gen_sequence_len
             prev_offset = 0
             for offset in tqdm(range(start_offset_sequence, gen_sequence_len)):
                 # get current sequence (note that the streaming API is providing the caching over previous offsets)
@@ -429,8 +605,8 @@ class LmModel(StreamingModule):
                 next_token = self._sample_next_token(
                     curr_sequence, condition_tensors, use_sampling, temp, top_k, top_p,
                     cfg_coef=cfg_coef, 
-                    sampled_token_pool=record_token_pool[-record_window:] if record_tokens else None,
-                    ignore_tokens = ignore_tokens
+                    repetition_penalty=record_token_pool,
+                    ignore_mask=ignore_mask
                     )
                 # ensure the tokens that should be masked are properly set to special_token_id
                 # as the model never output special_token_id
@@ -447,7 +623,9 @@ class LmModel(StreamingModule):
                 
                 # record sampled tokens in a window
                 if record_tokens:
-                    record_token_pool.append(next_token.squeeze())
+                    record_token_pool.append(next_token)
+                if callback is not None:
+                    callback(1 + offset - start_offset_sequence, gen_sequence_len - start_offset_sequence)
                 if torch.all(is_end):
                     gen_sequence = gen_sequence[..., :offset+1]
                     break
@@ -479,8 +657,8 @@ class LmModel(StreamingModule):
                            top_k: int = 0,
                            top_p: float = 0.0,
                            cfg_coef: tp.Optional[float] = None,
-                           sampled_token_pool: tp.Optional[list] = None,
-                           ignore_tokens: tp.Optional[torch.tensor] = torch.tensor([])) -> torch.Tensor:
+                           repetition_penalty: tp.Optional[RepetitionPenaltyWindow] = None,
+                           ignore_mask: tp.Optional[torch.Tensor] = None) -> torch.Tensor:
         """Sample next token from the model given a sequence and a set of conditions. The model supports
         multiple sampling strategies (greedy sampling, softmax, top-k, top-p...).
 
@@ -495,6 +673,8 @@ class LmModel(StreamingModule):
             top_k (int): K for "top-k" sampling.
             top_p (float): P for "top-p" sampling.
             cfg_coef (float, optional): classifier free guidance coefficient
+            repetition_penalty (RepetitionPenaltyWindow, optional): recently sampled tokens to penalize.
+            ignore_mask (torch.Tensor, optional): [B, card] tokens that must not be sampled on the first codebook.
         Returns:
             next_token (torch.Tensor): Next token tensor of shape [B, K, 1].
         """
@@ -513,17 +693,12 @@ class LmModel(StreamingModule):
         logits = logits[..., -1]  # [B x K x card]
         
         # add punishment to pre-sampled tokens
-        if sampled_token_pool is not None and len(sampled_token_pool) > 0:
-            sampled_token_pool = torch.stack(sampled_token_pool, -1) # [K, T]
-            for q in range(self.code_depth):
-                # q_count = torch.bincount(sampled_token_pool)
-                q_count = torch.bincount(torch.unique(sampled_token_pool[q]))
-                tmp = min(q_count.shape[-1], self.code_size - 1) 
-                logits[:, q, :tmp] /= (1.1 ** q_count[:tmp])
+        if repetition_penalty is not None:
+            repetition_penalty.apply(logits)
 
         # Apply softmax for sampling if temp > 0. Else, do greedy sampling to avoid zero division error.
-        if(ignore_tokens is not None and len(ignore_tokens) > 0):
-            logits[0][0][ignore_tokens.to(torch.int)] = float('-inf')
+        if ignore_mask is not None:
+            logits[:, 0].masked_fill_(ignore_mask, float('-inf'))
         if use_sampling and temp > 0.0:
             probs = torch.softmax(logits / temp, dim=-1)
             if top_p > 0.0:
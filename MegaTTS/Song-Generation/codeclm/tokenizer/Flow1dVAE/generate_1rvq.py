@@ -11,6 +11,7 @@ import numpy as np
 from .tools.get_1dvae_large import get_model
 from .tools import torch_tools
 from safetensors.torch import load_file
+from codeclm.utils.inference import inference_autocast
 
 class Tango:
     def __init__(self, \
@@ -193,7 +194,7 @@ class Tango:
         latent_length = min_samples
         latent_list = []
         spk_embeds = torch.zeros([1, 32, 1, 32], device=codes.device)
-        with torch.autocast(device_type="cuda" if torch.cuda.is_available() else "cpu", dtype=torch.float16):
+        with inference_autocast(self.device):
             for sinx in range(0, codes.shape[-1]-hop_samples, hop_samples):
                 codes_input=[]
                 codes_input.append(codes[:,:,sinx:sinx+min_samples])
@@ -14,6 +14,7 @@ from .tools import torch_tools
 from safetensors.torch import load_file
 from third_party.demucs.models.pretrained import get_model_from_yaml
 from filelock import FileLock
+from codeclm.utils.inference import inference_autocast, empty_device_cache
 import kaldiio
 # os.path.join(args.model_dir, "htdemucs.pth"), os.path.join(args.model_dir, "htdemucs.yaml")
 class Separator:
@@ -67,6 +68,7 @@ class Separator:
         return full_audio, vocal_audio, bgm_audio
 
 class Tango:
+    STREAM_CHANNELS = 2  # the VAE decodes stereo
     def __init__(self, \
         model_path, \
         vae_config,
@@ -174,6 +176,37 @@ class Tango:
 
     @torch.no_grad()
     def code2sound(self, codes, prompt_vocal=None, prompt_bgm=None, duration=40, guidance_scale=1.5, num_steps=20, disable_progress=False, chunked=False):
+        """Decode the whole song at once; the cross-faded windows are written into a preallocated buffer."""
+        output = None
+        filled = 0
+        for chunk in self.code2sound_stream(codes, prompt_vocal, prompt_bgm, duration=duration, guidance_scale=guidance_scale,
+                                            num_steps=num_steps, disable_progress=disable_progress, chunked=chunked):
+            if output is None:
+                output = torch.empty(chunk.shape[0], self._stream_target_len, dtype=chunk.dtype)
+            output[:, filled:filled + chunk.shape[-1]] = chunk
+            filled += chunk.shape[-1]
+        if output is None:
+            # nothing to decode (no codes beyond the prompt): an empty stereo waveform, not None
+            return torch.zeros(self.STREAM_CHANNELS, 0)
+        return output[:, :filled]
+
+    def _overlap_ramp(self, ovlp_samples):
+        """Cross-fade ramps (fade-in, fade-out) for an overlap, cached per overlap length."""
+        if not hasattr(self, '_ramp_cache'):
+            self._ramp_cache = {}
+        if ovlp_samples not in self._ramp_cache:
+            fade_in = torch.from_numpy(np.linspace(0, 1, ovlp_samples)[None, :])
+            self._ramp_cache[ovlp_samples] = (fade_in, 1 - fade_in)
+        return self._ramp_cache[ovlp_samples]
+
+    @torch.no_grad()
+    def code2sound_stream(self, codes, prompt_vocal=None, prompt_bgm=None, duration=40, guidance_scale=1.5, num_steps=20, disable_progress=False, chunked=False):
+        """Progressive decode: yield cross-faded PCM chunks [C, T] as soon as each latent window is decoded.
+
+        Each window is run through `inference_codes` and VAE-decoded immediately; only the previous latent
+        (for the in-context overlap) and the last `ovlp` output samples (for the cross-fade) are kept.
+        Concatenating the chunks gives exactly the output of the former all-at-once decode.
+        """
         codes_vocal,codes_bgm = codes
         codes_vocal = codes_vocal.to(self.device)
         codes_bgm = codes_bgm.to(self.device)
@@ -228,6 +261,9 @@ class Tango:
         codes_len= codes_vocal.shape[-1]
         target_len = int((codes_len - first_latent_codes_length) / 100 * 4 * self.sample_rate)
         # target_len = int(codes_len / 100 * 4 * self.sample_rate)
+        if target_len <= 0:
+            # no codes to decode (the code repeat below would never terminate on an empty sequence)
+            return
         # code repeat
         if(codes_len < min_samples):
             while(codes_vocal.shape[-1] < min_samples):
@@ -245,45 +281,56 @@ class Tango:
             codes_vocal = codes_vocal[:,:,0:len_codes]
             codes_bgm = codes_bgm[:,:,0:len_codes]
         latent_length = min_samples
-        latent_list = []
         spk_embeds = torch.zeros([1, 32, 1, 32], device=codes_vocal.device)
-        with torch.autocast(device_type="cuda", dtype=torch.float16):
-            for sinx in range(0, codes_vocal.shape[-1]-hop_samples, hop_samples):
-                codes_vocal_input=codes_vocal[:,:,sinx:sinx+min_samples]
-                codes_bgm_input=codes_bgm[:,:,sinx:sinx+min_samples]
+        self._stream_target_len = target_len
+
+        # window sizes in output samples (one latent frame = 40ms)
+        out_ovlp_samples = int(min_samples * self.sample_rate // 1000 * 40) - int(hop_samples * self.sample_rate // 1000 * 40)
+        fade_in, fade_out = self._overlap_ramp(out_ovlp_samples)
+        prev_latents = None
+        tail = None
+        emitted = 0
+        for sinx in range(0, codes_vocal.shape[-1]-hop_samples, hop_samples):
+            codes_vocal_input=codes_vocal[:,:,sinx:sinx+min_samples]
+            codes_bgm_input=codes_bgm[:,:,sinx:sinx+min_samples]
+            with inference_autocast(self.device):
                 if(sinx == 0):
                     incontext_length = first_latent_length
                     latents = self.model.inference_codes([codes_vocal_input,codes_bgm_input], spk_embeds, first_latent, latent_length, incontext_length=incontext_length, additional_feats=[], guidance_scale=1.5, num_steps = num_steps, disable_progress=disable_progress, scenario='other_seg')
-                    latent_list.append(latents)
                 else:
-                    true_latent = latent_list[-1][:,:,-ovlp_frames:].permute(0,2,1)
+                    true_latent = prev_latents[:,:,-ovlp_frames:].permute(0,2,1)
                     len_add_to_1000 = min_samples - true_latent.shape[-2]
                     incontext_length = true_latent.shape[-2]
                     true_latent = torch.cat([true_latent, torch.randn(true_latent.shape[0],  len_add_to_1000, true_latent.shape[-1]).to(self.device)], -2)
                     latents = self.model.inference_codes([codes_vocal_input,codes_bgm_input], spk_embeds, true_latent, latent_length, incontext_length=incontext_length,  additional_feats=[], guidance_scale=1.5, num_steps = num_steps, disable_progress=disable_progress, scenario='other_seg')
-                    latent_list.append(latents)
+            prev_latents = latents
 
-        latent_list = [l.float() for l in latent_list]
-        latent_list[0] = latent_list[0][:,:,first_latent_length:]
-        min_samples =  int(min_samples * self.sample_rate // 1000 * 40)
-        hop_samples = int(hop_samples * self.sample_rate // 1000 * 40)
-        ovlp_samples = min_samples - hop_samples
-        torch.cuda.empty_cache()
-        with torch.no_grad():
-            output = None
-            for i in range(len(latent_list)):
-                latent = latent_list[i]
-                cur_output = self.vae.decode_audio(latent, chunked=chunked)[0].detach().cpu()
+            latent = latents.float()
+            if sinx == 0:
+                latent = latent[:,:,first_latent_length:]
+            cur_output = self.vae.decode_audio(latent, chunked=chunked)[0].detach().cpu()
 
-                if output is None:
-                    output = cur_output
-                else:
-                    ov_win = torch.from_numpy(np.linspace(0, 1, ovlp_samples)[None, :])
-                    ov_win = torch.cat([ov_win, 1 - ov_win], -1)
-                    output[:, -ovlp_samples:] = output[:, -ovlp_samples:] * ov_win[:, -ovlp_samples:] + cur_output[:, 0:ovlp_samples] * ov_win[:, 0:ovlp_samples]
-                    output = torch.cat([output, cur_output[:, ovlp_samples:]], -1)
-            output = output[:, 0:target_len]
-        return output
+            # explicit split point: a `-out_ovlp_samples` slice would drop the whole window when there is no overlap
+            split = cur_output.shape[-1] - out_ovlp_samples
+            if tail is None:
+                body = cur_output[:, :split]
+            else:
+                blended = (tail * fade_out + cur_output[:, 0:out_ovlp_samples] * fade_in).to(cur_output.dtype)
+                body = torch.cat([blended, cur_output[:, out_ovlp_samples:split]], -1)
+            tail = cur_output[:, split:]
+
+            body = body[:, :max(0, target_len - emitted)]
+            if body.shape[-1] > 0:
+                emitted += body.shape[-1]
+                yield body
+            if emitted >= target_len:
+                break
+        else:
+            if tail is not None:
+                tail = tail[:, :max(0, target_len - emitted)]
+                if tail.shape[-1] > 0:
+                    yield tail
+        empty_device_cache(self.device)
 
     @torch.no_grad()
     def preprocess_audio(self, input_audios_vocal, threshold=0.8):
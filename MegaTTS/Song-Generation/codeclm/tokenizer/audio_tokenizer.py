@@ -217,6 +217,13 @@ class Flow1dVAESeparate(AudioTokenizer):
                                     num_steps=50, disable_progress=False, chunked=chunked) # [B,N,T] -> [B,T]
         return wav[None]
 
+    @torch.no_grad()
+    def decode_stream(self, codes: torch.Tensor, prompt_vocal = None, prompt_bgm = None, chunked=False):
+        """Progressive decode, yielding [1, C, T] chunks as each window is ready."""
+        for chunk in self.model.code2sound_stream(codes, prompt_vocal=prompt_vocal, prompt_bgm=prompt_bgm, guidance_scale=1.5,
+                                                  num_steps=50, disable_progress=False, chunked=chunked):
+            yield chunk[None]
+
     
     @torch.no_grad()
     def decode_latent(self, codes: torch.Tensor):
@@ -0,0 +1,105 @@
+"""
+Device, precision and threading helpers so that inference runs on CUDA or on CPU-only hosts.
+"""
+
+import os
+import typing as tp
+from contextlib import nullcontext
+
+import torch
+import torch.nn as nn
+
+
+def resolve_device(device: tp.Optional[tp.Union[str, torch.device]] = None) -> torch.device:
+    """Return the requested device, or CUDA when available and CPU otherwise ('auto' / None)."""
+    if device is None or str(device) == 'auto':
+        return torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+    device = torch.device(device)
+    if device.type == 'cuda' and not torch.cuda.is_available():
+        raise RuntimeError("CUDA device requested but torch.cuda.is_available() is False")
+    return device
+
+
+def module_device(module: nn.Module) -> torch.device:
+    """Device of the first parameter of `module` (CPU for parameter-less modules)."""
+    for param in module.parameters():
+        return param.device
+    return torch.device('cpu')
+
+
+def cpu_supports_bf16() -> bool:
+    """True when the CPU has native bf16 kernels (AVX512-BF16 / AMX); emulated bf16 is slower than fp32."""
+    try:
+        return bool(torch.ops.mkldnn._is_mkldnn_bf16_supported())
+    except (AttributeError, RuntimeError):
+        return False
+
+
+_cpu_bf16_autocast: tp.Optional[bool] = None  # None: enable when the CPU supports bf16
+
+
+def set_cpu_autocast(enabled: tp.Optional[bool]):
+    """Force CPU bf16 autocast on/off, or None to follow `cpu_supports_bf16()`."""
+    global _cpu_bf16_autocast
+    _cpu_bf16_autocast = enabled
+
+
+def cpu_autocast_enabled() -> bool:
+    return cpu_supports_bf16() if _cpu_bf16_autocast is None else _cpu_bf16_autocast
+
+
+def inference_autocast(device: tp.Union[str, torch.device], cuda_dtype: torch.dtype = torch.float16):
+    """Mixed-precision context for inference: `cuda_dtype` on CUDA, bf16 on capable CPUs, fp32 otherwise."""
+    device_type = torch.device(device).type
+    if device_type == 'cuda':
+        return torch.autocast(device_type='cuda', dtype=cuda_dtype)
+    if device_type == 'cpu' and cpu_autocast_enabled():
+        return torch.autocast(device_type='cpu', dtype=torch.bfloat16)
+    return nullcontext()
+
+
+def empty_device_cache(device: tp.Union[str, torch.device]):
+    if torch.device(device).type == 'cuda':
+        torch.cuda.empty_cache()
+
+
+def default_cpu_threads() -> int:
+    """Physical cores usable by this process: SMT siblings only add contention to GEMM-bound decoding."""
+    try:
+        usable = len(os.sched_getaffinity(0))
+    except AttributeError:
+        usable = os.cpu_count() or 1
+    try:
+        import psutil
+        physical = psutil.cpu_count(logical=False) or usable
+        logical = psutil.cpu_count(logical=True) or usable
+        # scale affinity down by the SMT ratio of the host
+        usable = max(1, usable * physical // logical)
+    except ImportError:
+        pass
+    return max(1, usable)
+
+
+def configure_cpu_threads(num_threads: tp.Optional[int] = None, interop_threads: int = 1) -> int:
+    """Apply the CPU thread policy and return the intra-op thread count.
+
+    Intra-op threads default to the physical core count. Autoregressive decoding runs one small op
+    after another, so inter-op parallelism only oversubscribes cores and defaults to 1.
+    """
+    num_threads = num_threads or default_cpu_threads()
+    torch.set_num_threads(num_threads)
+    try:
+        torch.set_num_interop_threads(interop_threads)
+    except RuntimeError:
+        # can only be set once, before any inter-op parallel work has started
+        pass
+    return num_threads
+
+
+def quantize_dynamic_int8(module: nn.Module) -> nn.Module:
+    """Replace the nn.Linear layers of `module` in place with dynamically quantized int8 versions (CPU only).
+
+    Weights are stored as int8 and activations are quantized per call, which roughly halves the
+    memory traffic of the decoder GEMMs. Embeddings and norms stay in fp32.
+    """
+    return torch.ao.quantization.quantize_dynamic(module, {nn.Linear}, dtype=torch.qint8, inplace=True)
@@ -0,0 +1,92 @@
+"""
+Tango.code2sound / code2sound_stream on stand-in diffusion and VAE models: the streamed, cross-faded
+output must match an all-at-once cross-fade of the decoded windows, including the no-overlap case,
+and an empty code sequence must give an empty waveform instead of None.
+
+Run from the Song-Generation root:
+    python -m pytest -q tests/test_code2sound_stream.py
+"""
+
+import pytest
+import torch
+
+generate_septoken = pytest.importorskip("codeclm.tokenizer.Flow1dVAE.generate_septoken")
+Tango = generate_septoken.Tango
+
+
+class FakeDiffusion:
+    """inference_codes stand-in: a distinct, slowly varying latent per window."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def inference_codes(self, codes, spk_embeds, true_latent, latent_length, incontext_length=0, **kwargs):
+        self.calls += 1
+        batch = codes[0].shape[0]
+        ramp = torch.arange(latent_length, dtype=torch.float32) / latent_length
+        return (self.calls + ramp).expand(batch, 64, latent_length).clone()
+
+
+class FakeVAE:
+    """decode_audio stand-in: each latent frame becomes `samples_per_frame` stereo samples."""
+
+    def __init__(self, samples_per_frame):
+        self.samples_per_frame = samples_per_frame
+        self.decoded = []
+
+    def decode_audio(self, latent, chunked=False):
+        wav = latent[:, :2].repeat_interleave(self.samples_per_frame, -1)
+        self.decoded.append(wav[0].clone())
+        return wav
+
+
+def make_tango(sample_rate, samples_per_frame):
+    tango = Tango.__new__(Tango)
+    tango.device = "cpu"
+    tango.sample_rate = sample_rate
+    tango.model = FakeDiffusion()
+    tango.vae = FakeVAE(samples_per_frame)
+    return tango
+
+
+def reference_crossfade(windows, ovlp, target_len):
+    """All-at-once decode: append each window, cross-fading `ovlp` samples with the previous one."""
+    output = windows[0]
+    for cur in windows[1:]:
+        if ovlp > 0:
+            fade_in = torch.linspace(0, 1, ovlp, dtype=torch.float64)[None, :]
+            blended = (output[:, -ovlp:] * (1 - fade_in) + cur[:, :ovlp] * fade_in).to(cur.dtype)
+            output = torch.cat([output[:, :-ovlp], blended, cur[:, ovlp:]], -1)
+        else:
+            output = torch.cat([output, cur], -1)
+    return output[:, :target_len]
+
+
+def codes(length):
+    return torch.zeros(1, 1, length, dtype=torch.long), torch.zeros(1, 1, length, dtype=torch.long)
+
+
+def test_stream_matches_all_at_once_crossfade():
+    # duration 4 -> windows of 100 frames, hop 75; 40 output samples per frame at 1 kHz
+    tango = make_tango(sample_rate=1000, samples_per_frame=40)
+    wave = tango.code2sound(codes(250), duration=4, disable_progress=True)
+    target_len = int(250 / 100 * 4 * 1000)
+    assert wave.shape == (2, target_len)
+    torch.testing.assert_close(wave, reference_crossfade(tango.vae.decoded, 25 * 40, target_len))
+
+
+def test_no_overlap_returns_complete_waveform():
+    # duration 1 at 10 Hz: the 7-frame code overlap rounds to 0 output samples
+    tango = make_tango(sample_rate=10, samples_per_frame=1)
+    wave = tango.code2sound(codes(100), duration=1, disable_progress=True)
+    target_len = int(100 / 100 * 4 * 10)
+    assert wave is not None and wave.shape == (2, target_len)
+    torch.testing.assert_close(wave, reference_crossfade(tango.vae.decoded, 0, target_len))
+
+
+def test_empty_codes_give_empty_waveform():
+    tango = make_tango(sample_rate=1000, samples_per_frame=40)
+    assert list(tango.code2sound_stream(codes(0), duration=4)) == []
+    wave = tango.code2sound(codes(0), duration=4)
+    assert wave.shape == (Tango.STREAM_CHANNELS, 0)
+    assert tango.model.calls == 0
@@ -0,0 +1,122 @@
+"""
+LmModel condition cache: the conditions assembled from cached per-sample rows must equal the batched
+ConditionerProvider output, with and without CFG null conditions, and again after LRU evictions.
+
+Uses a tiny model with the real conditioners (the Qwen2 tokenizer files in third_party/Qwen2-7B).
+
+Run from the Song-Generation root:
+    python -m pytest -q tests/test_condition_cache.py
+"""
+
+import argparse
+import os
+
+import pytest
+import torch
+
+from codeclm.models.lm_levo import LmModel
+from codeclm.modules.conditioners import (
+    ConditionerProvider, ConditionFuser, QuantizedEmbeddingConditioner, QwTextConditioner, QwTokenizerConditioner,
+)
+from codeclm.modules.pattern import DelayedPatternProvider
+
+TOKENIZER_PATH = "third_party/Qwen2-7B"
+STRUCTURE_TOKENS = ['[verse]', '[chorus]', '[bridge]', '[intro]', '[outro]', '[inst]', '.']
+CODE_SIZE = 16384   # the empty-prompt marker 16385 must be a valid index
+CODE_DEPTH = 3
+PROMPT_FRAMES = 20
+DIM = 16
+
+pytestmark = pytest.mark.skipif(not os.path.exists(os.path.join(TOKENIZER_PATH, "vocab.json")),
+                                reason="Qwen2 tokenizer files not available")
+
+
+@pytest.fixture(scope="module")
+def model():
+    torch.manual_seed(0)
+    conditioners = {
+        'description': QwTokenizerConditioner(DIM, TOKENIZER_PATH, max_len=40, add_token_list=STRUCTURE_TOKENS),
+        'prompt_audio': QuantizedEmbeddingConditioner(DIM, code_size=CODE_SIZE, code_depth=CODE_DEPTH,
+                                                      max_len=PROMPT_FRAMES + 2),
+        'type_info': QwTextConditioner(DIM, TOKENIZER_PATH, max_len=12),
+    }
+    model = LmModel(
+        pattern_provider=DelayedPatternProvider(CODE_DEPTH, delays=list(range(CODE_DEPTH))),
+        condition_provider=ConditionerProvider(conditioners),
+        fuser=ConditionFuser({'sum': [], 'prepend': ['type_info', 'prompt_audio', 'description']}),
+        code_depth=CODE_DEPTH, code_size=CODE_SIZE, dim=DIM, intermediate_size=DIM * 2,
+        num_heads=2, num_layers=1, num_layers_sub=1, use_flash_attn_2=False, condition_cache_size=3,
+    )
+    model.cfg = argparse.Namespace(sample_rate=48000)
+    return model.eval()
+
+
+def batched(model, **kwargs):
+    """Reference: the uncached path that conditions the whole batch at once."""
+    size = model.condition_cache_size
+    model.condition_cache_size = 0
+    try:
+        return model.prepare_condition_tensors(**kwargs)
+    finally:
+        model.condition_cache_size = size
+
+
+def assert_same_conditions(cached, reference):
+    assert cached.keys() == reference.keys()
+    for name in reference:
+        for got, expected in zip(cached[name], reference[name]):
+            assert got.shape == expected.shape, name
+            torch.testing.assert_close(got, expected, rtol=0, atol=0)
+
+
+def inputs(descriptions, seed):
+    generator = torch.Generator().manual_seed(seed)
+    prompt = torch.randint(0, CODE_SIZE, (len(descriptions), CODE_DEPTH, PROMPT_FRAMES), generator=generator)
+    prompt[-1] = 16385   # last sample has no prompt audio
+    texts = ["[verse] 晴天的风 . 吹过街角 [chorus] 啦啦啦", "[intro] 短"] * len(descriptions)
+    return dict(batch_size=len(descriptions), text=texts[:len(descriptions)], descriptions=descriptions,
+                audio_qt_emb=prompt)
+
+
+@pytest.mark.parametrize("prepare_null_condition", [False, True])
+@torch.no_grad()
+def test_cached_conditions_match_batched(model, prepare_null_condition):
+    model.clear_condition_cache()
+    assert model._can_cache_conditions()
+    kwargs = inputs(["female, pop, happy", "male, rock"], seed=1)
+    kwargs["prepare_null_condition"] = prepare_null_condition
+
+    reference = batched(model, **kwargs)
+    assert_same_conditions(model.prepare_condition_tensors(**kwargs), reference)
+    # second call is served from the cache
+    assert_same_conditions(model.prepare_condition_tensors(**kwargs), reference)
+
+
+@torch.no_grad()
+def test_cached_conditions_after_lru_eviction(model):
+    model.clear_condition_cache()
+    first = inputs(["female, pop, happy", "male, rock"], seed=1)
+    first["prepare_null_condition"] = True
+    reference = batched(model, **first)
+    model.prepare_condition_tensors(**first)
+    first_keys = list(model._condition_cache)
+
+    # other requests push every entry of the first one out of the 3-entry LRU
+    for seed, descriptions in enumerate([["jazz", "folk"], ["metal", "blues"]], start=2):
+        other = inputs(descriptions, seed=seed)
+        other["prepare_null_condition"] = False
+        assert_same_conditions(model.prepare_condition_tensors(**other), batched(model, **other))
+        assert len(model._condition_cache) <= model.condition_cache_size
+    assert not set(first_keys) & set(model._condition_cache)
+
+    assert_same_conditions(model.prepare_condition_tensors(**first), reference)
+
+
+def test_train_clears_cache(model):
+    kwargs = inputs(["female, pop, happy"], seed=1)
+    with torch.no_grad():
+        model.prepare_condition_tensors(**kwargs)
+    assert model._condition_cache
+    model.train()
+    assert not model._condition_cache
+    model.eval()
@@ -0,0 +1,79 @@
+"""
+Determinism test: RepetitionPenaltyWindow must produce bit-identical logits to the original
+list-based repetition penalty of LmModel._sample_next_token.
+
+Run from the Song-Generation root:
+    python -m pytest -q tests/test_repetition_penalty.py
+"""
+
+import torch
+
+from codeclm.models.lm_levo import RepetitionPenaltyWindow
+
+CODE_SIZE = 64 + 1              # LmModel.code_size (cardinality + EOS)
+EOS_TOKEN_ID = CODE_SIZE - 1
+SPECIAL_TOKEN_ID = CODE_SIZE
+CODE_DEPTH = 3
+
+
+def reference_penalty(logits, sampled_token_pool, code_depth=CODE_DEPTH, code_size=CODE_SIZE):
+    """Original implementation, kept verbatim for comparison."""
+    if sampled_token_pool is not None and len(sampled_token_pool) > 0:
+        sampled_token_pool = torch.stack(sampled_token_pool, -1)  # [K, T]
+        for q in range(code_depth):
+            q_count = torch.bincount(torch.unique(sampled_token_pool[q]))
+            tmp = min(q_count.shape[-1], code_size - 1)
+            logits[:, q, :tmp] /= (1.1 ** q_count[:tmp])
+    return logits
+
+
+def random_tokens(steps, batch_size, generator):
+    """Token stream with frequent repeats plus EOS / special tokens, shape [steps, B, K, 1]."""
+    tokens = torch.randint(0, 12, (steps, batch_size, CODE_DEPTH, 1), generator=generator)
+    specials = torch.rand(tokens.shape, generator=generator)
+    tokens[specials < 0.05] = EOS_TOKEN_ID
+    tokens[specials > 0.95] = SPECIAL_TOKEN_ID
+    wide = torch.rand(tokens.shape, generator=generator) < 0.3
+    tokens[wide] = torch.randint(0, EOS_TOKEN_ID, (int(wide.sum()),), generator=generator)
+    return tokens
+
+
+def test_matches_reference_implementation():
+    generator = torch.Generator().manual_seed(0)
+    window = 16
+    steps = 200
+    tokens = random_tokens(steps, 1, generator)
+    penalty = RepetitionPenaltyWindow(1, CODE_DEPTH, EOS_TOKEN_ID, window)
+    pool = []
+
+    for step in range(steps):
+        logits = torch.randn(1, CODE_DEPTH, CODE_SIZE, generator=generator)
+        expected = reference_penalty(logits.clone(), pool[-window:])
+        actual = penalty.apply(logits.clone())
+        assert torch.equal(actual, expected), f"mismatch at step {step}"
+
+        pool.append(tokens[step].squeeze())
+        penalty.append(tokens[step])
+
+
+def test_batched_rows_are_independent():
+    generator = torch.Generator().manual_seed(1)
+    window = 8
+    steps = 60
+    batch_size = 3
+    tokens = random_tokens(steps, batch_size, generator)
+    batched = RepetitionPenaltyWindow(batch_size, CODE_DEPTH, EOS_TOKEN_ID, window)
+    single = [RepetitionPenaltyWindow(1, CODE_DEPTH, EOS_TOKEN_ID, window) for _ in range(batch_size)]
+
+    for step in range(steps):
+        logits = torch.randn(batch_size, CODE_DEPTH, CODE_SIZE, generator=generator)
+        actual = batched.apply(logits.clone())
+        for b in range(batch_size):
+            assert torch.equal(actual[b:b + 1], single[b].apply(logits[b:b + 1].clone()))
+
+        batched.append(tokens[step])
+        for b in range(batch_size):
+            single[b].append(tokens[step, b:b + 1])
+
+    # counts always describe exactly the tokens inside the window
+    assert int(batched.counts.sum()) == batch_size * CODE_DEPTH * window
@@ -0,0 +1,104 @@
+"""
+CPU throughput report: LM decoding speed (tokens/s) of a reduced-size LmModel in fp32, with int8 dynamic
+quantization of the linear layers, and with bf16 autocast, using the thread policy of the API server.
+
+One token = one frame of all codebooks for one sample; 25 tokens = 1 second of audio.
+
+Usage (from the Song-Generation root):
+    python tools/benchmark_cpu_inference.py --seconds 10 --dim 512 --layers 8 --sub-layers 4
+"""
+
+import argparse
+import os
+import sys
+import time
+from contextlib import nullcontext
+
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from codeclm.models.lm_levo import LmModel  # noqa: E402
+from codeclm.modules.conditioners import (  # noqa: E402
+    ConditionerProvider, ConditionFuser, QuantizedEmbeddingConditioner, QwTextConditioner, QwTokenizerConditioner,
+)
+from codeclm.modules.pattern import DelayedPatternProvider  # noqa: E402
+from codeclm.utils.inference import (  # noqa: E402
+    configure_cpu_threads, cpu_supports_bf16, inference_autocast, quantize_dynamic_int8, set_cpu_autocast,
+)
+
+FRAME_RATE = 25
+CODE_SIZE = 16384
+CODE_DEPTH = 3
+PROMPT_FRAMES = 250
+TOKENIZER_PATH = "third_party/Qwen2-7B"
+STRUCTURE_TOKENS = ['[verse]', '[chorus]', '[bridge]', '[intro]', '[outro]', '[inst]', '.']
+
+
+def build_model(args) -> LmModel:
+    torch.manual_seed(0)
+    conditioners = {
+        'description': QwTokenizerConditioner(args.dim, TOKENIZER_PATH, max_len=300, add_token_list=STRUCTURE_TOKENS),
+        'prompt_audio': QuantizedEmbeddingConditioner(args.dim, code_size=CODE_SIZE, code_depth=CODE_DEPTH,
+                                                      max_len=PROMPT_FRAMES + 2),
+        'type_info': QwTextConditioner(args.dim, TOKENIZER_PATH, max_len=50),
+    }
+    model = LmModel(
+        pattern_provider=DelayedPatternProvider(CODE_DEPTH, delays=list(range(CODE_DEPTH))),
+        condition_provider=ConditionerProvider(conditioners),
+        fuser=ConditionFuser({'sum': [], 'prepend': ['type_info', 'prompt_audio', 'description']}),
+        code_depth=CODE_DEPTH, code_size=CODE_SIZE, dim=args.dim, intermediate_size=args.dim * 4,
+        num_heads=args.heads, num_layers=args.layers, num_layers_sub=args.sub_layers,
+        use_flash_attn_2=False, cfg_coef=1.5,
+    )
+    model.cfg = argparse.Namespace(sample_rate=48000)
+    return model.eval()
+
+
+@torch.no_grad()
+def run(model: LmModel, args, frames: int, autocast) -> float:
+    """Generate `frames` tokens per sample and return the decoding throughput in tokens/s."""
+    torch.manual_seed(1)
+    prompt = torch.randint(0, CODE_SIZE, (args.batch, CODE_DEPTH, PROMPT_FRAMES))
+    texts = ["[verse] 晴天的风吹过街角 . 我们一起唱歌 [chorus] 啦啦啦 . 啦啦啦"] * args.batch
+    descriptions = ["female, pop, happy, piano"] * args.batch
+    start = time.perf_counter()
+    with autocast:
+        tokens = model.generate(texts=texts, descriptions=descriptions, audio_qt_embs=prompt,
+                                max_gen_len=frames, top_k=50, cfg_coef=1.5, record_window=50)
+    elapsed = time.perf_counter() - start
+    return tokens.shape[-1] / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=10.0, help="audio length to generate per sample")
+    parser.add_argument("--batch", type=int, default=1)
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--heads", type=int, default=8)
+    parser.add_argument("--layers", type=int, default=8)
+    parser.add_argument("--sub-layers", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=0, help="0 = physical cores (server default)")
+    args = parser.parse_args()
+
+    threads = configure_cpu_threads(args.threads or None)
+    frames = int(args.seconds * FRAME_RATE)
+
+    set_cpu_autocast(True)
+    modes = [("fp32", False, nullcontext)]
+    modes.append(("bf16 autocast", False, lambda: inference_autocast('cpu')))
+    modes.append(("int8 dynamic", True, nullcontext))
+
+    print(f"config: dim={args.dim} heads={args.heads} layers={args.layers}+{args.sub_layers} batch={args.batch} "
+          f"threads={threads} native bf16={cpu_supports_bf16()} audio={args.seconds:.1f}s ({frames} tokens)")
+    for name, quantize, autocast in modes:
+        model = build_model(args)
+        if quantize:
+            quantize_dynamic_int8(model)
+        run(model, args, 16, autocast())  # warm-up
+        rate = run(model, args, frames, autocast())
+        print(f"{name:<14} {rate:8.1f} tokens/s   {rate / FRAME_RATE:5.2f}x realtime")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+CPU benchmark: per-step decode latency of the legacy growing `past_key_values` (torch.cat every step)
+versus the preallocated StaticKVCache, on a small random-weight Llama config.
+
+Usage (from the Song-Generation root):
+    python tools/benchmark_kv_cache.py --steps 2000 --layers 4 --dim 256
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from codeclm.models.levo import CausalLM, LlamaConfig, StaticKVCache  # noqa: E402
+
+
+def build_model(args) -> CausalLM:
+    config = LlamaConfig(
+        hidden_size=args.dim,
+        intermediate_size=args.dim * 4,
+        num_attention_heads=args.heads,
+        num_hidden_layers=args.layers,
+        num_key_value_heads=args.heads,
+        vocab_size=1024,
+        use_cache=False,
+        max_position_embeddings=args.prompt + args.steps + 16,
+        rms_norm_eps=1e-5,
+        _flash_attn_2_enabled=False,
+    )
+    torch.manual_seed(0)
+    return CausalLM(config).eval()
+
+
+@torch.no_grad()
+def run_decode(model: CausalLM, args, static: bool):
+    """Prompt step followed by `steps` single-token steps; returns (per-step seconds, final hidden state)."""
+    torch.manual_seed(1)
+    prompt = torch.randn(args.batch, args.prompt, args.dim)
+    tokens = torch.randn(args.steps, args.batch, 1, args.dim)
+
+    past = StaticKVCache(model.config.num_hidden_layers, args.prompt + args.steps) if static else None
+    out = model(inputs_embeds=prompt, use_cache=True, past_key_values=past)
+    past = out.past_key_values
+
+    timings = []
+    for step in range(args.steps):
+        start = time.perf_counter()
+        out = model(inputs_embeds=tokens[step], use_cache=True, past_key_values=past)
+        past = out.past_key_values
+        timings.append(time.perf_counter() - start)
+    return timings, out.hidden_states
+
+
+def summarize(name: str, timings, buckets: int):
+    size = len(timings) // buckets
+    means = [sum(timings[i * size:(i + 1) * size]) / size * 1000 for i in range(buckets)]
+    cells = " ".join(f"{m:7.2f}" for m in means)
+    print(f"{name:<14} {cells}   last/first = {means[-1] / means[0]:.2f}x   total = {sum(timings):.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--steps", type=int, default=2000)
+    parser.add_argument("--prompt", type=int, default=64)
+    parser.add_argument("--batch", type=int, default=2, help="2 = one sample with classifier-free guidance")
+    parser.add_argument("--layers", type=int, default=4)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--heads", type=int, default=4)
+    parser.add_argument("--buckets", type=int, default=8)
+    parser.add_argument("--threads", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    model = build_model(args)
+    # warm-up so allocator/threads are initialised before timing
+    run_decode(model, argparse.Namespace(**{**vars(args), "steps": 32}), static=False)
+    run_decode(model, argparse.Namespace(**{**vars(args), "steps": 32}), static=True)
+
+    legacy, legacy_out = run_decode(model, args, static=False)
+    static, static_out = run_decode(model, args, static=True)
+
+    print(f"config: layers={args.layers} dim={args.dim} heads={args.heads} batch={args.batch} "
+          f"prompt={args.prompt} steps={args.steps} threads={torch.get_num_threads()}")
+    print(f"mean per-step latency (ms) over {args.buckets} consecutive buckets of steps")
+    summarize("torch.cat", legacy, args.buckets)
+    summarize("StaticKVCache", static, args.buckets)
+    print(f"max |diff| of final hidden state: {(legacy_out - static_out).abs().max().item():.2e}")
+
+
+if __name__ == "__main__":
+    main()
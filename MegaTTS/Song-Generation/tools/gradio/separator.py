@@ -1,50 +1,111 @@
-import torchaudio
+import hashlib
+import math
 import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import torchaudio
 import torch
 from third_party.demucs.models.pretrained import get_model_from_yaml
+from third_party.demucs.models.apply import apply_model
+from third_party.demucs.models.audio import convert_audio
+from third_party.demucs.models.utils import DummyPoolExecutor
 
 
 class Separator(torch.nn.Module):
-    def __init__(self, dm_model_path='third_party/demucs/ckpt/htdemucs.pth', dm_config_path='third_party/demucs/ckpt/htdemucs.yaml', gpu_id=0) -> None:
+    """Prompt separation: only the prompt window of a track is decoded and run through htdemucs.
+
+    Stems stay in memory (no FLAC round trip) and results are cached by the SHA-1 of the file content,
+    so uploading the same prompt again, under any name, costs one hash.
+    """
+    def __init__(self, dm_model_path='third_party/demucs/ckpt/htdemucs.pth', dm_config_path='third_party/demucs/ckpt/htdemucs.yaml', gpu_id=0,
+                 sample_rate=48000, prompt_seconds=10, context_seconds=1.0, cache_size=8, num_workers=None) -> None:
         super().__init__()
         if torch.cuda.is_available() and gpu_id < torch.cuda.device_count():
             self.device = torch.device(f"cuda:{gpu_id}")
         else:
             self.device = torch.device("cpu")
         self.demucs_model = self.init_demucs_model(dm_model_path, dm_config_path)
+        self.sample_rate = sample_rate
+        self.prompt_seconds = prompt_seconds
+        # audio after the window is separated too, so the window end is not a demucs segment edge
+        self.context_seconds = context_seconds
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        # the demucs segments of a window are separated in parallel on CPU, sequentially on GPU
+        if self.device.type == 'cpu':
+            self._pool = ThreadPoolExecutor(num_workers or min(4, os.cpu_count() or 1), thread_name_prefix="demucs")
+        else:
+            self._pool = DummyPoolExecutor()
 
     def init_demucs_model(self, model_path, config_path):
         model = get_model_from_yaml(config_path, model_path)
         model.to(self.device)
         model.eval()
         return model
-    
-    def load_audio(self, f):
-        a, fs = torchaudio.load(f)
-        if (fs != 48000):
-            a = torchaudio.functional.resample(a, fs, 48000)
-        if a.shape[-1] >= 48000*10:
-            a = a[..., :48000*10]
-        else:
+
+    @staticmethod
+    def content_hash(path, block_size=1 << 20):
+        sha1 = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(block_size), b''):
+                sha1.update(block)
+        return sha1.hexdigest()
+
+    def load_window(self, f, seconds):
+        """Decode only the first `seconds` of `f`, returns (audio [C, T], sample rate)."""
+        fs = torchaudio.info(f).sample_rate
+        a, fs = torchaudio.load(f, frame_offset=0, num_frames=int(math.ceil(seconds * fs)))
+        return a, fs
+
+    def fit_prompt(self, a):
+        """First prompt_seconds at self.sample_rate; shorter clips are repeated once, as before."""
+        length = self.sample_rate * self.prompt_seconds
+        if a.shape[-1] < length:
             a = torch.cat([a, a], -1)
-        return a[:, 0:48000*10]
-    
-    def run(self, audio_path, output_dir='tmp', ext=".flac"):
-        os.makedirs(output_dir, exist_ok=True)
-        name, _ = os.path.splitext(os.path.split(audio_path)[-1])
-        output_paths = []
-
-        for stem in self.demucs_model.sources:
-            output_path = os.path.join(output_dir, f"{name}_{stem}{ext}")
-            if os.path.exists(output_path):
-                output_paths.append(output_path)
-        if len(output_paths) == 1:  # 4
-            vocal_path = output_paths[0]
-        else:
-            drums_path, bass_path, other_path, vocal_path = self.demucs_model.separate(audio_path, output_dir, device=self.device)
-            for path in [drums_path, bass_path, other_path]:
-                os.remove(path)
-        full_audio = self.load_audio(audio_path)
-        vocal_audio = self.load_audio(vocal_path)
+        return a[..., :length]
+
+    def load_audio(self, f):
+        a, fs = self.load_window(f, self.prompt_seconds)
+        if (fs != self.sample_rate):
+            a = torchaudio.functional.resample(a, fs, self.sample_rate)
+        return self.fit_prompt(a)
+
+    @torch.no_grad()
+    def separate_vocals(self, mix, fs):
+        """htdemucs vocal stem of `mix` [C, T] sampled at `fs`, returned at self.sample_rate."""
+        model = self.demucs_model
+        wav = convert_audio(mix, fs, model.samplerate, model.audio_channels)
+        ref = wav.mean(0)
+        mean, std = ref.mean(), ref.std()
+        wav = (wav - mean) / std
+        sources = apply_model(model, wav[None], device=self.device, shifts=1, split=True, overlap=0.25,
+                              progress=False, pool=self._pool)[0]
+        vocals = sources[model.sources.index('vocals')] * std + mean
+        return torchaudio.functional.resample(vocals.cpu(), model.samplerate, self.sample_rate)
+
+    def run(self, audio_path):
+        key = self.content_hash(audio_path)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                return tuple(t.clone() for t in cached)
+
+        mix, fs = self.load_window(audio_path, self.prompt_seconds + self.context_seconds)
+        vocal_audio = self.separate_vocals(mix, fs)
+        full_audio = mix[..., :int(math.ceil(self.prompt_seconds * fs))]
+        if fs != self.sample_rate:
+            full_audio = torchaudio.functional.resample(full_audio, fs, self.sample_rate)
+        length = min(full_audio.shape[-1], vocal_audio.shape[-1])
+        full_audio = self.fit_prompt(full_audio[..., :length])
+        vocal_audio = self.fit_prompt(vocal_audio[..., :length])
         bgm_audio = full_audio - vocal_audio
-        return full_audio, vocal_audio, bgm_audio
+
+        with self._lock:
+            self._cache[key] = (full_audio, vocal_audio, bgm_audio)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return full_audio.clone(), vocal_audio.clone(), bgm_audio.clone()
@@ -0,0 +1,59 @@
+"""create synthesis jobs table
+
+Revision ID: 20250720_create_synthesis_jobs
+Revises: d8ec600ee987
+Create Date: 2025-07-20 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20250720_create_synthesis_jobs'
+down_revision = 'd8ec600ee987'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """创建持久化任务队列表"""
+    op.create_table(
+        'synthesis_jobs',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('job_type', sa.String(50), nullable=False, comment='任务类型'),
+        sa.Column('parent_id', sa.Integer(), sa.ForeignKey('synthesis_jobs.id', ondelete='CASCADE'), comment='父任务ID'),
+        sa.Column('project_id', sa.Integer(), sa.ForeignKey('novel_projects.id', ondelete='CASCADE'), comment='项目ID'),
+        sa.Column('chapter_id', sa.Integer(), comment='章节ID'),
+        sa.Column('segment_id', sa.Integer(), comment='段落ID'),
+        sa.Column('payload', sa.JSON(), comment='任务参数'),
+        sa.Column('result', sa.JSON(), comment='任务结果'),
+        sa.Column('status', sa.String(20), nullable=False, server_default='queued', comment='任务状态'),
+        sa.Column('priority', sa.Integer(), nullable=False, server_default='0', comment='优先级'),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0', comment='已尝试次数'),
+        sa.Column('max_attempts', sa.Integer(), nullable=False, server_default='3', comment='最大尝试次数'),
+        sa.Column('available_at', sa.DateTime(), nullable=False, server_default=sa.func.now(), comment='最早可执行时间'),
+        sa.Column('lease_owner', sa.String(100), comment='持有租约的Worker'),
+        sa.Column('lease_expires_at', sa.DateTime(), comment='租约过期时间'),
+        sa.Column('heartbeat_at', sa.DateTime(), comment='最近心跳时间'),
+        sa.Column('last_error', sa.Text(), comment='最近一次错误'),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.func.now()),
+        sa.Column('started_at', sa.DateTime()),
+        sa.Column('completed_at', sa.DateTime()),
+        sa.Column('updated_at', sa.DateTime(), server_default=sa.func.now()),
+    )
+    op.create_index('ix_synthesis_jobs_id', 'synthesis_jobs', ['id'])
+    op.create_index('idx_synthesis_jobs_dispatch', 'synthesis_jobs', ['status', 'available_at', 'priority'])
+    op.create_index('idx_synthesis_jobs_lease', 'synthesis_jobs', ['status', 'lease_expires_at'])
+    op.create_index('idx_synthesis_jobs_project_chapter', 'synthesis_jobs', ['project_id', 'chapter_id'])
+    op.create_index('idx_synthesis_jobs_parent_id', 'synthesis_jobs', ['parent_id'])
+
+
+def downgrade():
+    """删除持久化任务队列表"""
+    op.drop_index('idx_synthesis_jobs_parent_id', table_name='synthesis_jobs')
+    op.drop_index('idx_synthesis_jobs_project_chapter', table_name='synthesis_jobs')
+    op.drop_index('idx_synthesis_jobs_lease', table_name='synthesis_jobs')
+    op.drop_index('idx_synthesis_jobs_dispatch', table_name='synthesis_jobs')
+    op.drop_index('ix_synthesis_jobs_id', table_name='synthesis_jobs')
+    op.drop_table('synthesis_jobs')
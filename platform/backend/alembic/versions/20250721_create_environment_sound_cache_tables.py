@@ -0,0 +1,104 @@
+"""create environment sound cache and keyword index tables
+
+Revision ID: 20250721_environment_sound_cache
+Revises: 20250720_create_synthesis_jobs
+Create Date: 2025-07-21 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20250721_environment_sound_cache'
+down_revision = '20250720_create_synthesis_jobs'
+branch_labels = None
+depends_on = None
+
+# 本迁移创建时的索引规则（冻结副本，不随 app.services.environment_sound_cache 变化）：
+# 完整标签（小写），以及名称、提示词中长度 1~2 的字符片段
+KEYWORD_NGRAM = 2
+KEYWORD_MAX_LENGTH = 100
+BATCH_SIZE = 5000
+
+
+def _keywords(name, prompt, tags):
+    keywords = set()
+    for tag in tags or []:
+        if isinstance(tag, str) and tag.strip():
+            keywords.add(tag.strip().lower()[:KEYWORD_MAX_LENGTH])
+    for text in (name, prompt):
+        text = (text or "").lower()
+        for n in range(1, KEYWORD_NGRAM + 1):
+            for i in range(len(text) - n + 1):
+                if text[i:i + n].strip():
+                    keywords.add(text[i:i + n])
+    return keywords
+
+
+def upgrade():
+    """创建TangoFlux生成缓存表与环境音关键词索引表，并为已有环境音建立索引"""
+    op.create_table(
+        'environment_sound_keywords',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('keyword', sa.String(100), nullable=False, comment='关键词'),
+        sa.Column('environment_sound_id', sa.Integer(),
+                  sa.ForeignKey('environment_sounds.id', ondelete='CASCADE'), nullable=False, comment='环境音ID'),
+    )
+    op.create_index('idx_environment_sound_keywords_lookup', 'environment_sound_keywords',
+                    ['keyword', 'environment_sound_id'])
+    op.create_index('idx_environment_sound_keywords_sound', 'environment_sound_keywords', ['environment_sound_id'])
+
+    op.create_table(
+        'environment_sound_cache',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('cache_key', sa.String(64), nullable=False, unique=True, comment='缓存键(SHA-256)'),
+        sa.Column('normalized_prompt', sa.Text(), nullable=False, comment='规范化提示词'),
+        sa.Column('duration_bucket', sa.Float(), nullable=False, comment='时长档位(秒)'),
+        sa.Column('steps', sa.Integer(), comment='推理步数'),
+        sa.Column('guidance_scale', sa.Float(), comment='引导强度'),
+        sa.Column('content_hash', sa.String(64), nullable=False, comment='音频内容SHA-256'),
+        sa.Column('file_path', sa.String(500), nullable=False, comment='缓存文件路径'),
+        sa.Column('file_size', sa.Integer(), comment='文件大小(字节)'),
+        sa.Column('environment_sound_id', sa.Integer(),
+                  sa.ForeignKey('environment_sounds.id', ondelete='SET NULL'), comment='入库的环境音ID'),
+        sa.Column('hit_count', sa.Integer(), server_default='0', comment='命中次数'),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.func.now()),
+        sa.Column('last_used_at', sa.DateTime(), server_default=sa.func.now()),
+    )
+    op.create_index('idx_environment_sound_cache_content', 'environment_sound_cache', ['content_hash'])
+
+    # 为已有环境音建立关键词索引
+    bind = op.get_bind()
+    sounds = sa.table(
+        'environment_sounds',
+        sa.column('id', sa.Integer()),
+        sa.column('name', sa.String()),
+        sa.column('prompt', sa.Text()),
+        sa.column('tags', sa.JSON()),
+    )
+    keywords_table = sa.table(
+        'environment_sound_keywords',
+        sa.column('keyword', sa.String()),
+        sa.column('environment_sound_id', sa.Integer()),
+    )
+    rows = []
+    for sound_id, name, prompt, tags in bind.execute(
+        sa.select(sounds.c.id, sounds.c.name, sounds.c.prompt, sounds.c.tags)
+    ).fetchall():
+        rows.extend({'keyword': keyword, 'environment_sound_id': sound_id}
+                    for keyword in _keywords(name, prompt, tags))
+        if len(rows) >= BATCH_SIZE:
+            bind.execute(keywords_table.insert(), rows)
+            rows = []
+    if rows:
+        bind.execute(keywords_table.insert(), rows)
+
+
+def downgrade():
+    """删除TangoFlux生成缓存表与环境音关键词索引表"""
+    op.drop_index('idx_environment_sound_cache_content', table_name='environment_sound_cache')
+    op.drop_table('environment_sound_cache')
+    op.drop_index('idx_environment_sound_keywords_sound', table_name='environment_sound_keywords')
+    op.drop_index('idx_environment_sound_keywords_lookup', table_name='environment_sound_keywords')
+    op.drop_table('environment_sound_keywords')
@@ -0,0 +1,159 @@
+"""create synthesis plan segments table
+
+Revision ID: 20250722_synthesis_plan_segments
+Revises: 20250721_environment_sound_cache
+Create Date: 2025-07-22 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20250722_synthesis_plan_segments'
+down_revision = '20250721_environment_sound_cache'
+branch_labels = None
+depends_on = None
+
+# 本迁移创建时的拆分格式（冻结副本，不随 app.models.synthesis_plan_segment 变化）：
+# 段落列表在 synthesis_plan 键下，头部带 segment_storage=table 标记
+SEGMENTS_KEY = 'synthesis_plan'
+STORAGE_MARKER = 'segment_storage'
+STORAGE_TABLE = 'table'
+
+
+def _split(plan):
+    """(头部, 段落列表)；不是 {synthesis_plan: [dict, ...]} 形状时段落列表为 None"""
+    if not isinstance(plan, dict):
+        return plan, None
+    segments = plan.get(SEGMENTS_KEY)
+    if not isinstance(segments, list) or not all(isinstance(s, dict) for s in segments):
+        return plan, None
+    header = {k: v for k, v in plan.items() if k not in (SEGMENTS_KEY, STORAGE_MARKER)}
+    header[STORAGE_MARKER] = STORAGE_TABLE
+    return header, segments
+
+
+def _is_split_header(header):
+    return isinstance(header, dict) and header.get(STORAGE_MARKER) == STORAGE_TABLE
+
+
+def _assemble(header, segments):
+    plan = {k: v for k, v in header.items() if k != STORAGE_MARKER}
+    plan[SEGMENTS_KEY] = list(segments)
+    return plan
+
+
+def _segment_id(segment):
+    segment_id = segment.get('segment_id')
+    return segment_id if isinstance(segment_id, int) and not isinstance(segment_id, bool) else None
+
+
+def upgrade():
+    """创建合成计划段落表，并把已有合成计划中的段落拆分成行"""
+    op.create_table(
+        'synthesis_plan_segments',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('analysis_result_id', sa.Integer(),
+                  sa.ForeignKey('analysis_results.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('chapter_id', sa.Integer(), nullable=False),
+        sa.Column('segment_index', sa.Integer(), nullable=False),
+        sa.Column('segment_id', sa.Integer()),
+        sa.Column('speaker', sa.String(255)),
+        sa.Column('data', sa.JSON(), nullable=False),
+        sa.Column('status', sa.String(20), nullable=False, server_default='pending'),
+        sa.Column('project_id', sa.Integer(), sa.ForeignKey('novel_projects.id', ondelete='SET NULL')),
+        sa.Column('error_message', sa.Text()),
+        sa.Column('synthesized_at', sa.DateTime()),
+        sa.Column('updated_at', sa.DateTime(), server_default=sa.func.now()),
+    )
+    op.create_index('idx_synthesis_plan_segments_position', 'synthesis_plan_segments',
+                    ['analysis_result_id', 'segment_index'])
+    op.create_index('idx_synthesis_plan_segments_chapter_segment', 'synthesis_plan_segments',
+                    ['chapter_id', 'segment_id'])
+    op.create_index('idx_synthesis_plan_segments_chapter_status', 'synthesis_plan_segments',
+                    ['chapter_id', 'status'])
+    op.create_index('idx_synthesis_plan_segments_project_status', 'synthesis_plan_segments',
+                    ['project_id', 'status'])
+
+    bind = op.get_bind()
+    analysis_results = sa.table(
+        'analysis_results',
+        sa.column('id', sa.Integer()),
+        sa.column('chapter_id', sa.Integer()),
+        sa.column('synthesis_plan', sa.JSON()),
+    )
+    segments_table = sa.table(
+        'synthesis_plan_segments',
+        sa.column('analysis_result_id', sa.Integer()),
+        sa.column('chapter_id', sa.Integer()),
+        sa.column('segment_index', sa.Integer()),
+        sa.column('segment_id', sa.Integer()),
+        sa.column('speaker', sa.String()),
+        sa.column('data', sa.JSON()),
+        sa.column('status', sa.String()),
+    )
+
+    rows = bind.execute(
+        sa.select(analysis_results.c.id, analysis_results.c.chapter_id, analysis_results.c.synthesis_plan)
+        .where(analysis_results.c.synthesis_plan.isnot(None))
+    ).fetchall()
+    for result_id, chapter_id, plan in rows:
+        header, segments = _split(plan)
+        if segments is None:
+            continue
+        if segments:
+            bind.execute(segments_table.insert(), [
+                {
+                    'analysis_result_id': result_id,
+                    'chapter_id': chapter_id,
+                    'segment_index': index,
+                    'segment_id': _segment_id(segment),
+                    'speaker': segment.get('speaker')[:255] if isinstance(segment.get('speaker'), str) else None,
+                    'data': segment,
+                    'status': 'pending',
+                }
+                for index, segment in enumerate(segments)
+            ])
+        bind.execute(
+            analysis_results.update().where(analysis_results.c.id == result_id).values(synthesis_plan=header)
+        )
+
+
+def downgrade():
+    """把段落行合并回合成计划 JSON，然后删除段落表"""
+    bind = op.get_bind()
+    analysis_results = sa.table(
+        'analysis_results',
+        sa.column('id', sa.Integer()),
+        sa.column('synthesis_plan', sa.JSON()),
+    )
+    segments_table = sa.table(
+        'synthesis_plan_segments',
+        sa.column('analysis_result_id', sa.Integer()),
+        sa.column('segment_index', sa.Integer()),
+        sa.column('data', sa.JSON()),
+    )
+
+    rows = bind.execute(
+        sa.select(analysis_results.c.id, analysis_results.c.synthesis_plan)
+        .where(analysis_results.c.synthesis_plan.isnot(None))
+    ).fetchall()
+    for result_id, header in rows:
+        if not _is_split_header(header):
+            continue
+        segments = bind.execute(
+            sa.select(segments_table.c.data)
+            .where(segments_table.c.analysis_result_id == result_id)
+            .order_by(segments_table.c.segment_index)
+        ).scalars().all()
+        bind.execute(
+            analysis_results.update().where(analysis_results.c.id == result_id)
+            .values(synthesis_plan=_assemble(header, segments))
+        )
+
+    op.drop_index('idx_synthesis_plan_segments_project_status', table_name='synthesis_plan_segments')
+    op.drop_index('idx_synthesis_plan_segments_chapter_status', table_name='synthesis_plan_segments')
+    op.drop_index('idx_synthesis_plan_segments_chapter_segment', table_name='synthesis_plan_segments')
+    op.drop_index('idx_synthesis_plan_segments_position', table_name='synthesis_plan_segments')
+    op.drop_table('synthesis_plan_segments')
@@ -0,0 +1,134 @@
+"""partition system logs by created_at with trigram message index
+
+Revision ID: 20250723_partition_system_logs
+Revises: 20250722_synthesis_plan_segments
+Create Date: 2025-07-23 10:00:00.000000
+
+"""
+import os
+from datetime import datetime, timedelta
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20250723_partition_system_logs'
+down_revision = '20250722_synthesis_plan_segments'
+branch_labels = None
+depends_on = None
+
+# 本迁移创建时的分区规则（冻结副本，不随 app.services.system_log_service 变化）：
+# 按 LOG_PARTITION_GRANULARITY（day | month）划分，建到当前周期之后 LOG_PARTITIONS_AHEAD 个周期
+LOG_TABLE = "system_logs"
+DEFAULT_PARTITION = f"{LOG_TABLE}_default"
+LEGACY_TABLE = f"{LOG_TABLE}_unpartitioned"
+GRANULARITY = os.getenv("LOG_PARTITION_GRANULARITY", "day")
+PARTITIONS_AHEAD = int(os.getenv("LOG_PARTITIONS_AHEAD", "7"))
+
+
+def _period_start(moment):
+    if GRANULARITY == "month":
+        return datetime(moment.year, moment.month, 1)
+    return datetime(moment.year, moment.month, moment.day)
+
+
+def _next_period(start):
+    if GRANULARITY == "month":
+        return datetime(start.year + start.month // 12, start.month % 12 + 1, 1)
+    return start + timedelta(days=1)
+
+
+def _partition_ranges(since, now):
+    """覆盖 [since, 当前周期之后第 PARTITIONS_AHEAD 个周期] 的 (表名, 起, 止)"""
+    until = _period_start(now)
+    for _ in range(PARTITIONS_AHEAD):
+        until = _next_period(until)
+    ranges = []
+    start = _period_start(since)
+    while start <= until:
+        end = _next_period(start)
+        suffix = start.strftime("%Y%m") if GRANULARITY == "month" else start.strftime("%Y%m%d")
+        ranges.append((f"{LOG_TABLE}_p{suffix}", start, end))
+        start = end
+    return ranges
+
+
+def _create_partition_sql(name, start, end):
+    return (
+        f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {LOG_TABLE} "
+        f"FOR VALUES FROM ('{start.isoformat(sep=' ')}') TO ('{end.isoformat(sep=' ')}')"
+    )
+
+
+def _create_indexes():
+    op.create_index('idx_log_level_time', LOG_TABLE, ['level', 'created_at'])
+    op.create_index('idx_log_module_time', LOG_TABLE, ['module', 'created_at'])
+    op.create_index('idx_log_user_time', LOG_TABLE, ['user_id', 'created_at'])
+    op.create_index('idx_log_session', LOG_TABLE, ['session_id'])
+    op.create_index('idx_log_created_id', LOG_TABLE, ['created_at', 'id'])
+
+
+def _move_sequence(bind, from_table, to_table):
+    """id 序列归属新表，删除旧表时不会连带删除序列"""
+    sequence = bind.execute(sa.text(f"SELECT pg_get_serial_sequence('{from_table}', 'id')")).scalar()
+    if sequence:
+        op.execute(f"ALTER SEQUENCE {sequence} OWNED BY {to_table}.id")
+
+
+def upgrade():
+    """
+    PostgreSQL：system_logs 改为按 created_at 范围分区的表，message 建 pg_trgm GIN 索引；
+    其他数据库只补充游标分页索引
+    """
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        op.create_index('idx_log_created_id', LOG_TABLE, ['created_at', 'id'])
+        return
+
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.execute(f"UPDATE {LOG_TABLE} SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL")
+    op.execute(f"ALTER TABLE {LOG_TABLE} RENAME TO {LEGACY_TABLE}")
+    op.execute(
+        f"CREATE TABLE {LOG_TABLE} (LIKE {LEGACY_TABLE} INCLUDING DEFAULTS) "
+        f"PARTITION BY RANGE (created_at)"
+    )
+    op.execute(f"ALTER TABLE {LOG_TABLE} ALTER COLUMN created_at SET NOT NULL")
+
+    now = datetime.utcnow()
+    oldest = bind.execute(sa.text(f"SELECT MIN(created_at) FROM {LEGACY_TABLE}")).scalar() or now
+    for name, start, end in _partition_ranges(oldest, now):
+        op.execute(_create_partition_sql(name, start, end))
+    # 兜底：维护任务未及时建分区时日志仍可写入
+    op.execute(f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF {LOG_TABLE} DEFAULT")
+
+    op.execute(f"INSERT INTO {LOG_TABLE} SELECT * FROM {LEGACY_TABLE}")
+    _move_sequence(bind, LEGACY_TABLE, LOG_TABLE)
+    op.execute(f"DROP TABLE {LEGACY_TABLE}")
+
+    # 旧表删除后主键名才可复用；分区表的主键必须包含分区键
+    op.execute(f"ALTER TABLE {LOG_TABLE} ADD PRIMARY KEY (id, created_at)")
+    _create_indexes()
+    op.execute(
+        f"CREATE INDEX idx_log_message_trgm ON {LOG_TABLE} USING gin (message gin_trgm_ops)"
+    )
+
+
+def downgrade():
+    """合并回普通表"""
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        op.drop_index('idx_log_created_id', table_name=LOG_TABLE)
+        return
+
+    op.execute(f"ALTER TABLE {LOG_TABLE} RENAME TO {LEGACY_TABLE}")
+    op.execute(f"CREATE TABLE {LOG_TABLE} (LIKE {LEGACY_TABLE} INCLUDING DEFAULTS)")
+    op.execute(f"INSERT INTO {LOG_TABLE} SELECT * FROM {LEGACY_TABLE}")
+    _move_sequence(bind, LEGACY_TABLE, LOG_TABLE)
+    op.execute(f"DROP TABLE {LEGACY_TABLE} CASCADE")
+
+    op.execute(f"ALTER TABLE {LOG_TABLE} ADD PRIMARY KEY (id)")
+    op.execute(f"ALTER TABLE {LOG_TABLE} ALTER COLUMN created_at DROP NOT NULL")
+    op.create_index('idx_log_level_time', LOG_TABLE, ['level', 'created_at'])
+    op.create_index('idx_log_module_time', LOG_TABLE, ['module', 'created_at'])
+    op.create_index('idx_log_user_time', LOG_TABLE, ['user_id', 'created_at'])
@@ -0,0 +1,76 @@
+"""create project progress projection
+
+Revision ID: 20250724_project_progress
+Revises: 20250723_partition_system_logs
+Create Date: 2025-07-24 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20250724_project_progress'
+down_revision = '20250723_partition_system_logs'
+branch_labels = None
+depends_on = None
+
+# 按本迁移创建时的统计口径一次回填全部项目（不依赖 app.services.project_progress_service）：
+# 总数 = 项目所属书籍各章节中已完成智能准备的段落数；完成 = segment 类型音频文件数；
+# 失败 = 标记为 failed 的段落数；进行中 = 排队/租约中的段落合成任务数；无章节的计入 chapter_id=0
+BACKFILL_SQL = """
+INSERT INTO project_progress
+    (project_id, chapter_id, total_segments, completed_segments, failed_segments, in_flight_segments)
+SELECT project_id, chapter_id, SUM(total), SUM(completed), SUM(failed), SUM(in_flight)
+FROM (
+    SELECT p.id AS project_id, c.id AS chapter_id,
+           (SELECT COUNT(s.id) FROM synthesis_plan_segments s
+            JOIN analysis_results r ON r.id = s.analysis_result_id
+            WHERE s.chapter_id = c.id AND r.status = 'completed') AS total,
+           0 AS completed, 0 AS failed, 0 AS in_flight
+    FROM novel_projects p JOIN book_chapters c ON c.book_id = p.book_id
+    UNION ALL
+    SELECT project_id, COALESCE(chapter_id, 0), 0, COUNT(id), 0, 0
+    FROM audio_files
+    WHERE project_id IS NOT NULL AND audio_type = 'segment'
+    GROUP BY project_id, COALESCE(chapter_id, 0)
+    UNION ALL
+    SELECT project_id, chapter_id, 0, 0, COUNT(id), 0
+    FROM synthesis_plan_segments
+    WHERE project_id IS NOT NULL AND status = 'failed'
+    GROUP BY project_id, chapter_id
+    UNION ALL
+    SELECT project_id, COALESCE(chapter_id, 0), 0, 0, 0, COUNT(id)
+    FROM synthesis_jobs
+    WHERE project_id IS NOT NULL AND job_type = 'segment_synthesis' AND status IN ('queued', 'leased')
+    GROUP BY project_id, COALESCE(chapter_id, 0)
+) counts
+WHERE project_id IN (SELECT id FROM novel_projects)
+GROUP BY project_id, chapter_id
+"""
+
+
+def upgrade():
+    """创建项目进度投影表并按现有数据回填"""
+    op.create_table(
+        'project_progress',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('project_id', sa.Integer(),
+                  sa.ForeignKey('novel_projects.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('chapter_id', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('total_segments', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('completed_segments', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('failed_segments', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('in_flight_segments', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('updated_at', sa.DateTime(), server_default=sa.func.now()),
+    )
+    op.create_index('uq_project_progress_project_chapter', 'project_progress',
+                    ['project_id', 'chapter_id'], unique=True)
+
+    op.execute(BACKFILL_SQL)
+
+
+def downgrade():
+    """删除项目进度投影表"""
+    op.drop_index('uq_project_progress_project_chapter', table_name='project_progress')
+    op.drop_table('project_progress')
@@ -4,7 +4,7 @@
 """
 
 from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, defer, selectinload
 from typing import List, Optional, Dict, Any
 import asyncio
 import json
@@ -19,11 +19,27 @@ from app.schemas import (
 from app.utils.exceptions import (
     AnalysisSessionNotFoundError, AnalysisConfigError, LLMServiceError
 )
+from app.utils.list_views import FieldSet
 from app.websocket.manager import WebSocketManager
 
 router = APIRouter(prefix="/analysis")
 websocket_manager = WebSocketManager()
 
+# 列表字段视图：summary 不含分析内容与合成计划等 JSON 大字段
+ANALYSIS_RESULT_FIELDS = FieldSet(
+    AnalysisResult,
+    summary=[
+        'id', 'session_id', 'chapter_id', 'is_user_confirmed', 'status', 'processing_time',
+        'confidence_score', 'error_message', 'created_at', 'completed_at', 'confirmed_at', 'updated_at'
+    ],
+    derived={
+        'synthesis_plan': (('synthesis_plan_header',), lambda result: result.synthesis_plan,
+                           lambda: selectinload(AnalysisResult.plan_segments)),
+    },
+    detail_options=[lambda: selectinload(AnalysisResult.plan_segments)],
+    hidden=['synthesis_plan_header']
+)
+
 
 @router.post("/sessions", response_model=AnalysisSessionResponse)
 async def create_analysis_session(
@@ -173,13 +189,16 @@ async def stop_analysis_session(session_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=f"停止分析失败: {str(e)}")
 
 
-@router.get("/sessions/{session_id}/results", response_model=List[AnalysisResultResponse])
+@router.get("/sessions/{session_id}/results", response_model=List[AnalysisResultResponse],
+            response_model_exclude_unset=True)
 def get_analysis_results(
     session_id: int,
     skip: int = 0,
     limit: int = 50,
     status_filter: Optional[str] = None,
     include_raw: bool = False,
+    view: Optional[str] = None,
+    fields: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
     """
@@ -187,7 +206,13 @@ def get_analysis_results(
     - 支持分页查询
     - 支持状态筛选
     - 可选择是否包含原始数据
+    - view=summary / fields=id,status,... 只查询并返回所需字段
     """
+    try:
+        names = ANALYSIS_RESULT_FIELDS.resolve(fields, view)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
     # 检查会话是否存在
     session = db.query(AnalysisSession).filter(AnalysisSession.id == session_id).first()
     if not session:
@@ -198,8 +223,13 @@ def get_analysis_results(
     if status_filter:
         query = query.filter(AnalysisResult.status == status_filter)
     
+    query = query.options(*ANALYSIS_RESULT_FIELDS.query_options(names))
+    if names is None and not include_raw:
+        # 不输出原始数据时不查询这两列
+        query = query.options(defer(AnalysisResult.original_analysis), defer(AnalysisResult.llm_response_raw))
+    
     results = query.order_by(AnalysisResult.chapter_id).offset(skip).limit(limit).all()
-    return [result.to_dict(include_raw=include_raw) for result in results]
+    return [ANALYSIS_RESULT_FIELDS.serialize(result, names, include_raw=include_raw) for result in results]
 
 
 @router.get("/results/{result_id}", response_model=AnalysisResultResponse)
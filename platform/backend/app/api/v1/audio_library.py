@@ -3,7 +3,7 @@
 统一管理所有生成的音频文件
 """
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from fastapi.responses import FileResponse
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import desc, asc, func, or_, and_
@@ -16,6 +16,8 @@ from datetime import datetime
 
 from app.database import get_db
 from app.models import AudioFile, NovelProject, VoiceProfile  # TextSegment已废弃
+from app.services.waveform_peaks import waveform_peaks_response
+from app.services.audio_rendition_service import audio_playback_response
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/audio-library", tags=["Audio Library"])
@@ -262,10 +264,12 @@ async def get_audio_stats(
 @router.get("/download/{file_id}", summary="下载单个音频文件")
 async def download_audio_file(
     file_id: int,
+    request: Request,
+    rendition: Optional[str] = Query(None, description="播放格式：opus / mp3 / opus-32k 等，默认原始WAV"),
     db: Session = Depends(get_db)
 ):
     """
-    下载单个音频文件
+    下载单个音频文件（支持Range，可直接用于播放拖动；rendition 指定压缩播放副本）
     """
     try:
         logger.info(f"🔍 [下载请求] 查找音频文件 ID: {file_id}")
@@ -290,10 +294,11 @@ async def download_audio_file(
         
         logger.info(f"📦 [开始下载] ID={file_id}, filename={download_name}, path={audio_file.file_path}")
         
-        return FileResponse(
-            path=audio_file.file_path,
+        return await audio_playback_response(
+            request,
+            audio_file.file_path,
             filename=download_name,
-            media_type='audio/wav'
+            rendition=rendition
         )
         
     except HTTPException:
@@ -302,6 +307,33 @@ async def download_audio_file(
         logger.error(f"❌ [下载异常] ID={file_id}, error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"下载音频文件失败: {str(e)}")
 
+@router.get("/files/{file_id}/peaks", summary="获取音频波形峰值")
+async def get_audio_file_peaks(
+    file_id: int,
+    request: Request,
+    format: str = Query("binary", regex="^(binary|json)$", description="返回格式"),
+    samples_per_peak: Optional[int] = Query(None, ge=1, description="每个峰值对应的采样数"),
+    pixels: Optional[int] = Query(None, ge=1, le=100000, description="绘制宽度（像素）"),
+    level: Optional[int] = Query(None, ge=0, description="金字塔层级"),
+    start: Optional[float] = Query(None, ge=0, description="起始时间（秒）"),
+    end: Optional[float] = Query(None, ge=0, description="结束时间（秒）"),
+    db: Session = Depends(get_db)
+):
+    """
+    获取音频文件的多分辨率波形峰值，首次请求时生成并缓存
+    """
+    audio_file = db.query(AudioFile).filter(AudioFile.id == file_id).first()
+    if not audio_file or not audio_file.file_path or not os.path.exists(audio_file.file_path):
+        raise HTTPException(status_code=404, detail="音频文件不存在")
+
+    try:
+        return await waveform_peaks_response(
+            audio_file.file_path, format, samples_per_peak, pixels, level, start, end, request=request
+        )
+    except Exception as e:
+        logger.error(f"生成波形峰值失败: ID={file_id}, error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"生成波形峰值失败: {str(e)}")
+
 @router.post("/files/{file_id}/favorite")
 async def toggle_favorite(
     file_id: int,
@@ -17,6 +17,7 @@ from pydantic import BaseModel
 
 from app.database import get_db
 from app.models import Book, BookChapter, AnalysisResult
+from app.utils.list_views import FieldSet, paginate
 
 # 配置文件上传大小限制
 from fastapi import File
@@ -26,6 +27,20 @@ router = APIRouter(prefix="/books")
 
 logger = logging.getLogger(__name__)
 
+# 列表字段视图：summary 不含全文、章节数据与角色汇总
+BOOK_FIELDS = FieldSet(
+    Book,
+    summary=[
+        'id', 'title', 'author', 'description', 'status', 'tags', 'word_count', 'chapter_count',
+        'source_file_name', 'created_at', 'updated_at'
+    ],
+    derived={
+        'tags': (('tags',), Book.get_tags, None),
+        'chapters': (('chapters_data',), Book.get_chapters, None),
+        'character_summary': (('character_summary',), Book.get_character_summary, None),
+    }
+)
+
 
 def detect_chapters_from_content(content: str) -> List[dict]:
     """
@@ -217,14 +232,24 @@ async def get_books(
     status: str = Query("", description="状态过滤"),
     sort_by: str = Query("created_at", description="排序字段"),
     sort_order: str = Query("desc", description="排序方向"),
+    view: Optional[str] = Query(None, description="字段视图：summary（不含全文等大字段）| detail（默认）"),
+    fields: Optional[str] = Query(None, description="返回字段，逗号分隔，如 id,title,chapter_count"),
+    cursor: Optional[str] = Query(None, description="游标（上一页返回的 nextCursor）"),
+    include_total: bool = Query(False, description="游标分页时是否统计总数"),
     db: Session = Depends(get_db)
 ):
     """
     获取书籍列表
-    - 支持分页查询
+    - 支持分页查询（页码或游标）
     - 支持标题和作者搜索
+    - view / fields 选择字段，未选择的大字段不会被查询
     """
     try:
+        try:
+            names = BOOK_FIELDS.resolve(fields, view)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
         # 构建查询
         query = db.query(Book)
         
@@ -247,36 +272,21 @@ async def get_books(
         if status:
             query = query.filter(Book.status == status)
         
-        # 排序
-        sort_field = getattr(Book, sort_by, Book.created_at)
-        if sort_order == "asc":
-            query = query.order_by(asc(sort_field))
-        else:
-            query = query.order_by(desc(sort_field))
-        
-        # 统计总数
-        total = query.count()
-        
-        # 分页
-        offset = (page - 1) * page_size
-        books = query.offset(offset).limit(page_size).all()
-        
-        # 转换为字典格式
-        book_list = [book.to_dict() for book in books]
+        # 排序与分页
+        try:
+            books, pagination = paginate(
+                query, BOOK_FIELDS, names, sort_by, Book.created_at, sort_order,
+                page, page_size, cursor=cursor, include_total=include_total
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
-        # 分页信息
-        total_pages = (total + page_size - 1) // page_size
+        book_list = [BOOK_FIELDS.serialize(book, names) for book in books]
         
         return {
             "success": True,
             "data": book_list,
-            "pagination": {
-                "page": page,
-                "pageSize": page_size,
-                "total": total,
-                "totalPages": total_pages,
-                "hasMore": page < total_pages
-            },
+            "pagination": pagination,
             "filters": {
                 "search": search,
                 "author": author,
@@ -284,6 +294,8 @@ async def get_books(
             }
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"获取书籍列表失败: {str(e)}")
         raise HTTPException(status_code=500, detail=f"获取书籍列表失败: {str(e)}")
@@ -1467,10 +1479,9 @@ async def _sync_character_voice_to_synthesis_plans(
                     elif 'synthesis_plan' in synthesis_plan:
                         synthesis_plan['synthesis_plan'] = segments
                     
-                    # 🔥 关键修复：强制SQLAlchemy检测JSON字段修改
+                    # 段落行与现有数据比对，只写入声音配置有变化的段落
                     from sqlalchemy.orm.attributes import flag_modified
                     analysis.synthesis_plan = synthesis_plan
-                    flag_modified(analysis, 'synthesis_plan')
                     
                     # 🔥 CRITICAL FIX: 清空final_config避免API返回旧数据
                     # 当synthesis_plan更新时，自动清空final_config，确保API返回最新同步的数据
@@ -4,7 +4,7 @@
 """
 
 from fastapi import APIRouter, Depends, HTTPException, Query, Form, Body
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import desc, asc, func, or_
 from typing import List, Optional, Dict, Any
 import logging
@@ -13,6 +13,7 @@ from datetime import datetime
 from app.database import get_db
 from app.models import BookChapter, Book
 from app.utils import log_system_event
+from app.utils.list_views import FieldSet, paginate
 from app.services.content_preparation_service import ContentPreparationService
 from app.services.chapter_service import (
     ChapterService, 
@@ -27,6 +28,27 @@ router = APIRouter(prefix="/chapters", tags=["Chapters"])
 
 # 检测器类已移到 app.detectors 模块，这里只保留路由处理
 
+
+def _chapter_book(chapter: BookChapter) -> Optional[Dict[str, Any]]:
+    if not chapter.book:
+        return None
+    return {"id": chapter.book.id, "title": chapter.book.title, "author": chapter.book.author}
+
+
+# 列表字段视图：summary 不含正文
+CHAPTER_FIELDS = FieldSet(
+    BookChapter,
+    summary=[
+        'id', 'book_id', 'chapter_number', 'chapter_title', 'word_count', 'character_count',
+        'analysis_status', 'synthesis_status', 'created_at', 'updated_at', 'book'
+    ],
+    derived={
+        'book': (('book_id',), _chapter_book,
+                 lambda: joinedload(BookChapter.book).load_only(Book.id, Book.title, Book.author)),
+    },
+    detail_extras=['book']
+)
+
 @router.post("")
 async def create_chapter(
     book_id: int = Form(..., description="书籍ID"),
@@ -211,10 +233,24 @@ async def get_chapters(
     status: str = Query("", description="状态过滤"),
     sort_by: str = Query("chapter_number", description="排序字段"),
     sort_order: str = Query("asc", description="排序方向"),
+    view: Optional[str] = Query(None, description="字段视图：summary（不含正文）| detail（默认）"),
+    fields: Optional[str] = Query(None, description="返回字段，逗号分隔，如 id,chapter_title,word_count"),
+    cursor: Optional[str] = Query(None, description="游标（上一页返回的 nextCursor）"),
+    include_total: bool = Query(False, description="游标分页时是否统计总数"),
     db: Session = Depends(get_db)
 ):
-    """获取章节列表"""
+    """
+    获取章节列表
+    - view / fields 选择字段，未选择的正文等大字段不会被查询
+    - 所属书籍随列表一次加载
+    - 支持页码分页与 (排序列, id) 游标分页
+    """
     try:
+        try:
+            names = CHAPTER_FIELDS.resolve(fields, view)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
         # 构建查询
         query = db.query(BookChapter)
         
@@ -227,7 +263,7 @@ async def get_chapters(
             search_pattern = f"%{search}%"
             query = query.filter(
                 or_(
-                    BookChapter.title.like(search_pattern),
+                    BookChapter.chapter_title.like(search_pattern),
                     BookChapter.content.like(search_pattern)
                 )
             )
@@ -236,48 +272,21 @@ async def get_chapters(
         if status:
             query = query.filter(BookChapter.analysis_status == status)
         
-        # 排序
-        sort_field = getattr(BookChapter, sort_by, BookChapter.chapter_number)
-        if sort_order == "asc":
-            query = query.order_by(asc(sort_field))
-        else:
-            query = query.order_by(desc(sort_field))
-        
-        # 统计总数
-        total = query.count()
-        
-        # 分页
-        offset = (page - 1) * page_size
-        chapters = query.offset(offset).limit(page_size).all()
-        
-        # 转换为字典格式
-        chapter_list = []
-        for chapter in chapters:
-            chapter_data = chapter.to_dict()
-            
-            # 添加书籍信息
-            if chapter.book:
-                chapter_data['book'] = {
-                    "id": chapter.book.id,
-                    "title": chapter.book.title,
-                    "author": chapter.book.author
-                }
-            
-            chapter_list.append(chapter_data)
+        # 排序与分页
+        try:
+            chapters, pagination = paginate(
+                query, CHAPTER_FIELDS, names, sort_by, BookChapter.chapter_number, sort_order,
+                page, page_size, cursor=cursor, include_total=include_total
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
-        # 分页信息
-        total_pages = (total + page_size - 1) // page_size
+        chapter_list = [CHAPTER_FIELDS.serialize(chapter, names) for chapter in chapters]
         
         return {
             "success": True,
             "data": chapter_list,
-            "pagination": {
-                "page": page,
-                "pageSize": page_size,
-                "total": total,
-                "totalPages": total_pages,
-                "hasMore": page < total_pages
-            },
+            "pagination": pagination,
             "filters": {
                 "book_id": book_id,
                 "search": search,
@@ -285,6 +294,8 @@ async def get_chapters(
             }
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"获取章节列表失败: {str(e)}")
         raise HTTPException(status_code=500, detail=f"获取章节列表失败: {str(e)}")
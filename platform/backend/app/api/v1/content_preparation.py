@@ -6,7 +6,7 @@
 from fastapi import APIRouter, Depends, HTTPException, Query, Body
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 import logging
 
 from app.database import get_db
@@ -26,6 +26,11 @@ class PreparationRequest(BaseModel):
     tts_optimization: str = "balanced"  # fast, balanced, quality
 
 
+class SegmentPatchRequest(BaseModel):
+    """段落局部更新请求：每项必须包含segment_id，其余字段合并进段落"""
+    segments: List[Dict[str, Any]]
+
+
 @router.get("/content-stats/{chapter_id}")
 async def get_content_stats(
     chapter_id: int,
@@ -368,7 +373,6 @@ async def clear_preparation_cache(
             result.final_config = None
             result.synthesis_plan = None
             flag_modified(result, 'final_config')
-            flag_modified(result, 'synthesis_plan')
             message = "已清除所有缓存，需要重新进行智能准备"
         else:
             raise HTTPException(status_code=400, detail="不支持的缓存类型")
@@ -539,6 +543,62 @@ async def update_preparation_result(
         raise HTTPException(status_code=500, detail=f"更新智能准备结果失败: {str(e)}")
 
 
+@router.patch("/result/{chapter_id}/segments")
+async def patch_preparation_segments(
+    chapter_id: int,
+    request: SegmentPatchRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    局部更新章节智能准备结果中的段落
+    只读写被修改的段落行，不重写整份合成计划
+    """
+    try:
+        latest_result = db.query(AnalysisResult).filter(
+            AnalysisResult.chapter_id == chapter_id,
+            AnalysisResult.status == 'completed'
+        ).order_by(AnalysisResult.created_at.desc()).first()
+        
+        if not latest_result:
+            raise HTTPException(status_code=404, detail="该章节尚未完成智能准备，无法更新")
+        
+        updates = {}
+        for item in request.segments:
+            segment_id = item.get('segment_id')
+            if not isinstance(segment_id, int):
+                raise HTTPException(status_code=400, detail="每个段落都必须包含整数segment_id")
+            updates[segment_id] = {k: v for k, v in item.items() if k != 'segment_id'}
+        
+        from app.services.synthesis_plan_service import update_plan_segments
+        outcome = update_plan_segments(db, latest_result.id, updates, commit=False)
+        if outcome['not_found']:
+            db.rollback()
+            raise HTTPException(status_code=404, detail=f"未找到段落: {outcome['not_found']}")
+        
+        if outcome['updated'] and latest_result.final_config:
+            # 段落已更新，清空final_config避免GET返回旧的编辑缓存
+            latest_result.final_config = None
+        db.commit()
+        
+        logger.info(f"章节 {chapter_id} 局部更新了 {len(outcome['updated'])} 个段落")
+        
+        return {
+            "success": True,
+            "data": {
+                "result_id": latest_result.id,
+                "updated_segments": outcome['updated']
+            },
+            "message": f"已更新 {len(outcome['updated'])} 个段落"
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        db.rollback()
+        logger.error(f"局部更新段落失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"局部更新段落失败: {str(e)}")
+
+
 @router.post("/ai-resegment")
 async def ai_resegment_text(
     request_data: Dict[str, Any],
@@ -3,17 +3,22 @@
 提供环境混音作品的管理、生成和下载功能
 """
 
-from fastapi import APIRouter, Depends, HTTPException, Query, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, Query, BackgroundTasks, Request
 from sqlalchemy.orm import Session
 from typing import List, Optional, Dict, Any
+import asyncio
 import logging
 from datetime import datetime
 import json
 
 from app.database import get_db
-from app.models import NovelProject, EnvironmentAudioMixingJob, EnvironmentGenerationSession
+from app.models import NovelProject, EnvironmentAudioMixingJob, EnvironmentGenerationSession, JobType
+from app.services.job_queue import get_job_queue
+from app.services.audio_rendition_service import audio_playback_response
+from app.services.environment_sound_cache import get_environment_sound_cache, index_environment_sound
+from app.services.ambience_tiler import get_ambience_tiler, seed_for
 from pydantic import BaseModel
-from app.clients.tangoflux_client import TangoFluxClient
+from app.clients.tangoflux_client import get_tangoflux_client
 import requests
 import io
 import numpy as np
@@ -79,6 +84,7 @@ async def _save_generated_sound_to_library(
         
         db.add(environment_sound)
         db.flush()  # 获取ID但不立即提交
+        index_environment_sound(db, environment_sound)
         
         sound_id = environment_sound.id
         logger.info(f"🎵 音效已保存到库: {sound_name} (ID: {sound_id})")
@@ -89,6 +95,37 @@ async def _save_generated_sound_to_library(
         logger.error(f"保存音效到库失败: {str(e)}")
         return None
 
+async def _generate_tangoflux_audio(prompt: str, duration: float) -> Dict[str, Any]:
+    """
+    通过生成缓存调用TangoFlux：相同提示词、时长档位与参数只生成一次，
+    并发的相同请求共享同一次生成；长于种子时长的请求只生成种子，再循环拼接到请求时长。
+    返回结构与 TangoFluxClient.generate_environment_sound 一致，
+    额外的 cached 字段为种子的缓存条目（音频可能长于请求时长，由调用方裁剪）
+    """
+    errors = {}
+    
+    async def generate(bucket_duration: float) -> Optional[bytes]:
+        result = await get_tangoflux_client().generate_environment_sound(
+            prompt=prompt,
+            duration=bucket_duration,
+            steps=50,
+            cfg_scale=3.5,
+            return_type='file'
+        )
+        if not result['success']:
+            errors['error'] = result.get('error', 'Unknown error')
+            return None
+        return result['audio_data']
+    
+    tiler = get_ambience_tiler()
+    cached = await get_environment_sound_cache().get_or_generate(
+        prompt, tiler.generation_duration(duration), generate, steps=50, guidance_scale=3.5, max_duration=30
+    )
+    if not cached:
+        return {'success': False, 'error': errors.get('error', 'TangoFlux生成失败')}
+    audio_data = await asyncio.to_thread(tiler.extend_wav_bytes, cached.read_bytes(), duration, seed_for(prompt))
+    return {'success': True, 'audio_data': audio_data, 'cached': cached}
+
 async def _build_tangoflux_prompt_intelligent(keywords: List[str], duration: float) -> str:
     """使用AI智能构建TangoFlux提示词"""
     try:
@@ -418,8 +455,13 @@ async def start_environment_mixing(
         
         logger.info(f"创建环境混音任务记录: ID={mixing_job.id}")
         
-        # 启动后台混音任务
-        background_tasks.add_task(process_environment_mixing, mixing_job.id)
+        # 写入持久化任务队列，由Worker执行混音
+        get_job_queue().enqueue(
+            db,
+            JobType.ENVIRONMENT_MIXING,
+            payload={"mixing_job_id": mixing_job.id},
+            project_id=project_id
+        )
         
         return {
             "success": True,
@@ -442,13 +484,14 @@ async def start_environment_mixing(
 @router.get("/{mixing_id}/download")
 async def download_mixing(
     mixing_id: int,
+    request: Request,
+    rendition: Optional[str] = Query(None, description="播放格式：opus / mp3，默认原始WAV"),
     db: Session = Depends(get_db)
 ):
     """
-    下载环境混音作品
+    下载环境混音作品（支持Range与压缩播放副本）
     """
     try:
-        from fastapi.responses import FileResponse
         import os
         
         # 从数据库查询真实的文件路径
@@ -470,10 +513,11 @@ async def download_mixing(
         # 生成友好的下载文件名
         download_filename = f"环境混音_项目{mixing_job.project_id}_{mixing_job.id}.wav"
         
-        return FileResponse(
+        return await audio_playback_response(
+            request,
             mixing_job.output_file_path,
-            media_type="audio/wav",
-            filename=download_filename
+            filename=download_filename,
+            rendition=rendition
         )
         
     except HTTPException:
@@ -863,16 +907,9 @@ async def get_mixing_audio(
                         # 构建TangoFlux提示词（智能AI转换）
                         tango_prompt = await _build_tangoflux_prompt_intelligent(keywords, track_duration)
                         
-                        # 调用TangoFlux生成音效
+                        # 调用TangoFlux生成音效（经生成缓存）
                         try:
-                            tangoflux_client = TangoFluxClient()
-                            generation_result = tangoflux_client.generate_environment_sound(
-                                prompt=tango_prompt,
-                                duration=track_duration,
-                                steps=50,
-                                cfg_scale=3.5,
-                                return_type='file'
-                            )
+                            generation_result = await _generate_tangoflux_audio(tango_prompt, track_duration)
                             
                             if generation_result['success']:
                                 # 成功生成音效
@@ -1141,32 +1178,30 @@ async def process_environment_mixing(mixing_job_id: int):
                         # 构建TangoFlux提示词（智能AI转换）
                         tango_prompt = await _build_tangoflux_prompt_intelligent(keywords, track_duration)
                         
-                        # 调用TangoFlux生成音效
+                        # 调用TangoFlux生成音效（经生成缓存）
                         try:
-                            tangoflux_client = TangoFluxClient()
-                            generation_result = tangoflux_client.generate_environment_sound(
-                                prompt=tango_prompt,
-                                duration=track_duration,
-                                steps=50,
-                                cfg_scale=3.5,
-                                return_type='file'
-                            )
+                            generation_result = await _generate_tangoflux_audio(tango_prompt, track_duration)
                             
                             if generation_result['success']:
                                 # 成功生成音效
                                 logger.info(f"✅ TangoFlux生成成功: {tango_prompt[:50]}...")
                                 
-                                # 🔄 保存生成的音效到环境音效库
-                                try:
-                                    await _save_generated_sound_to_library(
-                                        audio_data=generation_result['audio_data'],
-                                        keywords=keywords,
-                                        prompt=tango_prompt,
-                                        duration=track_duration,
-                                        db=db
-                                    )
-                                except Exception as save_error:
-                                    logger.warning(f"保存音效到库失败: {save_error}")
+                                # 🔄 保存生成的音效到环境音效库（缓存条目已入库时不再重复保存）
+                                cached = generation_result['cached']
+                                if cached.environment_sound_id is None:
+                                    try:
+                                        sound_id = await _save_generated_sound_to_library(
+                                            audio_data=cached.read_bytes(),
+                                            keywords=keywords,
+                                            prompt=tango_prompt,
+                                            duration=cached.duration_bucket,
+                                            db=db
+                                        )
+                                        if sound_id:
+                                            db.commit()
+                                            get_environment_sound_cache().attach_sound(cached.cache_key, sound_id)
+                                    except Exception as save_error:
+                                        logger.warning(f"保存音效到库失败: {save_error}")
                                 
                                 # 将音频数据转换为AudioSegment
                                 audio_bytes = generation_result['audio_data']
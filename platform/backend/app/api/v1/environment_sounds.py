@@ -14,7 +14,6 @@ import tempfile
 import threading
 import time
 from datetime import datetime, timedelta
-import aiohttp
 import asyncio
 
 from app.database import get_db
@@ -29,54 +28,30 @@ from app.schemas.environment_sound import (
     EnvironmentSoundListResponse
 )
 from app.clients.file_manager import save_audio_file, get_audio_file_path
+from app.clients.tangoflux_client import get_tangoflux_client
 from app.config.environment import get_environment_config
+from app.services.waveform_peaks import waveform_peaks_response
+from app.services.audio_rendition_service import audio_playback_response
+from app.services.environment_sound_cache import index_environment_sound, remove_environment_sound_index
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 env_config = get_environment_config()
 
-# TangoFlux服务配置
-TANGOFLUX_SERVICE_URL = os.getenv("TANGOFLUX_URL", "http://localhost:7930")
-
-def get_tangoflux_client():
-    """获取TangoFlux客户端（HTTP调用）"""
-    return {
-        "base_url": TANGOFLUX_SERVICE_URL,
-        "timeout": 300  # 5分钟超时
-    }
-
 async def call_tangoflux_generate(prompt: str, duration: float, steps: int, cfg_scale: float) -> bytes:
-    """调用TangoFlux服务生成音频"""
-    client = get_tangoflux_client()
-    
-    try:
-        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=client["timeout"])) as session:
-            data = {
-                "prompt": prompt,
-                "duration": duration,
-                "steps": steps,
-                "guidance_scale": cfg_scale  # TangoFlux API使用guidance_scale参数名
-            }
-            
-            # 调用TangoFlux API的正确端点
-            async with session.post(f"{client['base_url']}/api/v1/audio/generate", json=data) as response:
-                if response.status == 200:
-                    result = await response.json()
-                    # TangoFlux返回base64编码的音频数据
-                    if result.get("success") and "audio_base64" in result:
-                        import base64
-                        return base64.b64decode(result["audio_base64"])
-                    else:
-                        raise Exception("TangoFlux服务返回格式错误")
-                else:
-                    error_text = await response.text()
-                    raise Exception(f"TangoFlux服务错误: {response.status} - {error_text}")
-                    
-    except asyncio.TimeoutError:
-        raise Exception("TangoFlux服务调用超时")
-    except Exception as e:
-        logger.error(f"TangoFlux服务调用失败: {e}")
-        raise Exception(f"TangoFlux服务不可用: {str(e)}")
+    """调用TangoFlux服务生成音频（共享连接池的异步客户端）"""
+    result = await get_tangoflux_client().generate_environment_sound(
+        prompt,
+        duration=duration,
+        steps=steps,
+        cfg_scale=cfg_scale,
+        return_type='file',
+        timeout=300  # 5分钟超时
+    )
+    if not result['success']:
+        logger.error(f"TangoFlux服务调用失败: {result.get('error')}")
+        raise Exception(f"TangoFlux服务不可用: {result.get('error')}")
+    return result['audio_data']
 
 @router.get("/categories", response_model=List[EnvironmentSoundCategoryResponse])
 async def get_categories(
@@ -331,6 +306,8 @@ async def generate_environment_sound(
     )
     
     db.add(sound)
+    db.flush()
+    index_environment_sound(db, sound)
     db.commit()
     db.refresh(sound)
     
@@ -383,6 +360,7 @@ async def regenerate_environment_sound(
 async def download_environment_sound(
     sound_id: int,
     request: Request,
+    rendition: Optional[str] = Query(None, description="播放格式：opus / mp3，默认原始WAV"),
     db: Session = Depends(get_db)
 ):
     """下载环境音文件"""
@@ -400,11 +378,32 @@ async def download_environment_sound(
     # sound.download_count += 1
     db.commit()
     
-    from fastapi.responses import FileResponse
-    return FileResponse(
-        path=sound.file_path,
+    return await audio_playback_response(
+        request,
+        sound.file_path,
         filename=f"{sound.name}.wav",
-        media_type="audio/wav"
+        rendition=rendition
+    )
+
+@router.get("/{sound_id}/peaks")
+async def get_environment_sound_peaks(
+    sound_id: int,
+    request: Request,
+    format: str = Query("binary", regex="^(binary|json)$"),
+    samples_per_peak: Optional[int] = Query(None, ge=1),
+    pixels: Optional[int] = Query(None, ge=1, le=100000),
+    level: Optional[int] = Query(None, ge=0),
+    start: Optional[float] = Query(None, ge=0),
+    end: Optional[float] = Query(None, ge=0),
+    db: Session = Depends(get_db)
+):
+    """获取环境音波形峰值"""
+    sound = db.query(EnvironmentSound).filter(EnvironmentSound.id == sound_id).first()
+    if not sound or not sound.file_path or not os.path.exists(sound.file_path):
+        raise HTTPException(status_code=404, detail="音频文件不存在")
+
+    return await waveform_peaks_response(
+        sound.file_path, format, samples_per_peak, pixels, level, start, end, request=request
     )
 
 @router.post("/{sound_id}/play")
@@ -485,7 +484,8 @@ async def delete_environment_sound(
         except Exception as e:
             logger.warning(f"删除音频文件失败: {e}")
     
-    # 删除数据库记录
+    # 删除数据库记录及关键词索引
+    remove_environment_sound_index(db, sound.id)
     db.delete(sound)
     db.commit()
     
@@ -17,6 +17,7 @@ from pydantic import BaseModel
 
 from ...database import get_db
 from ...models.system import SystemLog
+from ...services.system_log_service import drop_expired_logs, keyset_page, keyword_condition
 from ...utils.logger import LogLevel, LogModule
 
 router = APIRouter(prefix="/logs", tags=["日志监控"])
@@ -52,15 +53,18 @@ async def get_logs(
     module: Optional[str] = Query(None, description="模块过滤"),
     start_time: Optional[str] = Query(None, description="开始时间 (ISO格式)"),
     end_time: Optional[str] = Query(None, description="结束时间 (ISO格式)"),
-    keyword: Optional[str] = Query(None, description="关键词搜索"),
+    keyword: Optional[str] = Query(None, description="关键词搜索（日志消息）"),
+    search_details: bool = Query(False, description="关键词同时搜索详细信息（无索引，较慢）"),
     user_id: Optional[str] = Query(None, description="用户ID过滤"),
-    page: int = Query(1, ge=1, description="页码"),
+    cursor: Optional[str] = Query(None, description="游标（上一页返回的 next_cursor）"),
+    include_total: bool = Query(False, description="游标分页时是否统计总数"),
+    page: int = Query(1, ge=1, description="页码（兼容旧分页，建议使用 cursor）"),
     page_size: int = Query(50, ge=1, le=1000, description="每页数量"),
     db: Session = Depends(get_db)
 ):
     """
     获取日志列表
-    支持多种过滤条件和分页
+    支持多种过滤条件；按 (created_at, id) 游标分页，翻页不随页码变慢
     """
     try:
         # 构建查询条件
@@ -98,13 +102,9 @@ async def get_logs(
             except ValueError:
                 raise HTTPException(status_code=400, detail="结束时间格式无效")
         
-        # 关键词搜索
+        # 关键词搜索（message 上有 trigram 索引）
         if keyword:
-            keyword_filter = f"%{keyword}%"
-            conditions.append(
-                SystemLog.message.like(keyword_filter) |
-                SystemLog.details.like(keyword_filter)
-            )
+            conditions.append(keyword_condition(keyword, include_details=search_details))
         
         # 用户ID过滤
         if user_id:
@@ -114,14 +114,21 @@ async def get_logs(
         if conditions:
             query = query.filter(and_(*conditions))
         
-        # 计算总数
-        total = query.count()
+        # 游标分页；未带游标的 page>1 请求按旧方式 OFFSET 兼容
+        if cursor or page == 1:
+            try:
+                logs, next_cursor = keyset_page(query, page_size, cursor)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+        else:
+            logs = query.order_by(desc(SystemLog.created_at), desc(SystemLog.id)) \
+                       .offset((page - 1) * page_size) \
+                       .limit(page_size) \
+                       .all()
+            next_cursor = None
         
-        # 分页和排序
-        logs = query.order_by(desc(SystemLog.created_at)) \
-                   .offset((page - 1) * page_size) \
-                   .limit(page_size) \
-                   .all()
+        # 总数需全量计数，游标翻页时默认不统计
+        total = query.count() if (not cursor or include_total) else None
         
         # 转换为字典格式
         log_list = [log.to_dict() for log in logs]
@@ -134,7 +141,8 @@ async def get_logs(
                     "page": page,
                     "page_size": page_size,
                     "total": total,
-                    "total_pages": (total + page_size - 1) // page_size
+                    "total_pages": (total + page_size - 1) // page_size if total is not None else None,
+                    "next_cursor": next_cursor
                 }
             }
         }
@@ -255,7 +263,8 @@ async def get_recent_logs(
 @router.get("/errors")
 async def get_error_logs(
     hours: int = Query(24, ge=1, le=168, description="时间范围(小时)"),
-    page: int = Query(1, ge=1, description="页码"),
+    cursor: Optional[str] = Query(None, description="游标（上一页返回的 next_cursor）"),
+    page: int = Query(1, ge=1, description="页码（兼容旧分页，建议使用 cursor）"),
     page_size: int = Query(20, ge=1, le=100, description="每页数量"),
     db: Session = Depends(get_db)
 ):
@@ -274,14 +283,21 @@ async def get_error_logs(
             )
         )
         
-        # 计算总数
+        # 计算总数（时间范围有限，走 level+created_at 索引）
         total = query.count()
         
         # 分页获取
-        error_logs = query.order_by(desc(SystemLog.created_at)) \
-                         .offset((page - 1) * page_size) \
-                         .limit(page_size) \
-                         .all()
+        if cursor or page == 1:
+            try:
+                error_logs, next_cursor = keyset_page(query, page_size, cursor)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+        else:
+            error_logs = query.order_by(desc(SystemLog.created_at), desc(SystemLog.id)) \
+                             .offset((page - 1) * page_size) \
+                             .limit(page_size) \
+                             .all()
+            next_cursor = None
         
         return {
             "success": True,
@@ -291,7 +307,8 @@ async def get_error_logs(
                     "page": page,
                     "page_size": page_size,
                     "total": total,
-                    "total_pages": (total + page_size - 1) // page_size
+                    "total_pages": (total + page_size - 1) // page_size,
+                    "next_cursor": next_cursor
                 },
                 "time_range": {
                     "hours": hours,
@@ -300,6 +317,8 @@ async def get_error_logs(
             }
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"获取错误日志失败: {e}")
         raise HTTPException(status_code=500, detail=f"获取错误日志失败: {str(e)}")
@@ -312,23 +331,12 @@ async def clear_old_logs(
 ):
     """
     清理旧日志
-    保留指定天数内的日志，删除更早的记录
+    保留指定天数内的日志：分区表直接删除整个过期分区，非分区表分批删除
     """
     try:
-        # 计算删除时间点
-        cutoff_time = datetime.utcnow() - timedelta(days=days)
-        
-        # 查询要删除的日志数量
-        delete_count = db.query(SystemLog).filter(
-            SystemLog.created_at < cutoff_time
-        ).count()
-        
-        # 执行删除
-        deleted = db.query(SystemLog).filter(
-            SystemLog.created_at < cutoff_time
-        ).delete()
-        
-        db.commit()
+        result = drop_expired_logs(db, days)
+        deleted = result["deleted_count"]
+        cutoff_time = result["cutoff_time"]
         
         # 记录清理操作
         new_log = SystemLog(
@@ -338,7 +346,8 @@ async def clear_old_logs(
             details=json.dumps({
                 "deleted_count": deleted,
                 "cutoff_days": days,
-                "cutoff_time": cutoff_time.isoformat()
+                "cutoff_time": cutoff_time.isoformat(),
+                "dropped_partitions": result["dropped_partitions"]
             })
         )
         db.add(new_log)
@@ -350,7 +359,8 @@ async def clear_old_logs(
             "data": {
                 "deleted_count": deleted,
                 "cutoff_days": days,
-                "cutoff_time": cutoff_time.isoformat()
+                "cutoff_time": cutoff_time.isoformat(),
+                "dropped_partitions": result["dropped_partitions"]
             }
         }
         
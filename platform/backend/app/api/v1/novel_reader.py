@@ -18,22 +18,74 @@ from pydub import AudioSegment
 
 from app.database import get_db
 from app.models import NovelProject, AudioFile, VoiceProfile  # TextSegment已废弃
+from app.services.job_queue import get_job_queue
+from app.services.project_progress_service import get_projects_progress
+from app.utils.list_views import FieldSet, paginate
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/novel-reader", tags=["Novel Reader"])
 
+# 列表字段视图：summary 不含配置与错误详情；progress / segment_stats 取自进度投影
+PROJECT_FIELDS = FieldSet(
+    NovelProject,
+    summary=[
+        'id', 'book_id', 'name', 'description', 'status', 'started_at', 'completed_at',
+        'created_at', 'updated_at', 'progress', 'segment_stats'
+    ],
+    derived={
+        'progress': ((), None, None),
+        'segment_stats': ((), None, None),
+    },
+    detail_extras=['progress', 'segment_stats']
+)
+
+
+def serialize_projects(db: Session, projects: List[NovelProject], names: Optional[List[str]]) -> List[Dict[str, Any]]:
+    """按字段视图输出项目；进度取自进度投影：当前页的项目一次按项目ID的索引查询"""
+    with_progress = PROJECT_FIELDS.includes(names, 'progress')
+    with_stats = PROJECT_FIELDS.includes(names, 'segment_stats')
+    progress_map = get_projects_progress(db, [project.id for project in projects]) \
+        if (with_progress or with_stats) else {}
+
+    project_list = []
+    for project in projects:
+        project_data = PROJECT_FIELDS.serialize(project, names)
+        if with_progress:
+            project_data['progress'] = progress_map[project.id]['progress']
+        if with_stats:
+            project_progress = progress_map[project.id]
+            project_data['segment_stats'] = {
+                'total': project_progress['total'],
+                'completed': project_progress['completed'],
+                'failed': project_progress['failed'],
+                'in_flight': project_progress['in_flight']
+            }
+        project_list.append(project_data)
+    return project_list
+
+
 @router.get("/projects")
 async def get_projects(
     page: int = Query(1, ge=1, description="页码"),
     page_size: int = Query(20, ge=1, le=100, description="每页数量"),
     search: str = Query("", description="搜索关键词"),
     status: str = Query("", description="状态过滤"),
+    book_id: Optional[int] = Query(None, description="书籍ID过滤"),
     sort_by: str = Query("created_at", description="排序字段"),
     sort_order: str = Query("desc", description="排序方向"),
+    view: Optional[str] = Query(None, description="字段视图：summary（不含配置等大字段）| detail（默认）"),
+    fields: Optional[str] = Query(None, description="返回字段，逗号分隔，如 id,name,progress"),
+    cursor: Optional[str] = Query(None, description="游标（上一页返回的 next_cursor）"),
+    include_total: bool = Query(False, description="游标分页时是否统计总数"),
     db: Session = Depends(get_db)
 ):
     """获取项目列表"""
     try:
+        try:
+            names = PROJECT_FIELDS.resolve(fields, view)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
         # 构建基础查询
         query = db.query(NovelProject)
         
@@ -45,38 +97,34 @@ async def get_projects(
         if status:
             query = query.filter(NovelProject.status == status)
         
-        # 应用排序
-        if sort_by == "created_at":
-            query = query.order_by(desc(NovelProject.created_at) if sort_order == "desc" else asc(NovelProject.created_at))
-        else:
-            query = query.order_by(desc(NovelProject.id))
-        
-        # 获取总数
-        total = query.count()
-        
-        # 应用分页
-        projects = query.offset((page - 1) * page_size).limit(page_size).all()
-        
-        # 转换为字典格式
-        project_list = []
-        for project in projects:
-            project_data = project.to_dict()
-            project_list.append(project_data)
+        # 书籍ID过滤
+        if book_id:
+            query = query.filter(NovelProject.book_id == book_id)
         
-        # 分页信息
-        total_pages = (total + page_size - 1) // page_size
+        # 排序与分页：带 cursor 时按 (排序列, id) 游标翻页，否则按页码
+        try:
+            projects, pagination = paginate(
+                query, PROJECT_FIELDS, names, sort_by, NovelProject.created_at, sort_order,
+                page, page_size, cursor=cursor, include_total=include_total
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
         return {
             "success": True,
             "data": {
-                "projects": project_list,
-                "total": total,
+                "projects": serialize_projects(db, projects, names),
+                "total": pagination["total"],
                 "page": page,
                 "page_size": page_size,
-                "total_pages": total_pages
+                "total_pages": pagination["totalPages"],
+                "has_more": pagination["hasMore"],
+                "next_cursor": pagination["nextCursor"]
             }
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"获取项目列表失败: {str(e)}")
         raise HTTPException(status_code=500, detail=f"获取项目列表失败: {str(e)}")
@@ -373,6 +421,9 @@ async def start_project_generation(
             # 重新合成模式：清理所有现有音频文件
             logger.info(f"[RESTART_SYNTHESIS] 重新合成模式，清理选中章节 {selected_chapter_ids} 的现有音频文件...")
             
+            # 取消选中章节仍在队列中的旧任务
+            get_job_queue().cancel_project(db, project_id, chapter_ids=selected_chapter_ids)
+            
             # 删除数据库中的音频文件记录
             existing_audio_files = db.query(AudioFile).filter(
                 AudioFile.project_id == project_id,
@@ -416,14 +467,8 @@ async def start_project_generation(
         project.started_at = datetime.utcnow()
         db.commit()
         
-        # 启动合成任务
-        from app.novel_reader import process_audio_generation_from_synthesis_plan
-        background_tasks.add_task(
-            process_audio_generation_from_synthesis_plan,
-            project_id=project_id,
-            synthesis_data=synthesis_data,
-            parallel_tasks=parallel_tasks
-        )
+        # 写入持久化任务队列，由Worker按段落领取执行
+        enqueued = get_job_queue().enqueue_synthesis_plan(db, project_id, synthesis_data)
         
         # 根据合成模式返回不同的消息
         if continue_synthesis:
@@ -439,7 +484,9 @@ async def start_project_generation(
                 "total_segments": len(synthesis_data),
                 "parallel_tasks": parallel_tasks,
                 "selected_chapters": selected_chapter_ids,
-                "synthesis_mode": "continue" if continue_synthesis else "restart"
+                "synthesis_mode": "continue" if continue_synthesis else "restart",
+                "queued_chapter_jobs": len(enqueued["chapter_jobs"]),
+                "queued_segment_jobs": enqueued["segment_jobs"]
             }
         }
         
@@ -470,13 +517,29 @@ async def resume_generation(
         project.status = 'processing'
         db.commit()
         
-        # 调用启动API
+        # 队列中保留了中断时的任务状态，直接放回队列即可，无需比对AudioFile
+        job_queue = get_job_queue()
+        if job_queue.has_jobs(db, project_id):
+            resumed = job_queue.resume_project(db, project_id)
+            if resumed:
+                return {
+                    "success": True,
+                    "message": f"已恢复 {resumed} 个任务",
+                    "data": {
+                        "project_id": project_id,
+                        "resumed_jobs": resumed,
+                        "jobs": job_queue.get_project_summary(db, project_id)
+                    }
+                }
+        
+        # 旧项目没有任务记录：按缺失段落继续合成
         return await start_project_generation(
             project_id=project_id,
             background_tasks=background_tasks,
             parallel_tasks=parallel_tasks,
             synthesis_mode="chapters",
             chapter_ids=chapter_ids,
+            continue_synthesis=True,
             db=db
         )
         
@@ -501,25 +564,15 @@ async def retry_all_failed_segments(
         if not project.book_id:
             raise HTTPException(status_code=400, detail="项目未关联书籍，无法重试")
         
-        # 获取智能准备结果
-        from app.models import AnalysisResult, BookChapter
-        analysis_results = db.query(AnalysisResult).join(
-            BookChapter, AnalysisResult.chapter_id == BookChapter.id
-        ).filter(
-            BookChapter.book_id == project.book_id,
-            AnalysisResult.status == 'completed',
-            AnalysisResult.synthesis_plan.isnot(None)
-        ).all()
+        # 获取智能准备的段落行
+        from app.services.synthesis_plan_service import book_segments_query
+        segment_rows = book_segments_query(db, project.book_id).all()
         
-        if not analysis_results:
+        if not segment_rows:
             raise HTTPException(status_code=400, detail="未找到智能准备结果")
         
-        # 收集所有合成段落数据
-        synthesis_data = []
-        for result in analysis_results:
-            if result.synthesis_plan and 'synthesis_plan' in result.synthesis_plan:
-                plan_segments = result.synthesis_plan['synthesis_plan']
-                synthesis_data.extend(plan_segments)
+        synthesis_data = [dict(row.data) for row in segment_rows]
+        analysis_results = list({row.analysis_result_id: row.analysis_result for row in segment_rows}.values())
         
         # 为synthesis_data添加章节信息
         from app.novel_reader import add_chapter_info_to_synthesis_data
@@ -530,21 +583,19 @@ async def retry_all_failed_segments(
         project.status = 'processing'
         db.commit()
         
-        # 启动合成任务
-        from app.services.audio_generation_service import process_audio_generation_from_synthesis_plan
-        background_tasks.add_task(
-            process_audio_generation_from_synthesis_plan,
-            project_id=project_id,
-            synthesis_data=synthesis_data,
-            parallel_tasks=1  # 重试时使用单线程
-        )
+        # 失败任务直接重新入队；没有任务记录的旧项目按计划入队（已存在的段落由Worker跳过）
+        job_queue = get_job_queue()
+        retried = job_queue.resume_project(db, project_id) if job_queue.has_jobs(db, project_id) else 0
+        if not retried:
+            retried = job_queue.enqueue_synthesis_plan(db, project_id, synthesis_data)["segment_jobs"]
         
         return {
             "success": True,
             "message": "开始重试失败的段落",
             "data": {
                 "project_id": project_id,
-                "total_segments": len(synthesis_data)
+                "total_segments": len(synthesis_data),
+                "retried_jobs": retried
             }
         }
         
@@ -832,6 +883,9 @@ async def pause_generation(
         project.status = 'paused'
         db.commit()
         
+        # 暂停队列中的任务，执行中的任务在下次心跳时停止
+        get_job_queue().pause_project(db, project_id)
+        
         return {
             "success": True,
             "message": "项目已暂停",
@@ -875,6 +929,9 @@ async def cancel_generation(
         ).count()
         project.error_message = f"合成已被用户取消，已处理 {current_progress} 个段落"
         
+        # 取消队列中未结束的任务
+        get_job_queue().cancel_project(db, project_id)
+        
         # 注意：不重置进度字段，保留取消时的进度信息
         # project.processed_segments = 0  # 保留当前进度
         # project.total_segments = None   # 保留总数
@@ -1142,29 +1199,11 @@ async def retry_segment(
         if not project.book_id:
             raise HTTPException(status_code=400, detail="项目未关联书籍，无法重试")
         
-        # 获取智能准备结果，找到对应segment_id的数据
-        from app.models import AnalysisResult, BookChapter
-        analysis_results = db.query(AnalysisResult).join(
-            BookChapter, AnalysisResult.chapter_id == BookChapter.id
-        ).filter(
-            BookChapter.book_id == project.book_id,
-            AnalysisResult.status == 'completed',
-            AnalysisResult.synthesis_plan.isnot(None)
-        ).all()
+        # 按segment_id索引定位智能准备中的段落
+        from app.services.synthesis_plan_service import find_book_segment
+        target_segment = find_book_segment(db, project.book_id, segment_id)
         
-        # 查找对应的segment数据
-        target_segment_data = None
-        for result in analysis_results:
-            if result.synthesis_plan and 'synthesis_plan' in result.synthesis_plan:
-                plan_segments = result.synthesis_plan['synthesis_plan']
-                for segment_data in plan_segments:
-                    if segment_data.get('segment_id') == segment_id:
-                        target_segment_data = segment_data
-                        break
-                if target_segment_data:
-                    break
-        
-        if not target_segment_data:
+        if not target_segment:
             raise HTTPException(status_code=404, detail=f"未找到段落{segment_id}的智能准备数据")
         
         # 更新项目状态为处理中
@@ -1206,47 +1245,16 @@ async def retry_all_failed_segments(
         if not project.book_id:
             raise HTTPException(status_code=400, detail="项目未关联书籍，无法重试")
         
-        # 🚀 新架构：获取智能准备结果，确定应该有哪些段落
-        from app.models import AnalysisResult, BookChapter
-        analysis_results = db.query(AnalysisResult).join(
-            BookChapter, AnalysisResult.chapter_id == BookChapter.id
-        ).filter(
-            BookChapter.book_id == project.book_id,
-            AnalysisResult.status == 'completed',
-            AnalysisResult.synthesis_plan.isnot(None)
-        ).all()
+        # 🚀 新架构：段落行确定应该有哪些段落，反连接AudioFile得到缺失（失败）的段落
+        from app.services.synthesis_plan_service import count_book_segments, missing_audio_segments
+        expected_count = count_book_segments(db, project.book_id)
         
-        if not analysis_results:
+        if not expected_count:
             raise HTTPException(status_code=400, detail="未找到智能准备结果")
         
-        # 收集所有应该合成的段落ID
-        expected_segments = set()
-        synthesis_data = []
-        for result in analysis_results:
-            if result.synthesis_plan and 'synthesis_plan' in result.synthesis_plan:
-                plan_segments = result.synthesis_plan['synthesis_plan']
-                for segment_data in plan_segments:
-                    segment_id = segment_data.get('segment_id')
-                    if segment_id:
-                        expected_segments.add(segment_id)
-                synthesis_data.extend(plan_segments)
-        
-        # 🔥 关键修复：为synthesis_data添加章节信息
-        from app.novel_reader import add_chapter_info_to_synthesis_data
-        synthesis_data = add_chapter_info_to_synthesis_data(synthesis_data, analysis_results, db)
-        logger.info(f"[CHAPTER_FIX] 已为 {len(synthesis_data)} 个段落添加章节信息")
-        
-        # 🚀 新架构：查找已存在的AudioFile段落ID
-        existing_audio_files = db.query(AudioFile).filter(
-            AudioFile.project_id == project_id,
-            AudioFile.audio_type == 'segment',
-            AudioFile.paragraph_index.isnot(None)
-        ).all()
-        
-        existing_segments = set(af.paragraph_index for af in existing_audio_files)
-        
-        # 计算失败（缺失）的段落
-        failed_segments = expected_segments - existing_segments
+        missing_rows = missing_audio_segments(db, project_id, project.book_id)
+        failed_segments = {row.segment_id for row in missing_rows}
+        completed_count = expected_count - len(missing_rows)
         
         if not failed_segments:
             return {
@@ -1255,8 +1263,8 @@ async def retry_all_failed_segments(
                 "data": {
                     "project_id": project_id,
                     "retried_segments": 0,
-                    "total_segments": len(expected_segments),
-                    "completed_segments": len(existing_segments)
+                    "total_segments": expected_count,
+                    "completed_segments": completed_count
                 }
             }
         
@@ -1265,22 +1273,16 @@ async def retry_all_failed_segments(
         db.commit()
         
         # 🚀 启动智能准备模式重新合成（只处理失败的段落）
-        if synthesis_data:
-            # 过滤出失败段落的数据
-            failed_synthesis_data = [
-                segment_data for segment_data in synthesis_data
-                if segment_data.get('segment_id') in failed_segments
-            ]
-            
-            if failed_synthesis_data:
-                # 启动后台任务处理音频生成
-                from app.novel_reader import process_audio_generation_from_synthesis_plan
-                background_tasks.add_task(
-                    process_audio_generation_from_synthesis_plan,
-                    project_id,
-                    failed_synthesis_data,
-                    1  # 默认并行任务数为1
-                )
+        failed_synthesis_data = [dict(row.data) for row in missing_rows]
+        
+        # 🔥 关键修复：为synthesis_data添加章节信息
+        from app.novel_reader import add_chapter_info_to_synthesis_data
+        analysis_results = list({row.analysis_result_id: row.analysis_result for row in missing_rows}.values())
+        failed_synthesis_data = add_chapter_info_to_synthesis_data(failed_synthesis_data, analysis_results, db)
+        logger.info(f"[CHAPTER_FIX] 已为 {len(failed_synthesis_data)} 个段落添加章节信息")
+        
+        # 写入持久化任务队列
+        get_job_queue().enqueue_synthesis_plan(db, project_id, failed_synthesis_data)
         
         return {
             "success": True,
@@ -1288,8 +1290,8 @@ async def retry_all_failed_segments(
             "data": {
                 "project_id": project_id,
                 "retried_segments": len(failed_segments),
-                "total_segments": len(expected_segments),
-                "completed_segments": len(existing_segments),
+                "total_segments": expected_count,
+                "completed_segments": completed_count,
                 "project_status": project.status
             }
         }
@@ -1316,102 +1318,74 @@ async def get_failed_segments(
         if not project.book_id:
             raise HTTPException(status_code=400, detail="项目未关联书籍，无法获取失败段落信息")
         
-        # 🚀 新架构：获取智能准备结果，确定应该有哪些段落
-        from app.models import AnalysisResult, BookChapter
-        analysis_results = db.query(AnalysisResult).join(
-            BookChapter, AnalysisResult.chapter_id == BookChapter.id
-        ).filter(
-            BookChapter.book_id == project.book_id,
-            AnalysisResult.status == 'completed',
-            AnalysisResult.synthesis_plan.isnot(None)
-        ).all()
+        # 🚀 新架构：段落行确定应该有哪些段落，反连接AudioFile得到缺失（失败）的段落
+        from app.services.synthesis_plan_service import count_book_segments, missing_audio_segments
+        expected_count = count_book_segments(db, project.book_id)
         
-        if not analysis_results:
+        if not expected_count:
             return {
                 "success": True,
                 "data": [],
                 "message": "未找到智能准备结果，无法确定失败段落"
             }
         
-        # 收集所有应该合成的段落信息
-        expected_segments = {}  # segment_id -> segment_data
-        for result in analysis_results:
-            if result.synthesis_plan and 'synthesis_plan' in result.synthesis_plan:
-                plan_segments = result.synthesis_plan['synthesis_plan']
-                for segment_data in plan_segments:
-                    segment_id = segment_data.get('segment_id')
-                    if segment_id:
-                        expected_segments[segment_id] = {
-                            "segment_id": segment_id,
-                            "text": segment_data.get('text', ''),
-                            "speaker": segment_data.get('speaker', ''),
-                            "voice_id": segment_data.get('voice_id'),
-                            "chapter_id": result.chapter_id,
-                            "chapter_number": result.chapter.chapter_number if result.chapter else None,
-                            "parameters": segment_data.get('parameters', {})
-                        }
-        
-        # 🚀 新架构：查找已存在的AudioFile段落ID
-        existing_audio_files = db.query(AudioFile).filter(
-            AudioFile.project_id == project_id,
-            AudioFile.audio_type == 'segment',
-            AudioFile.paragraph_index.isnot(None)
-        ).all()
-        
-        existing_segments = set(af.paragraph_index for af in existing_audio_files)
+        missing_rows = missing_audio_segments(db, project_id, project.book_id)
+        completed_count = expected_count - len(missing_rows)
         
-        # 计算失败（缺失）的段落
         failed_segments = []
-        for segment_id, segment_info in expected_segments.items():
-            if segment_id not in existing_segments:
-                # 判断失败原因
-                error_type = "synthesis_failed"
-                error_message = "音频合成失败"
-                
-                # 检查声音配置
-                voice_id = segment_info.get('voice_id')
-                if not voice_id:
-                    error_type = "voice_not_configured"
-                    error_message = "未配置声音档案"
+        for row in missing_rows:
+            segment_data = row.data
+            text = segment_data.get('text', '')
+            chapter = row.analysis_result.chapter
+            
+            # 判断失败原因（合成时记录了错误则优先使用）
+            error_type = "synthesis_failed"
+            error_message = row.error_message or "音频合成失败"
+            
+            # 检查声音配置
+            voice_id = segment_data.get('voice_id')
+            if not voice_id:
+                error_type = "voice_not_configured"
+                error_message = "未配置声音档案"
+            else:
+                # 检查声音档案是否存在
+                voice = db.query(VoiceProfile).filter(VoiceProfile.id == voice_id).first()
+                if not voice:
+                    error_type = "voice_not_found"
+                    error_message = f"声音档案不存在 (ID: {voice_id})"
                 else:
-                    # 检查声音档案是否存在
-                    voice = db.query(VoiceProfile).filter(VoiceProfile.id == voice_id).first()
-                    if not voice:
-                        error_type = "voice_not_found"
-                        error_message = f"声音档案不存在 (ID: {voice_id})"
-                    else:
-                        # 检查声音文件是否完整
-                        file_validation = voice.validate_files()
-                        if not file_validation['valid']:
-                            error_type = "voice_files_missing"
-                            error_message = f"声音文件缺失: {', '.join(file_validation['missing_files'])}"
-                
-                failed_segments.append({
-                    "segment_id": segment_id,
-                    "index": segment_id,
-                    "speaker": segment_info.get('speaker', '未知角色'),
-                    "text": segment_info.get('text', '')[:100] + ("..." if len(segment_info.get('text', '')) > 100 else ""),
-                    "full_text": segment_info.get('text', ''),
-                    "voice_id": voice_id,
-                    "chapter_id": segment_info.get('chapter_id'),
-                    "chapter_number": segment_info.get('chapter_number'),
-                    "error_type": error_type,
-                    "error_message": error_message,
-                    "parameters": segment_info.get('parameters', {}),
-                    "retry_available": True
-                })
+                    # 检查声音文件是否完整
+                    file_validation = voice.validate_files()
+                    if not file_validation['valid']:
+                        error_type = "voice_files_missing"
+                        error_message = f"声音文件缺失: {', '.join(file_validation['missing_files'])}"
+            
+            failed_segments.append({
+                "segment_id": row.segment_id,
+                "index": row.segment_id,
+                "speaker": segment_data.get('speaker', '未知角色'),
+                "text": text[:100] + ("..." if len(text) > 100 else ""),
+                "full_text": text,
+                "voice_id": voice_id,
+                "chapter_id": row.chapter_id,
+                "chapter_number": chapter.chapter_number if chapter else None,
+                "error_type": error_type,
+                "error_message": error_message,
+                "parameters": segment_data.get('parameters', {}),
+                "retry_available": True
+            })
         
         # 按段落ID排序
         failed_segments.sort(key=lambda x: x['segment_id'])
         
-        logger.info(f"项目 {project_id} 失败段落查询: 预期{len(expected_segments)}个，已完成{len(existing_segments)}个，失败{len(failed_segments)}个")
+        logger.info(f"项目 {project_id} 失败段落查询: 预期{expected_count}个，已完成{completed_count}个，失败{len(failed_segments)}个")
         
         return {
             "success": True,
             "data": failed_segments,
             "summary": {
-                "total_expected": len(expected_segments),
-                "completed": len(existing_segments),
+                "total_expected": expected_count,
+                "completed": completed_count,
                 "failed": len(failed_segments),
                 "project_status": project.status
             }
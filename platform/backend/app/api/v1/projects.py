@@ -14,6 +14,8 @@ from datetime import datetime
 from app.database import get_db
 from app.models import NovelProject, VoiceProfile, Book  # 🚀 TextSegment已删除
 from app.utils import log_system_event
+from app.utils.list_views import paginate
+from .novel_reader import PROJECT_FIELDS, serialize_projects
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/projects", tags=["Projects"])
@@ -27,10 +29,19 @@ async def get_projects(
     book_id: Optional[int] = Query(None, description="书籍ID过滤"),
     sort_by: str = Query("created_at", description="排序字段"),
     sort_order: str = Query("desc", description="排序方向"),
+    view: Optional[str] = Query(None, description="字段视图：summary（不含配置等大字段）| detail（默认）"),
+    fields: Optional[str] = Query(None, description="返回字段，逗号分隔，如 id,name,progress"),
+    cursor: Optional[str] = Query(None, description="游标（上一页返回的 nextCursor）"),
+    include_total: bool = Query(False, description="游标分页时是否统计总数"),
     db: Session = Depends(get_db)
 ):
     """获取项目列表"""
     try:
+        try:
+            names = PROJECT_FIELDS.resolve(fields, view)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
         # 构建查询
         query = db.query(NovelProject)
         
@@ -52,70 +63,19 @@ async def get_projects(
         if book_id:
             query = query.filter(NovelProject.book_id == book_id)
         
-        # 排序
-        sort_field = getattr(NovelProject, sort_by, NovelProject.created_at)
-        if sort_order == "asc":
-            query = query.order_by(asc(sort_field))
-        else:
-            query = query.order_by(desc(sort_field))
-        
-        # 统计总数
-        total = query.count()
-        
-        # 分页
-        offset = (page - 1) * page_size
-        projects = query.offset(offset).limit(page_size).all()
-        
-        # 转换为字典格式
-        project_list = []
-        for project in projects:
-            # 🚀 新架构：动态计算进度
-            progress = 0
-            
-            # 获取实际完成的音频文件数量
-            audio_count = db.query(AudioFile).filter(
-                AudioFile.project_id == project.id,
-                AudioFile.audio_type == 'segment'
-            ).count()
-            
-            # 获取智能准备的总段落数量
-            total_count = 0
-            if project.book_id:
-                from app.models import AnalysisResult, BookChapter
-                analysis_results = db.query(AnalysisResult).join(
-                    BookChapter, AnalysisResult.chapter_id == BookChapter.id
-                ).filter(
-                    BookChapter.book_id == project.book_id,
-                    AnalysisResult.status == 'completed',
-                    AnalysisResult.synthesis_plan.isnot(None)
-                ).all()
-                
-                for result in analysis_results:
-                    if result.synthesis_plan and 'synthesis_plan' in result.synthesis_plan:
-                        segments = result.synthesis_plan['synthesis_plan']
-                        total_count += len(segments)
-            
-            # 计算进度百分比
-            if total_count > 0:
-                progress = round((audio_count / total_count) * 100, 1)
-            
-            project_data = project.to_dict()
-            project_data['progress'] = progress
-            project_list.append(project_data)
-        
-        # 分页信息
-        total_pages = (total + page_size - 1) // page_size
+        # 排序与分页
+        try:
+            projects, pagination = paginate(
+                query, PROJECT_FIELDS, names, sort_by, NovelProject.created_at, sort_order,
+                page, page_size, cursor=cursor, include_total=include_total
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
         return {
             "success": True,
-            "data": project_list,
-            "pagination": {
-                "page": page,
-                "pageSize": page_size,
-                "total": total,
-                "totalPages": total_pages,
-                "hasMore": page < total_pages
-            },
+            "data": serialize_projects(db, projects, names),
+            "pagination": pagination,
             "filters": {
                 "search": search,
                 "status": status,
@@ -123,6 +83,8 @@ async def get_projects(
             }
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"获取项目列表失败: {str(e)}")
         raise HTTPException(status_code=500, detail=f"获取项目列表失败: {str(e)}")
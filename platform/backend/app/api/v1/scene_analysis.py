@@ -505,10 +505,10 @@ async def update_environment_sound_scene_tags(
 # 后台任务函数
 async def _execute_batch_generation_task(generation_queue: List[Dict[str, Any]]):
     """执行批量生成任务"""
-    from app.clients.tangoflux_client import TangoFluxClient
+    from app.clients.tangoflux_client import get_tangoflux_client
     
     try:
-        tangoflux_client = TangoFluxClient()
+        tangoflux_client = get_tangoflux_client()
         
         for item in generation_queue:
             try:
@@ -16,13 +16,15 @@ import shutil
 import json
 from datetime import datetime
 
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query, BackgroundTasks, Request
 from fastapi.responses import FileResponse, StreamingResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import desc
 from pydantic import BaseModel, Field
 
 from ...database import get_db
+from ...services.waveform_peaks import waveform_peaks_response
+from ...services.audio_rendition_service import audio_playback_response
 from ...config.environment import get_environment_config
 
 logger = logging.getLogger(__name__)
@@ -1070,6 +1072,8 @@ async def generate_silence_file(output_path: str, duration: float):
 @router.get("/preview/download/{preview_id}")
 async def download_preview_audio(
     preview_id: str,
+    request: Request,
+    rendition: Optional[str] = Query(None, description="播放格式：opus / mp3，默认原始WAV"),
     db: Session = Depends(get_db)
 ):
     """下载预览音频文件"""
@@ -1097,16 +1101,44 @@ async def download_preview_audio(
                 detail="预览音频文件为空\n请确保FFmpeg正常工作: winget install ffmpeg"
             )
         
-        return FileResponse(
-            path=str(preview_file),
+        return await audio_playback_response(
+            request,
+            str(preview_file),
             filename=f"preview_{preview_id}.wav",
-            media_type="audio/wav"
+            rendition=rendition
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"下载预览音频失败: {str(e)}")
         raise HTTPException(status_code=500, detail=f"预览下载失败: {str(e)}")
 
+@router.get("/preview/{preview_id}/peaks")
+async def get_preview_peaks(
+    preview_id: str,
+    request: Request,
+    format: str = Query("binary", regex="^(binary|json)$"),
+    samples_per_peak: Optional[int] = Query(None, ge=1),
+    pixels: Optional[int] = Query(None, ge=1, le=100000),
+    level: Optional[int] = Query(None, ge=0),
+    start: Optional[float] = Query(None, ge=0),
+    end: Optional[float] = Query(None, ge=0)
+):
+    """获取预览音频的波形峰值（多分辨率，按需取层）"""
+    current_dir = Path(__file__).parent.parent.parent.parent.parent  # 回到项目根目录
+    preview_file = current_dir / "storage" / "audio_editor" / "previews" / f"{Path(preview_id).name}.wav"
+    if not preview_file.exists():
+        raise HTTPException(status_code=404, detail=f"预览音频文件不存在: {preview_id}")
+
+    try:
+        return await waveform_peaks_response(
+            str(preview_file), format, samples_per_peak, pixels, level, start, end, request=request
+        )
+    except Exception as e:
+        logger.error(f"生成预览波形失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"生成预览波形失败: {str(e)}")
+
 @router.delete("/preview/{filename}")
 async def delete_preview_file(
     filename: str,
@@ -248,4 +248,12 @@ async def tts_preview(
         # 更新使用统计
         await update_usage_stats(db, success=False, processing_time=processing_time)
         
-        raise HTTPException(status_code=500, detail=f"试听异常: {str(e)}") 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"试听异常: {str(e)}") 
+
+@router.get("/nodes")
+async def get_tts_nodes():
+    """查看MegaTTS3节点池状态：在途请求、延迟EWMA、熔断状态"""
+    return {
+        "success": True,
+        "data": get_tts_client().pool.get_status()
+    }
@@ -21,6 +21,7 @@ from pathlib import Path
 from database import get_db
 from .models import AudioFile, NovelProject, VoiceProfile, SystemLog  # TextSegment已废弃
 from utils import log_system_event, get_audio_duration
+from .services.audio_rendition_service import audio_playback_response
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/audio-library", tags=["音频库管理"])
@@ -377,10 +378,12 @@ async def batch_delete_audio_files(
 @router.get("/download/{file_id}", summary="下载单个音频文件")
 async def download_audio_file(
     file_id: int,
+    request: Request,
+    rendition: Optional[str] = Query(None, description="播放格式：opus / mp3 / opus-32k 等，默认原始WAV"),
     db: Session = Depends(get_db)
 ):
     """
-    下载单个音频文件
+    下载单个音频文件（支持Range；rendition 指定压缩播放副本）
     """
     try:
         audio_file = db.query(AudioFile).filter(AudioFile.id == file_id).first()
@@ -393,10 +396,11 @@ async def download_audio_file(
         # 生成下载文件名
         download_name = audio_file.original_name or audio_file.filename
         
-        return FileResponse(
-            path=audio_file.file_path,
+        return await audio_playback_response(
+            request,
+            audio_file.file_path,
             filename=download_name,
-            media_type='audio/wav'
+            rendition=rendition
         )
         
     except HTTPException:
@@ -11,8 +11,8 @@ import asyncio
 import json
 import websockets
 from pathlib import Path
-from typing import Optional, Dict, Any, Callable
-from dataclasses import dataclass
+from typing import Optional, Dict, Any, Callable, List
+from dataclasses import dataclass, field
 
 logger = logging.getLogger(__name__)
 
@@ -23,12 +23,25 @@ class SynthesizeRequest:
     style: str = "pop"
     duration: int = 30
 
+JOB_POLL_INTERVAL = 2.0
+
+# 引擎任务阶段 -> 进度提示
+JOB_STAGE_MESSAGES = {
+    "queued": "排队等待生成",
+    "separating": "分离参考音频",
+    "generating": "生成音乐tokens",
+    "decoding": "解码音频",
+    "saving": "保存音频文件",
+    "done": "音乐生成完成",
+}
+
 @dataclass
 class SynthesizeResponse:
     """音乐合成响应"""
     audio_url: str
     duration: float
     generation_time: float
+    audio_urls: List[str] = field(default_factory=list)  # 多候选时每个候选的地址，第一个与audio_url相同
 
 class SongGenerationEngineClient:
     """
@@ -139,6 +152,7 @@ class SongGenerationEngineClient:
                                      cfg_coef: float = 1.5,
                                      temperature: float = 0.9,
                                      top_k: int = 50,
+                                     n_samples: int = 1,
                                      progress_callback: Optional[Callable[[float, str], None]] = None) -> Optional[SynthesizeResponse]:
         """
         带进度监控的音乐合成
@@ -150,6 +164,7 @@ class SongGenerationEngineClient:
             cfg_coef: CFG系数（0.1-3.0）
             temperature: 温度（0.1-2.0）
             top_k: Top-K（1-100）
+            n_samples: 候选数量，引擎在同一批次中生成（仅任务队列接口支持）
             progress_callback: 进度回调函数 (progress: float, message: str) -> None
             
         Returns:
@@ -180,7 +195,21 @@ class SongGenerationEngineClient:
                     await progress_callback(-1, "音乐生成服务不可用")
                 return None
             
-            # 步骤1: 启动异步生成任务
+            # 步骤1: 优先使用引擎的任务队列接口，可获得真实的生成进度与结果地址
+            job_request = {
+                "lyrics": formatted_lyrics,
+                "descriptions": description or None,
+                "auto_prompt_audio_type": genre,
+                "cfg_coef": float(cfg_coef),
+                "temperature": float(temperature),
+                "top_k": int(top_k),
+                "n_samples": int(n_samples)
+            }
+            job_id = await self._submit_job(job_request)
+            if job_id:
+                return await self._wait_for_job(job_id, progress_callback)
+
+            # 旧版引擎（无 /jobs 接口）：回退到 /generate_async + WebSocket
             if progress_callback:
                 await progress_callback(0.05, "启动异步音乐生成...")
             
@@ -409,54 +438,82 @@ class SongGenerationEngineClient:
             # 返回安全的默认格式
             return "[verse]\n暂无歌词内容"
 
-    async def _poll_for_completion(self, task_id: str, lyrics_hint: str) -> Optional[SynthesizeResponse]:
+    async def _submit_job(self, request_data: Dict[str, Any]) -> Optional[str]:
         """
-        轮询等待音乐生成完成
-        
-        由于SongGeneration在生成时会阻塞API，我们通过以下方式检测完成：
-        1. 定期检查健康状态
-        2. 服务恢复后尝试列出生成的文件
-        3. 根据时间戳匹配最新生成的文件
+        提交生成任务到 /jobs，返回任务ID
+
+        引擎不支持任务接口（404/405）时返回None；队列已满（429）时按Retry-After重试
         """
+        async with httpx.AsyncClient(timeout=60) as client:
+            for attempt in range(5):
+                response = await client.post(f"{self.base_url}/jobs", json=request_data)
+                if response.status_code != 429:
+                    break
+                retry_after = float(response.headers.get("Retry-After", "30"))
+                logger.warning(f"SongGeneration队列已满，{retry_after:.0f}秒后重试 ({attempt + 1}/5)")
+                await asyncio.sleep(retry_after)
+
+        if response.status_code in (404, 405):
+            logger.info("SongGeneration引擎不支持任务接口，使用旧版异步接口")
+            return None
+        if response.status_code != 202 and response.status_code != 200:
+            raise RuntimeError(f"提交生成任务失败: {response.status_code} - {response.text}")
+
+        data = response.json()
+        logger.info(f"生成任务已提交，job_id: {data['job_id']}，排队位置: {data.get('queue_position')}")
+        return data["job_id"]
+
+    async def _wait_for_job(self, job_id: str,
+                            progress_callback: Optional[Callable[[float, str], None]] = None) -> Optional[SynthesizeResponse]:
+        """轮询任务状态直至完成，进度直接来自引擎的token计数"""
         start_time = time.time()
-        max_wait_time = 1200  # 最大等待20分钟 (适应复杂音乐生成)
-        check_interval = 10   # 每10秒检查一次 (更频繁检查)
-        
-        logger.info(f"开始轮询等待音乐生成完成 (任务ID: {task_id})")
-        
-        while time.time() - start_time < max_wait_time:
-            try:
-                # 检查服务是否恢复响应
-                async with httpx.AsyncClient(timeout=5) as client:
-                    health_response = await client.get(f"{self.base_url}/health")
-                    
-                    if health_response.status_code == 200:
-                        logger.info("🎉 SongGeneration服务恢复响应，检查生成结果...")
-                        
-                        # 尝试获取最新生成的文件
-                        file_id = await self._find_latest_generated_file(start_time)
-                        if file_id:
-                            generation_time = time.time() - start_time
-                            logger.info(f"✅ 音乐生成完成！文件ID: {file_id}, 耗时: {generation_time:.1f}秒")
-                            
-                            return SynthesizeResponse(
-                                audio_url=f"/download/{file_id}",
-                                duration=30.0,
-                                generation_time=generation_time
-                            )
-                        else:
-                            logger.warning("服务恢复但未找到生成的文件，继续等待...")
-                    
-            except Exception as e:
-                # 服务仍在生成中，继续等待
-                elapsed = time.time() - start_time
-                logger.debug(f"等待中... ({elapsed:.0f}s/{max_wait_time}s)")
-            
-            await asyncio.sleep(check_interval)
-        
-        logger.error(f"音乐生成超时 (等待了 {max_wait_time} 秒)")
+        last_progress = None
+
+        async with httpx.AsyncClient(timeout=10) as client:
+            while time.time() - start_time < self.timeout:
+                try:
+                    response = await client.get(f"{self.base_url}/jobs/{job_id}")
+                except httpx.HTTPError as e:
+                    logger.debug(f"查询任务状态失败，继续等待: {e}")
+                    await asyncio.sleep(JOB_POLL_INTERVAL)
+                    continue
+
+                if response.status_code == 404:
+                    logger.error(f"生成任务不存在: {job_id}")
+                    return None
+                data = response.json()
+                status = data.get("status")
+
+                if status == "succeeded":
+                    if progress_callback:
+                        await progress_callback(1.0, JOB_STAGE_MESSAGES["done"])
+                    logger.info(f"✅ 音乐生成完成！job_id: {job_id}, 耗时: {data.get('generation_time') or 0:.1f}秒")
+                    result_urls = data.get("result_urls") or [f"/jobs/{job_id}/result"]
+                    return SynthesizeResponse(
+                        audio_url=result_urls[0],
+                        duration=30.0,
+                        generation_time=data.get("generation_time") or (time.time() - start_time),
+                        audio_urls=result_urls
+                    )
+                if status in ("failed", "cancelled"):
+                    logger.error(f"音乐生成失败: {data.get('error')}")
+                    if progress_callback:
+                        await progress_callback(-1, data.get("error") or "音乐生成失败")
+                    return None
+
+                progress = data.get("progress", 0.0)
+                if progress_callback and progress != last_progress:
+                    message = JOB_STAGE_MESSAGES.get(data.get("stage"), "生成中")
+                    if status == "queued" and data.get("queue_position"):
+                        message = f"{message}（第{data['queue_position']}位）"
+                    await progress_callback(progress, message)
+                    last_progress = progress
+
+                await asyncio.sleep(JOB_POLL_INTERVAL)
+
+        logger.error(f"音乐生成超时 (等待了 {self.timeout} 秒)")
         return None
-    
+
     async def _find_latest_generated_file(self, since_time: float) -> Optional[str]:
         """
         查找最新生成的音频文件
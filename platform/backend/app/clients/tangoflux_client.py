@@ -3,241 +3,434 @@
 """
 TangoFlux Environment Sound Client
 AI-Sound平台的环境音合成客户端
+
+异步实现：所有调用方共享同一个 aiohttp 连接池（每个事件循环一个会话），
+不再在事件循环里发起阻塞的 requests 调用，也不再为每次生成新建会话。
+连接错误与 429/5xx 在重试预算内退避重试；调用方取消任务时请求随之取消。
+服务提供批量端点时，generate_batch 把多条提示词合并为一次请求
 """
 
-import requests
+import asyncio
 import base64
 import json
-import time
 import logging
-from typing import Optional, Dict, Any, Union
-import tempfile
 import os
+import random
+import time
+import weakref
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import aiohttp
 
 logger = logging.getLogger(__name__)
 
+TANGOFLUX_URL = os.getenv("TANGOFLUX_URL", "http://127.0.0.1:7930")
+TANGOFLUX_TIMEOUT = float(os.getenv("TANGOFLUX_TIMEOUT", "120"))
+TANGOFLUX_CONNECT_TIMEOUT = float(os.getenv("TANGOFLUX_CONNECT_TIMEOUT", "10"))
+TANGOFLUX_POOL_SIZE = int(os.getenv("TANGOFLUX_POOL_SIZE", "8"))
+TANGOFLUX_MAX_RETRIES = int(os.getenv("TANGOFLUX_MAX_RETRIES", "2"))
+TANGOFLUX_RETRY_RATIO = float(os.getenv("TANGOFLUX_RETRY_RATIO", "0.2"))
+TANGOFLUX_MAX_BATCH = int(os.getenv("TANGOFLUX_MAX_BATCH", "4"))
+
+# 可重试的响应状态（生成超时不重试：一次生成本身就要数十秒）
+RETRYABLE_STATUS = {429, 502, 503, 504}
+# 批量端点不存在时的响应状态
+BATCH_UNSUPPORTED_STATUS = {404, 405, 501}
+
+
+class RetryBudget:
+    """
+    重试预算：每个请求存入 ratio 个令牌，每次重试取出 1 个。
+    服务整体故障时重试量不超过请求量的 ratio 倍，避免重试把负载放大
+    """
+
+    def __init__(self, ratio: float = TANGOFLUX_RETRY_RATIO, initial: float = 3.0, capacity: float = 10.0):
+        self.ratio = ratio
+        self.capacity = capacity
+        self.tokens = min(initial, capacity)
+
+    def record_request(self):
+        self.tokens = min(self.capacity, self.tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        return False
+
+
 class TangoFluxClient:
     """TangoFlux环境音合成客户端"""
-    
-    def __init__(self, base_url: str = "http://127.0.0.1:7930", timeout: int = 120):
+
+    def __init__(
+        self,
+        base_url: str = TANGOFLUX_URL,
+        timeout: float = TANGOFLUX_TIMEOUT,
+        connect_timeout: float = TANGOFLUX_CONNECT_TIMEOUT,
+        pool_size: int = TANGOFLUX_POOL_SIZE,
+        max_retries: int = TANGOFLUX_MAX_RETRIES,
+        max_batch: int = TANGOFLUX_MAX_BATCH,
+        retry_budget: Optional[RetryBudget] = None
+    ):
         """
         初始化TangoFlux客户端
-        
+
         Args:
             base_url: TangoFlux API服务地址
-            timeout: 请求超时时间（秒）
+            timeout: 生成请求超时时间（秒）
+            connect_timeout: 建立连接超时时间（秒）
+            pool_size: 连接池大小，同时也是对服务的最大并发请求数
+            max_retries: 单个请求的最大重试次数
+            max_batch: 批量端点单次请求的最大提示词数
+            retry_budget: 重试预算（默认每个客户端独立一份）
         """
         self.base_url = base_url.rstrip('/')
         self.timeout = timeout
-        self.session = requests.Session()
-        
-    def check_health(self) -> Dict[str, Any]:
+        self.connect_timeout = connect_timeout
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self.max_batch = max(1, max_batch)
+        self.retry_budget = retry_budget or RetryBudget()
+        # None: 尚未探测；False: 服务没有批量端点
+        self.batch_supported: Optional[bool] = None
+        self._sessions: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, aiohttp.ClientSession]" = \
+            weakref.WeakKeyDictionary()
+        self.stats = {"requests": 0, "retries": 0, "budget_exhausted": 0, "batch_requests": 0}
+
+    def _session(self) -> aiohttp.ClientSession:
+        """当前事件循环的共享会话（aiohttp 会话不能跨事件循环使用）"""
+        loop = asyncio.get_running_loop()
+        session = self._sessions.get(loop)
+        if session is None or session.closed:
+            session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size, limit_per_host=self.pool_size),
+                timeout=aiohttp.ClientTimeout(total=self.timeout, connect=self.connect_timeout)
+            )
+            self._sessions[loop] = session
+        return session
+
+    async def close(self):
+        """关闭当前事件循环的连接池"""
+        session = self._sessions.pop(asyncio.get_running_loop(), None)
+        if session and not session.closed:
+            await session.close()
+
+    async def _request(
+        self,
+        method: str,
+        path: str,
+        json: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = None
+    ) -> Tuple[int, bytes]:
+        """
+        发送请求并读取完整响应体
+        连接错误与可重试状态码在重试预算内指数退避重试，超时和取消直接向上抛出
+        """
+        self.stats["requests"] += 1
+        self.retry_budget.record_request()
+        request_timeout = aiohttp.ClientTimeout(total=timeout, connect=self.connect_timeout) if timeout else None
+        attempt = 0
+
+        while True:
+            try:
+                async with self._session().request(
+                    method, f"{self.base_url}{path}", json=json, timeout=request_timeout
+                ) as response:
+                    body = await response.read()
+                    if response.status not in RETRYABLE_STATUS or not self._may_retry(attempt):
+                        return response.status, body
+                    logger.warning(f"TangoFlux返回 {response.status}，准备重试: {path}")
+            except aiohttp.ClientConnectionError as e:
+                if not self._may_retry(attempt):
+                    raise
+                logger.warning(f"TangoFlux连接失败，准备重试: {path} - {e}")
+
+            attempt += 1
+            self.stats["retries"] += 1
+            await asyncio.sleep(min(8.0, 0.5 * 2 ** (attempt - 1)) * (0.5 + random.random()))
+
+    def _may_retry(self, attempt: int) -> bool:
+        if attempt >= self.max_retries:
+            return False
+        if not self.retry_budget.try_spend():
+            self.stats["budget_exhausted"] += 1
+            return False
+        return True
+
+    @staticmethod
+    def _json(body: bytes) -> Dict[str, Any]:
+        return json.loads(body.decode('utf-8'))
+
+    @classmethod
+    def _error_message(cls, status: int, body: bytes) -> str:
+        try:
+            return cls._json(body).get('error', f'HTTP {status}')
+        except Exception:
+            return f'HTTP {status}: {body[:500].decode("utf-8", errors="replace")}'
+
+    async def _get_json(self, path: str) -> Dict[str, Any]:
+        try:
+            status, body = await self._request('GET', path, timeout=10)
+            if status == 200:
+                return {'success': True, 'data': self._json(body)}
+            return {'success': False, 'error': f"HTTP {status}", 'data': None}
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"TangoFlux request {path} failed: {e}")
+            return {'success': False, 'error': str(e) or type(e).__name__, 'data': None}
+
+    async def check_health(self) -> Dict[str, Any]:
         """
         检查TangoFlux服务健康状态
-        
+
         Returns:
             Dict: 健康状态信息
         """
-        try:
-            response = self.session.get(
-                f"{self.base_url}/health",
-                timeout=10
-            )
-            
-            if response.status_code == 200:
-                return {
-                    'status': 'healthy',
-                    'data': response.json()
-                }
-            else:
-                return {
-                    'status': 'unhealthy',
-                    'error': f"HTTP {response.status_code}",
-                    'data': None
-                }
-                
-        except Exception as e:
-            logger.error(f"TangoFlux health check failed: {e}")
-            return {
-                'status': 'error',
-                'error': str(e),
-                'data': None
-            }
-    
-    def get_service_info(self) -> Dict[str, Any]:
+        result = await self._get_json("/health")
+        if result['success']:
+            return {'status': 'healthy', 'data': result['data']}
+        status = 'unhealthy' if result['error'].startswith('HTTP') else 'error'
+        return {'status': status, 'error': result['error'], 'data': None}
+
+    async def get_service_info(self) -> Dict[str, Any]:
         """
         获取TangoFlux服务信息
-        
+
         Returns:
             Dict: 服务信息
         """
-        try:
-            response = self.session.get(
-                f"{self.base_url}/api/v1/info",
-                timeout=10
-            )
-            
-            if response.status_code == 200:
-                return {
-                    'success': True,
-                    'data': response.json()
-                }
-            else:
-                return {
-                    'success': False,
-                    'error': f"HTTP {response.status_code}",
-                    'data': None
-                }
-                
-        except Exception as e:
-            logger.error(f"Failed to get TangoFlux service info: {e}")
-            return {
-                'success': False,
-                'error': str(e),
-                'data': None
-            }
-    
-    def generate_environment_sound(
+        return await self._get_json("/api/v1/info")
+
+    @staticmethod
+    def _build_payload(
+        prompt: str,
+        duration: float,
+        steps: int,
+        cfg_scale: float
+    ) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """参数验证并构建请求体，返回 (payload, 错误信息)"""
+        if not prompt or not isinstance(prompt, str):
+            return None, 'prompt must be a non-empty string'
+        if not (1 <= duration <= 30):
+            return None, 'duration must be between 1 and 30 seconds'
+        if not (1 <= steps <= 200):
+            return None, 'steps must be between 1 and 200'
+        if not (1.0 <= cfg_scale <= 10.0):
+            return None, 'cfg_scale must be between 1.0 and 10.0'
+        return {
+            'prompt': prompt,
+            'duration': duration,
+            'steps': steps,
+            'cfg_scale': cfg_scale
+        }, None
+
+    async def generate_environment_sound(
         self,
         prompt: str,
         duration: float = 10.0,
         steps: int = 50,
         cfg_scale: float = 3.5,
-        return_type: str = 'base64'
+        return_type: str = 'base64',
+        timeout: Optional[float] = None
     ) -> Dict[str, Any]:
         """
         生成环境音
-        
+
         Args:
             prompt: 环境音描述文本（英文）
             duration: 音频时长（秒，1-30）
             steps: 推理步数（1-200）
             cfg_scale: CFG引导强度（1.0-10.0）
             return_type: 返回类型 ('base64' 或 'file')
-            
+            timeout: 本次请求的超时时间（秒），默认使用客户端配置
+
         Returns:
             Dict: 生成结果
         """
-        # 参数验证
-        if not prompt or not isinstance(prompt, str):
-            return {
-                'success': False,
-                'error': 'prompt must be a non-empty string'
-            }
-        
-        if not (1 <= duration <= 30):
-            return {
-                'success': False,
-                'error': 'duration must be between 1 and 30 seconds'
-            }
-        
-        if not (1 <= steps <= 200):
-            return {
-                'success': False,
-                'error': 'steps must be between 1 and 200'
-            }
-        
-        if not (1.0 <= cfg_scale <= 10.0):
-            return {
-                'success': False,
-                'error': 'cfg_scale must be between 1.0 and 10.0'
-            }
-        
-        # 构建请求
-        payload = {
-            'prompt': prompt,
-            'duration': duration,
-            'steps': steps,
-            'cfg_scale': cfg_scale
-        }
-        
+        payload, error = self._build_payload(prompt, duration, steps, cfg_scale)
+        if error:
+            return {'success': False, 'error': error}
+
         # 选择端点
-        if return_type == 'file':
-            endpoint = f"{self.base_url}/api/v1/audio/generate_file"
-        else:
-            endpoint = f"{self.base_url}/api/v1/audio/generate"
-        
+        path = "/api/v1/audio/generate_file" if return_type == 'file' else "/api/v1/audio/generate"
+        timeout = timeout or self.timeout
+
         try:
             logger.info(f"Generating environment sound: {prompt[:50]}...")
             start_time = time.time()
-            
-            response = self.session.post(
-                endpoint,
-                headers={'Content-Type': 'application/json'},
-                json=payload,
-                timeout=self.timeout
-            )
-            
+            status, body = await self._request('POST', path, json=payload, timeout=timeout)
             request_time = time.time() - start_time
-            
-            if response.status_code == 200:
-                if return_type == 'file':
-                    # 文件返回模式
-                    return {
-                        'success': True,
-                        'audio_data': response.content,
-                        'content_type': 'audio/wav',
-                        'prompt': prompt,
-                        'parameters': payload,
-                        'request_time': round(request_time, 2),
-                        'size_bytes': len(response.content)
-                    }
-                else:
-                    # Base64返回模式
-                    result = response.json()
-                    if result.get('success'):
-                        return {
-                            'success': True,
-                            'audio_base64': result['audio_base64'],
-                            'content_type': result['content_type'],
-                            'prompt': result['prompt'],
-                            'parameters': result['parameters'],
-                            'audio_info': result['audio_info'],
-                            'request_time': round(request_time, 2)
-                        }
-                    else:
-                        return {
-                            'success': False,
-                            'error': result.get('error', 'Unknown error')
-                        }
-            else:
-                try:
-                    error_data = response.json()
-                    error_msg = error_data.get('error', f'HTTP {response.status_code}')
-                except:
-                    error_msg = f'HTTP {response.status_code}: {response.text}'
-                
+
+            if status != 200:
+                return {'success': False, 'error': self._error_message(status, body)}
+
+            if return_type == 'file':
+                # 文件返回模式
                 return {
-                    'success': False,
-                    'error': error_msg
+                    'success': True,
+                    'audio_data': body,
+                    'content_type': 'audio/wav',
+                    'prompt': prompt,
+                    'parameters': payload,
+                    'request_time': round(request_time, 2),
+                    'size_bytes': len(body)
                 }
-                
-        except requests.exceptions.Timeout:
+
+            # Base64返回模式
+            result = self._json(body)
+            if not result.get('success'):
+                return {'success': False, 'error': result.get('error', 'Unknown error')}
             return {
-                'success': False,
-                'error': f'Request timeout after {self.timeout} seconds'
+                'success': True,
+                'audio_base64': result['audio_base64'],
+                'content_type': result['content_type'],
+                'prompt': result['prompt'],
+                'parameters': result['parameters'],
+                'audio_info': result['audio_info'],
+                'request_time': round(request_time, 2)
             }
+
+        except asyncio.TimeoutError:
+            return {'success': False, 'error': f'Request timeout after {timeout} seconds'}
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
             logger.error(f"Environment sound generation failed: {e}")
-            return {
-                'success': False,
-                'error': str(e)
-            }
-    
+            return {'success': False, 'error': str(e) or type(e).__name__}
+
+    async def generate_batch(
+        self,
+        requests: List[Dict[str, Any]],
+        timeout: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        批量生成环境音
+        服务提供 /api/v1/audio/generate_batch 时按 max_batch 分组，每组一次请求；
+        首次探测到批量端点不存在后改为并发单条请求（并发度受连接池限制）
+
+        Args:
+            requests: 每项包含 prompt，可选 duration/steps/cfg_scale
+            timeout: 单次请求超时时间（秒），批量请求按组内条数放大
+
+        Returns:
+            List[Dict]: 与 requests 一一对应，格式同 generate_environment_sound(return_type='file')
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(requests)
+        payloads: Dict[int, Dict[str, Any]] = {}
+        for index, item in enumerate(requests):
+            payload, error = self._build_payload(
+                item.get('prompt'),
+                item.get('duration', 10.0),
+                item.get('steps', 50),
+                item.get('cfg_scale', 3.5)
+            )
+            if error:
+                results[index] = {'success': False, 'error': error}
+            else:
+                payloads[index] = payload
+
+        pending = list(payloads)
+        if len(pending) > 1 and self.batch_supported is not False:
+            groups = [pending[i:i + self.max_batch] for i in range(0, len(pending), self.max_batch)]
+            # 第一组兼作批量端点探测
+            if self.batch_supported is None:
+                await self._generate_group(groups[0], payloads, results, timeout)
+                groups = groups[1:] if self.batch_supported else []
+            if groups:
+                await asyncio.gather(*[self._generate_group(g, payloads, results, timeout) for g in groups])
+
+        remaining = [index for index in pending if results[index] is None]
+        if remaining:
+            singles = await asyncio.gather(*[
+                self.generate_environment_sound(return_type='file', timeout=timeout, **payloads[index])
+                for index in remaining
+            ])
+            for index, result in zip(remaining, singles):
+                results[index] = result
+        return results
+
+    async def _generate_group(
+        self,
+        indices: List[int],
+        payloads: Dict[int, Dict[str, Any]],
+        results: List[Optional[Dict[str, Any]]],
+        timeout: Optional[float]
+    ):
+        """
+        通过批量端点生成一组提示词，结果写入 results；
+        批量端点不存在时保持 None，由调用方改走单条请求
+        """
+        group_timeout = (timeout or self.timeout) * len(indices)
+        start_time = time.time()
+        try:
+            self.stats["batch_requests"] += 1
+            status, body = await self._request(
+                'POST', "/api/v1/audio/generate_batch",
+                json={'requests': [payloads[index] for index in indices]},
+                timeout=group_timeout
+            )
+        except asyncio.TimeoutError:
+            for index in indices:
+                results[index] = {'success': False, 'error': f'Request timeout after {group_timeout} seconds'}
+            return
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Batch environment sound generation failed: {e}")
+            for index in indices:
+                results[index] = {'success': False, 'error': str(e) or type(e).__name__}
+            return
+
+        if status in BATCH_UNSUPPORTED_STATUS:
+            if self.batch_supported is None:
+                logger.info("TangoFlux服务不支持批量生成，改为并发单条请求")
+            self.batch_supported = False
+            return
+        self.batch_supported = True
+        request_time = round(time.time() - start_time, 2)
+
+        if status != 200:
+            error = self._error_message(status, body)
+            for index in indices:
+                results[index] = {'success': False, 'error': error}
+            return
+
+        try:
+            items = self._json(body).get('results') or []
+        except Exception as e:
+            items = []
+            logger.error(f"Batch response parse failed: {e}")
+        for position, index in enumerate(indices):
+            item = items[position] if position < len(items) else {'error': 'missing result in batch response'}
+            if item.get('success') and item.get('audio_base64'):
+                audio_data = base64.b64decode(item['audio_base64'])
+                results[index] = {
+                    'success': True,
+                    'audio_data': audio_data,
+                    'content_type': item.get('content_type', 'audio/wav'),
+                    'prompt': payloads[index]['prompt'],
+                    'parameters': payloads[index],
+                    'request_time': request_time,
+                    'size_bytes': len(audio_data)
+                }
+            else:
+                results[index] = {'success': False, 'error': item.get('error', 'Unknown error')}
+
     def save_audio_to_file(
-        self, 
-        audio_data: Union[str, bytes], 
-        filename: str, 
+        self,
+        audio_data: Union[str, bytes],
+        filename: str,
         is_base64: bool = True
     ) -> Dict[str, Any]:
         """
         保存音频数据到文件
-        
+
         Args:
             audio_data: 音频数据（base64字符串或字节）
             filename: 保存的文件名
             is_base64: 数据是否为base64格式
-            
+
         Returns:
             Dict: 保存结果
         """
@@ -247,26 +440,26 @@ class TangoFluxClient:
                 audio_bytes = base64.b64decode(audio_data)
             else:
                 audio_bytes = audio_data
-            
+
             with open(filename, 'wb') as f:
                 f.write(audio_bytes)
-            
+
             file_size = os.path.getsize(filename)
-            
+
             return {
                 'success': True,
                 'filename': filename,
                 'size_bytes': file_size
             }
-            
+
         except Exception as e:
             logger.error(f"Failed to save audio file: {e}")
             return {
                 'success': False,
                 'error': str(e)
             }
-    
-    def generate_and_save(
+
+    async def generate_and_save(
         self,
         prompt: str,
         output_path: str,
@@ -276,36 +469,37 @@ class TangoFluxClient:
     ) -> Dict[str, Any]:
         """
         生成环境音并保存到文件
-        
+
         Args:
             prompt: 环境音描述文本
             output_path: 输出文件路径
             duration: 音频时长
             steps: 推理步数
             cfg_scale: CFG引导强度
-            
+
         Returns:
             Dict: 生成和保存结果
         """
         # 生成音频
-        result = self.generate_environment_sound(
+        result = await self.generate_environment_sound(
             prompt=prompt,
             duration=duration,
             steps=steps,
             cfg_scale=cfg_scale,
             return_type='base64'
         )
-        
+
         if not result['success']:
             return result
-        
+
         # 保存文件
-        save_result = self.save_audio_to_file(
+        save_result = await asyncio.to_thread(
+            self.save_audio_to_file,
             audio_data=result['audio_base64'],
             filename=output_path,
             is_base64=True
         )
-        
+
         if save_result['success']:
             return {
                 'success': True,
@@ -318,37 +512,27 @@ class TangoFluxClient:
             }
         else:
             return save_result
-    
-    def get_models_info(self) -> Dict[str, Any]:
+
+    async def get_models_info(self) -> Dict[str, Any]:
         """
         获取可用模型信息
-        
+
         Returns:
             Dict: 模型信息
         """
-        try:
-            response = self.session.get(
-                f"{self.base_url}/api/v1/audio/models",
-                timeout=10
-            )
-            
-            if response.status_code == 200:
-                return {
-                    'success': True,
-                    'data': response.json()
-                }
-            else:
-                return {
-                    'success': False,
-                    'error': f"HTTP {response.status_code}"
-                }
-                
-        except Exception as e:
-            logger.error(f"Failed to get models info: {e}")
-            return {
-                'success': False,
-                'error': str(e)
-            }
+        return await self._get_json("/api/v1/audio/models")
+
+
+# 全局共享实例
+_tangoflux_client: Optional[TangoFluxClient] = None
+
+
+def get_tangoflux_client() -> TangoFluxClient:
+    """获取共享连接池的TangoFlux客户端"""
+    global _tangoflux_client
+    if _tangoflux_client is None:
+        _tangoflux_client = TangoFluxClient()
+    return _tangoflux_client
 
 # 预定义的环境音提示词模板
 ENVIRONMENT_SOUND_TEMPLATES = {
@@ -24,6 +24,7 @@ import uuid
 from app.database import get_db
 from app.models.auth import User, UserSession, LoginLog, Role, Permission, UserStatus
 from app.config import settings
+from app.core.permission_cache import AuthenticatedUser, get_permission_cache
 
 # 密码加密上下文 - 添加兼容性配置
 pwd_context = CryptContext(
@@ -166,10 +167,14 @@ auth_manager = AuthManager()
 
 
 async def get_current_user(
+    request: Request,
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: Session = Depends(get_db)
-) -> User:
-    """获取当前用户"""
+) -> AuthenticatedUser:
+    """
+    获取当前用户
+    返回用户权限快照：缓存命中时不访问数据库；同一请求内按令牌记忆解析结果
+    """
     
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -177,6 +182,11 @@ async def get_current_user(
         headers={"WWW-Authenticate": "Bearer"},
     )
     
+    # 请求级记忆：同一请求内多次解析只做一次
+    memo = getattr(request.state, 'auth_user', None)
+    if memo is not None and memo[0] == credentials.credentials:
+        return memo[1]
+    
     # 验证令牌
     payload = auth_manager.verify_token(credentials.credentials)
     if payload is None:
@@ -200,8 +210,8 @@ async def get_current_user(
     #     if not session or not session.is_valid:
     #         raise credentials_exception
     
-    # 获取用户
-    user = db.query(User).filter(User.id == int(user_id)).first()
+    # 获取用户（权限快照缓存）
+    user = get_permission_cache().resolve(db, int(user_id))
     if user is None:
         raise credentials_exception
     
@@ -212,6 +222,7 @@ async def get_current_user(
             detail="用户账号已被禁用"
         )
     
+    request.state.auth_user = (credentials.credentials, user)
     return user
 
 
@@ -225,7 +236,7 @@ def require_permissions(*permissions: str):
             if not current_user:
                 # 如果没有在kwargs中，尝试从args中获取
                 for arg in args:
-                    if isinstance(arg, User):
+                    if isinstance(arg, (User, AuthenticatedUser)):
                         current_user = arg
                         break
             
@@ -256,7 +267,7 @@ def require_roles(*roles: str):
             current_user = kwargs.get('current_user')
             if not current_user:
                 for arg in args:
-                    if isinstance(arg, User):
+                    if isinstance(arg, (User, AuthenticatedUser)):
                         current_user = arg
                         break
             
@@ -280,14 +291,14 @@ def require_roles(*roles: str):
 
 
 # 常用权限检查依赖
-async def get_current_active_user(current_user: User = Depends(get_current_user)) -> User:
+async def get_current_active_user(current_user: AuthenticatedUser = Depends(get_current_user)) -> AuthenticatedUser:
     """获取当前活跃用户"""
     if current_user.status != "active":
         raise HTTPException(status_code=400, detail="用户账号未激活")
     return current_user
 
 
-async def get_current_admin_user(current_user: User = Depends(get_current_user)) -> User:
+async def get_current_admin_user(current_user: AuthenticatedUser = Depends(get_current_user)) -> AuthenticatedUser:
     """获取当前管理员用户"""
     if not current_user.has_role("admin"):
         raise HTTPException(
@@ -297,7 +308,7 @@ async def get_current_admin_user(current_user: User = Depends(get_current_user))
     return current_user
 
 
-def require_permission(user: User, permission: str):
+def require_permission(user: AuthenticatedUser, permission: str):
     """检查用户权限"""
     if user.is_superuser:
         return  # 超级管理员拥有所有权限
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+用户身份与权限快照缓存
+认证请求不再每次查询 User 行并遍历 角色→权限：
+按用户缓存一份不可变快照（状态、角色、权限代码），TTL 到期或
+用户/角色/权限变更时失效；命中时授权检查不访问数据库
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, Optional, Tuple
+
+from sqlalchemy.orm import Session, selectinload
+
+from app.models.auth import User, Role
+
+PERMISSION_CACHE_TTL = float(os.getenv("PERMISSION_CACHE_TTL", "60"))
+PERMISSION_CACHE_MAX_USERS = int(os.getenv("PERMISSION_CACHE_MAX_USERS", "10000"))
+
+
+@dataclass(frozen=True)
+class AuthenticatedUser:
+    """
+    已认证用户的只读快照
+    提供与 User 相同的常用属性与 has_permission/has_role，供依赖注入的 current_user 使用
+    """
+    id: int
+    username: str
+    email: str
+    full_name: Optional[str]
+    status: str
+    is_superuser: bool
+    is_verified: bool
+    role_ids: FrozenSet[int]
+    role_names: FrozenSet[str]
+    permission_codes: FrozenSet[str]
+
+    @classmethod
+    def from_user(cls, user: User) -> "AuthenticatedUser":
+        status = user.status.value if hasattr(user.status, 'value') else user.status
+        return cls(
+            id=user.id,
+            username=user.username,
+            email=user.email,
+            full_name=user.full_name,
+            status=status,
+            is_superuser=bool(user.is_superuser),
+            is_verified=bool(user.is_verified),
+            role_ids=frozenset(role.id for role in user.roles),
+            role_names=frozenset(role.name for role in user.roles),
+            permission_codes=frozenset(p.code for role in user.roles for p in role.permissions)
+        )
+
+    @property
+    def permissions(self):
+        """用户所有权限代码（与 User.permissions 一致）"""
+        return list(self.permission_codes)
+
+    def has_permission(self, permission_code: str) -> bool:
+        return permission_code in self.permission_codes
+
+    def has_role(self, role_name: str) -> bool:
+        return role_name in self.role_names
+
+
+class PermissionCache:
+    """按用户ID缓存权限快照（LRU + TTL，线程安全）"""
+
+    def __init__(self, ttl: float = PERMISSION_CACHE_TTL, max_users: int = PERMISSION_CACHE_MAX_USERS):
+        self.ttl = ttl
+        self.max_users = max_users
+        self._entries: "OrderedDict[int, Tuple[float, AuthenticatedUser]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # 每次失效递增；加载期间发生过失效的结果不写入缓存，避免把旧数据放回去
+        self._generation = 0
+        self.stats: Dict[str, int] = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+    def get(self, user_id: int) -> Optional[AuthenticatedUser]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return entry[1]
+
+    def resolve(self, db: Session, user_id: int) -> Optional[AuthenticatedUser]:
+        """命中则直接返回快照，否则一次查询载入用户、角色与权限"""
+        snapshot = self.get(user_id)
+        if snapshot is not None:
+            self.stats['hits'] += 1
+            return snapshot
+        self.stats['misses'] += 1
+
+        with self._lock:
+            generation = self._generation
+        user = db.query(User).options(
+            selectinload(User.roles).selectinload(Role.permissions)
+        ).filter(User.id == user_id).first()
+        if user is None:
+            return None
+        snapshot = AuthenticatedUser.from_user(user)
+
+        with self._lock:
+            if generation == self._generation and self.ttl > 0:
+                self._entries[user_id] = (time.monotonic() + self.ttl, snapshot)
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.max_users:
+                    self._entries.popitem(last=False)
+        return snapshot
+
+    def invalidate_user(self, user_id: int):
+        """用户资料、状态或角色变更"""
+        with self._lock:
+            self._generation += 1
+            self._entries.pop(user_id, None)
+            self.stats['invalidations'] += 1
+
+    def invalidate_role(self, role_id: int):
+        """角色变更或其权限变更：失效拥有该角色的用户"""
+        with self._lock:
+            self._generation += 1
+            for user_id in [uid for uid, (_, s) in self._entries.items() if role_id in s.role_ids]:
+                del self._entries[user_id]
+            self.stats['invalidations'] += 1
+
+    def invalidate_all(self):
+        """权限定义变更等影响范围不明确时"""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self.stats['invalidations'] += 1
+
+
+# 全局实例
+permission_cache = PermissionCache()
+
+
+def get_permission_cache() -> PermissionCache:
+    """获取权限快照缓存实例"""
+    return permission_cache
@@ -0,0 +1,285 @@
+"""
+条件 GET 中间件
+前端轮询的目录/状态端点大多数时候返回相同数据：
+- 按端点依赖的表计算校验值（行数 + updated_at 最大值，附加本进程的表版本计数），
+  生成弱 ETag；请求带 If-None-Match 且匹配时直接返回 304，不执行端点查询
+- 未携带认证信息的相同请求共享一个短时响应缓存：本进程未提交相关表的写入、
+  且未超过 RESPONSE_CACHE_TTL 时连校验查询也省去
+本进程内的 ORM 提交会立即使相关缓存失效；其他进程的写入最多延迟 RESPONSE_CACHE_TTL 秒可见
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from fastapi import Request, Response
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from ..models import (
+    Book, BookChapter, BackupStats, BackupTask, Character, EnvironmentSound, EnvironmentSoundCategory,
+    EnvironmentSoundPreset, EnvironmentSoundTag, NovelProject, RestoreTask, VoiceProfile
+)
+from ..models.base import Base
+
+logger = logging.getLogger(__name__)
+
+CONDITIONAL_GET_ENABLED = os.getenv("CONDITIONAL_GET_ENABLED", "true").lower() == "true"
+# 共享响应缓存的有效期（秒），同时是其他进程写入的最大可见延迟，0 表示不缓存
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "5"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "256"))
+# 超过该大小（字节）的响应只做 ETag 校验，不缓存响应体
+RESPONSE_CACHE_MAX_BODY = int(os.getenv("RESPONSE_CACHE_MAX_BODY", str(1024 * 1024)))
+
+
+# ==================== 表版本计数 ====================
+
+class TableVersions:
+    """本进程内各表的提交版本号：ORM 提交（含批量 update/delete）涉及的表版本 +1"""
+
+    def __init__(self):
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, tables: Iterable[str]) -> Tuple[int, ...]:
+        return tuple(self._versions.get(table, 0) for table in tables)
+
+    def bump(self, tables: Iterable[str]):
+        with self._lock:
+            for table in tables:
+                self._versions[table] = self._versions.get(table, 0) + 1
+
+
+table_versions = TableVersions()
+
+_CHANGED_TABLES_KEY = "conditional_get_changed_tables"
+
+
+def _mark_changed(session: Session, tables: Iterable[str]):
+    session.info.setdefault(_CHANGED_TABLES_KEY, set()).update(tables)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_flushed_tables(session, flush_context):
+    changed = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        mapper = getattr(obj, "__mapper__", None)
+        if mapper is not None:
+            changed.update(table.name for table in mapper.tables)
+    _mark_changed(session, changed)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _collect_bulk_tables(orm_execute_state):
+    if orm_execute_state.is_select or orm_execute_state.bind_mapper is None:
+        return
+    _mark_changed(orm_execute_state.session, (orm_execute_state.bind_mapper.local_table.name,))
+
+
+@event.listens_for(Session, "after_commit")
+def _bump_committed_tables(session):
+    changed = session.info.pop(_CHANGED_TABLES_KEY, None)
+    if changed:
+        table_versions.bump(changed)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changed_tables(session):
+    session.info.pop(_CHANGED_TABLES_KEY, None)
+
+
+def table_fingerprint(db: Session, tables: Sequence[str]) -> Tuple:
+    """各表的 (行数, updated_at 最大值)；没有 updated_at 的表用 id 最大值。行数用于发现删除"""
+    columns = []
+    for name in tables:
+        table = Base.metadata.tables[name]
+        marker = table.c.updated_at if "updated_at" in table.c else table.c.id
+        columns.append(select(func.count()).select_from(table).scalar_subquery())
+        columns.append(select(func.max(marker)).scalar_subquery())
+    return tuple(db.execute(select(*columns)).one())
+
+
+# ==================== 端点规则 ====================
+
+class ConditionalRule:
+    """
+    端点规则
+
+    Args:
+        pattern: 路径正则（完整匹配）
+        tables: 端点响应依赖的表
+        time_bucket: 响应随时间变化的端点（如"今日新增"、近 N 天统计）按该秒数分桶，0 表示不分桶
+    """
+
+    def __init__(self, pattern: str, tables: Sequence[str], time_bucket: int = 0):
+        self.pattern = re.compile(pattern)
+        self.tables = tuple(tables)
+        self.time_bucket = time_bucket
+
+
+DEFAULT_RULES: List[ConditionalRule] = [
+    ConditionalRule(r"/api/v1/environment-sounds/?",
+                    [EnvironmentSound.__tablename__, EnvironmentSoundCategory.__tablename__]),
+    ConditionalRule(r"/api/v1/environment-sounds/stats", [EnvironmentSound.__tablename__], time_bucket=60),
+    ConditionalRule(r"/api/v1/environment-sounds/categories", [EnvironmentSoundCategory.__tablename__]),
+    ConditionalRule(r"/api/v1/environment-sounds/tags", [EnvironmentSoundTag.__tablename__]),
+    ConditionalRule(r"/api/v1/environment-sounds/presets", [EnvironmentSoundPreset.__tablename__]),
+    ConditionalRule(r"/api/v1/characters", [Character.__tablename__, Book.__tablename__]),
+    ConditionalRule(r"/api/v1/characters/statistics", [VoiceProfile.__tablename__]),
+    ConditionalRule(r"/api/v1/chapters", [BookChapter.__tablename__, Book.__tablename__]),
+    ConditionalRule(r"/api/v1/backup/stats",
+                    [BackupTask.__tablename__, RestoreTask.__tablename__, BackupStats.__tablename__],
+                    time_bucket=60),
+    ConditionalRule(r"/api/v1/novel-reader/projects/\d+", [NovelProject.__tablename__]),
+]
+
+
+# ==================== ETag ====================
+
+def parse_if_none_match(header: Optional[str]) -> List[str]:
+    """If-None-Match 中的实体标签（去掉弱标记，按弱比较）"""
+    if not header:
+        return []
+    tags = []
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag:
+            tags.append(tag)
+    return tags
+
+
+def etag_matches(etag: str, header: Optional[str]) -> bool:
+    tags = parse_if_none_match(header)
+    return "*" in tags or etag[2:] in tags
+
+
+def make_etag(request_key: str, fingerprint: Tuple, bucket: int) -> str:
+    digest = hashlib.sha1(f"{request_key}|{fingerprint!r}|{bucket}".encode()).hexdigest()[:24]
+    return f'W/"{digest}"'
+
+
+class _CacheEntry:
+    __slots__ = ("versions", "etag", "created", "body", "headers", "media_type")
+
+    def __init__(self, versions, etag, created, body=None, headers=None, media_type=None):
+        self.versions = versions
+        self.etag = etag
+        self.created = created
+        self.body = body
+        self.headers = headers
+        self.media_type = media_type
+
+
+class ConditionalGetMiddleware(BaseHTTPMiddleware):
+    """为规则内的 GET 端点提供 ETag / 304 与短时响应缓存"""
+
+    def __init__(self, app, rules: Optional[List[ConditionalRule]] = None,
+                 session_factory: Optional[Callable[[], Session]] = None,
+                 cache_ttl: float = RESPONSE_CACHE_TTL, enabled: bool = CONDITIONAL_GET_ENABLED):
+        super().__init__(app)
+        self.rules = DEFAULT_RULES if rules is None else rules
+        self.session_factory = session_factory
+        self.cache_ttl = cache_ttl
+        self.enabled = enabled
+        self._cache: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _match(self, path: str) -> Optional[ConditionalRule]:
+        for rule in self.rules:
+            if rule.pattern.fullmatch(path):
+                return rule
+        return None
+
+    def _fingerprint(self, tables: Sequence[str]) -> Tuple:
+        if self.session_factory is None:
+            from ..database import SessionLocal
+            self.session_factory = SessionLocal
+        db = self.session_factory()
+        try:
+            return table_fingerprint(db, tables)
+        finally:
+            db.close()
+
+    def _cached(self, key: str, versions: Tuple, now: float) -> Optional[_CacheEntry]:
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                return None
+            if entry.versions != versions or now - entry.created >= self.cache_ttl:
+                del self._cache[key]
+                return None
+            self._cache.move_to_end(key)
+            return entry
+
+    def _store(self, key: str, entry: _CacheEntry):
+        with self._lock:
+            self._cache[key] = entry
+            self._cache.move_to_end(key)
+            while len(self._cache) > RESPONSE_CACHE_MAX_ENTRIES:
+                self._cache.popitem(last=False)
+
+    @staticmethod
+    def _not_modified(etag: str) -> Response:
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+    async def dispatch(self, request: Request, call_next):
+        rule = self._match(request.url.path) if (self.enabled and request.method == "GET") else None
+        if rule is None:
+            return await call_next(request)
+
+        # 携带认证信息的请求不共享响应体；ETag 按凭据区分
+        credentials = request.headers.get("authorization") or request.headers.get("cookie") or ""
+        shared = not credentials
+        query = "&".join(sorted(str(request.query_params).split("&")))
+        request_key = f"{request.url.path}?{query}"
+        if credentials:
+            request_key += "#" + hashlib.sha1(credentials.encode()).hexdigest()
+        if_none_match = request.headers.get("if-none-match")
+
+        now = time.time()
+        bucket = int(now // rule.time_bucket) if rule.time_bucket else 0
+        versions = table_versions.get(rule.tables) + (bucket,)
+
+        entry = self._cached(request_key, versions, now) if self.cache_ttl > 0 else None
+        if entry is None:
+            try:
+                fingerprint = await asyncio.to_thread(self._fingerprint, rule.tables)
+            except Exception as e:
+                logger.warning(f"条件GET校验值计算失败，按普通请求处理: {e}")
+                return await call_next(request)
+            entry = _CacheEntry(versions, make_etag(request_key, fingerprint, bucket), now)
+
+        if etag_matches(entry.etag, if_none_match):
+            if self.cache_ttl > 0:
+                self._store(request_key, entry)
+            return self._not_modified(entry.etag)
+
+        if entry.body is not None:
+            return Response(content=entry.body, status_code=200, headers=entry.headers,
+                            media_type=entry.media_type)
+
+        response = await call_next(request)
+        if response.status_code != 200:
+            return response
+
+        body = b"".join([chunk async for chunk in response.body_iterator])
+        headers = {
+            name: value for name, value in response.headers.items()
+            if name.lower() not in ("content-length", "etag", "cache-control")
+        }
+        headers["ETag"] = entry.etag
+        headers["Cache-Control"] = "no-cache" if shared else "private, no-cache"
+        if self.cache_ttl > 0:
+            if shared and len(body) <= RESPONSE_CACHE_MAX_BODY and "set-cookie" not in response.headers:
+                entry.body, entry.headers, entry.media_type = body, headers, response.media_type
+            self._store(request_key, entry)
+        return Response(content=body, status_code=200, headers=headers, media_type=response.media_type)
@@ -8,6 +8,7 @@ from .book import Book
 from .book_chapter import BookChapter  
 from .audio import AudioFile
 from .analysis_result import AnalysisResult
+from .synthesis_plan_segment import SynthesisPlanSegment
 from .analysis_session import AnalysisSession
 from .novel_project import NovelProject
 from .voice import VoiceProfile
@@ -16,7 +17,8 @@ from .character import Character
 from .system import SystemLog, UsageStats, UserPreset
 from .environment_sound import (
     EnvironmentSound, EnvironmentSoundCategory, EnvironmentSoundTag,
-    EnvironmentSoundFavorite, EnvironmentSoundUsageLog, EnvironmentSoundPreset
+    EnvironmentSoundFavorite, EnvironmentSoundUsageLog, EnvironmentSoundPreset,
+    EnvironmentSoundKeyword, EnvironmentSoundCacheEntry
 )
 from .backup import (
     BackupTask, BackupConfig, RestoreTask, BackupSchedule, BackupStats,
@@ -28,6 +30,8 @@ from .auth import (
 )
 
 from .synthesis_task import SynthesisTask
+from .synthesis_job import SynthesisJob, JobStatus, JobType
+from .project_progress import ProjectProgress
 from .text_segment import TextSegment
 from .environment_generation import (
     EnvironmentGenerationSession, EnvironmentTrackConfig, 
@@ -53,6 +57,7 @@ __all__ = [
     'Character',
     'AnalysisSession',
     'AnalysisResult',
+    'SynthesisPlanSegment',
     'SystemLog',
     'UsageStats',
     'UserPreset',
@@ -62,6 +67,8 @@ __all__ = [
     'EnvironmentSoundFavorite',
     'EnvironmentSoundUsageLog',
     'EnvironmentSoundPreset',
+    'EnvironmentSoundKeyword',
+    'EnvironmentSoundCacheEntry',
     'BackupTask',
     'BackupConfig',
     'RestoreTask',
@@ -82,6 +89,10 @@ __all__ = [
 
     # 其他模型
     'SynthesisTask',
+    'SynthesisJob',
+    'ProjectProgress',
+    'JobStatus',
+    'JobType',
     'TextSegment',
     'EnvironmentGenerationSession',
     'EnvironmentTrackConfig',
@@ -3,12 +3,17 @@
 存储LLM分析的结果和用户修改
 """
 
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Index, JSON, Boolean
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Index, JSON, Boolean, event, inspect
+from sqlalchemy.orm import object_session, relationship
+from sqlalchemy.ext.hybrid import hybrid_property
+import copy
 from datetime import datetime
 from typing import Dict, Any, Optional, List
 
 from .base import Base
+from .synthesis_plan_segment import (
+    SynthesisPlanSegment, split_synthesis_plan, is_split_header, assemble_synthesis_plan
+)
 
 
 class AnalysisResult(Base):
@@ -31,8 +36,9 @@ class AnalysisResult(Base):
     emotion_analysis = Column(JSON)  # 情感分析结果
     voice_recommendations = Column(JSON)  # 声音推荐
     
-    # 合成计划
-    synthesis_plan = Column(JSON)  # 合成计划配置
+    # 合成计划：列中只保存头部（角色映射等），段落列表拆分到 synthesis_plan_segments 表，
+    # 通过 synthesis_plan 属性以原 JSON 形状读写
+    synthesis_plan_header = Column('synthesis_plan', JSON)
     
     # 用户修改
     user_modifications = Column(JSON)  # 用户手动修改记录
@@ -60,6 +66,11 @@ class AnalysisResult(Base):
     session = relationship("AnalysisSession", back_populates="analysis_results")
     chapter = relationship("BookChapter", back_populates="analysis_results")
     synthesis_tasks = relationship("SynthesisTask", back_populates="analysis_result")
+    plan_segments = relationship(
+        "SynthesisPlanSegment", back_populates="analysis_result",
+        order_by="SynthesisPlanSegment.segment_index",
+        cascade="all, delete-orphan", passive_deletes=True
+    )
     
     # 索引
     __table_args__ = (
@@ -70,6 +81,74 @@ class AnalysisResult(Base):
         Index('idx_analysis_results_session_chapter', 'session_id', 'chapter_id'),
     )
     
+    # 组装好的合成计划视图；头部、段落行变化或实例过期/刷新时清空
+    _synthesis_plan_view = None
+
+    def _get_synthesis_plan(self) -> Optional[Dict[str, Any]]:
+        """
+        合成计划（兼容视图）：头部 + 段落行。
+        组装一次后缓存在实例上，重复读取不再逐段复制；视图与行数据互不共享对象，
+        原地修改后需重新赋值 synthesis_plan 才会写入
+        """
+        header = self.synthesis_plan_header
+        if not is_split_header(header):
+            return header  # 未拆分的旧数据或非标准形状
+        if self._synthesis_plan_view is None:
+            self._synthesis_plan_view = assemble_synthesis_plan(header, [row.data for row in self.plan_segments])
+        return self._synthesis_plan_view
+
+    def invalidate_synthesis_plan(self):
+        """丢弃缓存的合成计划视图，下次读取时重新组装"""
+        self._synthesis_plan_view = None
+
+    def _set_synthesis_plan(self, plan: Optional[Dict[str, Any]]):
+        """
+        写入合成计划：与现有段落行比对，只更新变化的行、追加新增的行、删除多余的行。
+        段落 segment_id 唯一时按 segment_id 匹配（保留合成状态），否则按位置匹配
+        """
+        self.invalidate_synthesis_plan()
+        header, segments = split_synthesis_plan(plan)
+        if header != self.synthesis_plan_header:
+            self.synthesis_plan_header = header
+        if segments is None:
+            if self.plan_segments:
+                self.plan_segments = []
+            return
+
+        existing = sorted(self.plan_segments, key=lambda row: row.segment_index)
+        new_ids = [s.get('segment_id') for s in segments]
+        old_ids = [row.segment_id for row in existing]
+        by_id = (
+            None not in new_ids and len(set(new_ids)) == len(new_ids)
+            and None not in old_ids and len(set(old_ids)) == len(old_ids)
+        )
+        lookup = {row.segment_id: row for row in existing} if by_id else None
+
+        rows = []
+        for index, segment in enumerate(segments):
+            if by_id:
+                row = lookup.get(segment.get('segment_id'))
+            else:
+                row = existing[index] if index < len(existing) else None
+            if row is None:
+                row = SynthesisPlanSegment(segment_index=index, chapter_id=self.chapter_id)
+                row.set_data(copy.deepcopy(segment))
+            else:
+                if row.segment_index != index:
+                    row.segment_index = index
+                if row.data != segment:
+                    row.set_data(copy.deepcopy(segment))
+            rows.append(row)
+
+        if rows != list(self.plan_segments):
+            self.plan_segments = rows
+
+    def _synthesis_plan_expression(cls):
+        """查询中的 synthesis_plan 即头部列（如 AnalysisResult.synthesis_plan.isnot(None)）"""
+        return cls.synthesis_plan_header
+
+    synthesis_plan = hybrid_property(_get_synthesis_plan, _set_synthesis_plan, expr=_synthesis_plan_expression)
+
     def __repr__(self):
         return f"<AnalysisResult(id={self.id}, session_id={self.session_id}, chapter_id={self.chapter_id}, status='{self.status}')>"
     
@@ -149,8 +228,8 @@ class AnalysisResult(Base):
             self.final_config = self.synthesis_plan
             return
         
-        # 从原始合成计划开始
-        final_config = self.synthesis_plan.copy() if self.synthesis_plan else {}
+        # 从原始合成计划开始（深拷贝：下面会原地修改嵌套字典，不能改到缓存的视图）
+        final_config = copy.deepcopy(self.synthesis_plan) if self.synthesis_plan else {}
         
         # 应用每个修改
         for mod in self.user_modifications:
@@ -248,4 +327,41 @@ class AnalysisResult(Base):
                 score += min(25, recommendation_count * 5)  # 最多25分
         
         self.confidence_score = min(100, score)
-        return self.confidence_score 
\ No newline at end of file
+        return self.confidence_score
+
+
+# ==================== 合成计划视图失效 ====================
+
+def _owner_result(segment: SynthesisPlanSegment) -> Optional[AnalysisResult]:
+    """段落行所属、已在会话中的分析结果（不触发懒加载）"""
+    owner = segment.__dict__.get('analysis_result')
+    if owner is not None:
+        return owner
+    session = object_session(segment)
+    result_id = segment.__dict__.get('analysis_result_id')
+    if session is None or result_id is None:
+        return None
+    return session.identity_map.get(inspect(AnalysisResult).identity_key_from_primary_key([result_id]))
+
+
+@event.listens_for(AnalysisResult.synthesis_plan_header, 'set')
+@event.listens_for(AnalysisResult.plan_segments, 'append')
+@event.listens_for(AnalysisResult.plan_segments, 'remove')
+def _plan_changed(target, *args):
+    target.invalidate_synthesis_plan()
+
+
+@event.listens_for(AnalysisResult, 'expire')
+@event.listens_for(AnalysisResult, 'refresh')
+def _result_reloaded(target, *args):
+    if target is not None:  # 提交时过期的实例可能已被回收
+        target.invalidate_synthesis_plan()
+
+
+@event.listens_for(SynthesisPlanSegment.data, 'set')
+@event.listens_for(SynthesisPlanSegment.segment_index, 'set')
+@event.listens_for(SynthesisPlanSegment, 'refresh')
+def _segment_changed(target, *args):
+    owner = _owner_result(target)
+    if owner is not None:
+        owner.invalidate_synthesis_plan()
@@ -2,7 +2,7 @@
 环境音模型
 """
 
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, JSON, Float
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, JSON, Float, ForeignKey, Index
 from sqlalchemy.orm import relationship
 import json
 from datetime import datetime
@@ -208,4 +208,47 @@ class EnvironmentSoundPreset(Base):
     
     # 时间戳
     created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
\ No newline at end of file
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class EnvironmentSoundKeyword(Base):
+    """环境音关键词索引：完整标签，以及名称、提示词的 1~2 字符片段（支持子串查找），替代逐条扫描匹配"""
+    __tablename__ = "environment_sound_keywords"
+    
+    id = Column(Integer, primary_key=True)
+    keyword = Column(String(100), nullable=False, comment="关键词")
+    environment_sound_id = Column(
+        Integer, ForeignKey('environment_sounds.id', ondelete='CASCADE'), nullable=False, comment="环境音ID"
+    )
+    
+    __table_args__ = (
+        Index('idx_environment_sound_keywords_lookup', 'keyword', 'environment_sound_id'),
+        Index('idx_environment_sound_keywords_sound', 'environment_sound_id'),
+    )
+
+
+class EnvironmentSoundCacheEntry(Base):
+    """TangoFlux生成缓存：按 规范化提示词+时长档位+步数+引导强度 寻址"""
+    __tablename__ = "environment_sound_cache"
+    
+    id = Column(Integer, primary_key=True)
+    cache_key = Column(String(64), nullable=False, unique=True, comment="缓存键(SHA-256)")
+    normalized_prompt = Column(Text, nullable=False, comment="规范化提示词")
+    duration_bucket = Column(Float, nullable=False, comment="时长档位(秒)")
+    steps = Column(Integer, comment="推理步数")
+    guidance_scale = Column(Float, comment="引导强度")
+    
+    content_hash = Column(String(64), nullable=False, comment="音频内容SHA-256")
+    file_path = Column(String(500), nullable=False, comment="缓存文件路径")
+    file_size = Column(Integer, comment="文件大小(字节)")
+    environment_sound_id = Column(
+        Integer, ForeignKey('environment_sounds.id', ondelete='SET NULL'), comment="入库的环境音ID"
+    )
+    
+    hit_count = Column(Integer, default=0, comment="命中次数")
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_used_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        Index('idx_environment_sound_cache_content', 'content_hash'),
+    )
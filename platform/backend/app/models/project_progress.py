@@ -0,0 +1,83 @@
+"""
+项目进度投影模型
+按 (项目, 章节) 维护段落总数、已完成、失败与进行中数量；
+音频文件、合成计划段落与合成任务变更时在同一事务内增量更新，
+项目列表读取进度只需一次按项目ID的索引查询
+"""
+
+from datetime import datetime
+from typing import Any, Dict
+
+from sqlalchemy import Column, Integer, DateTime, ForeignKey, Index, event
+from sqlalchemy.orm import Session
+
+from .base import Base
+from .analysis_result import AnalysisResult
+from .audio import AudioFile
+from .novel_project import NovelProject
+from .synthesis_job import SynthesisJob
+from .synthesis_plan_segment import SynthesisPlanSegment
+
+# 未关联章节的段落音频计入的章节ID
+UNASSIGNED_CHAPTER = 0
+
+
+class ProjectProgress(Base):
+    """项目章节进度"""
+
+    __tablename__ = 'project_progress'
+
+    id = Column(Integer, primary_key=True, index=True)
+    project_id = Column(Integer, ForeignKey('novel_projects.id', ondelete='CASCADE'), nullable=False)
+    chapter_id = Column(Integer, nullable=False, default=UNASSIGNED_CHAPTER)
+
+    total_segments = Column(Integer, nullable=False, default=0)       # 合成计划中的段落数
+    completed_segments = Column(Integer, nullable=False, default=0)   # 已生成的段落音频数
+    failed_segments = Column(Integer, nullable=False, default=0)      # 合成失败的段落数
+    in_flight_segments = Column(Integer, nullable=False, default=0)   # 排队或执行中的段落任务数
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        Index('uq_project_progress_project_chapter', 'project_id', 'chapter_id', unique=True),
+    )
+
+    def __repr__(self):
+        return (f"<ProjectProgress(project_id={self.project_id}, chapter_id={self.chapter_id}, "
+                f"{self.completed_segments}/{self.total_segments})>")
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为字典格式"""
+        return {
+            'project_id': self.project_id,
+            'chapter_id': self.chapter_id,
+            'total_segments': self.total_segments,
+            'completed_segments': self.completed_segments,
+            'failed_segments': self.failed_segments,
+            'in_flight_segments': self.in_flight_segments,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+        }
+
+
+# 进度计数依赖的属性：赋值时先加载旧值，flush 时才知道计数应从哪一行扣减
+_TRACKED_ATTRIBUTES = (
+    AudioFile.audio_type, AudioFile.project_id, AudioFile.chapter_id,
+    SynthesisPlanSegment.status, SynthesisPlanSegment.project_id, SynthesisPlanSegment.chapter_id,
+    SynthesisJob.job_type, SynthesisJob.status, SynthesisJob.project_id, SynthesisJob.chapter_id,
+    AnalysisResult.status, AnalysisResult.chapter_id,
+    NovelProject.book_id,
+)
+
+
+def _keep_old_value(target, value, oldvalue, initiator):
+    pass
+
+
+for _attribute in _TRACKED_ATTRIBUTES:
+    event.listen(_attribute, 'set', _keep_old_value, active_history=True)
+
+
+@event.listens_for(Session, 'after_flush')
+def _apply_progress_changes(session, flush_context):
+    """把本次 flush 中相关行的变化增量写入进度投影（同一事务）"""
+    from ..services.project_progress_service import apply_flush_changes
+    apply_flush_changes(session)
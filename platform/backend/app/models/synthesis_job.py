@@ -0,0 +1,100 @@
+"""
+持久化任务队列模型
+基于PostgreSQL的 SELECT ... FOR UPDATE SKIP LOCKED 实现多Worker任务分发
+"""
+
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Index, JSON
+from datetime import datetime
+from typing import Dict, Any
+
+from .base import Base
+
+
+class JobStatus:
+    """任务状态常量"""
+    WAITING = 'waiting'        # 章节任务：等待子段落任务全部结束
+    QUEUED = 'queued'          # 可被Worker领取
+    LEASED = 'leased'          # 已被Worker租约锁定，执行中
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'          # 重试次数耗尽
+    PAUSED = 'paused'
+    CANCELLED = 'cancelled'
+
+    ACTIVE = (WAITING, QUEUED, LEASED)
+    TERMINAL = (SUCCEEDED, FAILED, CANCELLED)
+
+
+class JobType:
+    """任务类型常量"""
+    SEGMENT_SYNTHESIS = 'segment_synthesis'      # 单段落TTS合成
+    CHAPTER_FINALIZE = 'chapter_finalize'        # 章节音频合并与状态更新
+    ENVIRONMENT_MIXING = 'environment_mixing'    # 环境音混音
+
+
+class SynthesisJob(Base):
+    """持久化合成任务"""
+
+    __tablename__ = 'synthesis_jobs'
+
+    id = Column(Integer, primary_key=True, index=True)
+    job_type = Column(String(50), nullable=False, comment="任务类型")
+    parent_id = Column(Integer, ForeignKey('synthesis_jobs.id', ondelete='CASCADE'), comment="父任务ID（段落任务指向章节任务）")
+
+    # 业务定位
+    project_id = Column(Integer, ForeignKey('novel_projects.id', ondelete='CASCADE'), comment="项目ID")
+    chapter_id = Column(Integer, comment="章节ID")
+    segment_id = Column(Integer, comment="段落ID")
+    payload = Column(JSON, comment="任务参数")
+    result = Column(JSON, comment="任务结果")
+
+    # 调度状态
+    status = Column(String(20), nullable=False, default=JobStatus.QUEUED, comment="任务状态")
+    priority = Column(Integer, nullable=False, default=0, comment="优先级，越大越先执行")
+    attempts = Column(Integer, nullable=False, default=0, comment="已尝试次数")
+    max_attempts = Column(Integer, nullable=False, default=3, comment="最大尝试次数")
+    available_at = Column(DateTime, nullable=False, default=datetime.utcnow, comment="最早可执行时间（退避重试）")
+
+    # 租约与心跳
+    lease_owner = Column(String(100), comment="持有租约的Worker")
+    lease_expires_at = Column(DateTime, comment="租约过期时间")
+    heartbeat_at = Column(DateTime, comment="最近心跳时间")
+
+    last_error = Column(Text, comment="最近一次错误")
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime)
+    completed_at = Column(DateTime)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        Index('idx_synthesis_jobs_dispatch', 'status', 'available_at', 'priority'),
+        Index('idx_synthesis_jobs_lease', 'status', 'lease_expires_at'),
+        Index('idx_synthesis_jobs_project_chapter', 'project_id', 'chapter_id'),
+        Index('idx_synthesis_jobs_parent_id', 'parent_id'),
+    )
+
+    def __repr__(self):
+        return f"<SynthesisJob(id={self.id}, type='{self.job_type}', status='{self.status}', attempts={self.attempts})>"
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为字典格式"""
+        return {
+            'id': self.id,
+            'job_type': self.job_type,
+            'parent_id': self.parent_id,
+            'project_id': self.project_id,
+            'chapter_id': self.chapter_id,
+            'segment_id': self.segment_id,
+            'status': self.status,
+            'priority': self.priority,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'available_at': self.available_at.isoformat() if self.available_at else None,
+            'lease_owner': self.lease_owner,
+            'lease_expires_at': self.lease_expires_at.isoformat() if self.lease_expires_at else None,
+            'heartbeat_at': self.heartbeat_at.isoformat() if self.heartbeat_at else None,
+            'last_error': self.last_error,
+            'result': self.result,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None,
+        }
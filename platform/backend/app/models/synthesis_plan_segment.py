@@ -0,0 +1,102 @@
+"""
+合成计划段落模型
+AnalysisResult.synthesis_plan 中的段落列表按行存储，按章节/项目/状态建索引；
+段落编辑、状态查询与重试筛选只读写受影响的行，不再整体重写 JSON
+"""
+
+import copy
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Index, JSON, event
+from sqlalchemy.orm import relationship
+
+from .base import Base
+
+# 合成计划 JSON 中段落列表所在的键
+SEGMENTS_KEY = 'synthesis_plan'
+# 头部标记：段落已拆分到 synthesis_plan_segments 表
+STORAGE_MARKER = 'segment_storage'
+STORAGE_TABLE = 'table'
+
+
+class SynthesisPlanSegment(Base):
+    """合成计划段落"""
+
+    __tablename__ = 'synthesis_plan_segments'
+
+    id = Column(Integer, primary_key=True, index=True)
+    analysis_result_id = Column(Integer, ForeignKey('analysis_results.id', ondelete='CASCADE'), nullable=False)
+    chapter_id = Column(Integer, nullable=False)  # 冗余自 AnalysisResult.chapter_id，便于按章节查询
+    segment_index = Column(Integer, nullable=False)  # 在计划中的位置
+
+    # 冗余自段落数据，用于索引查询
+    segment_id = Column(Integer)
+    speaker = Column(String(255))
+
+    data = Column(JSON, nullable=False)  # 完整的段落字典
+
+    # 合成状态
+    status = Column(String(20), default='pending', nullable=False)  # pending, completed, failed
+    project_id = Column(Integer, ForeignKey('novel_projects.id', ondelete='SET NULL'))  # 最近一次合成所属项目
+    error_message = Column(Text)
+    synthesized_at = Column(DateTime)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    analysis_result = relationship("AnalysisResult", back_populates="plan_segments")
+
+    __table_args__ = (
+        # 非唯一：段落重排时逐行更新位置不会触发中间态冲突
+        Index('idx_synthesis_plan_segments_position', 'analysis_result_id', 'segment_index'),
+        Index('idx_synthesis_plan_segments_chapter_segment', 'chapter_id', 'segment_id'),
+        Index('idx_synthesis_plan_segments_chapter_status', 'chapter_id', 'status'),
+        Index('idx_synthesis_plan_segments_project_status', 'project_id', 'status'),
+    )
+
+    def __repr__(self):
+        return (f"<SynthesisPlanSegment(id={self.id}, chapter_id={self.chapter_id}, "
+                f"segment_id={self.segment_id}, status='{self.status}')>")
+
+    def set_data(self, data: Dict[str, Any]):
+        """写入段落数据并同步冗余列"""
+        self.data = data
+        segment_id = data.get('segment_id')
+        self.segment_id = segment_id if isinstance(segment_id, int) and not isinstance(segment_id, bool) else None
+        speaker = data.get('speaker')
+        self.speaker = speaker[:255] if isinstance(speaker, str) else None
+
+
+@event.listens_for(SynthesisPlanSegment, 'before_insert')
+def _fill_chapter_id(mapper, connection, target):
+    """新段落的章节ID取自所属分析结果"""
+    if target.chapter_id is None and target.analysis_result is not None:
+        target.chapter_id = target.analysis_result.chapter_id
+
+
+def split_synthesis_plan(plan: Any) -> Tuple[Any, Optional[List[Dict[str, Any]]]]:
+    """
+    把合成计划拆成头部与段落列表
+
+    Returns:
+        (header, segments)；计划不是 {synthesis_plan: [dict, ...]} 形状时 segments 为 None，header 即原值
+    """
+    if not isinstance(plan, dict):
+        return plan, None
+    segments = plan.get(SEGMENTS_KEY)
+    if not isinstance(segments, list) or not all(isinstance(s, dict) for s in segments):
+        return plan, None
+    header = {k: copy.deepcopy(v) for k, v in plan.items() if k not in (SEGMENTS_KEY, STORAGE_MARKER)}
+    header[STORAGE_MARKER] = STORAGE_TABLE
+    return header, segments
+
+
+def is_split_header(header: Any) -> bool:
+    """头部是否带有拆分标记（未迁移的旧数据整体仍在 JSON 列中）"""
+    return isinstance(header, dict) and header.get(STORAGE_MARKER) == STORAGE_TABLE
+
+
+def assemble_synthesis_plan(header: Dict[str, Any], segments: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """由头部与段落数据还原原始 JSON 形状（返回副本，原地修改不会影响行数据）"""
+    plan = {k: copy.deepcopy(v) for k, v in header.items() if k != STORAGE_MARKER}
+    plan[SEGMENTS_KEY] = [copy.deepcopy(s) for s in segments]
+    return plan
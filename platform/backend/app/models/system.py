@@ -79,6 +79,8 @@ class SystemLog(Base):
         Index('idx_log_level_time', 'level', 'created_at'),
         Index('idx_log_module_time', 'module', 'created_at'),
         Index('idx_log_user_time', 'user_id', 'created_at'),
+        # 游标分页 ORDER BY created_at DESC, id DESC
+        Index('idx_log_created_id', 'created_at', 'id'),
     )
     
     def get_details(self):
@@ -23,6 +23,7 @@ from app.database import get_db, engine
 from app.models import SystemLog, UsageStats, VoiceProfile, NovelProject  # TextSegment已废弃
 from app.tts_client import MegaTTS3Client, get_tts_client
 from app.utils import log_system_event, save_upload_file
+from app.services.system_log_service import drop_expired_logs, keyword_condition
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/monitor", tags=["系统监控"])
@@ -420,13 +421,7 @@ async def get_system_logs(
         
         # 搜索过滤
         if search:
-            search_pattern = f"%{search}%"
-            query = query.filter(
-                or_(
-                    SystemLog.message.like(search_pattern),
-                    SystemLog.details_json.like(search_pattern)
-                )
-            )
+            query = query.filter(keyword_condition(search, include_details=True))
         
         # 日期过滤
         if start_date:
@@ -517,18 +512,18 @@ async def cleanup_old_logs(
         # 计算清理时间点
         cutoff_date = datetime.utcnow() - timedelta(days=days)
         
-        # 构建删除查询
-        query = db.query(SystemLog).filter(SystemLog.created_at < cutoff_date)
-        
         if level and level in ['info', 'warning', 'error', 'critical']:
-            query = query.filter(SystemLog.level == level)
-        
-        # 统计要删除的数量
-        delete_count = query.count()
-        
-        # 执行删除
-        query.delete()
-        db.commit()
+            # 按级别清理只能逐行删除
+            query = db.query(SystemLog).filter(
+                SystemLog.created_at < cutoff_date,
+                SystemLog.level == level
+            )
+            delete_count = query.count()
+            query.delete()
+            db.commit()
+        else:
+            # 全部级别：分区表直接删除过期分区
+            delete_count = drop_expired_logs(db, days)["deleted_count"]
         
         # 记录清理日志
         await log_system_event(
@@ -985,16 +980,7 @@ async def perform_maintenance_task(
             
             # 清理旧日志
             if cleanup_old_logs:
-                cutoff_date = datetime.utcnow() - timedelta(days=days_to_keep)
-                deleted_logs = db.query(SystemLog).filter(
-                    SystemLog.created_at < cutoff_date
-                ).count()
-                
-                db.query(SystemLog).filter(
-                    SystemLog.created_at < cutoff_date
-                ).delete()
-                
-                maintenance_results["logs_cleaned"] = deleted_logs
+                maintenance_results["logs_cleaned"] = drop_expired_logs(db, days_to_keep)["deleted_count"]
             
             # 优化数据库
             if optimize_database:
@@ -7,7 +7,7 @@ from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File,
 from fastapi.responses import FileResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import desc, asc, func, or_, and_
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Callable, Awaitable
 import os
 import json
 import time
@@ -882,14 +882,256 @@ async def get_generation_progress(
 
 # 🚀 已删除：update_segments_voice_mapping_no_commit - 旧架构函数，新架构不使用 
 
+async def synthesize_plan_segment(
+    db: Session,
+    tts_client: MegaTTS3Client,
+    project_id: int,
+    segment_data: Dict,
+    segment_index: int,
+    project_output_dir: str
+) -> Optional[Dict]:
+    """
+    合成智能准备结果中的单个段落，并写入AudioFile记录
+    批量合成流程与持久化任务队列的段落任务共用此实现
+    """
+    try:
+        segment_id = segment_data.get('segment_id', segment_index + 1)
+        text = segment_data.get('text', '')
+        speaker = segment_data.get('speaker', '未知')
+        voice_id = segment_data.get('voice_id')
+        character_id = segment_data.get('character_id')
+        parameters = segment_data.get('parameters', {})
+        
+        logger.info(f"[SYNTHESIS_PLAN] 处理段落 {segment_id}: {speaker} - {text[:50]}...")
+        
+        if not text.strip():
+            logger.warning(f"[SYNTHESIS_PLAN] 段落 {segment_id} 文本为空，跳过")
+            return None
+        
+        # 🚀 架构改进：支持两种方式获取音频配置
+        # 方式1（推荐）：通过character_id获取最新配音
+        # 方式2（向后兼容）：通过voice_id获取VoiceProfile
+        character = None
+        voice = None
+        
+        if character_id:
+            # 🎯 新架构：通过character_id获取角色最新配音
+            try:
+                from app.models.character import Character
+                character = db.query(Character).filter(Character.id == character_id).first()
+                if character and character.reference_audio_path:
+                    logger.info(f"[NEW_ARCH] 段落 {segment_id} 使用角色配音：{character.name} (ID: {character.id})")
+                    # 创建兼容的voice对象
+                    class VoiceCompat:
+                        def __init__(self, char):
+                            self.id = char.id
+                            self.name = char.name
+                            self.reference_audio_path = char.reference_audio_path
+                            self.latent_file_path = char.latent_file_path
+                            self.status = char.status
+                        
+                        def validate_files(self):
+                            return {'valid': True, 'missing_files': []}
+                    
+                    voice = VoiceCompat(character)
+                else:
+                    logger.error(f"[NEW_ARCH] 段落 {segment_id} 角色ID {character_id} 不存在或未配置音频，请在角色配音库中配置声音")
+                    return {"error": f"段落 {segment_id} 角色'{speaker}'未配置声音，请在角色配音库中上传音频文件"}
+            except Exception as e:
+                logger.error(f"[NEW_ARCH] 段落 {segment_id} 查找角色失败: {e}")
+                return {"error": f"段落 {segment_id} 角色查找失败: {e}"}
+        
+        elif voice_id:
+            # 🔄 旧架构：通过voice_id获取VoiceProfile（向后兼容）
+            try:
+                voice = db.query(VoiceProfile).filter(VoiceProfile.id == voice_id).first()
+                if voice:
+                    logger.info(f"[OLD_ARCH] 段落 {segment_id} 使用VoiceProfile：{voice.name} (ID: {voice.id})")
+                else:
+                    logger.error(f"[OLD_ARCH] 段落 {segment_id} VoiceProfile不存在: {voice_id}")
+            except Exception as e:
+                logger.error(f"[OLD_ARCH] 段落 {segment_id} 查找VoiceProfile失败: {e}")
+        
+        if not voice:
+            logger.error(f"[SYNTHESIS_PLAN] 段落 {segment_id} 无法获取声音配置 (character_id: {character_id}, voice_id: {voice_id})")
+            return {"error": f"段落 {segment_id} 缺少声音配置"}
+        
+        # 验证声音文件
+        file_validation = voice.validate_files()
+        if not file_validation['valid']:
+            logger.error(f"[SYNTHESIS_PLAN] 段落 {segment_id} 声音文件缺失: {file_validation['missing_files']}")
+            return {"error": f"段落 {segment_id} 声音文件缺失"}
+        
+        # 生成音频文件路径
+        safe_speaker = "".join(c for c in speaker if c.isalnum() or c in (' ', '-', '_')).rstrip()
+        # 🔥 修复：根据实际使用的voice对象ID生成文件名，避免ID混用
+        voice_identifier = voice.id if hasattr(voice, 'id') else 'unknown'
+        
+        # 🚨 重要修复：在文件名中添加章节ID，避免不同章节的段落文件相互覆盖
+        chapter_id = segment_data.get('chapter_id', 'unknown')
+        audio_filename = f"chapter_{chapter_id}_segment_{segment_id:04d}_{safe_speaker}_{voice_identifier}.wav"
+        audio_path = os.path.join(project_output_dir, audio_filename)
+        
+        # 🔥 关键修复：优先使用角色配音库的个性化参数
+        final_parameters = {}
+        
+        # 方式1：从角色配音库获取参数（推荐）
+        if character and hasattr(character, 'voice_parameters') and character.voice_parameters:
+            try:
+                import json
+                char_params = json.loads(character.voice_parameters) if isinstance(character.voice_parameters, str) else character.voice_parameters
+                logger.info(f"[PARAMS] 使用角色配音库参数：{char_params}")
+                final_parameters = {
+                    'timeStep': char_params.get('timeStep', char_params.get('time_step', 32)),
+                    'pWeight': char_params.get('pWeight', char_params.get('p_weight', 1.4)),
+                    'tWeight': char_params.get('tWeight', char_params.get('t_weight', 3.0))
+                }
+            except Exception as e:
+                logger.warning(f"[PARAMS] 解析角色参数失败，使用默认参数: {e}")
+                final_parameters = {'timeStep': 32, 'pWeight': 1.4, 'tWeight': 3.0}
+        else:
+            # 方式2：使用synthesis_plan的通用参数（向后兼容）
+            final_parameters = {
+                'timeStep': parameters.get('timeStep', 32),
+                'pWeight': parameters.get('pWeight', 1.4),
+                'tWeight': parameters.get('tWeight', 3.0)
+            }
+            logger.info(f"[PARAMS] 使用通用参数：{final_parameters}")
+        
+        # 准备TTS请求
+        tts_request = TTSRequest(
+            text=text,
+            reference_audio_path=voice.reference_audio_path,
+            output_audio_path=audio_path,
+            time_step=final_parameters['timeStep'],
+            p_weight=final_parameters['pWeight'],
+            t_weight=final_parameters['tWeight'],
+            latent_file_path=voice.latent_file_path
+        )
+        
+        # 调用TTS合成
+        start_time = time.time()
+        response = await tts_client.synthesize_speech(tts_request)
+        processing_time = time.time() - start_time
+        
+        if response.success:
+            # 验证生成的音频文件
+            if os.path.exists(audio_path):
+                file_size = os.path.getsize(audio_path)
+                
+                # 获取音频时长
+                try:
+                    from app.utils import get_audio_duration
+                    duration = get_audio_duration(audio_path)
+                except:
+                    duration = 0.0
+                
+                # 🚀 获取章节信息用于新架构
+                chapter_number = segment_data.get('chapter_number')
+                chapter_id = segment_data.get('chapter_id')
+                if not chapter_number and chapter_id:
+                    # 尝试从数据库获取章节号
+                    try:
+                        from app.models import BookChapter
+                        chapter = db.query(BookChapter).filter(BookChapter.id == chapter_id).first()
+                        if chapter:
+                            chapter_number = chapter.chapter_number
+                            logger.info(f"[NEW_ARCH] 段落 {segment_id} 从数据库获取章节号: {chapter_number}")
+                    except Exception as e:
+                        logger.error(f"[NEW_ARCH] 获取章节信息失败: {e}")
+                
+                # 🚀 注释掉防重复检查：用户点击重新合成时已清理了所有现有文件
+                # 重新合成时不需要检查重复，因为启动时已经清理过了
+                logger.debug(f"[SYNTHESIS_PLAN] 开始合成段落 {segment_id}，角色: {speaker}")
+                
+                # 🔥 修复：正确设置character_id和voice_profile_id，避免ID空间冲突
+                # 根据voice对象的来源正确设置ID字段
+                audio_character_id = None
+                audio_voice_profile_id = None
+                
+                if character_id:
+                    # 新架构：使用角色配音库
+                    audio_character_id = character_id
+                    logger.debug(f"[NEW_ARCH] AudioFile使用character_id: {character_id}")
+                elif voice_id and hasattr(voice, 'id') and not hasattr(voice, '__dict__'):
+                    # 旧架构：使用VoiceProfile（voice是真正的VoiceProfile对象）
+                    audio_voice_profile_id = voice.id
+                    logger.debug(f"[OLD_ARCH] AudioFile使用voice_profile_id: {voice.id}")
+                else:
+                    logger.warning(f"[SYNTHESIS_PLAN] 段落 {segment_id} 无法确定ID类型，使用voice对象ID")
+                    # 如果无法确定，根据voice对象类型判断
+                    if hasattr(voice, '__dict__') and 'VoiceCompat' in str(type(voice)):
+                        # VoiceCompat对象来自Character
+                        audio_character_id = voice.id
+                    else:
+                        # 真正的VoiceProfile对象
+                        audio_voice_profile_id = voice.id if hasattr(voice, 'id') else None
+                
+                # 保存AudioFile记录（新架构：包含完整合成信息）
+                audio_file = AudioFile(
+                    filename=audio_filename,
+                    original_name=f"段落{segment_id}_{speaker}",
+                    file_path=audio_path,
+                    file_size=file_size,
+                    duration=duration,
+                    project_id=project_id,
+                    chapter_id=chapter_id,
+                    chapter_number=chapter_number,
+                    character_name=speaker,  # 角色名
+                    speaker=speaker,  # 说话人
+                    paragraph_index=segment_id,  # 段落索引
+                    character_id=audio_character_id,  # 🚀 新架构：Character ID
+                    voice_profile_id=audio_voice_profile_id,  # 🚀 旧架构：VoiceProfile ID
+                    text_content=text,
+                    audio_type='segment',
+                    processing_time=processing_time,
+                    model_used='MegaTTS3',
+                    status='active',
+                    created_at=datetime.utcnow()
+                )
+                db.add(audio_file)
+                db.commit()
+                db.refresh(audio_file)
+                
+                # 🚀 新架构：完全基于AudioFile，不再创建TextSegment
+                # AudioFile已包含所有必要信息：文本内容、说话人、章节等
+                
+                logger.info(f"[SYNTHESIS_PLAN] 段落 {segment_id} 合成成功，耗时 {processing_time:.2f}s")
+                
+                return {
+                    "segment_id": segment_id,
+                    "audio_file_id": audio_file.id,
+                    "file_path": audio_path,
+                    "duration": duration,
+                    "speaker": speaker,
+                    "character_id": audio_character_id,  # 🚀 新架构：返回正确的character_id
+                    "voice_profile_id": audio_voice_profile_id,  # 🚀 旧架构：返回正确的voice_profile_id
+                    "chapter_id": chapter_id  # 🔥 新增：返回章节ID用于音频合并
+                }
+            else:
+                logger.error(f"[SYNTHESIS_PLAN] 段落 {segment_id} 音频文件未生成")
+                return {"error": f"段落 {segment_id} 音频文件未生成"}
+        else:
+            logger.error(f"[SYNTHESIS_PLAN] 段落 {segment_id} TTS合成失败: {response.message}")
+            return {"error": f"段落 {segment_id} TTS合成失败: {response.message}"}
+            
+    except Exception as e:
+        logger.error(f"[SYNTHESIS_PLAN] 段落 {segment_index + 1} 处理异常: {str(e)}")
+        return {"error": f"段落 {segment_index + 1} 处理异常: {str(e)}"}
+
+
 async def process_audio_generation_from_synthesis_plan(
     project_id: int, 
     synthesis_data: List[Dict], 
-    parallel_tasks: int = 1
+    parallel_tasks: int = 1,
+    on_segment_complete: Optional[Callable[[int, Dict, Dict], Awaitable[None]]] = None
 ):
     """
     基于智能准备结果直接进行音频合成
     不依赖 TextSegment 表，直接使用 JSON 数据
+    
+    on_segment_complete: 每个段落合成成功后按顺序回调 (段落序号, 段落数据, 合成结果)，
+    供环境音协调器在整章合成结束前开始后续阶段
     """
     logger.info(f"[SYNTHESIS_PLAN] 开始处理项目 {project_id} 的音频合成，共 {len(synthesis_data)} 个段落")
     
@@ -939,226 +1181,9 @@ async def process_audio_generation_from_synthesis_plan(
                     logger.warning(f"[SYNTHESIS_PLAN] 段落处理中检测到项目已取消，停止处理段落 {segment_index + 1}")
                     return {"error": "项目已被取消"}
                 
-                segment_id = segment_data.get('segment_id', segment_index + 1)
-                text = segment_data.get('text', '')
-                speaker = segment_data.get('speaker', '未知')
-                voice_id = segment_data.get('voice_id')
-                character_id = segment_data.get('character_id')
-                parameters = segment_data.get('parameters', {})
-                
-                logger.info(f"[SYNTHESIS_PLAN] 处理段落 {segment_id}: {speaker} - {text[:50]}...")
-                
-                if not text.strip():
-                    logger.warning(f"[SYNTHESIS_PLAN] 段落 {segment_id} 文本为空，跳过")
-                    return None
-                
-                # 🚀 架构改进：支持两种方式获取音频配置
-                # 方式1（推荐）：通过character_id获取最新配音
-                # 方式2（向后兼容）：通过voice_id获取VoiceProfile
-                character = None
-                voice = None
-                
-                if character_id:
-                    # 🎯 新架构：通过character_id获取角色最新配音
-                    try:
-                        from app.models.character import Character
-                        character = db.query(Character).filter(Character.id == character_id).first()
-                        if character and character.reference_audio_path:
-                            logger.info(f"[NEW_ARCH] 段落 {segment_id} 使用角色配音：{character.name} (ID: {character.id})")
-                            # 创建兼容的voice对象
-                            class VoiceCompat:
-                                def __init__(self, char):
-                                    self.id = char.id
-                                    self.name = char.name
-                                    self.reference_audio_path = char.reference_audio_path
-                                    self.latent_file_path = char.latent_file_path
-                                    self.status = char.status
-                                
-                                def validate_files(self):
-                                    return {'valid': True, 'missing_files': []}
-                            
-                            voice = VoiceCompat(character)
-                        else:
-                            logger.error(f"[NEW_ARCH] 段落 {segment_id} 角色ID {character_id} 不存在或未配置音频，请在角色配音库中配置声音")
-                            return {"error": f"段落 {segment_id} 角色'{speaker}'未配置声音，请在角色配音库中上传音频文件"}
-                    except Exception as e:
-                        logger.error(f"[NEW_ARCH] 段落 {segment_id} 查找角色失败: {e}")
-                        return {"error": f"段落 {segment_id} 角色查找失败: {e}"}
-                
-                elif voice_id:
-                    # 🔄 旧架构：通过voice_id获取VoiceProfile（向后兼容）
-                    try:
-                        voice = db.query(VoiceProfile).filter(VoiceProfile.id == voice_id).first()
-                        if voice:
-                            logger.info(f"[OLD_ARCH] 段落 {segment_id} 使用VoiceProfile：{voice.name} (ID: {voice.id})")
-                        else:
-                            logger.error(f"[OLD_ARCH] 段落 {segment_id} VoiceProfile不存在: {voice_id}")
-                    except Exception as e:
-                        logger.error(f"[OLD_ARCH] 段落 {segment_id} 查找VoiceProfile失败: {e}")
-                
-                if not voice:
-                    logger.error(f"[SYNTHESIS_PLAN] 段落 {segment_id} 无法获取声音配置 (character_id: {character_id}, voice_id: {voice_id})")
-                    return {"error": f"段落 {segment_id} 缺少声音配置"}
-                
-                # 验证声音文件
-                file_validation = voice.validate_files()
-                if not file_validation['valid']:
-                    logger.error(f"[SYNTHESIS_PLAN] 段落 {segment_id} 声音文件缺失: {file_validation['missing_files']}")
-                    return {"error": f"段落 {segment_id} 声音文件缺失"}
-                
-                # 生成音频文件路径
-                safe_speaker = "".join(c for c in speaker if c.isalnum() or c in (' ', '-', '_')).rstrip()
-                # 🔥 修复：根据实际使用的voice对象ID生成文件名，避免ID混用
-                voice_identifier = voice.id if hasattr(voice, 'id') else 'unknown'
-                
-                # 🚨 重要修复：在文件名中添加章节ID，避免不同章节的段落文件相互覆盖
-                chapter_id = segment_data.get('chapter_id', 'unknown')
-                audio_filename = f"chapter_{chapter_id}_segment_{segment_id:04d}_{safe_speaker}_{voice_identifier}.wav"
-                audio_path = os.path.join(project_output_dir, audio_filename)
-                
-                # 🔥 关键修复：优先使用角色配音库的个性化参数
-                final_parameters = {}
-                
-                # 方式1：从角色配音库获取参数（推荐）
-                if character and hasattr(character, 'voice_parameters') and character.voice_parameters:
-                    try:
-                        import json
-                        char_params = json.loads(character.voice_parameters) if isinstance(character.voice_parameters, str) else character.voice_parameters
-                        logger.info(f"[PARAMS] 使用角色配音库参数：{char_params}")
-                        final_parameters = {
-                            'timeStep': char_params.get('timeStep', char_params.get('time_step', 32)),
-                            'pWeight': char_params.get('pWeight', char_params.get('p_weight', 1.4)),
-                            'tWeight': char_params.get('tWeight', char_params.get('t_weight', 3.0))
-                        }
-                    except Exception as e:
-                        logger.warning(f"[PARAMS] 解析角色参数失败，使用默认参数: {e}")
-                        final_parameters = {'timeStep': 32, 'pWeight': 1.4, 'tWeight': 3.0}
-                else:
-                    # 方式2：使用synthesis_plan的通用参数（向后兼容）
-                    final_parameters = {
-                        'timeStep': parameters.get('timeStep', 32),
-                        'pWeight': parameters.get('pWeight', 1.4),
-                        'tWeight': parameters.get('tWeight', 3.0)
-                    }
-                    logger.info(f"[PARAMS] 使用通用参数：{final_parameters}")
-                
-                # 准备TTS请求
-                tts_request = TTSRequest(
-                    text=text,
-                    reference_audio_path=voice.reference_audio_path,
-                    output_audio_path=audio_path,
-                    time_step=final_parameters['timeStep'],
-                    p_weight=final_parameters['pWeight'],
-                    t_weight=final_parameters['tWeight'],
-                    latent_file_path=voice.latent_file_path
+                return await synthesize_plan_segment(
+                    db, tts_client, project_id, segment_data, segment_index, project_output_dir
                 )
-                
-                # 调用TTS合成
-                start_time = time.time()
-                response = await tts_client.synthesize_speech(tts_request)
-                processing_time = time.time() - start_time
-                
-                if response.success:
-                    # 验证生成的音频文件
-                    if os.path.exists(audio_path):
-                        file_size = os.path.getsize(audio_path)
-                        
-                        # 获取音频时长
-                        try:
-                            from app.utils import get_audio_duration
-                            duration = get_audio_duration(audio_path)
-                        except:
-                            duration = 0.0
-                        
-                        # 🚀 获取章节信息用于新架构
-                        chapter_number = segment_data.get('chapter_number')
-                        chapter_id = segment_data.get('chapter_id')
-                        if not chapter_number and chapter_id:
-                            # 尝试从数据库获取章节号
-                            try:
-                                from app.models import BookChapter
-                                chapter = db.query(BookChapter).filter(BookChapter.id == chapter_id).first()
-                                if chapter:
-                                    chapter_number = chapter.chapter_number
-                                    logger.info(f"[NEW_ARCH] 段落 {segment_id} 从数据库获取章节号: {chapter_number}")
-                            except Exception as e:
-                                logger.error(f"[NEW_ARCH] 获取章节信息失败: {e}")
-                        
-                        # 🚀 注释掉防重复检查：用户点击重新合成时已清理了所有现有文件
-                        # 重新合成时不需要检查重复，因为启动时已经清理过了
-                        logger.debug(f"[SYNTHESIS_PLAN] 开始合成段落 {segment_id}，角色: {speaker}")
-                        
-                        # 🔥 修复：正确设置character_id和voice_profile_id，避免ID空间冲突
-                        # 根据voice对象的来源正确设置ID字段
-                        audio_character_id = None
-                        audio_voice_profile_id = None
-                        
-                        if character_id:
-                            # 新架构：使用角色配音库
-                            audio_character_id = character_id
-                            logger.debug(f"[NEW_ARCH] AudioFile使用character_id: {character_id}")
-                        elif voice_id and hasattr(voice, 'id') and not hasattr(voice, '__dict__'):
-                            # 旧架构：使用VoiceProfile（voice是真正的VoiceProfile对象）
-                            audio_voice_profile_id = voice.id
-                            logger.debug(f"[OLD_ARCH] AudioFile使用voice_profile_id: {voice.id}")
-                        else:
-                            logger.warning(f"[SYNTHESIS_PLAN] 段落 {segment_id} 无法确定ID类型，使用voice对象ID")
-                            # 如果无法确定，根据voice对象类型判断
-                            if hasattr(voice, '__dict__') and 'VoiceCompat' in str(type(voice)):
-                                # VoiceCompat对象来自Character
-                                audio_character_id = voice.id
-                            else:
-                                # 真正的VoiceProfile对象
-                                audio_voice_profile_id = voice.id if hasattr(voice, 'id') else None
-                        
-                        # 保存AudioFile记录（新架构：包含完整合成信息）
-                        audio_file = AudioFile(
-                            filename=audio_filename,
-                            original_name=f"段落{segment_id}_{speaker}",
-                            file_path=audio_path,
-                            file_size=file_size,
-                            duration=duration,
-                            project_id=project_id,
-                            chapter_id=chapter_id,
-                            chapter_number=chapter_number,
-                            character_name=speaker,  # 角色名
-                            speaker=speaker,  # 说话人
-                            paragraph_index=segment_id,  # 段落索引
-                            character_id=audio_character_id,  # 🚀 新架构：Character ID
-                            voice_profile_id=audio_voice_profile_id,  # 🚀 旧架构：VoiceProfile ID
-                            text_content=text,
-                            audio_type='segment',
-                            processing_time=processing_time,
-                            model_used='MegaTTS3',
-                            status='active',
-                            created_at=datetime.utcnow()
-                        )
-                        db.add(audio_file)
-                        db.commit()
-                        db.refresh(audio_file)
-                        
-                        # 🚀 新架构：完全基于AudioFile，不再创建TextSegment
-                        # AudioFile已包含所有必要信息：文本内容、说话人、章节等
-                        
-                        logger.info(f"[SYNTHESIS_PLAN] 段落 {segment_id} 合成成功，耗时 {processing_time:.2f}s")
-                        
-                        return {
-                            "segment_id": segment_id,
-                            "audio_file_id": audio_file.id,
-                            "file_path": audio_path,
-                            "duration": duration,
-                            "speaker": speaker,
-                            "character_id": audio_character_id,  # 🚀 新架构：返回正确的character_id
-                            "voice_profile_id": audio_voice_profile_id,  # 🚀 旧架构：返回正确的voice_profile_id
-                            "chapter_id": chapter_id  # 🔥 新增：返回章节ID用于音频合并
-                        }
-                    else:
-                        logger.error(f"[SYNTHESIS_PLAN] 段落 {segment_id} 音频文件未生成")
-                        return {"error": f"段落 {segment_id} 音频文件未生成"}
-                else:
-                    logger.error(f"[SYNTHESIS_PLAN] 段落 {segment_id} TTS合成失败: {response.message}")
-                    return {"error": f"段落 {segment_id} TTS合成失败: {response.message}"}
-                    
             except Exception as e:
                 logger.error(f"[SYNTHESIS_PLAN] 段落 {segment_index + 1} 处理异常: {str(e)}")
                 return {"error": f"段落 {segment_index + 1} 处理异常: {str(e)}"}
@@ -1211,6 +1236,12 @@ async def process_audio_generation_from_synthesis_plan(
                 
                 # 🔧 每完成一个段落就实时发送进度更新
                 if result and not isinstance(result, Exception) and "error" not in result:
+                    if on_segment_complete:
+                        try:
+                            await on_segment_complete(i, segment, result)
+                        except Exception as callback_error:
+                            logger.error(f"[SYNTHESIS_PLAN] 段落完成回调失败: {str(callback_error)}")
+                    
                     updated_completed = db.query(AudioFile).filter(
                         AudioFile.project_id == project_id,
                         AudioFile.audio_type == 'segment'
@@ -1242,7 +1273,18 @@ async def process_audio_generation_from_synthesis_plan(
                 results.append(e)
         
         # 统计处理结果
+        from app.services.synthesis_plan_service import mark_segment_status, SEGMENT_COMPLETED, SEGMENT_FAILED
         for i, result in enumerate(results):
+            # 同步段落行的合成状态（只更新对应段落）
+            segment = synthesis_data[i] if i < len(synthesis_data) else {}
+            if isinstance(result, Exception) or (result and "error" in result):
+                error = str(result) if isinstance(result, Exception) else result["error"]
+                mark_segment_status(db, segment.get('chapter_id'), segment.get('segment_id'),
+                                    SEGMENT_FAILED, project_id, error)
+            elif result:
+                mark_segment_status(db, segment.get('chapter_id'), segment.get('segment_id'),
+                                    SEGMENT_COMPLETED, project_id)
+            
             if isinstance(result, Exception):
                 logger.error(f"[SYNTHESIS_PLAN] 段落 {i + 1} 处理异常: {str(result)}")
                 failed_segments.append({
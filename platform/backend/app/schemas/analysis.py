@@ -4,6 +4,7 @@
 
 from pydantic import BaseModel, Field
 from typing import Optional, Dict, Any, List
+from datetime import datetime
 from .common import BaseResponseModel
 
 
@@ -47,26 +48,28 @@ class AnalysisSessionResponse(BaseResponseModel):
 
 
 class AnalysisResultResponse(BaseResponseModel):
-    """分析结果响应"""
-    session_id: int = Field(description="会话ID")
-    chapter_id: int = Field(description="章节ID")
-    detected_characters: Optional[List[Dict[str, Any]]] = Field(description="检测到的角色")
-    dialogue_segments: Optional[List[Dict[str, Any]]] = Field(description="对话段落")
-    emotion_analysis: Optional[Dict[str, Any]] = Field(description="情感分析")
-    voice_recommendations: Optional[List[Dict[str, Any]]] = Field(description="声音推荐")
-    synthesis_plan: Optional[Dict[str, Any]] = Field(description="合成计划")
-    user_modifications: Optional[List[Dict[str, Any]]] = Field(description="用户修改")
-    final_config: Optional[Dict[str, Any]] = Field(description="最终配置")
-    is_user_confirmed: bool = Field(description="用户是否已确认")
-    status: str = Field(description="处理状态")
-    processing_time: Optional[int] = Field(description="处理耗时")
-    confidence_score: Optional[int] = Field(description="置信度评分")
-    quality_metrics: Optional[Dict[str, Any]] = Field(description="质量指标")
-    error_message: Optional[str] = Field(description="错误消息")
-    completed_at: Optional[str] = Field(description="完成时间")
-    confirmed_at: Optional[str] = Field(description="确认时间")
-    original_analysis: Optional[Dict[str, Any]] = Field(description="原始分析数据")
-    llm_response_raw: Optional[str] = Field(description="LLM原始响应")
+    """分析结果响应（列表按 view / fields 返回字段子集，未返回的字段缺省）"""
+    created_at: Optional[datetime] = Field(default=None, description="创建时间")
+    updated_at: Optional[datetime] = Field(default=None, description="更新时间")
+    session_id: Optional[int] = Field(default=None, description="会话ID")
+    chapter_id: Optional[int] = Field(default=None, description="章节ID")
+    detected_characters: Optional[List[Dict[str, Any]]] = Field(default=None, description="检测到的角色")
+    dialogue_segments: Optional[List[Dict[str, Any]]] = Field(default=None, description="对话段落")
+    emotion_analysis: Optional[Dict[str, Any]] = Field(default=None, description="情感分析")
+    voice_recommendations: Optional[List[Dict[str, Any]]] = Field(default=None, description="声音推荐")
+    synthesis_plan: Optional[Dict[str, Any]] = Field(default=None, description="合成计划")
+    user_modifications: Optional[List[Dict[str, Any]]] = Field(default=None, description="用户修改")
+    final_config: Optional[Dict[str, Any]] = Field(default=None, description="最终配置")
+    is_user_confirmed: Optional[bool] = Field(default=None, description="用户是否已确认")
+    status: Optional[str] = Field(default=None, description="处理状态")
+    processing_time: Optional[int] = Field(default=None, description="处理耗时")
+    confidence_score: Optional[int] = Field(default=None, description="置信度评分")
+    quality_metrics: Optional[Dict[str, Any]] = Field(default=None, description="质量指标")
+    error_message: Optional[str] = Field(default=None, description="错误消息")
+    completed_at: Optional[str] = Field(default=None, description="完成时间")
+    confirmed_at: Optional[str] = Field(default=None, description="确认时间")
+    original_analysis: Optional[Dict[str, Any]] = Field(default=None, description="原始分析数据")
+    llm_response_raw: Optional[str] = Field(default=None, description="LLM原始响应")
 
 
 class ConfigModification(BaseModel):
@@ -1,17 +1,27 @@
 """
 AI TTS参数优化器服务
 基于大模型智能分析文本内容和角色特征，生成最佳TTS参数配置
-优化版：旁白使用默认值，减少token消耗
+优化版：旁白使用默认值，减少token消耗；整章批量推断，按 (角色, 情感, 文本特征) 记忆结果
 """
 
 import json
 import logging
 import os
+import re
+import threading
+from collections import OrderedDict
 import requests
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
+# 每次LLM调用分析的不同参数组合数
+TTS_PARAM_BATCH_SIZE = int(os.getenv("TTS_PARAM_BATCH_SIZE", "40"))
+# 记忆的参数组合数（进程内共享）
+TTS_PARAM_MEMO_SIZE = int(os.getenv("TTS_PARAM_MEMO_SIZE", "4096"))
+# 批量提示词中每段文本的最大字符数
+TTS_PARAM_BATCH_TEXT_CHARS = 80
+
 
 class AITTSOptimizer:
     """AI TTS参数优化器 - 优化版，旁白使用默认值"""
@@ -34,9 +44,95 @@ class AITTSOptimizer:
         self.ollama_detector = ollama_detector
         self.enable_ai_analysis = True  # 可以通过环境变量控制
     
+    # 参数记忆：特征签名 -> AI推断的参数（各实例共享）
+    _memo: "OrderedDict[Tuple, Dict]" = OrderedDict()
+    _memo_lock = threading.Lock()
+    
     def get_smart_tts_params(self, segment: Dict, detected_characters: List[Dict]) -> Dict:
         """🎯 智能TTS参数配置 - 优化版"""
         
+        rule_params = self._rule_based_params(segment)
+        if rule_params is not None:
+            return rule_params
+        
+        # 只对真正需要分析的内容使用AI
+        if self.enable_ai_analysis:
+            key = self.feature_signature(segment, self._find_character(segment, detected_characters))
+            memo = self._memo_get(key)
+            if memo is not None:
+                return memo
+            try:
+                ai_params = self._ai_analyze_tts_params(segment, detected_characters)
+                if ai_params:
+                    self._memo_put(key, ai_params)
+                    return ai_params
+                else:
+                    logger.warning(f"AI TTS参数分析返回空结果")
+                    return self.CHARACTER_DEFAULT_PARAMS
+            except Exception as e:
+                logger.error(f"AI TTS参数分析失败: {str(e)}")
+                return self.CHARACTER_DEFAULT_PARAMS
+        
+        # 快速模式：直接使用默认参数
+        return self.CHARACTER_DEFAULT_PARAMS
+    
+    def get_smart_tts_params_batch(self, segments: List[Dict], detected_characters: List[Dict],
+                                   enable_ai_analysis: Optional[bool] = None) -> List[Dict]:
+        """
+        🎯 整章批量TTS参数配置
+        规则可定的段落直接给默认值；其余按特征签名去重、查记忆，
+        未命中的签名每 TTS_PARAM_BATCH_SIZE 个合并为一次LLM调用；
+        批量结果中解析不出的条目才逐段回退到单条分析
+        
+        Args:
+            enable_ai_analysis: 本次调用是否启用AI分析，None 时使用实例设置；
+                                按调用传入，同一实例上并发的不同模式互不影响
+        
+        Returns:
+            与 segments 一一对应的参数
+        """
+        results: List[Optional[Dict]] = [None] * len(segments)
+        pending: "OrderedDict[Tuple, List[int]]" = OrderedDict()
+        representatives: Dict[Tuple, Tuple[Dict, Optional[Dict]]] = {}
+        if enable_ai_analysis is None:
+            enable_ai_analysis = self.enable_ai_analysis
+        
+        for index, segment in enumerate(segments):
+            rule_params = self._rule_based_params(segment)
+            if rule_params is not None:
+                results[index] = rule_params
+                continue
+            if not enable_ai_analysis:
+                results[index] = self.CHARACTER_DEFAULT_PARAMS
+                continue
+            character_info = self._find_character(segment, detected_characters)
+            key = self.feature_signature(segment, character_info)
+            memo = self._memo_get(key)
+            if memo is not None:
+                results[index] = memo
+                continue
+            pending.setdefault(key, []).append(index)
+            representatives.setdefault(key, (segment, character_info))
+        
+        if pending:
+            keys = list(pending.keys())
+            logger.info(f"批量推断TTS参数: {len(segments)}段 -> {len(keys)}组特征, "
+                        f"{(len(keys) + TTS_PARAM_BATCH_SIZE - 1) // TTS_PARAM_BATCH_SIZE}次LLM调用")
+            for start in range(0, len(keys), TTS_PARAM_BATCH_SIZE):
+                batch_keys = keys[start:start + TTS_PARAM_BATCH_SIZE]
+                inferred = self._ai_analyze_tts_params_batch([representatives[key] for key in batch_keys])
+                for key, params in zip(batch_keys, inferred):
+                    if params:
+                        self._memo_put(key, params)
+                    else:
+                        params = self.CHARACTER_DEFAULT_PARAMS
+                    for index in pending[key]:
+                        results[index] = params
+        
+        return [dict(params) for params in results]
+    
+    def _rule_based_params(self, segment: Dict) -> Optional[Dict]:
+        """无需AI分析的段落直接返回默认参数，否则返回 None"""
         speaker = segment.get('speaker', '旁白')
         text = segment.get('text', '')
         emotion = segment.get('emotion', 'neutral')
@@ -66,21 +162,54 @@ class AITTSOptimizer:
                 "neutral_mode": True
             }
         
-        # 只对真正需要分析的内容使用AI
-        if self.enable_ai_analysis:
-            try:
-                ai_params = self._ai_analyze_tts_params(segment, detected_characters)
-                if ai_params:
-                    return ai_params
-                else:
-                    logger.warning(f"AI TTS参数分析返回空结果")
-                    return self.CHARACTER_DEFAULT_PARAMS
-            except Exception as e:
-                logger.error(f"AI TTS参数分析失败: {str(e)}")
-                return self.CHARACTER_DEFAULT_PARAMS
-        
-        # 快速模式：直接使用默认参数
-        return self.CHARACTER_DEFAULT_PARAMS
+        return None
+    
+    @staticmethod
+    def _find_character(segment: Dict, detected_characters: List[Dict]) -> Optional[Dict]:
+        speaker = segment.get('speaker', '旁白')
+        for char in detected_characters:
+            if char.get('name') == speaker:
+                return char
+        return None
+    
+    @staticmethod
+    def feature_signature(segment: Dict, character_info: Dict = None) -> Tuple:
+        """
+        段落的参数特征签名：角色（含性别/性格）、情感与文本特征（长度档位、语气标点）
+        签名相同的段落共用一组TTS参数
+        """
+        text = segment.get('text', '').strip()
+        length = len(text)
+        length_bucket = 0 if length < 50 else 1 if length < 100 else 2 if length < 200 else 3
+        traits = None
+        if character_info:
+            traits = (character_info.get('gender'), character_info.get('personality'))
+        return (
+            segment.get('speaker', '旁白'),
+            traits,
+            segment.get('emotion', 'neutral'),
+            length_bucket,
+            bool(re.search(r'[!！]', text)),
+            bool(re.search(r'[?？]', text)),
+            bool(re.search(r'…|\.\.\.', text)),
+        )
+    
+    @classmethod
+    def _memo_get(cls, key: Tuple) -> Optional[Dict]:
+        with cls._memo_lock:
+            params = cls._memo.get(key)
+            if params is None:
+                return None
+            cls._memo.move_to_end(key)
+            return dict(params)
+    
+    @classmethod
+    def _memo_put(cls, key: Tuple, params: Dict):
+        with cls._memo_lock:
+            cls._memo[key] = dict(params)
+            cls._memo.move_to_end(key)
+            while len(cls._memo) > TTS_PARAM_MEMO_SIZE:
+                cls._memo.popitem(last=False)
     
     def _ai_analyze_tts_params(self, segment: Dict, detected_characters: List[Dict]) -> Dict:
         """使用AI智能分析TTS参数 - 简化版提示词"""
@@ -90,11 +219,7 @@ class AITTSOptimizer:
         emotion = segment.get('emotion', 'neutral')
         
         # 找到角色详细信息
-        character_info = None
-        for char in detected_characters:
-            if char.get('name') == speaker:
-                character_info = char
-                break
+        character_info = self._find_character(segment, detected_characters)
         
         # 🔧 优化：使用简化的提示词
         prompt = self._build_simplified_tts_prompt(segment, character_info)
@@ -143,6 +268,93 @@ class AITTSOptimizer:
         
         return prompt
     
+    def _ai_analyze_tts_params_batch(self, items: List[Tuple[Dict, Optional[Dict]]]) -> List[Optional[Dict]]:
+        """
+        一次LLM调用分析多个段落的TTS参数
+        
+        Args:
+            items: (代表段落, 角色信息)
+        
+        Returns:
+            与 items 对应的参数；LLM不可用时全为 None，单条解析失败的条目逐段回退分析
+        """
+        if len(items) == 1:
+            return [self._analyze_single(*items[0])]
+        
+        response = self._call_ollama_for_tts(self._build_batch_tts_prompt(items))
+        if not response:
+            logger.warning(f"批量TTS参数分析调用失败，{len(items)}组使用默认参数")
+            return [None] * len(items)
+        
+        parsed = self._parse_batch_tts_response(response, len(items))
+        results = []
+        for index, (segment, character_info) in enumerate(items):
+            params = parsed.get(index + 1)
+            if params is None:
+                logger.debug(f"批量结果缺少第{index + 1}条，单独分析")
+                params = self._analyze_single(segment, character_info)
+            results.append(params)
+        return results
+    
+    def _analyze_single(self, segment: Dict, character_info: Optional[Dict]) -> Optional[Dict]:
+        response = self._call_ollama_for_tts(self._build_simplified_tts_prompt(segment, character_info))
+        return self._parse_tts_analysis_response(response) if response else None
+    
+    def _build_batch_tts_prompt(self, items: List[Tuple[Dict, Optional[Dict]]]) -> str:
+        """构建批量TTS参数分析提示词：共用参数说明，逐条列出段落"""
+        lines = []
+        for index, (segment, character_info) in enumerate(items, start=1):
+            char_traits = "普通角色"
+            if character_info:
+                char_traits = f"{character_info.get('gender', 'unknown')}/{character_info.get('personality', 'calm')}"
+            text = segment.get('text', '').strip().replace('\n', ' ')
+            if len(text) > TTS_PARAM_BATCH_TEXT_CHARS:
+                text = text[:TTS_PARAM_BATCH_TEXT_CHARS] + "…"
+            lines.append(f'{index}. 角色: {segment.get("speaker", "旁白")} ({char_traits}) '
+                         f'情感: {segment.get("emotion", "neutral")} 文本: "{text}"')
+        
+        return f"""为以下每条对话分析TTS参数。
+
+{chr(10).join(lines)}
+
+参数范围:
+- timeStep: 20-40 (质量vs速度)
+- pWeight: 1.0-2.5 (清晰度)  
+- tWeight: 2.0-4.0 (表现力)
+
+参考配置:
+- 标准对话: timeStep=30, pWeight=1.4, tWeight=3.0
+- 激烈情感: timeStep=28, pWeight=1.6, tWeight=3.5
+- 温柔角色: timeStep=32, pWeight=1.2, tWeight=2.8
+
+只输出JSON数组，每条一项，id为上面的序号:
+[{{"id": 1, "timeStep": 数值, "pWeight": 数值, "tWeight": 数值, "reason": "简短理由"}}]"""
+    
+    def _parse_batch_tts_response(self, response: str, count: int) -> Dict[int, Dict]:
+        """解析批量分析结果：序号 -> 参数；无法解析的条目不出现"""
+        json_start = response.find('[')
+        json_end = response.rfind(']') + 1
+        if json_start == -1 or json_end <= json_start:
+            logger.error("解析批量AI TTS参数失败: 未找到JSON数组")
+            return {}
+        try:
+            data = json.loads(response[json_start:json_end])
+        except json.JSONDecodeError as e:
+            logger.error(f"解析批量AI TTS参数失败: {str(e)}")
+            return {}
+        
+        results = {}
+        for item in data if isinstance(data, list) else []:
+            if not isinstance(item, dict):
+                continue
+            try:
+                item_id = int(item.get('id'))
+                if 1 <= item_id <= count:
+                    results[item_id] = self._normalize_tts_params(item)
+            except (TypeError, ValueError):
+                continue
+        return results
+    
     def _call_ollama_for_tts(self, prompt: str) -> Optional[str]:
         """调用Ollama进行TTS参数分析 - 优化超时和参数"""
         try:
@@ -190,36 +402,39 @@ class AITTSOptimizer:
             if json_start != -1 and json_end != -1:
                 json_str = response[json_start:json_end]
                 data = json.loads(json_str)
-                
-                # 验证参数范围
-                time_step = int(data.get('timeStep', 30))
-                p_w = float(data.get('pWeight', 1.4))
-                t_w = float(data.get('tWeight', 3.0))
-                
-                # 参数范围检查和修正
-                time_step = max(20, min(40, time_step))
-                p_w = max(1.0, min(2.5, p_w))
-                t_w = max(2.0, min(4.0, t_w))
-                
-                reasoning = data.get('reason', data.get('reasoning', 'AI分析'))
-                
-                # 🔧 简化日志输出
-                logger.info(f"AI TTS: timeStep={time_step}, pWeight={p_w}, tWeight={t_w}")
-                logger.debug(f"分析理由: {reasoning}")
-                
-                return {
-                    "timeStep": time_step,
-                    "pWeight": round(p_w, 1),
-                    "tWeight": round(t_w, 1),
-                    "ai_reasoning": reasoning
-                }
+                return self._normalize_tts_params(data)
             
             return None
             
-        except (json.JSONDecodeError, ValueError, KeyError) as e:
+        except (json.JSONDecodeError, ValueError, KeyError, TypeError) as e:
             logger.error(f"解析AI TTS参数失败: {str(e)}")
             return None
     
+    @staticmethod
+    def _normalize_tts_params(data: Dict) -> Dict:
+        """校验并修正参数范围"""
+        # 验证参数范围
+        time_step = int(data.get('timeStep', 30))
+        p_w = float(data.get('pWeight', 1.4))
+        t_w = float(data.get('tWeight', 3.0))
+        
+        # 参数范围检查和修正
+        time_step = max(20, min(40, time_step))
+        p_w = max(1.0, min(2.5, p_w))
+        t_w = max(2.0, min(4.0, t_w))
+        
+        reasoning = data.get('reason', data.get('reasoning', 'AI分析'))
+        
+        # 🔧 简化日志输出
+        logger.debug(f"AI TTS: timeStep={time_step}, pWeight={p_w}, tWeight={t_w}, 理由: {reasoning}")
+        
+        return {
+            "timeStep": time_step,
+            "pWeight": round(p_w, 1),
+            "tWeight": round(t_w, 1),
+            "ai_reasoning": reasoning
+        }
+    
 
     
     def set_enable_ai_analysis(self, enabled: bool):
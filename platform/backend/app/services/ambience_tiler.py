@@ -0,0 +1,251 @@
+"""
+环境音循环拼接（Ambience Tiling）
+长时间的静态背景（雨声、风声、人群）不再按目标时长整段生成：
+只生成（或从生成缓存复用）一段较短的种子音频，通过相关性 + 频谱比较找到循环点，
+再以等功率交叉淡化拼接到任意长度。可选按随机顺序拼接片段，避免听出固定的重复周期。
+生成耗时由与时长成正比变为近似常数
+"""
+
+import io
+import logging
+import os
+import tempfile
+import zlib
+from typing import List, Optional, Tuple
+
+import numpy as np
+import soundfile as sf
+
+logger = logging.getLogger(__name__)
+
+AMBIENCE_TILING_ENABLED = os.getenv("AMBIENCE_TILING_ENABLED", "true").lower() in ("1", "true", "yes")
+AMBIENCE_SEED_DURATION = float(os.getenv("AMBIENCE_SEED_DURATION", "10"))
+AMBIENCE_CROSSFADE = float(os.getenv("AMBIENCE_CROSSFADE", "1.0"))
+AMBIENCE_SEGMENT_SECONDS = float(os.getenv("AMBIENCE_SEGMENT_SECONDS", "3.0"))
+AMBIENCE_RANDOMIZE = os.getenv("AMBIENCE_RANDOMIZE", "true").lower() in ("1", "true", "yes")
+
+# 循环点只在种子后半段搜索，保证每次循环的内容足够长
+MIN_LOOP_RATIO = 0.5
+# 相关性最高的若干候选再做频谱比较
+SPECTRAL_CANDIDATES = 8
+
+
+def equal_power_curves(frames: int) -> Tuple[np.ndarray, np.ndarray]:
+    """等功率淡入/淡出曲线（sin²+cos²=1，不相关信号交叉时响度不塌陷）"""
+    t = (np.arange(frames, dtype=np.float64) + 0.5) / max(frames, 1)
+    fade_in = np.sin(t * np.pi / 2).astype(np.float32)
+    fade_out = np.cos(t * np.pi / 2).astype(np.float32)
+    return fade_in, fade_out
+
+
+def _log_spectrum(window: np.ndarray) -> np.ndarray:
+    spectrum = np.abs(np.fft.rfft(window * np.hanning(len(window))))
+    return np.log1p(spectrum)
+
+
+def find_loop_point(samples: np.ndarray, window_frames: int, min_loop_ratio: float = MIN_LOOP_RATIO) -> int:
+    """
+    寻找循环终点 end：[end, end+window) 与开头 [0, window) 最相似，
+    拼接时用前者淡出、后者淡入，接缝两侧是相近的素材
+
+    Args:
+        samples: (帧数, 声道数) 或一维音频
+        window_frames: 比较窗口（即交叉淡化）长度
+        min_loop_ratio: 循环体占种子的最小比例
+
+    Returns:
+        循环终点帧（保证 end + window_frames <= 总帧数）
+    """
+    mono = samples.mean(axis=1) if samples.ndim == 2 else samples
+    mono = mono.astype(np.float64)
+    total = len(mono)
+    window = max(1, min(window_frames, total // 2))
+    lo = max(window, int(total * min_loop_ratio))
+    hi = total - window
+    if hi <= lo:
+        return max(hi, 1)
+
+    head = mono[:window]
+    region = mono[lo:hi + window]
+
+    # FFT 互相关：corr[k] = Σ region[k+i]·head[i]
+    size = 1 << int(np.ceil(np.log2(len(region) + window)))
+    corr = np.fft.irfft(np.fft.rfft(region, size) * np.conj(np.fft.rfft(head, size)), size)[:hi - lo + 1]
+
+    # 滑动窗口能量，用于归一化
+    energy = np.concatenate([[0.0], np.cumsum(region ** 2)])
+    window_energy = energy[window:window + hi - lo + 1] - energy[:hi - lo + 1]
+    head_energy = float(np.dot(head, head))
+    correlation = corr / (np.sqrt(np.maximum(window_energy, 0.0) * head_energy) + 1e-12)
+
+    # 相关性候选 + 频谱形状与响度比较（噪声类环境音的波形相关性普遍很低）
+    head_spectrum = _log_spectrum(head)
+    best_end, best_score = hi, -np.inf
+    for k in np.argsort(correlation)[::-1][:SPECTRAL_CANDIDATES]:
+        candidate = region[k:k + window]
+        spectrum = _log_spectrum(candidate)
+        spectral = float(np.dot(spectrum, head_spectrum) /
+                         (np.linalg.norm(spectrum) * np.linalg.norm(head_spectrum) + 1e-12))
+        level = abs(np.log((window_energy[k] + 1e-12) / (head_energy + 1e-12)))
+        score = float(correlation[k]) + spectral - 0.25 * level
+        if score > best_score:
+            best_end, best_score = lo + int(k), score
+    return best_end
+
+
+def tile_ambience(
+    samples: np.ndarray,
+    sample_rate: int,
+    target_frames: int,
+    crossfade: float = AMBIENCE_CROSSFADE,
+    randomize: bool = False,
+    segment_seconds: float = AMBIENCE_SEGMENT_SECONDS,
+    seed: Optional[int] = None
+) -> np.ndarray:
+    """
+    将种子音频拼接到目标长度
+
+    Args:
+        samples: (帧数, 声道数) 的 float32 种子音频
+        sample_rate: 采样率
+        target_frames: 目标帧数
+        crossfade: 接缝处的交叉淡化时长（秒）
+        randomize: 是否把循环体切成片段并随机排序
+        segment_seconds: 随机排序时的片段长度（秒）
+        seed: 随机种子，相同输入得到相同输出
+
+    Returns:
+        (target_frames, 声道数) 的 float32 音频
+    """
+    if samples.ndim == 1:
+        samples = samples[:, None]
+    samples = samples.astype(np.float32, copy=False)
+    if target_frames <= len(samples):
+        return samples[:target_frames].copy()
+
+    output = np.zeros((target_frames, samples.shape[1]), dtype=np.float32)
+    if len(samples) == 0:
+        return output
+
+    fade_frames = min(int(crossfade * sample_rate), len(samples) // 4)
+    loop_end = find_loop_point(samples, fade_frames) if fade_frames > 0 else len(samples)
+    segments = _loop_segments(loop_end, int(segment_seconds * sample_rate), fade_frames, randomize)
+    fade_in, fade_out = equal_power_curves(fade_frames)
+    rng = np.random.default_rng(seed)
+
+    position = 0
+    previous: Optional[int] = None
+    while position < target_frames:
+        if previous is None:
+            index = 0
+        elif len(segments) > 2:
+            # 不连续播放同一片段，也不选自然后继（那样等同于不拼接）
+            choices = [i for i in range(len(segments)) if i != previous and i != previous + 1]
+            index = int(rng.choice(choices))
+        else:
+            index = (previous + 1) % len(segments)
+
+        start, end = segments[index]
+        count = min(end - start, target_frames - position)
+        output[position:position + count] = samples[start:start + count]
+
+        previous_end = segments[previous][1] if previous is not None else None
+        if previous_end is not None and previous_end != start and fade_frames:
+            # 上一片段的自然延续淡出，本片段开头淡入
+            overlap = min(fade_frames, count)
+            output[position:position + overlap] = (
+                samples[previous_end:previous_end + overlap] * fade_out[:overlap, None]
+                + samples[start:start + overlap] * fade_in[:overlap, None]
+            )
+
+        position += count
+        previous = index
+    return output
+
+
+def _loop_segments(loop_end: int, segment_frames: int, fade_frames: int, randomize: bool) -> List[Tuple[int, int]]:
+    """循环体 [0, loop_end) 的片段划分；不随机时为整个循环体"""
+    segment_frames = max(segment_frames, 2 * fade_frames, 1)
+    if not randomize or loop_end < 3 * segment_frames:
+        return [(0, loop_end)]
+    bounds = list(range(0, loop_end, segment_frames))
+    # 末尾过短的片段并入前一段
+    if loop_end - bounds[-1] < segment_frames // 2:
+        bounds.pop()
+    return [(start, end) for start, end in zip(bounds, bounds[1:] + [loop_end])]
+
+
+def seed_for(text: str) -> int:
+    """由提示词得到稳定的随机种子"""
+    return zlib.crc32((text or "").encode("utf-8"))
+
+
+class AmbienceTiler:
+    """环境音拼接器：决定实际生成时长，并把短种子扩展到目标时长"""
+
+    def __init__(
+        self,
+        enabled: bool = AMBIENCE_TILING_ENABLED,
+        seed_duration: float = AMBIENCE_SEED_DURATION,
+        crossfade: float = AMBIENCE_CROSSFADE,
+        randomize: bool = AMBIENCE_RANDOMIZE,
+        segment_seconds: float = AMBIENCE_SEGMENT_SECONDS
+    ):
+        self.enabled = enabled
+        self.seed_duration = seed_duration
+        self.crossfade = crossfade
+        self.randomize = randomize
+        self.segment_seconds = segment_seconds
+
+    def generation_duration(self, duration: float) -> float:
+        """实际需要生成的种子时长"""
+        if not self.enabled:
+            return duration
+        return min(duration, self.seed_duration)
+
+    def extend(self, samples: np.ndarray, sample_rate: int, duration: float,
+               seed: Optional[int] = None) -> np.ndarray:
+        return tile_ambience(
+            samples, sample_rate, int(round(duration * sample_rate)),
+            crossfade=self.crossfade,
+            randomize=self.randomize,
+            segment_seconds=self.segment_seconds,
+            seed=seed
+        )
+
+    def extend_wav_bytes(self, audio_data: bytes, duration: float, seed: Optional[int] = None) -> bytes:
+        """WAV 数据短于目标时长时拼接扩展，否则原样返回（由调用方裁剪）"""
+        info = sf.info(io.BytesIO(audio_data))
+        if info.frames >= int(round(duration * info.samplerate)):
+            return audio_data
+        samples, sample_rate = sf.read(io.BytesIO(audio_data), dtype="float32", always_2d=True)
+        tiled = self.extend(samples, sample_rate, duration, seed)
+        buffer = io.BytesIO()
+        sf.write(buffer, tiled, sample_rate, subtype=info.subtype, format="WAV")
+        logger.info(f"[AMBIENCE] 种子 {info.duration:.1f}s 拼接到 {duration:.1f}s")
+        return buffer.getvalue()
+
+    def extend_file(self, source_path: str, target_path: str, duration: float, seed: Optional[int] = None):
+        """把种子文件拼接后写入 target_path（先写临时文件再替换，并发写同一目标也安全）"""
+        with open(source_path, "rb") as f:
+            audio_data = self.extend_wav_bytes(f.read(), duration, seed)
+        directory = os.path.dirname(target_path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(audio_data)
+            os.replace(temp_path, target_path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+
+# 全局实例
+ambience_tiler = AmbienceTiler()
+
+
+def get_ambience_tiler() -> AmbienceTiler:
+    """获取环境音拼接器实例"""
+    return ambience_tiler
@@ -0,0 +1,410 @@
+"""
+音频元数据探测服务
+只读取 WAV / MP3 / FLAC 文件头获取时长、采样率、声道数与编码，不解码音频；
+结果按 路径+mtime+大小 缓存在内存LRU与本地SQLite中，文件被重新生成后自然失效
+"""
+
+import logging
+import os
+import sqlite3
+import struct
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import BinaryIO, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = os.getenv("DATA_DIR", "data")
+AUDIO_METADATA_CACHE_PATH = os.getenv("AUDIO_METADATA_CACHE_PATH") or os.path.join(DATA_DIR, "audio_metadata.db")
+AUDIO_METADATA_MEMORY_ENTRIES = int(os.getenv("AUDIO_METADATA_MEMORY_ENTRIES", "8192"))
+MP3_SYNC_SCAN_BYTES = 64 * 1024
+
+
+@dataclass(frozen=True)
+class AudioMetadata:
+    """音频文件头信息"""
+    duration: float
+    sample_rate: int
+    channels: int
+    codec: str
+    bit_depth: Optional[int] = None
+    bitrate: Optional[int] = None      # bit/s，仅压缩格式
+    frames: Optional[int] = None       # 每声道采样数
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+# ---------------------------------------------------------------------------
+# 文件头解析
+# ---------------------------------------------------------------------------
+
+_WAV_CODECS = {1: "pcm", 3: "pcm_float", 6: "pcm_alaw", 7: "pcm_mulaw", 0x55: "mp3"}
+
+
+def read_wav_header(f: BinaryIO, file_size: int) -> Optional[AudioMetadata]:
+    """RIFF/RF64 WAV：fmt 与 data 块，data 长度未知（流式写入的0xFFFFFFFF）时按文件大小计算"""
+    head = f.read(12)
+    if len(head) < 12 or head[8:12] != b"WAVE" or head[:4] not in (b"RIFF", b"RF64"):
+        return None
+
+    fmt = None
+    data_size = None
+    fact_samples = None
+    ds64_data_size = None
+    while True:
+        chunk = f.read(8)
+        if len(chunk) < 8:
+            break
+        chunk_id, chunk_size = chunk[:4], struct.unpack("<I", chunk[4:])[0]
+        if chunk_id == b"fmt ":
+            body = f.read(chunk_size)
+            if len(body) < 16:
+                return None
+            fmt = struct.unpack("<HHIIHH", body[:16])
+            if fmt[0] == 0xFFFE and len(body) >= 26:
+                # WAVE_FORMAT_EXTENSIBLE：真实格式在子格式GUID的前两个字节
+                fmt = (struct.unpack("<H", body[24:26])[0],) + fmt[1:]
+        elif chunk_id == b"ds64":
+            body = f.read(chunk_size)
+            if len(body) >= 16:
+                ds64_data_size = struct.unpack("<Q", body[8:16])[0]
+        elif chunk_id == b"fact":
+            body = f.read(chunk_size)
+            if len(body) >= 4:
+                fact_samples = struct.unpack("<I", body[:4])[0]
+        elif chunk_id == b"data":
+            remaining = file_size - f.tell()
+            data_size = ds64_data_size if chunk_size == 0xFFFFFFFF and ds64_data_size else chunk_size
+            data_size = min(data_size, remaining)
+            break
+        else:
+            f.seek(chunk_size, os.SEEK_CUR)
+        if chunk_size % 2:
+            f.seek(1, os.SEEK_CUR)
+
+    if fmt is None or data_size is None:
+        return None
+    format_tag, channels, sample_rate, byte_rate, block_align, bits = fmt
+    if not sample_rate or not channels:
+        return None
+
+    codec = _WAV_CODECS.get(format_tag, f"wav_0x{format_tag:04x}")
+    if codec.startswith("pcm") and block_align:
+        frames = data_size // block_align
+    elif fact_samples is not None:
+        frames = fact_samples
+    elif byte_rate:
+        frames = int(data_size / byte_rate * sample_rate)
+    else:
+        return None
+    if codec == "pcm":
+        codec = "pcm_u8" if bits == 8 else f"pcm_s{bits}le"
+    elif codec == "pcm_float":
+        codec = f"pcm_f{bits}le"
+    return AudioMetadata(
+        duration=frames / sample_rate, sample_rate=sample_rate, channels=channels, codec=codec,
+        bit_depth=bits or None, bitrate=None if codec.startswith("pcm") else byte_rate * 8, frames=frames
+    )
+
+
+def _skip_id3v2(f: BinaryIO) -> int:
+    """跳过ID3v2标签，返回音频数据起始偏移"""
+    f.seek(0)
+    header = f.read(10)
+    if len(header) == 10 and header[:3] == b"ID3":
+        size = (header[6] << 21) | (header[7] << 14) | (header[8] << 7) | header[9]
+        offset = 10 + size + (10 if header[5] & 0x10 else 0)
+    else:
+        offset = 0
+    f.seek(offset)
+    return offset
+
+
+def read_flac_header(f: BinaryIO, file_size: int) -> Optional[AudioMetadata]:
+    """FLAC：STREAMINFO 块中的采样率、声道、位深与总采样数"""
+    _skip_id3v2(f)
+    if f.read(4) != b"fLaC":
+        return None
+    block_header = f.read(4)
+    if len(block_header) < 4 or block_header[0] & 0x7F != 0:
+        return None
+    info = f.read(34)
+    if len(info) < 34:
+        return None
+    packed = int.from_bytes(info[10:18], "big")
+    sample_rate = packed >> 44
+    channels = ((packed >> 41) & 0x7) + 1
+    bits = ((packed >> 36) & 0x1F) + 1
+    frames = packed & 0xFFFFFFFFF
+    if not sample_rate or not frames:
+        # 流式编码的FLAC总采样数为0，只能解码获得时长
+        return None
+    return AudioMetadata(
+        duration=frames / sample_rate, sample_rate=sample_rate, channels=channels, codec="flac",
+        bit_depth=bits, bitrate=int(file_size * 8 * sample_rate / frames), frames=frames
+    )
+
+
+_MP3_BITRATES = {
+    # (MPEG1?, layer) -> kbit/s，索引1-14
+    (True, 1): [32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (True, 2): [32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (True, 3): [32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (False, 1): [32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (False, 2): [8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+_MP3_BITRATES[(False, 3)] = _MP3_BITRATES[(False, 2)]
+_MP3_SAMPLE_RATES = {3: [44100, 48000, 32000], 2: [22050, 24000, 16000], 0: [11025, 12000, 8000]}
+
+
+def _parse_mp3_frame_header(header: bytes) -> Optional[Tuple[int, int, int, int, int, int]]:
+    """返回 (帧长度, 采样率, 声道数, 比特率, 每帧采样数, side info长度)，不是合法帧头时返回None"""
+    if len(header) < 4 or header[0] != 0xFF or header[1] & 0xE0 != 0xE0:
+        return None
+    version = (header[1] >> 3) & 0x3
+    layer = 4 - ((header[1] >> 1) & 0x3)
+    bitrate_index = header[2] >> 4
+    sample_rate_index = (header[2] >> 2) & 0x3
+    if version == 1 or layer == 4 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+    mpeg1 = version == 3
+    bitrate = _MP3_BITRATES[(mpeg1, layer)][bitrate_index - 1] * 1000
+    sample_rate = _MP3_SAMPLE_RATES[version][sample_rate_index]
+    padding = (header[2] >> 1) & 0x1
+    channels = 1 if header[3] >> 6 == 3 else 2
+    if layer == 1:
+        samples_per_frame = 384
+        frame_length = (12 * bitrate // sample_rate + padding) * 4
+    else:
+        samples_per_frame = 1152 if (layer == 2 or mpeg1) else 576
+        frame_length = samples_per_frame // 8 * bitrate // sample_rate + padding
+    if mpeg1:
+        side_info = 17 if channels == 1 else 32
+    else:
+        side_info = 9 if channels == 1 else 17
+    return frame_length, sample_rate, channels, bitrate, samples_per_frame, side_info
+
+
+def read_mp3_header(f: BinaryIO, file_size: int) -> Optional[AudioMetadata]:
+    """MP3：首帧帧头 + Xing/Info/VBRI 帧数；没有VBR头时按CBR用文件大小计算"""
+    start = _skip_id3v2(f)
+    buffer = f.read(MP3_SYNC_SCAN_BYTES)
+    position = 0
+    frame = None
+    while position < len(buffer) - 4:
+        position = buffer.find(b"\xFF", position)
+        if position < 0 or position > len(buffer) - 4:
+            return None
+        frame = _parse_mp3_frame_header(buffer[position:position + 4])
+        if frame:
+            # 下一帧也必须是合法帧头，避免把数据中的0xFF误认为同步字
+            f.seek(start + position + frame[0])
+            if _parse_mp3_frame_header(f.read(4)) or start + position + frame[0] >= file_size:
+                break
+        frame = None
+        position += 1
+    if frame is None:
+        return None
+
+    frame_length, sample_rate, channels, bitrate, samples_per_frame, side_info = frame
+    frame_offset = start + position
+    f.seek(frame_offset)
+    first_frame = f.read(max(frame_length, 4 + 32 + 8 + 112 + 24))
+    codec = {384: "mp1"}.get(samples_per_frame, "mp3")
+
+    frame_count = None
+    trimmed = 0
+    xing = 4 + side_info
+    if first_frame[xing:xing + 4] in (b"Xing", b"Info"):
+        flags = struct.unpack(">I", first_frame[xing + 4:xing + 8])[0]
+        if flags & 0x1:
+            frame_count = struct.unpack(">I", first_frame[xing + 8:xing + 12])[0]
+        # LAME扩展标签记录了编码器延迟与末尾填充（采样数），解码器会丢弃这部分
+        lame = xing + 8 + sum(size for bit, size in ((0x1, 4), (0x2, 4), (0x4, 100), (0x8, 4)) if flags & bit)
+        if first_frame[lame:lame + 4] in (b"LAME", b"Lavf", b"Lavc") and len(first_frame) >= lame + 24:
+            packed = int.from_bytes(first_frame[lame + 21:lame + 24], "big")
+            trimmed = (packed >> 12) + (packed & 0xFFF)
+    elif first_frame[36:40] == b"VBRI":
+        frame_count = struct.unpack(">I", first_frame[50:54])[0]
+
+    if frame_count:
+        frames = max(0, frame_count * samples_per_frame - trimmed)
+        duration = frames / sample_rate
+        bitrate = int((file_size - frame_offset) * 8 / duration) if duration else bitrate
+    else:
+        audio_bytes = file_size - frame_offset
+        f.seek(max(0, file_size - 128))
+        if f.read(3) == b"TAG":
+            audio_bytes -= 128
+        duration = audio_bytes * 8 / bitrate
+        frames = int(duration * sample_rate)
+    return AudioMetadata(
+        duration=duration, sample_rate=sample_rate, channels=channels, codec=codec,
+        bitrate=bitrate, frames=frames
+    )
+
+
+_HEADER_READERS = {".wav": read_wav_header, ".flac": read_flac_header, ".mp3": read_mp3_header}
+
+
+def _probe_with_soundfile(file_path: str) -> Optional[AudioMetadata]:
+    """其他格式（ogg等）：libsndfile 只读文件头"""
+    try:
+        import soundfile
+        info = soundfile.info(file_path)
+    except Exception:
+        return None
+    if not info.samplerate or info.frames <= 0:
+        return None
+    return AudioMetadata(
+        duration=info.frames / info.samplerate, sample_rate=info.samplerate, channels=info.channels,
+        codec=info.subtype.lower() if info.subtype else info.format.lower(), frames=info.frames
+    )
+
+
+def _probe_by_decoding(file_path: str) -> Optional[AudioMetadata]:
+    """文件头无法给出时长时（m4a、流式FLAC等）的兜底：librosa解码"""
+    try:
+        import librosa
+        y, sample_rate = librosa.load(file_path, sr=None, mono=False)
+    except Exception as e:
+        logger.warning(f"解码获取音频信息失败 {file_path}: {e}")
+        return None
+    channels = 1 if y.ndim == 1 else y.shape[0]
+    frames = y.shape[-1]
+    return AudioMetadata(
+        duration=frames / sample_rate, sample_rate=int(sample_rate), channels=channels,
+        codec=os.path.splitext(file_path)[1].lstrip(".").lower() or "unknown", frames=frames
+    )
+
+
+def probe_file(file_path: str) -> Optional[AudioMetadata]:
+    """不经缓存直接探测一个文件"""
+    reader = _HEADER_READERS.get(os.path.splitext(file_path)[1].lower())
+    if reader is not None:
+        try:
+            file_size = os.path.getsize(file_path)
+            with open(file_path, "rb") as f:
+                metadata = reader(f, file_size)
+            if metadata is not None:
+                return metadata
+        except (OSError, struct.error, IndexError, ZeroDivisionError) as e:
+            logger.warning(f"解析音频文件头失败 {file_path}: {e}")
+    return _probe_with_soundfile(file_path) or _probe_by_decoding(file_path)
+
+
+# ---------------------------------------------------------------------------
+# 缓存
+# ---------------------------------------------------------------------------
+
+class AudioMetadataService:
+    """带 内存LRU + SQLite 持久化缓存 的音频元数据探测"""
+
+    _COLUMNS = ("duration", "sample_rate", "channels", "codec", "bit_depth", "bitrate", "frames")
+
+    def __init__(self, cache_path: Optional[str] = AUDIO_METADATA_CACHE_PATH,
+                 memory_entries: int = AUDIO_METADATA_MEMORY_ENTRIES):
+        self.cache_path = cache_path
+        self.memory_entries = memory_entries
+        self._memory: "OrderedDict[str, Tuple[int, int, AudioMetadata]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_ready = False
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "probes": 0, "failures": 0}
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        """首次使用时打开持久化缓存；目录不可写时只使用内存缓存"""
+        if self._db_ready:
+            return self._db
+        self._db_ready = True
+        if not self.cache_path:
+            return None
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.cache_path)), exist_ok=True)
+            db = sqlite3.connect(self.cache_path, check_same_thread=False, timeout=5)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS audio_metadata ("
+                "path TEXT PRIMARY KEY, mtime_ns INTEGER NOT NULL, size INTEGER NOT NULL, "
+                "duration REAL NOT NULL, sample_rate INTEGER NOT NULL, channels INTEGER NOT NULL, "
+                "codec TEXT NOT NULL, bit_depth INTEGER, bitrate INTEGER, frames INTEGER, probed_at REAL NOT NULL)"
+            )
+            db.commit()
+            self._db = db
+        except sqlite3.Error as e:
+            logger.warning(f"音频元数据缓存不可用，仅使用内存缓存: {self.cache_path} - {e}")
+        return self._db
+
+    def _remember(self, path: str, mtime_ns: int, size: int, metadata: AudioMetadata):
+        self._memory[path] = (mtime_ns, size, metadata)
+        self._memory.move_to_end(path)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def probe(self, file_path: str) -> Optional[AudioMetadata]:
+        """获取音频元数据，文件不存在或无法识别时返回None"""
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        path = os.path.abspath(file_path)
+        key = (stat.st_mtime_ns, stat.st_size)
+
+        with self._lock:
+            cached = self._memory.get(path)
+            if cached is not None and cached[:2] == key:
+                self._memory.move_to_end(path)
+                self.stats["memory_hits"] += 1
+                return cached[2]
+            db = self._connection()
+            if db is not None:
+                try:
+                    row = db.execute(
+                        f"SELECT {', '.join(self._COLUMNS)} FROM audio_metadata "
+                        "WHERE path = ? AND mtime_ns = ? AND size = ?", (path, *key)
+                    ).fetchone()
+                except sqlite3.Error as e:
+                    logger.warning(f"读取音频元数据缓存失败: {e}")
+                    row = None
+                if row is not None:
+                    metadata = AudioMetadata(*row)
+                    self._remember(path, *key, metadata)
+                    self.stats["disk_hits"] += 1
+                    return metadata
+
+        metadata = probe_file(file_path)
+        with self._lock:
+            if metadata is None:
+                self.stats["failures"] += 1
+                return None
+            self.stats["probes"] += 1
+            self._remember(path, *key, metadata)
+            db = self._connection()
+            if db is not None:
+                try:
+                    db.execute(
+                        "INSERT OR REPLACE INTO audio_metadata VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (path, *key, *(getattr(metadata, c) for c in self._COLUMNS), time.time())
+                    )
+                    db.commit()
+                except sqlite3.Error as e:
+                    logger.warning(f"写入音频元数据缓存失败: {e}")
+        return metadata
+
+    def get_duration(self, file_path: str) -> Optional[float]:
+        metadata = self.probe(file_path)
+        return metadata.duration if metadata else None
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {"memory_entries": len(self._memory), "cache_path": self.cache_path, **self.stats}
+
+
+audio_metadata_service = AudioMetadataService()
+
+
+def get_audio_metadata_service() -> AudioMetadataService:
+    return audio_metadata_service
@@ -0,0 +1,277 @@
+"""
+音频压缩副本（rendition）服务
+按需将WAV转码为 Opus/MP3 播放副本：有界转码线程池、按 源指纹+配置 缓存到磁盘、
+超出容量按最近最少使用淘汰；新完成的章节在后台预热
+缓存目录可由多个进程共享：启动时按mtime扫描一次目录建立索引，此后增量维护占用；
+命中其他进程生成的副本时计入本进程索引并更新mtime
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import shutil
+import subprocess
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+RENDITION_CACHE_DIR = os.getenv("RENDITION_CACHE_DIR", "data/renditions")
+RENDITION_CACHE_MAX_MB = int(os.getenv("RENDITION_CACHE_MAX_MB", "4096"))
+RENDITION_WORKERS = int(os.getenv("RENDITION_WORKERS", "2"))
+RENDITION_TIMEOUT = int(os.getenv("RENDITION_TIMEOUT", "600"))
+RENDITION_PREWARM_PROFILES = os.getenv("RENDITION_PREWARM_PROFILES", "opus")
+OPUS_BITRATE = os.getenv("RENDITION_OPUS_BITRATE", "48k")
+MP3_BITRATE = os.getenv("RENDITION_MP3_BITRATE", "128k")
+
+
+@dataclass(frozen=True)
+class RenditionProfile:
+    """转码配置"""
+    name: str
+    codec: str
+    container: str
+    extension: str
+    media_type: str
+    bitrate: str
+
+    def ffmpeg_args(self) -> List[str]:
+        args = ["-vn", "-c:a", self.codec, "-b:a", self.bitrate]
+        if self.codec == "libopus":
+            # 有声书以语音为主，VBR在相同平均码率下音质更好
+            args += ["-vbr", "on", "-application", "audio"]
+        return args + ["-f", self.container]
+
+
+_CODECS = {
+    "opus": ("libopus", "ogg", "opus", "audio/ogg", OPUS_BITRATE),
+    "mp3": ("libmp3lame", "mp3", "mp3", "audio/mpeg", MP3_BITRATE),
+}
+
+
+def resolve_profile(rendition: str) -> RenditionProfile:
+    """
+    解析播放参数：opus / mp3 使用默认码率，opus-32k、mp3-96 等指定码率
+    """
+    codec_name, _, bitrate = rendition.strip().lower().partition("-")
+    if codec_name not in _CODECS:
+        raise ValueError(f"不支持的音频格式: {rendition}，可选: {', '.join(_CODECS)}")
+    codec, container, extension, media_type, default_bitrate = _CODECS[codec_name]
+    if bitrate:
+        digits = bitrate.rstrip("k")
+        if not digits.isdigit() or not 8 <= int(digits) <= 320:
+            raise ValueError(f"无效的码率: {bitrate}")
+        bitrate = f"{int(digits)}k"
+    else:
+        bitrate = default_bitrate
+    return RenditionProfile(
+        name=f"{codec_name}-{bitrate}", codec=codec, container=container,
+        extension=extension, media_type=media_type, bitrate=bitrate
+    )
+
+
+def _find_ffmpeg() -> Optional[str]:
+    return os.getenv("FFMPEG_PATH") or shutil.which("ffmpeg") or shutil.which("ffmpeg.exe")
+
+
+class AudioRenditionService:
+    """转码副本的生成、缓存与淘汰"""
+
+    def __init__(self, cache_dir: str = RENDITION_CACHE_DIR, max_bytes: int = RENDITION_CACHE_MAX_MB * 1024 * 1024,
+                 workers: int = RENDITION_WORKERS):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="rendition")
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, Future] = {}
+        self._index: Optional["OrderedDict[str, int]"] = None   # 路径 -> 大小，按访问顺序
+        self._total_bytes = 0
+
+    # ------------------------------------------------------------------
+    # 缓存索引
+    # ------------------------------------------------------------------
+
+    def _load_index(self):
+        """首次使用时扫描一次缓存目录，按mtime建立LRU顺序；此后由 _touch/_add/_evict 增量维护"""
+        if self._index is not None:
+            return
+        entries = []
+        if os.path.isdir(self.cache_dir):
+            for root, _, files in os.walk(self.cache_dir):
+                for name in files:
+                    if name.endswith(".tmp"):
+                        continue
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, path, stat.st_size))
+        entries.sort()
+        self._index = OrderedDict((path, size) for _, path, size in entries)
+        self._total_bytes = sum(self._index.values())
+
+    def _touch(self, path: str):
+        if path in self._index:
+            self._index.move_to_end(path)
+        else:
+            # 其他进程生成的副本
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                return
+            self._index[path] = size
+            self._total_bytes += size
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+
+    def _add(self, path: str):
+        """登记新副本并增量累计占用，超出容量时淘汰（持锁期间不扫描目录）"""
+        self._load_index()
+        size = os.path.getsize(path)
+        self._total_bytes += size - self._index.pop(path, 0)
+        self._index[path] = size
+        self._evict()
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and len(self._index) > 1:
+            path, size = self._index.popitem(last=False)
+            self._total_bytes -= size
+            try:
+                os.remove(path)
+                logger.info(f"淘汰音频副本: {path}")
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"删除音频副本失败: {path} - {e}")
+
+    # ------------------------------------------------------------------
+    # 转码
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def source_fingerprint(source_path: str) -> str:
+        """源文件指纹：绝对路径+mtime+大小，源文件被重新生成后自然失效"""
+        stat = os.stat(source_path)
+        raw = f"{os.path.abspath(source_path)}|{stat.st_mtime_ns}|{stat.st_size}"
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def rendition_path(self, source_path: str, profile: RenditionProfile) -> str:
+        key = self.source_fingerprint(source_path)
+        return os.path.join(self.cache_dir, key[:2], f"{key}.{profile.name}.{profile.extension}")
+
+    def _transcode(self, source_path: str, target: str, profile: RenditionProfile):
+        ffmpeg = _find_ffmpeg()
+        if not ffmpeg:
+            raise RuntimeError("FFmpeg未安装或不在PATH中，无法生成压缩音频")
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp_path = f"{target}.{threading.get_ident()}.tmp"
+        cmd = [ffmpeg, "-y", "-loglevel", "error", "-i", source_path] + profile.ffmpeg_args() + [tmp_path]
+        start = time.time()
+        try:
+            result = subprocess.run(cmd, capture_output=True, timeout=RENDITION_TIMEOUT)
+            if result.returncode != 0:
+                raise RuntimeError(f"转码失败: {result.stderr.decode('utf-8', 'ignore')[-500:]}")
+            os.replace(tmp_path, target)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        logger.info(f"生成音频副本 {profile.name}: {source_path} ({time.time() - start:.1f}s, "
+                    f"{os.path.getsize(source_path) // 1024}KB -> {os.path.getsize(target) // 1024}KB)")
+
+    def _run(self, key: str, source_path: str, target: str, profile: RenditionProfile) -> str:
+        try:
+            self._transcode(source_path, target, profile)
+            with self._lock:
+                self._add(target)
+            return target
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def submit(self, source_path: str, profile: RenditionProfile) -> Future:
+        """提交转码（命中缓存则返回已完成的Future；同一副本并发请求合并为一次转码）"""
+        target = self.rendition_path(source_path, profile)
+        with self._lock:
+            self._load_index()
+            if os.path.exists(target):
+                self._touch(target)
+                done: Future = Future()
+                done.set_result(target)
+                return done
+            future = self._inflight.get(target)
+            if future is None:
+                future = self._executor.submit(self._run, target, source_path, target, profile)
+                self._inflight[target] = future
+            return future
+
+    def get_rendition(self, source_path: str, rendition: str) -> str:
+        """同步获取副本路径（阻塞至转码完成）"""
+        return self.submit(source_path, resolve_profile(rendition)).result()
+
+    def prewarm(self, source_path: str, renditions: Optional[List[str]] = None):
+        """后台预热副本，不等待结果"""
+        names = renditions if renditions is not None else [
+            r.strip() for r in RENDITION_PREWARM_PROFILES.split(",") if r.strip()
+        ]
+        def log_failure(future: Future):
+            if future.exception():
+                logger.warning(f"预热音频副本失败: {source_path} - {future.exception()}")
+
+        for name in names:
+            try:
+                self.submit(source_path, resolve_profile(name)).add_done_callback(log_failure)
+            except Exception as e:
+                logger.warning(f"预热音频副本失败 {name}: {source_path} - {e}")
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            self._load_index()
+            return {
+                "cache_dir": self.cache_dir,
+                "entries": len(self._index),
+                "total_mb": round(self._total_bytes / (1024 * 1024), 2),
+                "max_mb": round(self.max_bytes / (1024 * 1024), 2),
+                "in_flight": len(self._inflight),
+            }
+
+
+audio_rendition_service = AudioRenditionService()
+
+
+def get_audio_rendition_service() -> AudioRenditionService:
+    return audio_rendition_service
+
+
+async def audio_playback_response(request, source_path: str, filename: Optional[str] = None,
+                                  rendition: Optional[str] = None, media_type: str = "audio/wav"):
+    """
+    播放接口统一响应：rendition 为空时返回原始WAV，否则返回对应压缩副本；均支持Range
+    转码失败、超时或副本不可读时回退为原始音频，播放不因副本问题中断
+    """
+    from fastapi import HTTPException
+    from app.utils.range_response import range_file_response
+
+    if not rendition or rendition.lower() in ("wav", "original"):
+        return range_file_response(request, source_path, media_type=media_type, filename=filename)
+
+    try:
+        profile = resolve_profile(rendition)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        path = await asyncio.wrap_future(audio_rendition_service.submit(source_path, profile))
+        rendition_filename = f"{os.path.splitext(filename)[0]}.{profile.extension}" if filename else None
+        # 副本可能在返回前被其他进程淘汰（FileNotFoundError 属于 OSError）
+        return range_file_response(request, path, media_type=profile.media_type, filename=rendition_filename)
+    except (RuntimeError, subprocess.TimeoutExpired, OSError) as e:
+        logger.error(f"生成音频副本失败，返回原始音频: {source_path} - {e}")
+        return range_file_response(request, source_path, media_type=media_type, filename=filename)
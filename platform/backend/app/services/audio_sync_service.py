@@ -9,7 +9,6 @@ import os
 import hashlib
 import logging
 import asyncio
-import wave
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional, Tuple
 from pathlib import Path
@@ -19,6 +18,8 @@ from sqlalchemy.orm import Session
 from sqlalchemy import and_, or_
 
 from app.database import SessionLocal
+from app.services.audio_metadata_service import get_audio_metadata_service
+from app.services.environment_sound_cache import index_environment_sound
 
 
 logger = logging.getLogger(__name__)
@@ -90,20 +91,18 @@ class AudioSyncService:
             # 计算MD5
             md5 = self.calculate_file_md5(file_path)
             
-            # 获取音频属性
+            # 获取音频属性（只读文件头，带缓存）
             duration = 0.0
             sample_rate = 44100
             channels = 2
             
-            if file_path.lower().endswith('.wav'):
-                try:
-                    with wave.open(file_path, 'r') as wav_file:
-                        frames = wav_file.getnframes()
-                        sample_rate = wav_file.getframerate()
-                        channels = wav_file.getnchannels()
-                        duration = frames / float(sample_rate)
-                except Exception as e:
-                    logger.warning(f"无法读取WAV文件信息 {file_path}: {e}")
+            metadata = get_audio_metadata_service().probe(file_path)
+            if metadata is not None:
+                duration = metadata.duration
+                sample_rate = metadata.sample_rate
+                channels = metadata.channels
+            else:
+                logger.warning(f"无法读取音频文件信息 {file_path}")
             
             return FileInfo(
                 path=file_path,
@@ -283,6 +282,7 @@ class AudioSyncService:
                             )
                             
                             db.add(environment_sound)
+                            index_environment_sound(db, environment_sound)
                             result.new_files += 1
                             logger.info(f"添加新环境音文件: {file_info.path}")
                         
@@ -0,0 +1,262 @@
+"""
+音频时间轴渲染器
+为整章预分配一块 float32 缓冲区：对话按顺序拼接、环境音按时间叠加，
+每个片段只解码一次并就地施加增益/淡入淡出/循环，最后单次写出到磁盘。
+替代 pydub 的 overlay/+= 链（每次操作都会复制整条累积音轨）
+
+输出格式与原 pydub 路径一致：采样率、声道数、位深取所有片段的最大值，
+且不低于 pydub 静音轨道的 11025Hz/单声道/16bit
+"""
+
+import logging
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+import soundfile as sf
+
+logger = logging.getLogger(__name__)
+
+# pydub 对应的采样位宽（24bit 在加载时会被扩展为 32bit）
+SUBTYPE_SAMPLE_WIDTH = {
+    "PCM_U8": 1,
+    "PCM_S8": 1,
+    "PCM_16": 2,
+    "PCM_24": 4,
+    "PCM_32": 4,
+    "FLOAT": 4,
+}
+WIDTH_SUBTYPE = {1: "PCM_U8", 2: "PCM_16", 4: "PCM_32"}
+WIDTH_DTYPE = {2: np.int16, 4: np.int32}
+
+WRITE_BLOCK_FRAMES = 1 << 18
+
+
+@dataclass
+class TimelineClip:
+    """叠加到时间轴上的片段（时间单位：秒）"""
+    file_path: str
+    start_time: float = 0.0
+    end_time: Optional[float] = None      # 超出部分截断
+    gain: float = 1.0                     # 线性增益
+    fade_in: float = 0.0
+    fade_out: float = 0.0
+    loop: bool = False                    # 片段短于 [start_time, end_time] 时循环填满
+
+
+@dataclass
+class ClipInfo:
+    """文件头信息"""
+    frames: int
+    sample_rate: int
+    channels: int
+    sample_width: int
+
+
+@dataclass
+class RenderedAudio:
+    """渲染结果：samples 为 (帧数, 声道数) 的 float32 数组，幅度归一化到 [-1, 1)"""
+    samples: np.ndarray
+    sample_rate: int
+    sample_width: int
+
+    @property
+    def channels(self) -> int:
+        return self.samples.shape[1]
+
+    @property
+    def duration(self) -> float:
+        return len(self.samples) / self.sample_rate
+
+    def write(self, path: str):
+        """单次顺序写出为WAV"""
+        write_rendered_sequence([self], path)
+
+
+def read_clip_info(file_path: str) -> Optional[ClipInfo]:
+    """只读取文件头，无法识别时返回 None"""
+    try:
+        info = sf.info(file_path)
+    except Exception as e:
+        logger.error(f"读取音频信息失败 {file_path}: {str(e)}")
+        return None
+    return ClipInfo(
+        frames=info.frames,
+        sample_rate=info.samplerate,
+        channels=info.channels,
+        sample_width=SUBTYPE_SAMPLE_WIDTH.get(info.subtype, 2),
+    )
+
+
+def convert_channels(data: np.ndarray, channels: int) -> np.ndarray:
+    """声道转换：单声道复制到各声道，多声道下混取平均（与 pydub set_channels 一致）"""
+    if data.shape[1] == channels:
+        return data
+    if data.shape[1] == 1:
+        return np.repeat(data, channels, axis=1)
+    mono = data.mean(axis=1, keepdims=True, dtype=np.float32)
+    return mono if channels == 1 else np.repeat(mono, channels, axis=1)
+
+
+def resample_linear(data: np.ndarray, source_rate: int, target_rate: int) -> np.ndarray:
+    """线性插值重采样（pydub 的 audioop.ratecv 同为线性插值）"""
+    if source_rate == target_rate or len(data) == 0:
+        return data
+    target_frames = int(len(data) * target_rate / source_rate)
+    positions = np.arange(target_frames, dtype=np.float64) * (source_rate / target_rate)
+    source_index = np.arange(len(data), dtype=np.float64)
+    resampled = np.empty((target_frames, data.shape[1]), dtype=np.float32)
+    for channel in range(data.shape[1]):
+        resampled[:, channel] = np.interp(positions, source_index, data[:, channel])
+    return resampled
+
+
+def ms_to_frames(milliseconds: float, sample_rate: int) -> int:
+    """pydub 按毫秒切片的帧数换算"""
+    return int(milliseconds * sample_rate / 1000.0)
+
+
+def apply_fades(data: np.ndarray, sample_rate: int, fade_in: float, fade_out: float):
+    """就地施加线性淡入淡出"""
+    fade_in_frames = min(len(data), int(fade_in * sample_rate))
+    if fade_in_frames > 0:
+        data[:fade_in_frames] *= np.linspace(0.0, 1.0, fade_in_frames, endpoint=False, dtype=np.float32)[:, None]
+    fade_out_frames = min(len(data), int(fade_out * sample_rate))
+    if fade_out_frames > 0:
+        data[-fade_out_frames:] *= np.linspace(1.0, 0.0, fade_out_frames, endpoint=False, dtype=np.float32)[:, None]
+
+
+class TimelineRenderer:
+    """
+    时间轴渲染器
+    先读取所有片段的文件头确定输出格式与总长度，再分配缓冲区并逐个解码写入
+    """
+
+    def __init__(
+        self,
+        placeholder_seconds: float = 3.0,
+        min_sample_rate: int = 11025,
+        min_channels: int = 1,
+        min_sample_width: int = 2
+    ):
+        self.placeholder_seconds = placeholder_seconds
+        self.min_sample_rate = min_sample_rate
+        self.min_channels = min_channels
+        self.min_sample_width = min_sample_width
+
+    def render(self, sequence: Sequence[str], overlays: Sequence[TimelineClip] = ()) -> RenderedAudio:
+        """
+        渲染时间轴
+
+        Args:
+            sequence: 顺序拼接的音频文件（对话），无法读取的文件以静音占位
+            overlays: 叠加片段（环境音），超出拼接总长度的部分被截断
+
+        Returns:
+            渲染结果
+        """
+        sequence_infos = [read_clip_info(path) for path in sequence]
+        overlay_infos = [read_clip_info(clip.file_path) for clip in overlays]
+        sample_rate, channels, sample_width = self._output_format(
+            [info for info in sequence_infos + overlay_infos if info]
+        )
+
+        # 拼接段在输出采样率下的起止帧
+        placements: List[Tuple[str, Optional[ClipInfo], int, int]] = []
+        position = 0
+        for path, info in zip(sequence, sequence_infos):
+            if info is None:
+                logger.error(f"加载音频文件失败 {path}，以 {self.placeholder_seconds}s 静音占位")
+                frames = int(self.placeholder_seconds * sample_rate)
+            elif info.sample_rate == sample_rate:
+                frames = info.frames
+            else:
+                frames = int(info.frames * sample_rate / info.sample_rate)
+            placements.append((path, info, position, frames))
+            position += frames
+
+        buffer = np.zeros((position, channels), dtype=np.float32)
+
+        for path, info, start, frames in placements:
+            if info is None:
+                continue
+            data = self._decode(path, info, sample_rate, channels)
+            if data is not None:
+                count = min(frames, len(data))
+                buffer[start:start + count] = data[:count]
+
+        for clip, info in zip(overlays, overlay_infos):
+            if info is None:
+                continue
+            self._overlay(buffer, clip, info, sample_rate, channels)
+
+        return RenderedAudio(samples=buffer, sample_rate=sample_rate, sample_width=sample_width)
+
+    def _output_format(self, infos: List[ClipInfo]) -> Tuple[int, int, int]:
+        sample_rate = max([self.min_sample_rate] + [info.sample_rate for info in infos])
+        channels = max([self.min_channels] + [info.channels for info in infos])
+        sample_width = max([self.min_sample_width] + [info.sample_width for info in infos])
+        return sample_rate, channels, sample_width
+
+    def _decode(self, path: str, info: ClipInfo, sample_rate: int, channels: int) -> Optional[np.ndarray]:
+        try:
+            data, _ = sf.read(path, dtype="float32", always_2d=True)
+        except Exception as e:
+            logger.error(f"解码音频文件失败 {path}: {str(e)}")
+            return None
+        data = convert_channels(data, channels)
+        return resample_linear(data, info.sample_rate, sample_rate)
+
+    def _overlay(self, buffer: np.ndarray, clip: TimelineClip, info: ClipInfo, sample_rate: int, channels: int):
+        start_ms = int(clip.start_time * 1000)
+        start = ms_to_frames(start_ms, sample_rate)
+        if start >= len(buffer):
+            return
+
+        data = self._decode(clip.file_path, info, sample_rate, channels)
+        if data is None or len(data) == 0:
+            return
+
+        length = len(buffer) - start
+        if clip.end_time is not None:
+            length = min(length, ms_to_frames(int(clip.end_time * 1000) - start_ms, sample_rate))
+        if clip.loop and len(data) < length:
+            data = np.tile(data, (-(-length // len(data)), 1))
+        data = data[:length]
+
+        if clip.gain != 1.0:
+            data *= np.float32(clip.gain)
+        if clip.fade_in or clip.fade_out:
+            apply_fades(data, sample_rate, clip.fade_in, clip.fade_out)
+
+        buffer[start:start + len(data)] += data
+
+
+def write_rendered_sequence(renders: Sequence[RenderedAudio], path: str):
+    """
+    按顺序把多段渲染结果写入同一个WAV文件（不做整体拼接复制）
+    各段格式不同时统一到最大采样率/声道数/位深
+    """
+    if not renders:
+        raise ValueError("没有可写出的音频")
+
+    sample_rate = max(render.sample_rate for render in renders)
+    channels = max(render.channels for render in renders)
+    sample_width = max(render.sample_width for render in renders)
+    subtype = WIDTH_SUBTYPE.get(sample_width, "PCM_16")
+    dtype = WIDTH_DTYPE.get(sample_width)
+
+    with sf.SoundFile(path, "w", samplerate=sample_rate, channels=channels, subtype=subtype, format="WAV") as output:
+        for render in renders:
+            samples = render.samples
+            if render.sample_rate != sample_rate or render.channels != channels:
+                samples = resample_linear(convert_channels(samples, channels), render.sample_rate, sample_rate)
+            for offset in range(0, len(samples), WRITE_BLOCK_FRAMES):
+                block = samples[offset:offset + WRITE_BLOCK_FRAMES]
+                if dtype is None:
+                    output.write(np.clip(block, -1.0, 1.0))
+                    continue
+                # 四舍五入并饱和到整数范围（对应 pydub 的饱和加法）
+                scale = float(np.iinfo(dtype).max) + 1.0
+                scaled = np.rint(block.astype(np.float64) * scale)
+                output.write(np.clip(scaled, -scale, scale - 1.0).astype(dtype))
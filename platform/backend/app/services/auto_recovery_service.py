@@ -91,7 +91,7 @@ class AutoRecoveryService:
     async def _fix_chapter_number_mismatch(self, project_id: int, issue: str) -> bool:
         """修复章节号不匹配问题"""
         try:
-            from ..models import NovelProject, BookChapter, AnalysisResult
+            from ..models import NovelProject, BookChapter
             
             # 获取项目信息
             project = self.db.query(NovelProject).filter(NovelProject.id == project_id).first()
@@ -104,37 +104,13 @@ class AutoRecoveryService:
             ).all()
             chapter_mapping = {ch.id: ch.chapter_number for ch in chapters}
             
-            # 获取分析结果并修复
-            analysis_results = self.db.query(AnalysisResult).filter(
-                AnalysisResult.chapter_id.in_(list(chapter_mapping.keys()))
-            ).all()
-            
-            fixed_count = 0
-            for analysis in analysis_results:
-                if not analysis.synthesis_plan:
-                    continue
-                
-                synthesis_plan = analysis.synthesis_plan
-                if 'synthesis_plan' in synthesis_plan:
-                    segments = synthesis_plan['synthesis_plan']
-                    corrected = False
-                    
-                    for segment in segments:
-                        chapter_id = segment.get('chapter_id')
-                        if chapter_id and chapter_id in chapter_mapping:
-                            correct_chapter_number = chapter_mapping[chapter_id]
-                            if segment.get('chapter_number') != correct_chapter_number:
-                                segment['chapter_number'] = correct_chapter_number
-                                corrected = True
-                    
-                    if corrected:
-                        # 标记为已修改并保存
-                        analysis.synthesis_plan = synthesis_plan
-                        fixed_count += 1
+            # 只修正章节号不一致的段落行
+            from .synthesis_plan_service import fix_segment_chapter_numbers
+            fixed_count = fix_segment_chapter_numbers(self.db, chapter_mapping)
             
             if fixed_count > 0:
                 self.db.commit()
-                logger.info(f"[AUTO_RECOVERY] 修复了 {fixed_count} 个章节号不匹配问题")
+                logger.info(f"[AUTO_RECOVERY] 修复了 {fixed_count} 个段落的章节号不匹配问题")
                 return True
             
         except Exception as e:
@@ -1,8 +1,10 @@
 import os
+import copy
+import itertools
 import json
 import hashlib
 import secrets
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
 from sqlalchemy import desc, and_
@@ -17,6 +19,7 @@ from app.schemas.collaboration import (
     BatchExportRequest, BatchExportResponse
 )
 from app.services.moviepy_service import MoviePyService
+from app.services.edit_history_delta import EditHistoryCodec, EDIT_HISTORY_RETAIN_VERSIONS, is_delta
 import logging
 
 logger = logging.getLogger(__name__)
@@ -31,6 +34,11 @@ class CollaborationService:
         self.template_dir = "storage/templates"
         self.cloud_storage_dir = "storage/cloud"
         
+        # 编辑历史：关键帧 + 增量；记住每个项目最新快照，写入增量时无需回读历史
+        self.history_codec = EditHistoryCodec()
+        self.history_retain_versions = EDIT_HISTORY_RETAIN_VERSIONS
+        self._history_heads: Dict[int, Tuple[int, int, Dict[str, Any], int]] = {}
+        
         # 确保目录存在
         os.makedirs(self.export_dir, exist_ok=True)
         os.makedirs(self.template_dir, exist_ok=True)
@@ -113,24 +121,35 @@ class CollaborationService:
     def save_edit_history(self, db: Session, project_id: int, operation_type: str, 
                          operation_data: Dict[str, Any], snapshot_data: Optional[Dict[str, Any]] = None,
                          user_id: Optional[int] = None) -> EditHistory:
-        """保存编辑历史"""
+        """
+        保存编辑历史
+        快照每隔若干版本存一次完整关键帧，其余版本只存相对上一快照的差异
+        """
         try:
             from app.models.audio_editor import EditHistoryModel
             
             # 获取当前项目的最新版本号
-            latest_version = db.query(EditHistoryModel)\
+            latest_version = db.query(EditHistoryModel.version_number)\
                 .filter(EditHistoryModel.project_id == project_id)\
                 .order_by(desc(EditHistoryModel.version_number))\
                 .first()
             
-            version_number = (latest_version.version_number + 1) if latest_version else 1
+            latest_number = latest_version.version_number if latest_version else 0
+            version_number = latest_number + 1
+            
+            stored_snapshot = None
+            head = None
+            if snapshot_data is not None:
+                base = self._history_head(db, project_id, latest_number)
+                stored_snapshot, chain_length = self.history_codec.encode(snapshot_data, base)
+                head = (version_number, version_number, copy.deepcopy(snapshot_data), chain_length)
             
             history = EditHistoryModel(
                 project_id=project_id,
                 version_number=version_number,
                 operation_type=operation_type,
                 operation_data=operation_data,
-                snapshot_data=snapshot_data,
+                snapshot_data=stored_snapshot,
                 user_id=user_id,
                 created_at=datetime.now()
             )
@@ -139,16 +158,132 @@ class CollaborationService:
             db.commit()
             db.refresh(history)
             
+            cached = self._history_heads.get(project_id)
+            if head is not None:
+                self._history_heads[project_id] = head
+            elif cached is not None and cached[0] == latest_number:
+                self._history_heads[project_id] = (version_number,) + cached[1:]
+            
+            # 写入关键帧时顺带压缩过旧的版本
+            if head is not None and head[3] == 0:
+                self.compact_edit_history(db, project_id)
+            
             logger.info(f"Saved edit history for project {project_id}, version {version_number}")
-            return EditHistory.from_orm(history)
+            result = EditHistory.from_orm(history)
+            result.snapshot_data = snapshot_data
+            return result
             
         except Exception as e:
             logger.error(f"Error saving edit history: {str(e)}")
             db.rollback()
             raise
     
+    def _history_head(self, db: Session, project_id: int,
+                      latest_number: int) -> Optional[Tuple[int, Dict[str, Any], int]]:
+        """最新一个有快照的版本 (版本号, 快照, 距关键帧增量数)，用作新增量的基准"""
+        cached = self._history_heads.get(project_id)
+        if cached is not None and cached[0] == latest_number:
+            return cached[1:]
+        
+        # 缓存失效（进程重启或其他进程写入）：从最近的关键帧重建
+        chain = self._snapshot_chain(db, project_id, latest_number)
+        for head_version, snapshot_data in chain:
+            if snapshot_data is not None:
+                break
+        else:
+            return None
+        snapshot, chain_length = self.history_codec.reconstruct(
+            itertools.chain([(head_version, snapshot_data)], chain), head_version
+        )
+        if snapshot is None:
+            return None
+        self._history_heads[project_id] = (latest_number, head_version, snapshot, chain_length)
+        return head_version, snapshot, chain_length
+    
+    def _snapshot_chain(self, db: Session, project_id: int, version_number: int):
+        """按版本号降序逐批读取 (版本号, snapshot_data)，调用方遇到关键帧即停止读取"""
+        from app.models.audio_editor import EditHistoryModel
+        
+        rows = db.query(EditHistoryModel.version_number, EditHistoryModel.snapshot_data)\
+            .filter(and_(
+                EditHistoryModel.project_id == project_id,
+                EditHistoryModel.version_number <= version_number
+            ))\
+            .order_by(desc(EditHistoryModel.version_number))\
+            .yield_per(self.history_codec.keyframe_interval + 1)
+        for row in rows:
+            yield row.version_number, row.snapshot_data
+    
+    def reconstruct_version(self, db: Session, project_id: int, version_number: int) -> Optional[Dict[str, Any]]:
+        """重建指定版本的完整快照；该版本没有快照时返回 None"""
+        cached = self._history_heads.get(project_id)
+        if cached is not None and cached[1] == version_number:
+            return copy.deepcopy(cached[2])
+        snapshot, _ = self.history_codec.reconstruct(
+            self._snapshot_chain(db, project_id, version_number), version_number
+        )
+        return snapshot
+    
+    def compact_edit_history(self, db: Session, project_id: int, retain_versions: Optional[int] = None) -> int:
+        """
+        压缩旧版本：只保留最近 retain_versions 个版本的快照，更早版本只留操作记录；
+        保留区第一个快照若为增量则改写为关键帧，保证保留的版本都可重建
+        
+        Returns:
+            被清除快照的版本数
+        """
+        retain_versions = self.history_retain_versions if retain_versions is None else retain_versions
+        if retain_versions <= 0:
+            return 0
+        try:
+            from app.models.audio_editor import EditHistoryModel
+            
+            latest_version = db.query(EditHistoryModel.version_number)\
+                .filter(EditHistoryModel.project_id == project_id)\
+                .order_by(desc(EditHistoryModel.version_number))\
+                .first()
+            if not latest_version or latest_version.version_number <= retain_versions:
+                return 0
+            cutoff = latest_version.version_number - retain_versions
+            
+            old_rows = db.query(EditHistoryModel)\
+                .filter(and_(
+                    EditHistoryModel.project_id == project_id,
+                    EditHistoryModel.version_number <= cutoff,
+                    EditHistoryModel.snapshot_data.isnot(None)
+                )).all()
+            old_rows = [row for row in old_rows if row.snapshot_data is not None]
+            if not old_rows:
+                return 0
+            
+            first_retained = db.query(EditHistoryModel)\
+                .filter(and_(
+                    EditHistoryModel.project_id == project_id,
+                    EditHistoryModel.version_number > cutoff
+                ))\
+                .order_by(EditHistoryModel.version_number).all()
+            for row in first_retained:
+                if row.snapshot_data is None:
+                    continue
+                snapshot = self.reconstruct_version(db, project_id, row.version_number)
+                if snapshot is not None:
+                    row.snapshot_data = snapshot
+                break
+            
+            for row in old_rows:
+                row.snapshot_data = None
+            db.commit()
+            
+            logger.info(f"Compacted edit history for project {project_id}: {len(old_rows)} versions before {cutoff + 1}")
+            return len(old_rows)
+            
+        except Exception as e:
+            logger.error(f"Error compacting edit history for project {project_id}: {str(e)}")
+            db.rollback()
+            return 0
+    
     def get_edit_history(self, db: Session, project_id: int, limit: int = 50) -> List[EditHistory]:
-        """获取编辑历史"""
+        """获取编辑历史（快照按需从关键帧和增量重建）"""
         try:
             from app.models.audio_editor import EditHistoryModel
             
@@ -156,8 +291,24 @@ class CollaborationService:
                 .filter(EditHistoryModel.project_id == project_id)\
                 .order_by(desc(EditHistoryModel.version_number))\
                 .limit(limit).all()
-            
-            return [EditHistory.from_orm(h) for h in histories]
+            if not histories:
+                return []
+            
+            # 从最早返回版本之前的关键帧起，一次遍历重建所有返回版本
+            chain = []
+            for version, snapshot_data in self._snapshot_chain(db, project_id, histories[0].version_number):
+                chain.append((version, snapshot_data))
+                if version <= histories[-1].version_number and snapshot_data is not None \
+                        and not is_delta(snapshot_data):
+                    break
+            snapshots = self.history_codec.materialize(reversed(chain), [h.version_number for h in histories])
+            
+            results = []
+            for history in histories:
+                item = EditHistory.from_orm(history)
+                item.snapshot_data = snapshots.get(history.version_number)
+                results.append(item)
+            return results
             
         except Exception as e:
             logger.error(f"Error getting edit history for project {project_id}: {str(e)}")
@@ -166,25 +317,18 @@ class CollaborationService:
     def revert_to_version(self, db: Session, project_id: int, version_number: int) -> Optional[Dict[str, Any]]:
         """回滚到指定版本"""
         try:
-            from app.models.audio_editor import EditHistoryModel
-            
-            history = db.query(EditHistoryModel)\
-                .filter(and_(
-                    EditHistoryModel.project_id == project_id,
-                    EditHistoryModel.version_number == version_number
-                )).first()
-            
-            if not history or not history.snapshot_data:
+            snapshot_data = self.reconstruct_version(db, project_id, version_number)
+            if not snapshot_data:
                 return None
             
             # 创建回滚操作记录
             self.save_edit_history(
                 db, project_id, "revert",
                 {"reverted_to_version": version_number},
-                history.snapshot_data
+                snapshot_data
             )
             
-            return history.snapshot_data
+            return snapshot_data
             
         except Exception as e:
             logger.error(f"Error reverting project {project_id} to version {version_number}: {str(e)}")
@@ -699,6 +699,11 @@ class ContentPreparationService:
         # 🤖 新增：AI二次分析处理未知角色
         segments = await self._ai_reanalyze_unknown_segments(segments, detected_characters)
         
+        # 🔥 TTS优化：整章批量推断参数（少量LLM调用，放到线程中避免阻塞事件循环）
+        batch_tts_params = await self._get_optimized_tts_params_batch(
+            segments, tts_optimization_mode, detected_characters
+        )
+        
         synthesis_plan = []
         
         for i, segment in enumerate(segments):
@@ -746,7 +751,7 @@ class ContentPreparationService:
                     logger.warning(f"⚠️ 角色'{speaker}'既不在角色配音库中，也没有传统映射，需要用户手动分配")
             
             # 🔥 TTS优化：根据模式调整参数
-            tts_params = self._get_optimized_tts_params(speaker, tts_optimization_mode, segment)
+            tts_params = batch_tts_params[i]
             
             # 🔥 架构修复：获取章节信息并强制添加到segment_data
             chapter_number = None
@@ -947,37 +952,44 @@ class ContentPreparationService:
         # 完全匹配现有系统格式
         return final_synthesis_data
 
-    def _get_optimized_tts_params(self, speaker: str, optimization_mode: str, segment: Dict) -> Dict:
-        """获取优化的TTS参数"""
+    # 获取TTS参数失败时的默认参数
+    FALLBACK_TTS_PARAMS = {
+        "speed": 1.0,
+        "pitch": 1.0,
+        "volume": 1.0,
+        "emotion": "neutral"
+    }
+    
+    def _get_tts_optimizer(self) -> AITTSOptimizer:
+        """获取（延迟创建的）共享TTS优化器；优化模式按调用传入，不修改其共享状态"""
+        if not self.tts_optimizer:
+            self.tts_optimizer = AITTSOptimizer(self.ollama_detector)
+        return self.tts_optimizer
+    
+    async def _get_optimized_tts_params_batch(
+        self,
+        segments: List[Dict],
+        optimization_mode: str,
+        detected_characters: List[Dict]
+    ) -> List[Dict]:
+        """
+        批量获取整章段落的TTS参数（与 segments 一一对应）
+        参数按合成计划中的说话人推断：空说话人按旁白处理
+        """
+        normalized = [
+            {**segment, 'speaker': segment.get('speaker', '').strip() or '旁白'}
+            for segment in segments
+        ]
+        # fast 模式只用默认参数，quality / balanced 启用AI分析
+        enable_ai_analysis = optimization_mode != "fast"
         try:
-            # 🎯 智能TTS参数配置 - 基于角色和文本内容
-            if not self.tts_optimizer:
-                from ..services.ai_tts_optimizer import AITTSOptimizer
-                self.tts_optimizer = AITTSOptimizer(self.ollama_detector)
-                # 根据优化模式配置TTS分析
-                if optimization_mode == "fast":
-                    self.tts_optimizer.set_enable_ai_analysis(False)
-                    logger.info("🚀 TTS优化器设置为快速模式（禁用AI分析）")
-                elif optimization_mode == "quality":
-                    self.tts_optimizer.set_enable_ai_analysis(True)
-                    logger.info("🎯 TTS优化器设置为质量模式（启用AI分析）")
-                else:  # balanced
-                    self.tts_optimizer.set_enable_ai_analysis(True)
-                    logger.info("⚖️ TTS优化器设置为平衡模式")
-            
-            # 获取智能TTS参数
-            tts_params = self.tts_optimizer.get_smart_tts_params(segment, [])
-            return tts_params
-            
+            return await asyncio.to_thread(
+                self._get_tts_optimizer().get_smart_tts_params_batch,
+                normalized, detected_characters, enable_ai_analysis
+            )
         except Exception as e:
-            logger.warning(f"获取TTS参数失败: {str(e)}，使用默认参数")
-            # 返回默认参数
-            return {
-                "speed": 1.0,
-                "pitch": 1.0,
-                "volume": 1.0,
-                "emotion": "neutral"
-            }
+            logger.warning(f"批量获取TTS参数失败: {str(e)}，使用默认参数")
+            return [dict(self.FALLBACK_TTS_PARAMS) for _ in segments]
     
 
     
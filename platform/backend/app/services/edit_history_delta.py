@@ -0,0 +1,223 @@
+"""
+编辑历史增量编码
+每隔 N 次编辑保存一次完整快照（关键帧），其余版本只保存相对上一快照的结构化 JSON 差异；
+任意版本可从最近的关键帧顺序应用差异重建。
+增量记录存放在 snapshot_data 中，形如 {"__delta__": {"base": 基准版本号, "ops": [...]}}；
+不带该标记的 snapshot_data 即完整快照（关键帧与历史旧数据）
+"""
+
+import copy
+import json
+import os
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+EDIT_HISTORY_KEYFRAME_INTERVAL = int(os.getenv("EDIT_HISTORY_KEYFRAME_INTERVAL", "20"))
+# 差异体积超过完整快照的该比例时直接保存关键帧
+EDIT_HISTORY_MAX_DELTA_RATIO = float(os.getenv("EDIT_HISTORY_MAX_DELTA_RATIO", "0.5"))
+# 每个项目保留可回滚快照的最近版本数，更早版本压缩为只保留操作记录（0 表示不压缩）
+EDIT_HISTORY_RETAIN_VERSIONS = int(os.getenv("EDIT_HISTORY_RETAIN_VERSIONS", "500"))
+
+DELTA_KEY = "__delta__"
+
+
+# ==================== 结构化差异 ====================
+
+def diff(old: Any, new: Any, path: Tuple = ()) -> List[list]:
+    """
+    计算把 old 变为 new 的操作列表
+
+    操作格式：
+        ["set", path, value]                    设置（或新增）path 处的值
+        ["del", path]                           删除字典键
+        ["splice", path, start, count, items]   替换列表 [start, start+count) 为 items
+    """
+    if type(old) is not type(new):
+        return [["set", list(path), copy.deepcopy(new)]]
+
+    if isinstance(old, dict):
+        ops = []
+        for key in old:
+            if key not in new:
+                ops.append(["del", list(path + (key,))])
+        for key, value in new.items():
+            if key not in old:
+                ops.append(["set", list(path + (key,)), copy.deepcopy(value)])
+            elif old[key] != value:
+                ops.extend(diff(old[key], value, path + (key,)))
+        return ops
+
+    if isinstance(old, list):
+        return _diff_list(old, new, path)
+
+    if old != new:
+        return [["set", list(path), copy.deepcopy(new)]]
+    return []
+
+
+def _diff_list(old: list, new: list, path: Tuple) -> List[list]:
+    # 去掉相同的前缀和后缀，只处理中间变化的部分
+    start = 0
+    while start < len(old) and start < len(new) and old[start] == new[start]:
+        start += 1
+    old_end, new_end = len(old), len(new)
+    while old_end > start and new_end > start and old[old_end - 1] == new[new_end - 1]:
+        old_end -= 1
+        new_end -= 1
+
+    if old_end - start == new_end - start:
+        # 等长：逐项比较，容器元素递归（如修改某个片段的一个属性）
+        ops = []
+        for index in range(start, old_end):
+            ops.extend(diff(old[index], new[index], path + (index,)))
+        return ops
+    if old_end == start and new_end == start:
+        return []
+    return [["splice", list(path), start, old_end - start, copy.deepcopy(new[start:new_end])]]
+
+
+def _resolve(doc: Any, path: List) -> Tuple[Any, Any]:
+    parent = doc
+    for key in path[:-1]:
+        parent = parent[key]
+    return parent, path[-1]
+
+
+def apply(doc: Any, ops: Iterable[list], in_place: bool = False) -> Any:
+    """应用操作列表，返回新文档（in_place 为真时直接修改 doc）"""
+    if not in_place:
+        doc = copy.deepcopy(doc)
+    for op in ops:
+        kind, path = op[0], op[1]
+        if kind == "set":
+            if not path:
+                doc = copy.deepcopy(op[2])
+                continue
+            parent, key = _resolve(doc, path)
+            value = copy.deepcopy(op[2])
+            if isinstance(parent, list) and key == len(parent):
+                parent.append(value)
+            else:
+                parent[key] = value
+        elif kind == "del":
+            parent, key = _resolve(doc, path)
+            del parent[key]
+        elif kind == "splice":
+            target = doc
+            for key in path:
+                target = target[key]
+            start, count, items = op[2], op[3], op[4]
+            target[start:start + count] = copy.deepcopy(items)
+        else:
+            raise ValueError(f"未知的差异操作: {kind}")
+    return doc
+
+
+# ==================== 版本链 ====================
+
+def is_delta(snapshot_data: Any) -> bool:
+    return isinstance(snapshot_data, dict) and DELTA_KEY in snapshot_data and len(snapshot_data) == 1
+
+
+def _size(value: Any) -> int:
+    return len(json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=str))
+
+
+class EditHistoryCodec:
+    """决定每个版本存关键帧还是增量，并从版本链重建快照"""
+
+    def __init__(self, keyframe_interval: int = EDIT_HISTORY_KEYFRAME_INTERVAL,
+                 max_delta_ratio: float = EDIT_HISTORY_MAX_DELTA_RATIO):
+        self.keyframe_interval = max(1, keyframe_interval)
+        self.max_delta_ratio = max_delta_ratio
+
+    def encode(self, snapshot: Dict[str, Any], base: Optional[Tuple[int, Dict[str, Any], int]]) -> Tuple[Any, int]:
+        """
+        编码新版本的快照
+
+        Args:
+            snapshot: 新版本的完整快照
+            base: (基准版本号, 基准快照, 基准距上个关键帧的增量数)；没有可用基准时为 None
+
+        Returns:
+            (写入 snapshot_data 的值, 新版本距上个关键帧的增量数，关键帧为 0)
+        """
+        if base is None:
+            return copy.deepcopy(snapshot), 0
+        base_version, base_snapshot, chain_length = base
+        if chain_length + 1 >= self.keyframe_interval:
+            return copy.deepcopy(snapshot), 0
+
+        ops = diff(base_snapshot, snapshot)
+        if _size(ops) > self.max_delta_ratio * _size(snapshot):
+            return copy.deepcopy(snapshot), 0
+        return {DELTA_KEY: {"base": base_version, "ops": ops}}, chain_length + 1
+
+    @staticmethod
+    def reconstruct(chain: Iterable[Tuple[int, Any]],
+                    target_version: Optional[int] = None) -> Tuple[Optional[Dict[str, Any]], int]:
+        """
+        从版本链重建快照
+
+        Args:
+            chain: 按版本号降序排列的 (版本号, snapshot_data)，从目标版本开始，遇到关键帧即可停止；
+                   snapshot_data 为空的版本被跳过
+            target_version: 目标版本号；链中第一个有快照的版本不是它时返回 None
+
+        Returns:
+            (目标版本的快照, 目标版本距关键帧的增量数)；目标无快照或链断裂时快照为 None
+        """
+        deltas = []
+        keyframe = None
+        expected = target_version
+        for version, snapshot_data in chain:
+            if snapshot_data is None:
+                continue
+            if expected is not None and version != expected:
+                if version < expected:
+                    return None, 0  # 目标版本（或被引用的基准版本）没有快照
+                continue
+            if is_delta(snapshot_data):
+                deltas.append(snapshot_data[DELTA_KEY]["ops"])
+                expected = snapshot_data[DELTA_KEY]["base"]
+                continue
+            keyframe = snapshot_data
+            break
+        if keyframe is None:
+            return None, 0
+
+        snapshot = copy.deepcopy(keyframe)
+        for ops in reversed(deltas):
+            snapshot = apply(snapshot, ops, in_place=True)
+        return snapshot, len(deltas)
+
+    @staticmethod
+    def materialize(chain: Iterable[Tuple[int, Any]], versions: Iterable[int]) -> Dict[int, Dict[str, Any]]:
+        """
+        一次遍历重建多个版本
+
+        Args:
+            chain: 按版本号升序排列的 (版本号, snapshot_data)，须从不晚于最小目标版本的关键帧开始
+            versions: 需要的版本号
+
+        Returns:
+            版本号 -> 快照（无快照的版本不出现）
+        """
+        wanted = set(versions)
+        result = {}
+        current = None
+        current_version = None
+        for version, snapshot_data in chain:
+            if snapshot_data is None:
+                continue
+            if is_delta(snapshot_data):
+                delta = snapshot_data[DELTA_KEY]
+                if current is None or delta["base"] != current_version:
+                    current = None  # 链断裂：直到下一个关键帧前都无法重建
+                    continue
+                current = apply(current, delta["ops"], in_place=current_version not in result)
+            else:
+                current = copy.deepcopy(snapshot_data)
+            current_version = version
+            if version in wanted:
+                result[version] = current
+        return result
@@ -0,0 +1,458 @@
+"""
+环境音生成缓存
+TangoFlux 每条音频需要数十秒，同一系列作品中“雨声”“脚步声”“人群”等场景反复出现。
+生成结果按 规范化提示词 + 时长档位 + 推理步数 + 引导强度 寻址，音频文件按内容哈希存储；
+相同请求并发到达时共享同一次生成。
+
+同时维护环境音关键词索引表（environment_sound_keywords）：名称、提示词的 1~2 字符片段与完整标签。
+check_existing_environment_sound 按子串语义查找（"雨" 可匹配 "下雨声"），先用片段索引筛出候选，
+再逐条核对，不再逐条扫描 EnvironmentSound
+"""
+
+import asyncio
+import hashlib
+import logging
+import math
+import os
+import re
+import threading
+import unicodedata
+from dataclasses import dataclass, replace
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.models.environment_sound import EnvironmentSound, EnvironmentSoundCacheEntry, EnvironmentSoundKeyword
+
+logger = logging.getLogger(__name__)
+
+ENVIRONMENT_SOUND_CACHE_DIR = os.getenv("ENVIRONMENT_SOUND_CACHE_DIR", "data/environment_cache")
+ENVIRONMENT_SOUND_DURATION_BUCKET = float(os.getenv("ENVIRONMENT_SOUND_DURATION_BUCKET", "5"))
+ENVIRONMENT_SOUND_MEMORY_ENTRIES = int(os.getenv("ENVIRONMENT_SOUND_MEMORY_ENTRIES", "4096"))
+
+# 名称/提示词按字符切成 1~KEYWORD_NGRAM 长的片段建索引，中文没有分隔符也能按子串查找
+KEYWORD_NGRAM = 2
+KEYWORD_MAX_LENGTH = 100
+
+
+def normalize_prompt(prompt: str) -> str:
+    """规范化提示词：全角转半角、小写、统一分隔符与空白、去掉首尾标点"""
+    text = unicodedata.normalize("NFKC", prompt or "").lower()
+    text = re.sub(r"\s*[,;、]\s*", ", ", text)
+    text = re.sub(r"\s+", " ", text)
+    return text.strip(" ,.!?")
+
+
+def duration_bucket(duration: float, bucket_seconds: float = ENVIRONMENT_SOUND_DURATION_BUCKET,
+                    max_duration: Optional[float] = None) -> float:
+    """时长向上取整到档位（缓存的音频不短于请求时长），并受生成上限约束"""
+    bucket = max(bucket_seconds, math.ceil(duration / bucket_seconds - 1e-9) * bucket_seconds)
+    if max_duration is not None:
+        bucket = min(bucket, max_duration)
+    return float(bucket)
+
+
+def make_cache_key(normalized_prompt: str, bucket: float, steps: Optional[int], guidance_scale: Optional[float]) -> str:
+    guidance = "" if guidance_scale is None else f"{float(guidance_scale):g}"
+    raw = f"{normalized_prompt}\x1f{bucket:g}\x1f{steps if steps is not None else ''}\x1f{guidance}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class CachedSound:
+    """缓存命中或新生成的音频"""
+    cache_key: str
+    file_path: str
+    content_hash: str
+    duration_bucket: float
+    environment_sound_id: Optional[int] = None
+    generated: bool = False  # True: 本次调用实际触发了生成
+
+    def read_bytes(self) -> bytes:
+        with open(self.file_path, "rb") as f:
+            return f.read()
+
+
+class EnvironmentSoundCache:
+    """TangoFlux生成缓存（内存 + 数据库索引 + 内容寻址文件）"""
+
+    def __init__(
+        self,
+        cache_dir: str = ENVIRONMENT_SOUND_CACHE_DIR,
+        bucket_seconds: float = ENVIRONMENT_SOUND_DURATION_BUCKET,
+        memory_entries: int = ENVIRONMENT_SOUND_MEMORY_ENTRIES,
+        session_factory: Optional[Callable[[], Session]] = None
+    ):
+        self.cache_dir = cache_dir
+        self.bucket_seconds = bucket_seconds
+        self.memory_entries = memory_entries
+        self._session_factory = session_factory
+        self._memory: Dict[str, CachedSound] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "index_hits": 0, "shared": 0, "generations": 0, "failures": 0}
+
+    def _session(self) -> Session:
+        if self._session_factory is None:
+            from app.database import SessionLocal
+            self._session_factory = SessionLocal
+        return self._session_factory()
+
+    def key_for(self, prompt: str, duration: float, steps: Optional[int] = None,
+                guidance_scale: Optional[float] = None, max_duration: Optional[float] = None) -> str:
+        bucket = duration_bucket(duration, self.bucket_seconds, max_duration)
+        return make_cache_key(normalize_prompt(prompt), bucket, steps, guidance_scale)
+
+    def lookup(self, cache_key: str) -> Optional[CachedSound]:
+        """按缓存键查找，文件丢失的条目视为未命中（会访问数据库，异步代码中使用 lookup_async）"""
+        return self._lookup_memory(cache_key) or self._lookup_index(cache_key)
+
+    async def lookup_async(self, cache_key: str) -> Optional[CachedSound]:
+        """lookup 的异步版本：内存未命中时在线程池中查询数据库，不阻塞事件循环"""
+        return self._lookup_memory(cache_key) or await run_in_threadpool(self._lookup_index, cache_key)
+
+    def _lookup_memory(self, cache_key: str) -> Optional[CachedSound]:
+        with self._lock:
+            cached = self._memory.get(cache_key)
+        if cached and os.path.exists(cached.file_path):
+            self.stats["memory_hits"] += 1
+            self._touch(cache_key)
+            return cached
+        return None
+
+    def _lookup_index(self, cache_key: str) -> Optional[CachedSound]:
+        db = self._session()
+        try:
+            entry = db.query(EnvironmentSoundCacheEntry).filter(
+                EnvironmentSoundCacheEntry.cache_key == cache_key
+            ).first()
+            if not entry or not os.path.exists(entry.file_path):
+                return None
+            entry.hit_count = (entry.hit_count or 0) + 1
+            entry.last_used_at = datetime.utcnow()
+            db.commit()
+            cached = CachedSound(
+                cache_key=cache_key,
+                file_path=entry.file_path,
+                content_hash=entry.content_hash,
+                duration_bucket=entry.duration_bucket,
+                environment_sound_id=entry.environment_sound_id
+            )
+        finally:
+            db.close()
+
+        self.stats["index_hits"] += 1
+        self._remember(cached)
+        return cached
+
+    async def get_or_generate(
+        self,
+        prompt: str,
+        duration: float,
+        generate: Callable[[float], Awaitable[Optional[bytes]]],
+        steps: Optional[int] = None,
+        guidance_scale: Optional[float] = None,
+        max_duration: Optional[float] = None
+    ) -> Optional[CachedSound]:
+        """
+        返回缓存的音频，未命中时调用 generate(档位时长) 生成并入库
+
+        Args:
+            prompt: 生成提示词
+            duration: 需要的时长（秒），按档位向上取整后生成，调用方自行裁剪
+            generate: 实际生成函数，返回WAV字节，失败返回 None
+            steps: 推理步数
+            guidance_scale: 引导强度
+            max_duration: 生成服务支持的最大时长
+
+        Returns:
+            缓存音频，生成失败时返回 None
+        """
+        normalized = normalize_prompt(prompt)
+        bucket = duration_bucket(duration, self.bucket_seconds, max_duration)
+        cache_key = make_cache_key(normalized, bucket, steps, guidance_scale)
+
+        cached = await self.lookup_async(cache_key)
+        if cached:
+            logger.info(f"[ENV_CACHE] 命中: {normalized[:50]} ({bucket:g}s)")
+            return cached
+
+        # 相同请求正在生成时等待同一结果
+        loop = asyncio.get_running_loop()
+        inflight = self._inflight.get(cache_key)
+        if inflight is not None and inflight.get_loop() is loop:
+            self.stats["shared"] += 1
+            logger.info(f"[ENV_CACHE] 共享进行中的生成: {normalized[:50]} ({bucket:g}s)")
+            shared = await asyncio.shield(inflight)
+            return replace(shared, generated=False) if shared else None
+
+        future = loop.create_future()
+        self._inflight[cache_key] = future
+        result = None
+        try:
+            self.stats["generations"] += 1
+            audio_data = await generate(bucket)
+            if audio_data:
+                result = await run_in_threadpool(
+                    self.store, cache_key, normalized, bucket, steps, guidance_scale, audio_data
+                )
+            else:
+                self.stats["failures"] += 1
+            return result
+        finally:
+            # 生成失败或被取消时等待者得到 None，由各自的失败分支处理
+            if not future.done():
+                future.set_result(result)
+            if self._inflight.get(cache_key) is future:
+                del self._inflight[cache_key]
+
+    async def prefill(
+        self,
+        requests: List[Dict[str, Any]],
+        generate_many: Callable[[List[Dict[str, Any]]], Awaitable[List[Optional[bytes]]]],
+        max_duration: Optional[float] = None
+    ) -> int:
+        """
+        批量生成未命中的条目（生成服务可一次请求多条提示词），之后的 get_or_generate 直接命中
+
+        Args:
+            requests: 每项包含 prompt、duration，可选 steps、guidance_scale
+            generate_many: 批量生成函数，参数中的 duration 已替换为档位时长，返回与参数一一对应的WAV字节
+            max_duration: 生成服务支持的最大时长
+
+        Returns:
+            新生成并入库的条目数
+        """
+        pending: Dict[str, Dict[str, Any]] = {}
+        for item in requests:
+            normalized = normalize_prompt(item["prompt"])
+            bucket = duration_bucket(item["duration"], self.bucket_seconds, max_duration)
+            steps, guidance_scale = item.get("steps"), item.get("guidance_scale")
+            cache_key = make_cache_key(normalized, bucket, steps, guidance_scale)
+            if cache_key in pending or cache_key in self._inflight or await self.lookup_async(cache_key):
+                continue
+            pending[cache_key] = {
+                "prompt": item["prompt"], "normalized": normalized, "duration": bucket,
+                "steps": steps, "guidance_scale": guidance_scale
+            }
+        if not pending:
+            return 0
+
+        # 登记为进行中，同时到达的单条请求等待批量结果
+        loop = asyncio.get_running_loop()
+        futures = {cache_key: loop.create_future() for cache_key in pending}
+        self._inflight.update(futures)
+        stored = 0
+        try:
+            self.stats["generations"] += len(pending)
+            results = await generate_many([
+                {key: value for key, value in item.items() if key != "normalized"} for item in pending.values()
+            ])
+            for (cache_key, item), audio_data in zip(pending.items(), results):
+                if not audio_data:
+                    self.stats["failures"] += 1
+                    continue
+                cached = await run_in_threadpool(
+                    self.store, cache_key, item["normalized"], item["duration"],
+                    item["steps"], item["guidance_scale"], audio_data
+                )
+                futures[cache_key].set_result(cached)
+                stored += 1
+            return stored
+        finally:
+            for cache_key, future in futures.items():
+                if not future.done():
+                    future.set_result(None)
+                if self._inflight.get(cache_key) is future:
+                    del self._inflight[cache_key]
+
+    def store(self, cache_key: str, normalized_prompt: str, bucket: float, steps: Optional[int],
+              guidance_scale: Optional[float], audio_data: bytes) -> CachedSound:
+        """写入内容寻址文件并登记缓存键"""
+        content_hash = hashlib.sha256(audio_data).hexdigest()
+        file_path = os.path.join(self.cache_dir, content_hash[:2], f"{content_hash}.wav")
+        if not os.path.exists(file_path):
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            tmp_path = f"{file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(audio_data)
+            os.replace(tmp_path, file_path)
+
+        db = self._session()
+        try:
+            entry = db.query(EnvironmentSoundCacheEntry).filter(
+                EnvironmentSoundCacheEntry.cache_key == cache_key
+            ).first()
+            if entry is None:
+                entry = EnvironmentSoundCacheEntry(cache_key=cache_key, hit_count=0)
+                db.add(entry)
+            entry.normalized_prompt = normalized_prompt
+            entry.duration_bucket = bucket
+            entry.steps = steps
+            entry.guidance_scale = guidance_scale
+            entry.content_hash = content_hash
+            entry.file_path = file_path
+            entry.file_size = len(audio_data)
+            entry.last_used_at = datetime.utcnow()
+            try:
+                db.commit()
+            except IntegrityError:
+                # 其他进程同时登记了同一个键，内容寻址文件可直接复用
+                db.rollback()
+            environment_sound_id = entry.environment_sound_id if entry.id else None
+        finally:
+            db.close()
+
+        cached = CachedSound(
+            cache_key=cache_key,
+            file_path=file_path,
+            content_hash=content_hash,
+            duration_bucket=bucket,
+            environment_sound_id=environment_sound_id,
+            generated=True
+        )
+        self._remember(cached)
+        logger.info(f"[ENV_CACHE] 已缓存: {normalized_prompt[:50]} ({bucket:g}s) -> {file_path}")
+        return cached
+
+    def attach_sound(self, cache_key: str, environment_sound_id: int):
+        """记录缓存条目对应的环境音库记录，之后命中时不再重复入库"""
+        db = self._session()
+        try:
+            db.query(EnvironmentSoundCacheEntry).filter(
+                EnvironmentSoundCacheEntry.cache_key == cache_key
+            ).update({"environment_sound_id": environment_sound_id})
+            db.commit()
+        finally:
+            db.close()
+        with self._lock:
+            cached = self._memory.get(cache_key)
+            if cached:
+                cached.environment_sound_id = environment_sound_id
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self.stats, "memory_entries": len(self._memory), "inflight": len(self._inflight)}
+
+    def _remember(self, cached: CachedSound):
+        with self._lock:
+            self._memory.pop(cached.cache_key, None)
+            self._memory[cached.cache_key] = cached
+            while len(self._memory) > self.memory_entries:
+                self._memory.pop(next(iter(self._memory)))
+
+    def _touch(self, cache_key: str):
+        with self._lock:
+            cached = self._memory.pop(cache_key, None)
+            if cached:
+                self._memory[cache_key] = cached
+
+
+def _ngrams(text: str) -> Set[str]:
+    """文本（小写）中长度 1~KEYWORD_NGRAM 的全部片段，纯空白片段除外"""
+    text = text.lower()
+    return {
+        text[i:i + n]
+        for n in range(1, KEYWORD_NGRAM + 1)
+        for i in range(len(text) - n + 1)
+        if text[i:i + n].strip()
+    }
+
+
+def _query_terms(keyword: str) -> Set[str]:
+    """子串查找需要全部命中的片段：单字用自身，否则用全部 KEYWORD_NGRAM 字片段"""
+    if len(keyword) <= KEYWORD_NGRAM:
+        return {keyword}
+    return {keyword[i:i + KEYWORD_NGRAM] for i in range(len(keyword) - KEYWORD_NGRAM + 1)}
+
+
+def extract_keywords(name: Optional[str], prompt: Optional[str], tags: Optional[Iterable[str]]) -> Set[str]:
+    """环境音的索引条目：完整标签（小写），以及名称与提示词的字符片段"""
+    keywords = set()
+    for tag in tags or []:
+        if isinstance(tag, str) and tag.strip():
+            keywords.add(tag.strip().lower()[:KEYWORD_MAX_LENGTH])
+    for text in (name, prompt):
+        keywords.update(_ngrams(text or ""))
+    return keywords
+
+
+def _matches(sound: EnvironmentSound, keyword: str) -> bool:
+    """与原逐条扫描一致的判定：命中某个标签，或是名称/提示词的子串（不区分大小写）"""
+    tags = [tag.strip().lower() for tag in (sound.tags or []) if isinstance(tag, str)]
+    return keyword in tags or keyword in (sound.name or "").lower() or keyword in (sound.prompt or "").lower()
+
+
+def index_environment_sound(db: Session, sound: EnvironmentSound):
+    """（重新）建立单个环境音的关键词索引，由调用方提交事务"""
+    if sound.id is None:
+        db.flush()
+    db.query(EnvironmentSoundKeyword).filter(
+        EnvironmentSoundKeyword.environment_sound_id == sound.id
+    ).delete(synchronize_session=False)
+    db.add_all([
+        EnvironmentSoundKeyword(keyword=keyword, environment_sound_id=sound.id)
+        for keyword in extract_keywords(sound.name, sound.prompt, sound.tags)
+    ])
+
+
+def remove_environment_sound_index(db: Session, sound_id: int):
+    db.query(EnvironmentSoundKeyword).filter(
+        EnvironmentSoundKeyword.environment_sound_id == sound_id
+    ).delete(synchronize_session=False)
+
+
+def find_environment_sound_by_keyword(db: Session, keyword: str) -> Optional[EnvironmentSound]:
+    """
+    查找标签等于关键词、或名称/提示词包含关键词的已生成完成的可用环境音
+
+    包含全部查询片段的环境音是候选（片段齐全不代表连续出现），逐条核对后返回 ID 最小的匹配
+    """
+    keyword = (keyword or "").strip().lower()
+    if not keyword:
+        return None
+    terms = _query_terms(keyword)
+    by_fragments = db.query(EnvironmentSoundKeyword.environment_sound_id).filter(
+        EnvironmentSoundKeyword.keyword.in_(terms)
+    ).group_by(EnvironmentSoundKeyword.environment_sound_id).having(
+        func.count(func.distinct(EnvironmentSoundKeyword.keyword)) == len(terms)
+    )
+    by_tag = db.query(EnvironmentSoundKeyword.environment_sound_id).filter(
+        EnvironmentSoundKeyword.keyword == keyword[:KEYWORD_MAX_LENGTH]
+    )
+    candidates = db.query(EnvironmentSound).filter(
+        EnvironmentSound.id.in_(by_fragments.union(by_tag)),
+        EnvironmentSound.is_active == True,
+        EnvironmentSound.generation_status == 'completed'
+    ).order_by(EnvironmentSound.id)
+    for sound in candidates.yield_per(50):
+        if _matches(sound, keyword):
+            return sound
+    return None
+
+
+def rebuild_environment_sound_index(db: Session) -> int:
+    """重建全部关键词索引，返回索引的环境音数量"""
+    db.query(EnvironmentSoundKeyword).delete(synchronize_session=False)
+    count = 0
+    rows = db.query(EnvironmentSound.id, EnvironmentSound.name, EnvironmentSound.prompt, EnvironmentSound.tags).all()
+    for sound_id, name, prompt, tags in rows:
+        db.add_all([
+            EnvironmentSoundKeyword(keyword=keyword, environment_sound_id=sound_id)
+            for keyword in extract_keywords(name, prompt, tags)
+        ])
+        count += 1
+    db.commit()
+    return count
+
+
+# 全局实例
+environment_sound_cache = EnvironmentSoundCache()
+
+
+def get_environment_sound_cache() -> EnvironmentSoundCache:
+    return environment_sound_cache
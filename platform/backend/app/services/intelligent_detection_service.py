@@ -486,7 +486,8 @@ class IntelligentDetectionService:
             if not analysis_result or not analysis_result.synthesis_plan or 'synthesis_plan' not in analysis_result.synthesis_plan:
                 return {'success': False, 'message': '未找到合成计划'}
             
-            segments = analysis_result.synthesis_plan['synthesis_plan'].copy()
+            synthesis_plan = analysis_result.synthesis_plan
+            segments = synthesis_plan['synthesis_plan']
             fixed_count = 0
             
             # 确定要修复的问题
@@ -505,8 +506,9 @@ class IntelligentDetectionService:
                 if success:
                     fixed_count += 1
             
-            # 更新合成计划
-            analysis_result.synthesis_plan['synthesis_plan'] = segments
+            # 更新合成计划（与段落行比对，只写入被修复/拆分的段落）
+            synthesis_plan['synthesis_plan'] = segments
+            analysis_result.synthesis_plan = synthesis_plan
             db.commit()
             
             return {
@@ -0,0 +1,442 @@
+"""
+持久化任务队列服务
+替代FastAPI BackgroundTasks：任务落库，多个Worker通过
+SELECT ... FOR UPDATE SKIP LOCKED 并发领取，租约过期后自动被其他Worker接管
+"""
+
+import logging
+import random
+import socket
+import os
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import Session
+
+from app.models import SynthesisJob, JobStatus, JobType
+from app.services.project_progress_service import refresh_in_flight
+
+logger = logging.getLogger(__name__)
+
+# 队列配置
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "120"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_BACKOFF_BASE_SECONDS = float(os.getenv("JOB_BACKOFF_BASE_SECONDS", "5"))
+JOB_BACKOFF_MAX_SECONDS = float(os.getenv("JOB_BACKOFF_MAX_SECONDS", "600"))
+
+
+def make_worker_id() -> str:
+    """生成Worker标识：主机名-进程号-随机后缀"""
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+
+def compute_backoff(attempts: int) -> float:
+    """指数退避（带抖动），attempts从1开始"""
+    delay = JOB_BACKOFF_BASE_SECONDS * (2 ** max(attempts - 1, 0))
+    delay = min(delay, JOB_BACKOFF_MAX_SECONDS)
+    return delay * random.uniform(0.8, 1.2)
+
+
+class JobQueue:
+    """基于数据库的持久化任务队列"""
+
+    def __init__(self, lease_seconds: int = JOB_LEASE_SECONDS):
+        self.lease_seconds = lease_seconds
+
+    # ------------------------------------------------------------------
+    # 入队
+    # ------------------------------------------------------------------
+
+    def enqueue(
+        self,
+        db: Session,
+        job_type: str,
+        payload: Optional[Dict[str, Any]] = None,
+        project_id: Optional[int] = None,
+        chapter_id: Optional[int] = None,
+        segment_id: Optional[int] = None,
+        parent_id: Optional[int] = None,
+        priority: int = 0,
+        max_attempts: int = JOB_MAX_ATTEMPTS,
+        status: str = JobStatus.QUEUED,
+        commit: bool = True
+    ) -> SynthesisJob:
+        """写入单个任务"""
+        job = SynthesisJob(
+            job_type=job_type,
+            payload=payload or {},
+            project_id=project_id,
+            chapter_id=chapter_id,
+            segment_id=segment_id,
+            parent_id=parent_id,
+            priority=priority,
+            max_attempts=max_attempts,
+            status=status,
+            available_at=datetime.utcnow()
+        )
+        db.add(job)
+        if commit:
+            db.commit()
+            db.refresh(job)
+        else:
+            db.flush()
+        return job
+
+    def enqueue_synthesis_plan(
+        self,
+        db: Session,
+        project_id: int,
+        synthesis_data: List[Dict],
+        priority: int = 0
+    ) -> Dict[str, Any]:
+        """
+        将智能准备的合成计划拆分为章节任务 + 段落任务
+
+        每个章节创建一个处于waiting状态的chapter_finalize任务，
+        其下每个段落一个segment_synthesis任务；段落任务全部结束后章节任务才进入队列。
+        同一章节已存在等待/排队中的章节任务时，仅补充尚未入队的段落，避免重复合成；
+        章节任务已被Worker领取执行时不重置它，另建新的章节任务，避免同一章节被两个Worker同时收尾。
+        """
+        segments_by_chapter: Dict[Optional[int], List[Dict]] = defaultdict(list)
+        for index, segment in enumerate(synthesis_data):
+            segment = dict(segment)
+            segment.setdefault('segment_id', index + 1)
+            segments_by_chapter[segment.get('chapter_id')].append(segment)
+
+        chapter_job_ids = []
+        segment_job_count = 0
+
+        for chapter_id, segments in segments_by_chapter.items():
+            chapter_job = db.query(SynthesisJob).filter(
+                SynthesisJob.job_type == JobType.CHAPTER_FINALIZE,
+                SynthesisJob.project_id == project_id,
+                SynthesisJob.chapter_id == chapter_id,
+                SynthesisJob.status.in_((JobStatus.WAITING, JobStatus.QUEUED))
+            ).first()
+
+            queued_segment_ids = set()
+            if chapter_job:
+                queued_segment_ids = {
+                    row.segment_id for row in db.query(SynthesisJob.segment_id).filter(
+                        SynthesisJob.parent_id == chapter_job.id,
+                        SynthesisJob.status.in_(JobStatus.ACTIVE)
+                    )
+                }
+                chapter_job.status = JobStatus.WAITING
+            else:
+                chapter_job = self.enqueue(
+                    db,
+                    JobType.CHAPTER_FINALIZE,
+                    payload={},
+                    project_id=project_id,
+                    chapter_id=chapter_id,
+                    priority=priority,
+                    status=JobStatus.WAITING,
+                    commit=False
+                )
+
+            for segment in segments:
+                if segment['segment_id'] in queued_segment_ids:
+                    continue
+                self.enqueue(
+                    db,
+                    JobType.SEGMENT_SYNTHESIS,
+                    payload={'segment': segment, 'segment_index': segment['segment_id'] - 1},
+                    project_id=project_id,
+                    chapter_id=chapter_id,
+                    segment_id=segment['segment_id'],
+                    parent_id=chapter_job.id,
+                    priority=priority,
+                    commit=False
+                )
+                segment_job_count += 1
+
+            chapter_job_ids.append(chapter_job.id)
+
+        db.commit()
+        logger.info(f"[JOB_QUEUE] 项目 {project_id} 入队 {len(chapter_job_ids)} 个章节任务, {segment_job_count} 个段落任务")
+
+        return {
+            "chapter_jobs": chapter_job_ids,
+            "segment_jobs": segment_job_count
+        }
+
+    # ------------------------------------------------------------------
+    # 领取 / 心跳 / 完成
+    # ------------------------------------------------------------------
+
+    def claim(
+        self,
+        db: Session,
+        worker_id: str,
+        job_types: Optional[Iterable[str]] = None
+    ) -> Optional[SynthesisJob]:
+        """
+        领取一个可执行任务
+
+        可执行 = queued且到达available_at，或leased但租约已过期（原Worker崩溃/重启）。
+        租约过期且尝试次数已用尽的任务（反复导致Worker崩溃）在同一事务中直接标记为失败，不再续租。
+        FOR UPDATE SKIP LOCKED 保证多个Worker并发领取时互不阻塞、不重复领取。
+        """
+        now = datetime.utcnow()
+        expired = and_(SynthesisJob.status == JobStatus.LEASED, SynthesisJob.lease_expires_at < now)
+        type_filter = SynthesisJob.job_type.in_(list(job_types)) if job_types else None
+
+        exhausted_query = db.query(SynthesisJob).filter(expired, SynthesisJob.attempts >= SynthesisJob.max_attempts)
+        if type_filter is not None:
+            exhausted_query = exhausted_query.filter(type_filter)
+        exhausted = exhausted_query.with_for_update(skip_locked=True).all()
+        for stale in exhausted:
+            logger.error(f"[JOB_QUEUE] 任务 {stale.id} 租约过期且已尝试{stale.attempts}次"
+                         f"（原Worker: {stale.lease_owner}），标记为失败")
+            stale.status = JobStatus.FAILED
+            stale.last_error = f"租约过期{stale.attempts}次，Worker可能在执行中崩溃"
+            stale.lease_owner = None
+            stale.lease_expires_at = None
+            stale.completed_at = now
+
+        query = db.query(SynthesisJob).filter(
+            or_(
+                and_(SynthesisJob.status == JobStatus.QUEUED, SynthesisJob.available_at <= now),
+                and_(expired, SynthesisJob.attempts < SynthesisJob.max_attempts)
+            )
+        )
+        if type_filter is not None:
+            query = query.filter(type_filter)
+
+        job = query.order_by(
+            SynthesisJob.priority.desc(),
+            SynthesisJob.id.asc()
+        ).with_for_update(skip_locked=True).limit(1).first()
+
+        if not job:
+            db.commit()
+            self._after_exhausted(db, exhausted)
+            return None
+
+        if job.status == JobStatus.LEASED:
+            logger.warning(f"[JOB_QUEUE] 任务 {job.id} 租约已过期（原Worker: {job.lease_owner}），由 {worker_id} 接管")
+
+        job.status = JobStatus.LEASED
+        job.lease_owner = worker_id
+        job.lease_expires_at = now + timedelta(seconds=self.lease_seconds)
+        job.heartbeat_at = now
+        job.attempts = (job.attempts or 0) + 1
+        job.started_at = job.started_at or now
+        db.commit()
+        self._after_exhausted(db, exhausted)
+        db.refresh(job)
+        return job
+
+    def _after_exhausted(self, db: Session, jobs: List[SynthesisJob]):
+        """放行失败任务的父任务（章节任务在子任务全部结束后才进入队列）"""
+        for parent_id in {job.parent_id for job in jobs if job.parent_id}:
+            self._release_parent(db, parent_id)
+
+    def heartbeat(self, db: Session, job_id: int, worker_id: str) -> bool:
+        """续租；返回False表示租约已丢失（被接管、暂停或取消），Worker应放弃执行"""
+        now = datetime.utcnow()
+        updated = db.query(SynthesisJob).filter(
+            SynthesisJob.id == job_id,
+            SynthesisJob.status == JobStatus.LEASED,
+            SynthesisJob.lease_owner == worker_id
+        ).update({
+            SynthesisJob.heartbeat_at: now,
+            SynthesisJob.lease_expires_at: now + timedelta(seconds=self.lease_seconds)
+        }, synchronize_session=False)
+        db.commit()
+        return updated == 1
+
+    def complete(self, db: Session, job: SynthesisJob, result: Optional[Dict[str, Any]] = None,
+                 worker_id: Optional[str] = None) -> bool:
+        """
+        标记任务成功，并在段落任务全部结束时放行章节任务
+
+        指定 worker_id 时只在该Worker仍持有租约（leased，或执行期间被暂停）时生效；
+        返回False表示租约已丢失，任务状态由新的持有方维护
+        """
+        finished = self._finish(db, job, worker_id, (JobStatus.LEASED, JobStatus.PAUSED), {
+            SynthesisJob.status: JobStatus.SUCCEEDED,
+            SynthesisJob.result: result,
+            SynthesisJob.last_error: None,
+            SynthesisJob.completed_at: datetime.utcnow()
+        })
+        if finished:
+            self._release_parent(db, job.parent_id)
+        return finished
+
+    def fail(self, db: Session, job: SynthesisJob, error: str, retryable: bool = True,
+             worker_id: Optional[str] = None) -> bool:
+        """
+        标记任务失败：未超过最大次数时按指数退避重新入队
+
+        worker_id 的含义同 complete；返回False表示租约已丢失，未做任何修改
+        """
+        values = {SynthesisJob.last_error: error[:2000] if error else error}
+        retry = retryable and job.attempts < job.max_attempts
+        if retry:
+            delay = compute_backoff(job.attempts)
+            values[SynthesisJob.status] = JobStatus.QUEUED
+            values[SynthesisJob.available_at] = datetime.utcnow() + timedelta(seconds=delay)
+        else:
+            values[SynthesisJob.status] = JobStatus.FAILED
+            values[SynthesisJob.completed_at] = datetime.utcnow()
+
+        if not self._finish(db, job, worker_id, (JobStatus.LEASED,), values):
+            return False
+
+        if retry:
+            logger.warning(f"[JOB_QUEUE] 任务 {job.id} 第{job.attempts}次失败，{delay:.1f}s后重试: {error}")
+        else:
+            logger.error(f"[JOB_QUEUE] 任务 {job.id} 最终失败（{job.attempts}/{job.max_attempts}）: {error}")
+            self._release_parent(db, job.parent_id)
+        return True
+
+    def _finish(self, db: Session, job: SynthesisJob, worker_id: Optional[str],
+                statuses: Iterable[str], values: Dict) -> bool:
+        """
+        条件更新结束任务：状态仍在 statuses 内且（指定时）租约仍属于 worker_id 才写入，
+        并释放租约。0 行表示租约已丢失（被接管、取消或已结束），回滚后返回False
+        """
+        query = db.query(SynthesisJob).filter(
+            SynthesisJob.id == job.id,
+            SynthesisJob.status.in_(list(statuses))
+        )
+        if worker_id is not None:
+            query = query.filter(SynthesisJob.lease_owner == worker_id)
+        updated = query.update({
+            **values,
+            SynthesisJob.lease_owner: None,
+            SynthesisJob.lease_expires_at: None
+        }, synchronize_session=False)
+        if not updated:
+            db.rollback()
+            logger.warning(f"[JOB_QUEUE] 任务 {job.id} 的租约已不属于 {worker_id}，忽略结束状态")
+            return False
+
+        # 批量更新不触发ORM事件，单独刷新项目的进行中段落数
+        if job.project_id is not None and job.job_type == JobType.SEGMENT_SYNTHESIS:
+            refresh_in_flight(db, job.project_id)
+        db.commit()
+        return True
+
+    def _release_parent(self, db: Session, parent_id: Optional[int]):
+        """子任务全部结束后，把等待中的父任务放入队列"""
+        if not parent_id:
+            return
+
+        pending = db.query(func.count(SynthesisJob.id)).filter(
+            SynthesisJob.parent_id == parent_id,
+            SynthesisJob.status.notin_(JobStatus.TERMINAL)
+        ).scalar()
+        if pending:
+            return
+
+        released = db.query(SynthesisJob).filter(
+            SynthesisJob.id == parent_id,
+            SynthesisJob.status == JobStatus.WAITING
+        ).update({
+            SynthesisJob.status: JobStatus.QUEUED,
+            SynthesisJob.available_at: datetime.utcnow()
+        }, synchronize_session=False)
+        db.commit()
+        if released:
+            logger.info(f"[JOB_QUEUE] 父任务 {parent_id} 的子任务已全部结束，进入队列")
+
+    # ------------------------------------------------------------------
+    # 项目级控制
+    # ------------------------------------------------------------------
+
+    def pause_project(self, db: Session, project_id: int) -> int:
+        """暂停项目未开始的任务；执行中的任务在下次心跳时感知"""
+        count = db.query(SynthesisJob).filter(
+            SynthesisJob.project_id == project_id,
+            SynthesisJob.status.in_(JobStatus.ACTIVE)
+        ).update({SynthesisJob.status: JobStatus.PAUSED}, synchronize_session=False)
+        refresh_in_flight(db, project_id)
+        db.commit()
+        return count
+
+    def cancel_project(self, db: Session, project_id: int, chapter_ids: Optional[List[int]] = None) -> int:
+        """取消项目（或指定章节）所有未结束的任务"""
+        query = db.query(SynthesisJob).filter(
+            SynthesisJob.project_id == project_id,
+            SynthesisJob.status.in_(JobStatus.ACTIVE + (JobStatus.PAUSED,))
+        )
+        if chapter_ids:
+            query = query.filter(SynthesisJob.chapter_id.in_(chapter_ids))
+        count = query.update({
+            SynthesisJob.status: JobStatus.CANCELLED,
+            SynthesisJob.completed_at: datetime.utcnow()
+        }, synchronize_session=False)
+        refresh_in_flight(db, project_id)
+        db.commit()
+        return count
+
+    def resume_project(self, db: Session, project_id: int, include_failed: bool = True) -> int:
+        """
+        恢复项目：直接把暂停/失败的任务放回队列，无需比对AudioFile重建进度
+
+        章节任务恢复为waiting，由子任务结束时重新放行。
+        """
+        statuses = [JobStatus.PAUSED]
+        if include_failed:
+            statuses.append(JobStatus.FAILED)
+
+        now = datetime.utcnow()
+        segment_count = db.query(SynthesisJob).filter(
+            SynthesisJob.project_id == project_id,
+            SynthesisJob.job_type != JobType.CHAPTER_FINALIZE,
+            SynthesisJob.status.in_(statuses)
+        ).update({
+            SynthesisJob.status: JobStatus.QUEUED,
+            SynthesisJob.attempts: 0,
+            SynthesisJob.available_at: now,
+            SynthesisJob.completed_at: None
+        }, synchronize_session=False)
+
+        chapter_jobs = db.query(SynthesisJob).filter(
+            SynthesisJob.project_id == project_id,
+            SynthesisJob.job_type == JobType.CHAPTER_FINALIZE,
+            SynthesisJob.status.in_(statuses)
+        ).all()
+        for chapter_job in chapter_jobs:
+            chapter_job.status = JobStatus.WAITING
+            chapter_job.attempts = 0
+            chapter_job.completed_at = None
+        refresh_in_flight(db, project_id)
+        db.commit()
+
+        for chapter_job in chapter_jobs:
+            self._release_parent(db, chapter_job.id)
+
+        return segment_count + len(chapter_jobs)
+
+    def has_jobs(self, db: Session, project_id: int) -> bool:
+        """项目是否曾经使用任务队列"""
+        return db.query(SynthesisJob.id).filter(SynthesisJob.project_id == project_id).first() is not None
+
+    def get_project_summary(self, db: Session, project_id: int) -> Dict[str, Any]:
+        """按类型与状态统计项目任务"""
+        rows = db.query(
+            SynthesisJob.job_type, SynthesisJob.status, func.count(SynthesisJob.id)
+        ).filter(
+            SynthesisJob.project_id == project_id
+        ).group_by(SynthesisJob.job_type, SynthesisJob.status).all()
+
+        summary: Dict[str, Dict[str, int]] = defaultdict(dict)
+        for job_type, status, count in rows:
+            summary[job_type][status] = count
+        return dict(summary)
+
+
+# 全局队列实例
+job_queue = JobQueue()
+
+
+def get_job_queue() -> JobQueue:
+    """获取任务队列实例"""
+    return job_queue
@@ -304,13 +304,14 @@ class MusicOrchestrator:
             custom_style: 自定义风格（可选）
             volume_level: 音量级别
             direct_mode: 直接模式（跳过复杂场景分析）
-            advanced_params: 高级参数字典（cfg_coef, temperature, top_k, description等）
+            advanced_params: 高级参数字典（cfg_coef, temperature, top_k, description, n_samples等）
             
         Returns:
-            生成结果字典
+            生成结果字典；n_samples > 1 时 candidates 中包含全部候选
         """
         start_time = time.time()
         advanced_params = advanced_params or {}
+        n_samples = int(advanced_params.get("n_samples", 1))
         
         try:
             logger.info(f"开始音乐生成流程，内容长度: {len(content)} 字符，直接模式: {direct_mode}")
@@ -341,6 +342,7 @@ class MusicOrchestrator:
                 cfg_coef=advanced_params.get("cfg_coef", 1.5),
                 temperature=advanced_params.get("temperature", 0.9),
                 top_k=advanced_params.get("top_k", 50),
+                n_samples=n_samples,
                 progress_callback=None  # 不带进度回调的简化版本
             )
             
@@ -359,6 +361,17 @@ class MusicOrchestrator:
                 logger.error("音乐文件下载失败")
                 return None
             
+            # 其余候选（引擎在同一批次中生成）
+            candidates = [{"audio_path": local_path, "audio_url": f"/api/v1/audio/generated/{filename}"}]
+            for index, candidate_url in enumerate(synthesis_result.audio_urls[1:], start=1):
+                candidate_filename = filename.replace(".flac", f"_{index}.flac")
+                candidate_path = await self._download_and_store_music(candidate_url, candidate_filename)
+                if candidate_path:
+                    candidates.append({
+                        "audio_path": candidate_path,
+                        "audio_url": f"/api/v1/audio/generated/{candidate_filename}"
+                    })
+            
             # 步骤6：音频后处理（音量调整等）
             processed_path = await self._post_process_audio(
                 local_path, 
@@ -383,7 +396,8 @@ class MusicOrchestrator:
                 "duration": synthesis_result.duration,
                 "generation_time": generation_time,
                 "volume_level": volume_level,
-                "chapter_id": chapter_id
+                "chapter_id": chapter_id,
+                "candidates": candidates
             }
             
             logger.info(f"音乐生成流程完成，耗时: {generation_time:.2f}s")
@@ -395,19 +409,22 @@ class MusicOrchestrator:
     
     async def generate_music_batch(self, 
                                  chapters: List[Dict],
-                                 max_concurrent: int = 3) -> BatchGenerationResult:
+                                 max_concurrent: int = 3,
+                                 candidates_per_chapter: int = 1) -> BatchGenerationResult:
         """
         批量生成音乐
         
         Args:
             chapters: 章节列表 [{id, content, duration?, style?, volume_level?}]
             max_concurrent: 最大并发数
+            candidates_per_chapter: 每个章节的候选数量，由引擎在一次批量推理中生成（n_samples）
             
         Returns:
             批量生成结果
         """
         start_time = time.time()
-        logger.info(f"开始批量音乐生成，章节数: {len(chapters)}, 并发数: {max_concurrent}")
+        logger.info(f"开始批量音乐生成，章节数: {len(chapters)}, 并发数: {max_concurrent}, "
+                    f"每章候选数: {candidates_per_chapter}")
         
         # 创建信号量限制并发
         semaphore = asyncio.Semaphore(max_concurrent)
@@ -419,7 +436,8 @@ class MusicOrchestrator:
                     content=chapter["content"],
                     chapter_id=chapter_id,
                     custom_style=chapter.get("style"),
-                    volume_level=chapter.get("volume_level", -12.0)
+                    volume_level=chapter.get("volume_level", -12.0),
+                    advanced_params={"n_samples": chapter.get("candidates", candidates_per_chapter)}
                 )
                 return chapter_id, result
         
@@ -586,8 +604,9 @@ class MusicOrchestrator:
             output_path = output_dir / filename
             
             # 🎯 方案1：优先从引擎输出目录直接复制最新文件
+            # 任务队列接口的结果地址能精确定位文件（含多候选），不使用"最新文件"推断
             engine_output_dir = Path("D:/AI-Sound/MegaTTS/Song-Generation/output/api_generated")
-            if engine_output_dir.exists():
+            if engine_output_dir.exists() and not audio_url.startswith("/jobs/"):
                 try:
                     # 获取最新生成的音频文件（按修改时间排序）
                     audio_files = list(engine_output_dir.glob("*.flac")) + list(engine_output_dir.glob("*.wav"))
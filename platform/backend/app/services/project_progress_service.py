@@ -0,0 +1,380 @@
+"""
+项目进度投影服务
+维护 project_progress 表：
+- 段落音频、段落失败状态、段落任务进出排队/执行状态：flush 时按 (项目, 章节) 原子增量更新
+- 合成计划段落增删、分析结果状态变化：重新统计受影响章节的段落总数与失败数
+- 项目新建或更换书籍：重建该项目的全部章节行
+- 重建命令用于修复批量操作等绕过 ORM 事件造成的偏差：
+    python -m app.services.project_progress_service [--project-id ID]
+"""
+
+import argparse
+import logging
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import and_, case, delete, func, inspect, literal, select, update
+from sqlalchemy.orm import Session
+
+from ..models import (
+    AnalysisResult, AudioFile, BookChapter, JobStatus, JobType, NovelProject,
+    SynthesisJob, SynthesisPlanSegment
+)
+from ..models.project_progress import ProjectProgress, UNASSIGNED_CHAPTER
+
+logger = logging.getLogger(__name__)
+
+progress_table = ProjectProgress.__table__
+COUNT_COLUMNS = ('total_segments', 'completed_segments', 'failed_segments', 'in_flight_segments')
+
+SEGMENT_FAILED = 'failed'
+ACTIVE_JOB_STATUSES = (JobStatus.QUEUED, JobStatus.LEASED)
+
+Key = Tuple[int, int]
+
+
+# ==================== flush 变更收集 ====================
+
+def _old_and_new(obj, attrs: Iterable[str]) -> Tuple[Dict[str, object], Dict[str, object]]:
+    """对象本次 flush 前后的属性值"""
+    state = inspect(obj)
+    old, new = {}, {}
+    for attr in attrs:
+        history = state.attrs[attr].history
+        current = getattr(obj, attr)
+        new[attr] = current
+        if history.deleted:
+            old[attr] = history.deleted[0]
+        elif history.added:
+            old[attr] = None
+        else:
+            old[attr] = current
+    return old, new
+
+
+def _audio_key(values) -> Optional[Key]:
+    if values['audio_type'] != 'segment' or not values['project_id']:
+        return None
+    return values['project_id'], values['chapter_id'] or UNASSIGNED_CHAPTER
+
+
+def _failed_key(values) -> Optional[Key]:
+    if values['status'] != SEGMENT_FAILED or not values['project_id'] or values['chapter_id'] is None:
+        return None
+    return values['project_id'], values['chapter_id']
+
+
+def _in_flight_key(values) -> Optional[Key]:
+    if (values['job_type'] != JobType.SEGMENT_SYNTHESIS or values['status'] not in ACTIVE_JOB_STATUSES
+            or not values['project_id']):
+        return None
+    return values['project_id'], values['chapter_id'] or UNASSIGNED_CHAPTER
+
+
+# 模型 -> (关注的属性, 计数列, 由属性值求 (项目, 章节) 的函数)
+_DELTA_SOURCES = {
+    AudioFile: (('audio_type', 'project_id', 'chapter_id'), 'completed_segments', _audio_key),
+    SynthesisPlanSegment: (('status', 'project_id', 'chapter_id'), 'failed_segments', _failed_key),
+    SynthesisJob: (('job_type', 'status', 'project_id', 'chapter_id'), 'in_flight_segments', _in_flight_key),
+}
+
+
+def apply_flush_changes(session: Session):
+    """收集本次 flush 的相关变更并写入进度投影（在 after_flush 中调用，同一事务）"""
+    deltas: Dict[Key, Counter] = defaultdict(Counter)
+    recount_chapters: Set[int] = set()
+    rebuild_projects: Set[int] = set()
+    removed_projects: Set[int] = set()
+
+    for kind, objects in (('new', session.new), ('deleted', session.deleted), ('dirty', session.dirty)):
+        for obj in objects:
+            source = _DELTA_SOURCES.get(type(obj))
+            if source is not None:
+                attrs, column, key_of = source
+                if kind == 'dirty' and not session.is_modified(obj):
+                    continue
+                old, new = _old_and_new(obj, attrs)
+                old_key = key_of(old) if kind != 'new' else None
+                new_key = key_of(new) if kind != 'deleted' else None
+                if old_key != new_key:
+                    if old_key:
+                        deltas[old_key][column] -= 1
+                    if new_key:
+                        deltas[new_key][column] += 1
+
+            if isinstance(obj, SynthesisPlanSegment):
+                if kind != 'dirty':
+                    recount_chapters.add(obj.chapter_id)
+                else:
+                    old, new = _old_and_new(obj, ('chapter_id',))
+                    if old['chapter_id'] != new['chapter_id']:
+                        recount_chapters.update((old['chapter_id'], new['chapter_id']))
+            elif isinstance(obj, AnalysisResult):
+                if kind != 'dirty':
+                    recount_chapters.add(obj.chapter_id)
+                else:
+                    old, new = _old_and_new(obj, ('status', 'chapter_id'))
+                    if old != new:
+                        recount_chapters.update((old['chapter_id'], new['chapter_id']))
+            elif isinstance(obj, NovelProject):
+                if kind == 'deleted':
+                    removed_projects.add(obj.id)
+                elif kind == 'new':
+                    rebuild_projects.add(obj.id)
+                else:
+                    old, new = _old_and_new(obj, ('book_id',))
+                    if old != new:
+                        rebuild_projects.add(obj.id)
+
+    recount_chapters.discard(None)
+    deltas = {key: counts for key, counts in deltas.items() if any(counts.values())}
+    if not (deltas or recount_chapters or rebuild_projects or removed_projects):
+        return
+
+    connection = session.connection()
+    if removed_projects:
+        connection.execute(delete(progress_table).where(progress_table.c.project_id.in_(removed_projects)))
+        deltas = {key: counts for key, counts in deltas.items() if key[0] not in removed_projects}
+    _apply_deltas(connection, deltas)
+    # 重新统计以数据库当前（含本次 flush）状态为准，覆盖上面的增量
+    if recount_chapters:
+        _recount_chapters(connection, recount_chapters)
+    for project_id in rebuild_projects - removed_projects:
+        rebuild_project_rows(connection, project_id)
+
+
+# ==================== 写入 ====================
+
+def _insert_statement(connection):
+    dialect = connection.dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+    return insert(progress_table)
+
+
+def _apply_deltas(connection, deltas: Dict[Key, Counter]):
+    """按 (项目, 章节) 原子加减计数；行不存在时插入"""
+    insert = _insert_statement(connection)
+    for (project_id, chapter_id), counts in deltas.items():
+        values = {column: counts.get(column, 0) for column in COUNT_COLUMNS}
+        if insert is not None:
+            statement = insert.values(project_id=project_id, chapter_id=chapter_id, updated_at=func.now(), **values)
+            connection.execute(statement.on_conflict_do_update(
+                index_elements=['project_id', 'chapter_id'],
+                set_={
+                    'updated_at': func.now(),
+                    **{column: progress_table.c[column] + statement.excluded[column] for column in values}
+                }
+            ))
+            continue
+        updated = connection.execute(update(progress_table).where(and_(
+            progress_table.c.project_id == project_id, progress_table.c.chapter_id == chapter_id
+        )).values(updated_at=func.now(), **{
+            column: progress_table.c[column] + amount for column, amount in values.items()
+        })).rowcount
+        if not updated:
+            connection.execute(progress_table.insert().values(
+                project_id=project_id, chapter_id=chapter_id, updated_at=func.now(), **values
+            ))
+
+
+def _ensure_rows(connection, keys: Iterable[Key]):
+    keys = set(keys)
+    if not keys:
+        return
+    existing = set(connection.execute(select(progress_table.c.project_id, progress_table.c.chapter_id).where(
+        progress_table.c.project_id.in_({project_id for project_id, _ in keys})
+    )).all())
+    missing = [{'project_id': p, 'chapter_id': c} for p, c in keys if (p, c) not in existing]
+    if not missing:
+        return
+    insert = _insert_statement(connection)
+    if insert is not None:
+        connection.execute(insert.on_conflict_do_nothing(index_elements=['project_id', 'chapter_id']), missing)
+    else:
+        connection.execute(progress_table.insert(), missing)
+
+
+def _total_segments_query(chapter_ids):
+    """章节中已完成智能准备的段落数"""
+    return select(
+        SynthesisPlanSegment.chapter_id, func.count(SynthesisPlanSegment.id)
+    ).join(
+        AnalysisResult, SynthesisPlanSegment.analysis_result_id == AnalysisResult.id
+    ).where(
+        SynthesisPlanSegment.chapter_id.in_(chapter_ids),
+        AnalysisResult.status == 'completed'
+    ).group_by(SynthesisPlanSegment.chapter_id)
+
+
+def _recount_chapters(connection, chapter_ids: Set[int]):
+    """重新统计章节的段落总数与各项目的失败数"""
+    project_chapters = connection.execute(select(NovelProject.id, BookChapter.id).join(
+        BookChapter, BookChapter.book_id == NovelProject.book_id
+    ).where(BookChapter.id.in_(chapter_ids))).all()
+    _ensure_rows(connection, project_chapters)
+
+    totals = dict(connection.execute(_total_segments_query(chapter_ids)).all())
+    failed = {
+        (project_id, chapter_id): count
+        for project_id, chapter_id, count in connection.execute(select(
+            SynthesisPlanSegment.project_id, SynthesisPlanSegment.chapter_id, func.count(SynthesisPlanSegment.id)
+        ).where(
+            SynthesisPlanSegment.chapter_id.in_(chapter_ids),
+            SynthesisPlanSegment.status == SEGMENT_FAILED,
+            SynthesisPlanSegment.project_id.isnot(None)
+        ).group_by(SynthesisPlanSegment.project_id, SynthesisPlanSegment.chapter_id)).all()
+    }
+    rows = connection.execute(select(progress_table.c.id, progress_table.c.project_id, progress_table.c.chapter_id).where(
+        progress_table.c.chapter_id.in_(chapter_ids)
+    )).all()
+    for row_id, project_id, chapter_id in rows:
+        connection.execute(update(progress_table).where(progress_table.c.id == row_id).values(
+            total_segments=totals.get(chapter_id, 0),
+            failed_segments=failed.get((project_id, chapter_id), 0),
+            updated_at=func.now()
+        ))
+
+
+def rebuild_project_rows(connection, project_id: int):
+    """按数据库当前状态重建项目的全部进度行"""
+    book_id = connection.execute(select(NovelProject.book_id).where(NovelProject.id == project_id)).scalar()
+    counts: Dict[int, Counter] = defaultdict(Counter)
+
+    if book_id:
+        chapter_ids = connection.execute(select(BookChapter.id).where(BookChapter.book_id == book_id)).scalars().all()
+        for chapter_id in chapter_ids:
+            counts[chapter_id]
+        if chapter_ids:
+            for chapter_id, total in connection.execute(_total_segments_query(chapter_ids)).all():
+                counts[chapter_id]['total_segments'] = total
+
+    chapter = func.coalesce(AudioFile.chapter_id, literal(UNASSIGNED_CHAPTER))
+    for chapter_id, count in connection.execute(select(chapter, func.count(AudioFile.id)).where(
+        AudioFile.project_id == project_id, AudioFile.audio_type == 'segment'
+    ).group_by(chapter)).all():
+        counts[chapter_id]['completed_segments'] = count
+
+    for chapter_id, count in connection.execute(select(
+        SynthesisPlanSegment.chapter_id, func.count(SynthesisPlanSegment.id)
+    ).where(
+        SynthesisPlanSegment.project_id == project_id, SynthesisPlanSegment.status == SEGMENT_FAILED
+    ).group_by(SynthesisPlanSegment.chapter_id)).all():
+        counts[chapter_id]['failed_segments'] = count
+
+    chapter = func.coalesce(SynthesisJob.chapter_id, literal(UNASSIGNED_CHAPTER))
+    for chapter_id, count in connection.execute(select(chapter, func.count(SynthesisJob.id)).where(
+        SynthesisJob.project_id == project_id,
+        SynthesisJob.job_type == JobType.SEGMENT_SYNTHESIS,
+        SynthesisJob.status.in_(ACTIVE_JOB_STATUSES)
+    ).group_by(chapter)).all():
+        counts[chapter_id]['in_flight_segments'] = count
+
+    connection.execute(delete(progress_table).where(progress_table.c.project_id == project_id))
+    if counts:
+        connection.execute(progress_table.insert(), [
+            {'project_id': project_id, 'chapter_id': chapter_id,
+             **{column: chapter_counts.get(column, 0) for column in COUNT_COLUMNS}}
+            for chapter_id, chapter_counts in counts.items()
+        ])
+
+
+# ==================== 对外接口 ====================
+
+def rebuild_progress(db: Session, project_ids: Optional[Iterable[int]] = None) -> int:
+    """
+    重建进度投影（全部项目或指定项目）并提交
+
+    Returns:
+        重建的项目数
+    """
+    if project_ids is None:
+        project_ids = [row.id for row in db.query(NovelProject.id).order_by(NovelProject.id).all()]
+    project_ids = list(project_ids)
+    connection = db.connection()
+    for project_id in project_ids:
+        rebuild_project_rows(connection, project_id)
+    db.commit()
+    return len(project_ids)
+
+
+def refresh_in_flight(db: Session, project_id: int):
+    """批量变更任务状态（暂停/取消/恢复）后重新统计项目的进行中段落数，不提交"""
+    connection = db.connection()
+    chapter = func.coalesce(SynthesisJob.chapter_id, literal(UNASSIGNED_CHAPTER))
+    active = dict(connection.execute(select(chapter, func.count(SynthesisJob.id)).where(
+        SynthesisJob.project_id == project_id,
+        SynthesisJob.job_type == JobType.SEGMENT_SYNTHESIS,
+        SynthesisJob.status.in_(ACTIVE_JOB_STATUSES)
+    ).group_by(chapter)).all())
+    _ensure_rows(connection, [(project_id, chapter_id) for chapter_id in active])
+    connection.execute(update(progress_table).where(progress_table.c.project_id == project_id).values(
+        in_flight_segments=case(
+            *[(progress_table.c.chapter_id == chapter_id, count) for chapter_id, count in active.items()],
+            else_=0
+        ) if active else 0,
+        updated_at=func.now()
+    ))
+
+
+def get_projects_progress(db: Session, project_ids: Iterable[int]) -> Dict[int, Dict[str, float]]:
+    """
+    一次查询获取多个项目的进度汇总
+
+    Returns:
+        项目ID -> {total, completed, failed, in_flight, progress}；没有进度行的项目为全 0
+    """
+    project_ids = list(project_ids)
+    result = {
+        project_id: {'total': 0, 'completed': 0, 'failed': 0, 'in_flight': 0, 'progress': 0}
+        for project_id in project_ids
+    }
+    if not project_ids:
+        return result
+    rows = db.query(
+        ProjectProgress.project_id,
+        func.sum(ProjectProgress.total_segments),
+        func.sum(ProjectProgress.completed_segments),
+        func.sum(ProjectProgress.failed_segments),
+        func.sum(ProjectProgress.in_flight_segments)
+    ).filter(ProjectProgress.project_id.in_(project_ids)).group_by(ProjectProgress.project_id).all()
+    for project_id, total, completed, failed, in_flight in rows:
+        total, completed = int(total or 0), int(completed or 0)
+        result[project_id] = {
+            'total': total,
+            'completed': completed,
+            'failed': int(failed or 0),
+            'in_flight': int(in_flight or 0),
+            'progress': round((completed / total) * 100, 1) if total > 0 else 0
+        }
+    return result
+
+
+def get_chapter_progress(db: Session, project_id: int) -> List[ProjectProgress]:
+    """项目各章节的进度行"""
+    return db.query(ProjectProgress).filter(
+        ProjectProgress.project_id == project_id
+    ).order_by(ProjectProgress.chapter_id).all()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="重建项目进度投影")
+    parser.add_argument("--project-id", type=int, action="append", help="只重建指定项目，可重复；默认全部")
+    args = parser.parse_args()
+
+    from ..database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        count = rebuild_progress(db, args.project_id)
+        print(f"已重建 {count} 个项目的进度")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
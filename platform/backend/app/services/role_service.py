@@ -7,6 +7,7 @@ from sqlalchemy import and_, or_, func
 
 from app.models.auth import Role, Permission
 from app.schemas.role import RoleCreate, RoleUpdate
+from app.core.permission_cache import get_permission_cache
 from app.utils.logger import get_logger
 
 logger = get_logger(__name__)
@@ -126,6 +127,7 @@ class RoleService:
                 db_role.permissions = permissions
             
             self.db.commit()
+            get_permission_cache().invalidate_role(role_id)
             self.db.refresh(db_role)
             
             logger.info(f"角色更新成功: {db_role.name}")
@@ -144,6 +146,7 @@ class RoleService:
             
             self.db.delete(db_role)
             self.db.commit()
+            get_permission_cache().invalidate_role(role_id)
             
             logger.info(f"角色删除成功: {db_role.name}")
             return True
@@ -161,6 +164,7 @@ class RoleService:
             
             db_role.status = status
             self.db.commit()
+            get_permission_cache().invalidate_role(role_id)
             self.db.refresh(db_role)
             
             logger.info(f"角色状态更新成功: {db_role.name} -> {status}")
@@ -185,6 +189,7 @@ class RoleService:
             # 更新角色权限
             db_role.permissions = permissions
             self.db.commit()
+            get_permission_cache().invalidate_role(role_id)
             
             logger.info(f"角色权限更新成功: {db_role.name}")
             return True
@@ -207,6 +212,7 @@ class RoleService:
             if permission not in db_role.permissions:
                 db_role.permissions.append(permission)
                 self.db.commit()
+                get_permission_cache().invalidate_role(role_id)
                 logger.info(f"权限分配成功: {db_role.name} -> {permission.name}")
             
             return True
@@ -229,6 +235,7 @@ class RoleService:
             if permission in db_role.permissions:
                 db_role.permissions.remove(permission)
                 self.db.commit()
+                get_permission_cache().invalidate_role(role_id)
                 logger.info(f"权限移除成功: {db_role.name} -> {permission.name}")
             
             return True
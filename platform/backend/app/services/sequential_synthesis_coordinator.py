@@ -1,6 +1,10 @@
 """
 顺序生成协调器
 协调 TTS3 → TangoFlux → 混合 的完整环境音混合流程
+
+流水线模式（默认）下四个阶段按场景重叠执行：某个场景的对话合成完毕后，
+其环境音生成立即开始，而后续场景的TTS继续进行；场景的对话与环境音都就绪后即可混合。
+整章耗时趋近于最慢的阶段，而不是四个阶段之和
 """
 
 import os
@@ -9,27 +13,36 @@ import asyncio
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 import json
-import numpy as np
 
 from sqlalchemy.orm import Session
 from app.database import get_db
 from app.models import NovelProject, AudioFile
 from app.novel_reader import process_audio_generation_from_synthesis_plan
-from app.services.sequential_timeline_generator import timeline_generator
-from app.services.audio_enhancement import AudioEnhancementService
-from app.clients.tangoflux_client import TangoFluxClient
-from app.utils import get_audio_duration
-from pydub import AudioSegment
-import io
+from app.services.sequential_timeline_generator import timeline_generator, SceneSegment
+from app.services.environment_sound_cache import get_environment_sound_cache
+from app.services.ambience_tiler import get_ambience_tiler, seed_for
+from app.services.audio_timeline_renderer import (
+    TimelineRenderer, TimelineClip, RenderedAudio, write_rendered_sequence
+)
+from app.clients.tangoflux_client import get_tangoflux_client
 
 logger = logging.getLogger(__name__)
 
+# 流水线模式开关及各阶段并发上限（TTS并发仍由 parallel_tasks 控制）
+SYNTHESIS_PIPELINE_ENABLED = os.getenv("SYNTHESIS_PIPELINE_ENABLED", "true").lower() in ("1", "true", "yes")
+ENVIRONMENT_CONCURRENCY = int(os.getenv("SYNTHESIS_ENVIRONMENT_CONCURRENCY", "1"))
+MIXING_CONCURRENCY = int(os.getenv("SYNTHESIS_MIXING_CONCURRENCY", "1"))
+
+
 class SequentialSynthesisCoordinator:
     """顺序生成协调器 - 管理完整的环境音混合流程"""
     
-    def __init__(self):
-        self.audio_enhancement = AudioEnhancementService()
-        self.tangoflux_client = TangoFluxClient()
+    def __init__(self, pipelined: Optional[bool] = None):
+        self.tangoflux_client = get_tangoflux_client()
+        self.pipelined = SYNTHESIS_PIPELINE_ENABLED if pipelined is None else pipelined
+        self.environment_concurrency = max(1, ENVIRONMENT_CONCURRENCY)
+        self.mixing_concurrency = max(1, MIXING_CONCURRENCY)
+        self.renderer = TimelineRenderer()
         
     async def synthesize_with_environment(
         self, 
@@ -79,6 +92,17 @@ class SequentialSynthesisCoordinator:
             }
             
             try:
+                if enable_environment and self.pipelined:
+                    await self._run_pipeline(
+                        project_id, synthesis_data, environment_volume, parallel_tasks,
+                        progress_callback, result
+                    )
+                    project.status = 'completed'
+                    db.commit()
+                    
+                    logger.info(f"[COORDINATOR] 项目 {project_id} 环境音混合合成完成（流水线模式）")
+                    return result
+                
                 # 阶段1: TTS语音合成
                 await self._update_progress(progress_callback, "stage_1_tts", 0, "开始TTS语音合成...")
                 dialogue_files = await self._stage_1_tts_synthesis(
@@ -225,31 +249,9 @@ class SequentialSynthesisCoordinator:
                     f"生成环境音 {i+1}/{len(timeline.environment_tracks)}: {track.scene_prompt}"
                 )
                 
-                # 生成环境音音频
-                audio_data = await self._generate_single_environment_audio(
-                    track.tango_prompt, track.duration
-                )
-                
-                if audio_data:
-                    # 保存环境音文件
-                    env_filename = f"environment_{i+1:03d}_{track.scene_prompt.replace(' ', '_')}.wav"
-                    env_path = os.path.join(project_output_dir, env_filename)
-                    
-                    with open(env_path, 'wb') as f:
-                        f.write(audio_data)
-                    
-                    environment_files.append({
-                        "file_path": env_path,
-                        "start_time": track.start_time,
-                        "end_time": track.end_time,
-                        "duration": track.duration,
-                        "scene_prompt": track.scene_prompt,
-                        "volume_level": track.volume_level
-                    })
-                    
-                    logger.info(f"[COORDINATOR] 环境音生成成功: {env_filename}")
-                else:
-                    logger.warning(f"[COORDINATOR] 环境音生成失败: {track.scene_prompt}")
+                env_file = await self._generate_environment_file(i, track, project_output_dir)
+                if env_file:
+                    environment_files.append(env_file)
                     
             except Exception as e:
                 logger.error(f"[COORDINATOR] 环境音轨道 {i} 生成失败: {str(e)}")
@@ -272,23 +274,17 @@ class SequentialSynthesisCoordinator:
         logger.info(f"[COORDINATOR] 阶段4: 开始音频混合")
         
         try:
-            # 加载所有对话音频并按时间顺序拼接
-            dialogue_audio = self._load_and_concatenate_dialogue(dialogue_files)
-            
-            # 创建环境音轨道
-            environment_audio = self._create_environment_track(
-                environment_files, dialogue_audio.duration_seconds, environment_volume
+            # 对话拼接与环境音叠加在同一缓冲区中渲染
+            mixed_audio = await asyncio.to_thread(
+                self._render_mix, dialogue_files, environment_files, environment_volume
             )
             
-            # 混合音频
-            mixed_audio = dialogue_audio.overlay(environment_audio)
-            
             # 保存最终音频文件
             project_output_dir = f"outputs/projects/{project_id}"
             final_filename = f"final_mixed_audio_{project_id}_{int(datetime.now().timestamp())}.wav"
             final_path = os.path.join(project_output_dir, final_filename)
             
-            mixed_audio.export(final_path, format="wav")
+            await asyncio.to_thread(mixed_audio.write, final_path)
             
             logger.info(f"[COORDINATOR] 阶段4完成: 最终音频已保存 {final_path}")
             return final_path
@@ -297,6 +293,170 @@ class SequentialSynthesisCoordinator:
             logger.error(f"[COORDINATOR] 音频混合失败: {str(e)}")
             raise
     
+    async def _run_pipeline(
+        self,
+        project_id: int,
+        synthesis_data: List[Dict],
+        environment_volume: float,
+        parallel_tasks: int,
+        progress_callback,
+        result: Dict[str, Any]
+    ):
+        """
+        流水线执行四个阶段
+        TTS每完成一段即追加到增量时间轴；场景闭合后立即调度该场景的环境音生成与混合，
+        最后按场景顺序拼接各场景的混合结果。阶段名与进度区间与顺序模式一致，进度只增不减
+        """
+        logger.info(f"[COORDINATOR] 流水线模式: 项目 {project_id}, {len(synthesis_data)} 个段落")
+        
+        project_output_dir = f"outputs/projects/{project_id}"
+        os.makedirs(project_output_dir, exist_ok=True)
+        
+        builder = timeline_generator.create_incremental_builder()
+        environment_semaphore = asyncio.Semaphore(self.environment_concurrency)
+        mixing_semaphore = asyncio.Semaphore(self.mixing_concurrency)
+        scene_tasks: List[asyncio.Task] = []
+        dialogue_files: List[Dict] = []
+        environment_files: List[Dict] = []
+        state = {"percent": 0, "scenes_total": None, "environment_done": 0}
+        
+        async def report(stage: str, percent: float, message: str):
+            state["percent"] = max(state["percent"], percent)
+            await self._update_progress(progress_callback, stage, state["percent"], message)
+        
+        async def process_scene(scene: SceneSegment) -> RenderedAudio:
+            track = scene.track
+            async with environment_semaphore:
+                total = state["scenes_total"]
+                if total:
+                    await report(
+                        "stage_3_environment", 50 + (state["environment_done"] / total) * 20,
+                        f"生成环境音 {scene.index + 1}/{total}: {track.scene_prompt}"
+                    )
+                else:
+                    await report(
+                        "stage_3_environment", state["percent"],
+                        f"生成环境音 {scene.index + 1}: {track.scene_prompt}"
+                    )
+                try:
+                    env_file = await self._generate_environment_file(scene.index, track, project_output_dir)
+                except Exception as e:
+                    logger.error(f"[COORDINATOR] 环境音轨道 {scene.index} 生成失败: {str(e)}")
+                    env_file = None
+            state["environment_done"] += 1
+            if env_file:
+                environment_files.append(env_file)
+            
+            async with mixing_semaphore:
+                return await asyncio.to_thread(
+                    self._mix_scene, scene, env_file, environment_volume
+                )
+        
+        def schedule(scene: Optional[SceneSegment]):
+            if scene is not None:
+                logger.info(f"[COORDINATOR] 场景 {scene.index + 1} 对话就绪 "
+                            f"({scene.start_time:.2f}s-{scene.end_time:.2f}s)，开始生成环境音")
+                scene_tasks.append(asyncio.create_task(process_scene(scene)))
+        
+        async def on_segment_complete(segment_index: int, segment_data: Dict, segment_result: Dict):
+            dialogue_file = {
+                "file_path": segment_result["file_path"],
+                "text_content": segment_data.get("text", ""),
+                "speaker": segment_result.get("speaker") or segment_data.get("speaker", "旁白"),
+                "duration": segment_result.get("duration"),
+                "paragraph_index": segment_result.get("segment_id", segment_index + 1)
+            }
+            dialogue_files.append(dialogue_file)
+            schedule(builder.add(dialogue_file))
+        
+        try:
+            # 阶段1: TTS语音合成（阶段2/3/4随场景闭合在后台展开）
+            await report("stage_1_tts", 0, "开始TTS语音合成...")
+            await process_audio_generation_from_synthesis_plan(
+                project_id, synthesis_data, parallel_tasks, on_segment_complete=on_segment_complete
+            )
+            result["stages_completed"].append("tts_synthesis")
+            result["dialogue_files_count"] = len(dialogue_files)
+            
+            # 阶段2: 时间轴随TTS增量生成，此处闭合最后一个场景
+            await report("stage_2_timeline", 25, "分析音频，生成时间轴...")
+            schedule(builder.finish())
+            timeline = builder.build_timeline()
+            state["scenes_total"] = len(scene_tasks)
+            result["stages_completed"].append("timeline_generation")
+            result["total_duration"] = timeline.total_duration
+            
+            if not scene_tasks:
+                raise ValueError(f"项目 {project_id} 没有可混合的对话音频")
+            
+            # 阶段3: 等待剩余场景的环境音
+            await report("stage_3_environment", 50, "生成环境音效...")
+            scene_mixes = await asyncio.gather(*scene_tasks)
+            result["stages_completed"].append("environment_generation")
+            result["environment_files_count"] = len(environment_files)
+            
+            # 阶段4: 各场景已分别混合，按顺序拼接导出
+            await report("stage_4_mixing", 75, "混合音频，生成最终文件...")
+            final_filename = f"final_mixed_audio_{project_id}_{int(datetime.now().timestamp())}.wav"
+            final_path = os.path.join(project_output_dir, final_filename)
+            await asyncio.to_thread(self._export_scene_mixes, scene_mixes, final_path)
+            result["stages_completed"].append("audio_mixing")
+            result["final_audio_path"] = final_path
+            
+            await report("completed", 100, "环境音混合完成！")
+            logger.info(f"[COORDINATOR] 流水线完成: {len(scene_mixes)} 个场景, 最终音频 {final_path}")
+        
+        finally:
+            for task in scene_tasks:
+                if not task.done():
+                    task.cancel()
+    
+    async def _generate_environment_file(self, index: int, track: Any, project_output_dir: str) -> Optional[Dict]:
+        """
+        生成并保存单个环境音轨道，失败时返回 None
+        """
+        audio_data = await self._generate_single_environment_audio(
+            track.tango_prompt, track.duration
+        )
+        
+        if not audio_data:
+            logger.warning(f"[COORDINATOR] 环境音生成失败: {track.scene_prompt}")
+            return None
+        
+        # 保存环境音文件
+        env_filename = f"environment_{index+1:03d}_{track.scene_prompt.replace(' ', '_')}.wav"
+        env_path = os.path.join(project_output_dir, env_filename)
+        
+        with open(env_path, 'wb') as f:
+            f.write(audio_data)
+        
+        logger.info(f"[COORDINATOR] 环境音生成成功: {env_filename}")
+        return {
+            "file_path": env_path,
+            "start_time": track.start_time,
+            "end_time": track.end_time,
+            "duration": track.duration,
+            "scene_prompt": track.scene_prompt,
+            "volume_level": track.volume_level
+        }
+    
+    def _mix_scene(self, scene: SceneSegment, env_file: Optional[Dict], environment_volume: float) -> RenderedAudio:
+        """
+        混合单个场景：场景内对话拼接后叠加该场景的环境音（时间相对场景起点）
+        """
+        scene_env_files = []
+        if env_file:
+            scene_env_files.append({
+                **env_file,
+                "start_time": 0.0,
+                "end_time": env_file["end_time"] - env_file["start_time"]
+            })
+        return self._render_mix(scene.audio_files, scene_env_files, environment_volume)
+    
+    def _export_scene_mixes(self, scene_mixes: List[RenderedAudio], final_path: str):
+        """按场景顺序写出混合结果"""
+        write_rendered_sequence(scene_mixes, final_path)
+    
     async def _generate_single_environment_audio(self, prompt: str, duration: float) -> Optional[bytes]:
         """
         生成单个环境音音频
@@ -305,78 +465,51 @@ class SequentialSynthesisCoordinator:
             # 限制时长在合理范围内
             duration = max(1.0, min(duration, 60.0))
             
-            # 调用TangoFlux生成音频
-            audio_data = await self.audio_enhancement.generate_scene_audio(
-                prompt, int(duration)
-            )
+            # 调用TangoFlux生成短种子（经生成缓存，重复场景只生成一次），再循环拼接到轨道时长
+            async def generate(bucket_duration: float) -> Optional[bytes]:
+                result = await self.tangoflux_client.generate_environment_sound(
+                    prompt, duration=bucket_duration, steps=50, return_type='file'
+                )
+                if not result['success']:
+                    logger.warning(f"[COORDINATOR] TangoFlux生成失败 '{prompt}': {result.get('error')}")
+                    return None
+                return result['audio_data']
             
-            return audio_data
+            tiler = get_ambience_tiler()
+            cached = await get_environment_sound_cache().get_or_generate(
+                prompt, tiler.generation_duration(duration), generate,
+                steps=50, guidance_scale=3.5, max_duration=30.0
+            )
+            if not cached:
+                return None
+            return await asyncio.to_thread(tiler.extend_wav_bytes, cached.read_bytes(), duration, seed_for(prompt))
             
         except Exception as e:
             logger.error(f"[COORDINATOR] 环境音生成失败 '{prompt}': {str(e)}")
             return None
     
-    def _load_and_concatenate_dialogue(self, dialogue_files: List[Dict]) -> AudioSegment:
-        """
-        加载并拼接所有对话音频
-        """
-        concatenated = AudioSegment.empty()
-        
-        for file_info in dialogue_files:
-            try:
-                audio = AudioSegment.from_wav(file_info["file_path"])
-                concatenated += audio
-            except Exception as e:
-                logger.error(f"[COORDINATOR] 加载音频文件失败 {file_info['file_path']}: {str(e)}")
-                # 添加静音作为占位符
-                placeholder = AudioSegment.silent(duration=3000)  # 3秒静音
-                concatenated += placeholder
-        
-        return concatenated
-    
-    def _create_environment_track(
-        self, 
-        environment_files: List[Dict], 
-        target_duration: float,
+    def _render_mix(
+        self,
+        dialogue_files: List[Dict],
+        environment_files: List[Dict],
         volume_level: float
-    ) -> AudioSegment:
+    ) -> RenderedAudio:
         """
-        创建环境音轨道，匹配目标时长
+        渲染混合音轨：对话按顺序拼接（无法加载的文件以3秒静音占位），
+        环境音按时间轴位置叠加并截断到各自的时间段
         """
-        if not environment_files:
-            # 如果没有环境音文件，创建静音轨道
-            return AudioSegment.silent(duration=int(target_duration * 1000))
-        
-        # 创建环境音轨道
-        environment_track = AudioSegment.silent(duration=int(target_duration * 1000))
-        
+        clips = []
         for env_file in environment_files:
-            try:
-                # 加载环境音文件
-                env_audio = AudioSegment.from_wav(env_file["file_path"])
-                
-                # 调整音量
-                file_volume = env_file.get("volume_level", volume_level)
-                env_audio = env_audio + (20 * np.log10(file_volume)) if file_volume > 0 else env_audio - 60
-                
-                # 计算在时间轴上的位置
-                start_ms = int(env_file["start_time"] * 1000)
-                end_ms = int(env_file["end_time"] * 1000)
-                
-                # 确保不超出目标时长
-                if start_ms < len(environment_track):
-                    # 裁剪环境音以匹配时间段
-                    target_length = min(end_ms - start_ms, len(env_audio))
-                    env_audio = env_audio[:target_length]
-                    
-                    # 叠加到环境音轨道
-                    environment_track = environment_track.overlay(env_audio, position=start_ms)
-                
-            except Exception as e:
-                logger.error(f"[COORDINATOR] 处理环境音文件失败 {env_file['file_path']}: {str(e)}")
-                continue
+            # 调整音量（音量为0时按 -60dB 处理）
+            file_volume = env_file.get("volume_level", volume_level)
+            clips.append(TimelineClip(
+                file_path=env_file["file_path"],
+                start_time=env_file["start_time"],
+                end_time=env_file["end_time"],
+                gain=file_volume if file_volume > 0 else 10 ** (-60 / 20)
+            ))
         
-        return environment_track
+        return self.renderer.render([file_info["file_path"] for file_info in dialogue_files], clips)
     
     async def _update_progress(self, progress_callback, stage: str, percent: int, message: str):
         """
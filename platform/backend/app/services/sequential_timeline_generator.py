@@ -10,7 +10,7 @@ from dataclasses import dataclass
 from pathlib import Path
 import re
 
-from app.utils import get_audio_duration
+from app.services.audio_metadata_service import get_audio_metadata_service
 from app.services.audio_enhancement import AudioEnhancementService
 
 logger = logging.getLogger(__name__)
@@ -125,37 +125,41 @@ class SequentialTimelineGenerator:
         current_time = 0.0
         
         for index, audio_file in enumerate(audio_files):
-            file_path = audio_file.get('file_path', '')
-            text_content = audio_file.get('text_content', '')
-            speaker = audio_file.get('speaker', '旁白')
-            
-            # 获取实际音频时长
-            duration = self._get_audio_duration_safe(file_path)
-            if duration is None:
-                logger.warning(f"无法获取音频时长: {file_path}")
-                duration = self._estimate_duration_from_text(text_content)
-            
-            # 提取场景关键词
-            scene_keywords = self._extract_scene_keywords(text_content)
-            
-            segment = DialogueSegment(
-                index=index,
-                start_time=current_time,
-                end_time=current_time + duration,
-                duration=duration,
-                file_path=file_path,
-                text_content=text_content,
-                speaker=speaker,
-                scene_keywords=scene_keywords
-            )
-            
+            segment = self.build_dialogue_segment(index, audio_file, current_time)
             dialogue_segments.append(segment)
-            current_time += duration
-            
-            logger.info(f"段落 {index}: {duration:.2f}s, 累计: {current_time:.2f}s")
+            current_time = segment.end_time
         
         return dialogue_segments
     
+    def build_dialogue_segment(self, index: int, audio_file: Dict[str, Any], start_time: float) -> DialogueSegment:
+        """根据单个音频文件生成从 start_time 开始的对话段落"""
+        file_path = audio_file.get('file_path', '')
+        text_content = audio_file.get('text_content', '')
+        speaker = audio_file.get('speaker', '旁白')
+        
+        # 获取实际音频时长
+        duration = self._get_audio_duration_safe(file_path)
+        if duration is None:
+            logger.warning(f"无法获取音频时长: {file_path}")
+            duration = self._estimate_duration_from_text(text_content)
+        
+        # 提取场景关键词
+        scene_keywords = self._extract_scene_keywords(text_content)
+        
+        segment = DialogueSegment(
+            index=index,
+            start_time=start_time,
+            end_time=start_time + duration,
+            duration=duration,
+            file_path=file_path,
+            text_content=text_content,
+            speaker=speaker,
+            scene_keywords=scene_keywords
+        )
+        
+        logger.info(f"段落 {index}: {duration:.2f}s, 累计: {segment.end_time:.2f}s")
+        return segment
+    
     def detect_scene_changes(self, dialogue_segments: List[DialogueSegment]) -> List[Dict[str, Any]]:
         """
         检测场景切换点
@@ -266,12 +270,16 @@ class SequentialTimelineGenerator:
         
         return timeline
     
+    def create_incremental_builder(self) -> "IncrementalTimelineBuilder":
+        """创建增量时间轴构建器（流水线合成时逐段追加对话音频）"""
+        return IncrementalTimelineBuilder(self)
+    
     def _get_audio_duration_safe(self, file_path: str) -> Optional[float]:
         """安全获取音频时长"""
         try:
             if not file_path or not os.path.exists(file_path):
                 return None
-            return get_audio_duration(file_path)
+            return get_audio_metadata_service().get_duration(file_path)
         except Exception as e:
             logger.warning(f"获取音频时长失败 {file_path}: {e}")
             return None
@@ -425,5 +433,105 @@ class SequentialTimelineGenerator:
         }
 
 
+@dataclass
+class SceneSegment:
+    """已闭合的场景：场景内的对话音频及其环境音轨道"""
+    index: int
+    start_time: float
+    end_time: float
+    audio_files: List[Dict[str, Any]]
+    dialogue_segments: List[DialogueSegment]
+    track: EnvironmentTrack
+    
+    @property
+    def duration(self) -> float:
+        return self.end_time - self.start_time
+
+
+class IncrementalTimelineBuilder:
+    """
+    增量时间轴构建器
+    对话音频按顺序逐段追加，检测到场景切换时立即产出上一个场景，
+    无需等待整章合成完成。产出的场景与 generate_timeline 的环境音轨道一一对应
+    """
+    
+    def __init__(self, generator: SequentialTimelineGenerator):
+        self.generator = generator
+        self.dialogue_segments: List[DialogueSegment] = []
+        self.environment_tracks: List[EnvironmentTrack] = []
+        self.scene_changes: List[Dict[str, Any]] = []
+        self._current_scene: Optional[SceneInfo] = None
+        self._scene_audio_files: List[Dict[str, Any]] = []
+        self._scene_segments: List[DialogueSegment] = []
+        self._scene_count = 0
+        self._finished = False
+    
+    @property
+    def total_duration(self) -> float:
+        return self.dialogue_segments[-1].end_time if self.dialogue_segments else 0.0
+    
+    def add(self, audio_file: Dict[str, Any]) -> Optional[SceneSegment]:
+        """追加一段对话音频，若该段开启了新场景则返回刚闭合的上一个场景"""
+        if self._finished:
+            raise RuntimeError("时间轴已完成，不能继续追加段落")
+        
+        segment = self.generator.build_dialogue_segment(
+            len(self.dialogue_segments), audio_file, self.total_duration
+        )
+        scene_info = self.generator._analyze_segment_scene(segment)
+        
+        closed_scene = None
+        if self.generator._is_scene_changed(self._current_scene, scene_info):
+            closed_scene = self._close_scene(segment.start_time)
+            self.scene_changes.append({
+                "time": segment.start_time,
+                "segment_index": segment.index,
+                "from_scene": self._current_scene,
+                "to_scene": scene_info,
+                "confidence": scene_info.confidence
+            })
+            self._current_scene = scene_info
+            logger.info(f"检测到场景切换 @ {segment.start_time:.2f}s: {scene_info.location}/{scene_info.atmosphere}")
+        
+        self.dialogue_segments.append(segment)
+        self._scene_audio_files.append(audio_file)
+        self._scene_segments.append(segment)
+        return closed_scene
+    
+    def finish(self) -> Optional[SceneSegment]:
+        """所有段落追加完毕，返回最后一个场景"""
+        self._finished = True
+        return self._close_scene(self.total_duration)
+    
+    def build_timeline(self) -> Timeline:
+        """返回目前为止的完整时间轴"""
+        return Timeline(
+            total_duration=self.total_duration,
+            dialogue_segments=list(self.dialogue_segments),
+            environment_tracks=list(self.environment_tracks),
+            scene_changes=list(self.scene_changes)
+        )
+    
+    def _close_scene(self, end_time: float) -> Optional[SceneSegment]:
+        if not self._scene_segments:
+            return None
+        
+        start_time = self._scene_segments[0].start_time
+        track = self.generator._create_environment_track(start_time, end_time, self._current_scene)
+        scene = SceneSegment(
+            index=self._scene_count,
+            start_time=start_time,
+            end_time=end_time,
+            audio_files=self._scene_audio_files,
+            dialogue_segments=self._scene_segments,
+            track=track
+        )
+        self.environment_tracks.append(track)
+        self._scene_count += 1
+        self._scene_audio_files = []
+        self._scene_segments = []
+        return scene
+
+
 # 全局实例
 timeline_generator = SequentialTimelineGenerator()
\ No newline at end of file
@@ -0,0 +1,178 @@
+"""
+合成计划段落服务
+基于 synthesis_plan_segments 表的局部更新、状态标记与重试筛选：
+只读写受影响的段落行，不再加载并重写整份合成计划 JSON
+"""
+
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import and_, distinct, func
+from sqlalchemy.orm import Session, contains_eager
+
+from ..models import AnalysisResult, AudioFile, BookChapter, SynthesisPlanSegment
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_PENDING = 'pending'
+SEGMENT_COMPLETED = 'completed'
+SEGMENT_FAILED = 'failed'
+
+
+def book_segments_query(db: Session, book_id: int):
+    """书籍下已完成智能准备的全部段落（按章节号、段落位置排序），同时载入所属分析结果与章节"""
+    return db.query(SynthesisPlanSegment).join(
+        AnalysisResult, SynthesisPlanSegment.analysis_result_id == AnalysisResult.id
+    ).join(
+        BookChapter, AnalysisResult.chapter_id == BookChapter.id
+    ).filter(
+        BookChapter.book_id == book_id,
+        AnalysisResult.status == 'completed'
+    ).options(
+        contains_eager(SynthesisPlanSegment.analysis_result).contains_eager(AnalysisResult.chapter)
+    ).order_by(BookChapter.chapter_number, SynthesisPlanSegment.segment_index)
+
+
+def find_book_segment(db: Session, book_id: int, segment_id: int) -> Optional[SynthesisPlanSegment]:
+    """按 segment_id 定位书籍中的段落"""
+    return book_segments_query(db, book_id).filter(SynthesisPlanSegment.segment_id == segment_id).first()
+
+
+def count_book_segments(db: Session, book_id: int) -> int:
+    """书籍中应合成的段落数（按 segment_id 去重）"""
+    return db.query(func.count(distinct(SynthesisPlanSegment.segment_id))).join(
+        AnalysisResult, SynthesisPlanSegment.analysis_result_id == AnalysisResult.id
+    ).join(
+        BookChapter, AnalysisResult.chapter_id == BookChapter.id
+    ).filter(
+        BookChapter.book_id == book_id,
+        AnalysisResult.status == 'completed'
+    ).scalar() or 0
+
+
+def missing_audio_segments(db: Session, project_id: int, book_id: int) -> List[SynthesisPlanSegment]:
+    """
+    项目中尚无段落音频的段落（反连接 AudioFile），即需要重试的段落；按 segment_id 去重
+    """
+    rows = book_segments_query(db, book_id).outerjoin(
+        AudioFile, and_(
+            AudioFile.project_id == project_id,
+            AudioFile.audio_type == 'segment',
+            AudioFile.paragraph_index == SynthesisPlanSegment.segment_id
+        )
+    ).filter(
+        SynthesisPlanSegment.segment_id.isnot(None),
+        AudioFile.id.is_(None)
+    ).all()
+    seen = set()
+    missing = []
+    for row in rows:
+        if row.segment_id not in seen:
+            seen.add(row.segment_id)
+            missing.append(row)
+    return missing
+
+
+def update_plan_segments(
+    db: Session,
+    analysis_result_id: int,
+    updates: Dict[int, Dict[str, Any]],
+    commit: bool = True
+) -> Dict[str, List[int]]:
+    """
+    局部更新段落：只加载并写入 updates 中列出的段落
+
+    Args:
+        analysis_result_id: 分析结果ID
+        updates: segment_id -> 需要合并进段落数据的字段
+        commit: 是否提交
+
+    Returns:
+        {'updated': 数据有变化的segment_id, 'not_found': 计划中不存在的segment_id}
+    """
+    if not updates:
+        return {'updated': [], 'not_found': []}
+    rows = db.query(SynthesisPlanSegment).filter(
+        SynthesisPlanSegment.analysis_result_id == analysis_result_id,
+        SynthesisPlanSegment.segment_id.in_(list(updates.keys()))
+    ).all()
+
+    updated = []
+    for row in rows:
+        data = {**row.data, **updates[row.segment_id]}
+        if data != row.data:
+            row.set_data(data)
+            updated.append(row.segment_id)
+    if commit and updated:
+        db.commit()
+    found = {row.segment_id for row in rows}
+    return {
+        'updated': sorted(updated),
+        'not_found': sorted(segment_id for segment_id in updates if segment_id not in found)
+    }
+
+
+def fix_segment_chapter_numbers(db: Session, chapter_numbers: Dict[int, int]) -> int:
+    """
+    修正段落数据中的章节号，只写入不一致的行
+
+    Args:
+        chapter_numbers: 章节ID -> 正确的章节号
+
+    Returns:
+        修正的段落数
+    """
+    if not chapter_numbers:
+        return 0
+    fixed = 0
+    rows = db.query(SynthesisPlanSegment).filter(
+        SynthesisPlanSegment.chapter_id.in_(list(chapter_numbers.keys()))
+    ).all()
+    for row in rows:
+        chapter_id = row.data.get('chapter_id')
+        if chapter_id in chapter_numbers and row.data.get('chapter_number') != chapter_numbers[chapter_id]:
+            row.set_data({**row.data, 'chapter_number': chapter_numbers[chapter_id]})
+            fixed += 1
+    return fixed
+
+
+def mark_segment_status(
+    db: Session,
+    chapter_id: Any,
+    segment_id: Any,
+    status: str,
+    project_id: Optional[int] = None,
+    error_message: Optional[str] = None
+) -> int:
+    """
+    标记段落合成状态（按 chapter_id+segment_id 索引定位，不提交）
+    经 ORM 写入，失败数等进度投影随 flush 同步更新
+
+    Returns:
+        更新的行数
+    """
+    if not isinstance(chapter_id, int) or not isinstance(segment_id, int):
+        return 0
+    rows = db.query(SynthesisPlanSegment).filter(
+        SynthesisPlanSegment.chapter_id == chapter_id,
+        SynthesisPlanSegment.segment_id == segment_id
+    ).all()
+    now = datetime.utcnow()
+    for row in rows:
+        row.status = status
+        row.error_message = error_message if status == SEGMENT_FAILED else None
+        row.updated_at = now
+        if project_id is not None:
+            row.project_id = project_id
+        if status == SEGMENT_COMPLETED:
+            row.synthesized_at = now
+    return len(rows)
+
+
+def segments_by_status(db: Session, chapter_ids: Iterable[int], status: str) -> List[SynthesisPlanSegment]:
+    """章节中处于指定状态的段落"""
+    return db.query(SynthesisPlanSegment).filter(
+        SynthesisPlanSegment.chapter_id.in_(list(chapter_ids)),
+        SynthesisPlanSegment.status == status
+    ).order_by(SynthesisPlanSegment.chapter_id, SynthesisPlanSegment.segment_index).all()
@@ -0,0 +1,364 @@
+"""
+系统日志存储服务
+- PostgreSQL 上 system_logs 按 created_at 范围分区（按天或按月），保留期清理直接
+  DETACH + DROP 过期分区，不做 DELETE 扫描、不长时间锁表
+- 分区提前创建，默认分区只作兜底且保持为空，维护过程中从不摘下
+- 多个进程的维护任务用 advisory lock 互斥
+- 关键词搜索走 message 上的 pg_trgm GIN 索引（ILIKE）
+- 列表使用 (created_at, id) 游标分页，翻页代价与页码无关
+非分区环境（SQLite 开发库、尚未迁移的库）退化为分批删除
+"""
+
+import asyncio
+import base64
+import logging
+import os
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, or_, text
+from sqlalchemy.orm import Session
+
+from ..models.system import SystemLog
+
+logger = logging.getLogger(__name__)
+
+# 分区粒度：day | month
+LOG_PARTITION_GRANULARITY = os.getenv("LOG_PARTITION_GRANULARITY", "day")
+# 提前创建的未来分区数，避免新日志落入默认分区
+LOG_PARTITIONS_AHEAD = int(os.getenv("LOG_PARTITIONS_AHEAD", "7"))
+# 后台维护自动清理的保留天数，0 表示只建分区不自动清理
+LOG_RETENTION_DAYS = int(os.getenv("LOG_RETENTION_DAYS", "0"))
+# 后台维护（建分区 + 清理过期分区）间隔（秒），0 表示不启动
+LOG_MAINTENANCE_INTERVAL = int(os.getenv("LOG_MAINTENANCE_INTERVAL", "3600"))
+# 非分区环境下每批删除的行数
+LOG_DELETE_BATCH_SIZE = int(os.getenv("LOG_DELETE_BATCH_SIZE", "5000"))
+# 建分区 / 分离分区时等待父表锁的上限，超时则留到下一次维护
+LOG_MAINTENANCE_LOCK_TIMEOUT = os.getenv("LOG_MAINTENANCE_LOCK_TIMEOUT", "5s")
+# 分区维护的 advisory lock 键（"syslogmt"）
+LOG_MAINTENANCE_LOCK_KEY = int.from_bytes(b"syslogmt", "big")
+
+LOG_TABLE = "system_logs"
+DEFAULT_PARTITION = f"{LOG_TABLE}_default"
+
+
+# ==================== 分区命名与范围 ====================
+
+def _period_start(moment: datetime, granularity: str) -> datetime:
+    if granularity == "month":
+        return datetime(moment.year, moment.month, 1)
+    return datetime(moment.year, moment.month, moment.day)
+
+
+def _next_period(start: datetime, granularity: str) -> datetime:
+    if granularity == "month":
+        return datetime(start.year + start.month // 12, start.month % 12 + 1, 1)
+    return start + timedelta(days=1)
+
+
+def partition_name(start: datetime, granularity: str = LOG_PARTITION_GRANULARITY) -> str:
+    """分区表名：system_logs_p20250723（按天）/ system_logs_p202507（按月）"""
+    suffix = start.strftime("%Y%m") if granularity == "month" else start.strftime("%Y%m%d")
+    return f"{LOG_TABLE}_p{suffix}"
+
+
+def parse_partition_name(name: str) -> Optional[Tuple[datetime, datetime]]:
+    """从分区表名解析 [起, 止)；不是按本规则命名的分区返回 None"""
+    prefix = f"{LOG_TABLE}_p"
+    if not name.startswith(prefix):
+        return None
+    suffix = name[len(prefix):]
+    try:
+        if len(suffix) == 6:
+            start = datetime.strptime(suffix, "%Y%m")
+            return start, _next_period(start, "month")
+        if len(suffix) == 8:
+            start = datetime.strptime(suffix, "%Y%m%d")
+            return start, _next_period(start, "day")
+    except ValueError:
+        pass
+    return None
+
+
+def partition_ranges(since: datetime, until: datetime,
+                     granularity: str = LOG_PARTITION_GRANULARITY) -> List[Tuple[str, datetime, datetime]]:
+    """覆盖 [since, until] 的所有分区 (表名, 起, 止)"""
+    ranges = []
+    start = _period_start(since, granularity)
+    while start <= until:
+        end = _next_period(start, granularity)
+        ranges.append((partition_name(start, granularity), start, end))
+        start = end
+    return ranges
+
+
+def partitions_until(now: datetime, ahead: int = LOG_PARTITIONS_AHEAD,
+                     granularity: str = LOG_PARTITION_GRANULARITY) -> datetime:
+    """当前周期之后第 ahead 个周期的起始时间"""
+    until = _period_start(now, granularity)
+    for _ in range(ahead):
+        until = _next_period(until, granularity)
+    return until
+
+
+def create_partition_sql(name: str, start: datetime, end: datetime) -> str:
+    return (
+        f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {LOG_TABLE} "
+        f"FOR VALUES FROM ('{start.isoformat(sep=' ')}') TO ('{end.isoformat(sep=' ')}')"
+    )
+
+
+# ==================== 分区维护 ====================
+
+def is_partitioned(db: Session) -> bool:
+    """system_logs 是否为 PostgreSQL 分区表"""
+    if db.get_bind().dialect.name != "postgresql":
+        return False
+    relkind = db.execute(
+        text("SELECT relkind FROM pg_class WHERE relname = :name AND relkind IN ('r', 'p')"),
+        {"name": LOG_TABLE}
+    ).scalar()
+    return relkind == "p"
+
+
+def list_partitions(db: Session) -> List[Tuple[str, datetime, datetime]]:
+    """已有的范围分区 (表名, 起, 止)，按起始时间排序；默认分区不在其中"""
+    names = db.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = :name"
+    ), {"name": LOG_TABLE}).scalars().all()
+    partitions = []
+    for name in names:
+        bounds = parse_partition_name(name)
+        if bounds:
+            partitions.append((name, bounds[0], bounds[1]))
+    return sorted(partitions, key=lambda p: p[1])
+
+
+def has_default_partition(db: Session) -> bool:
+    return bool(db.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = :parent AND c.relname = :name)"
+    ), {"parent": LOG_TABLE, "name": DEFAULT_PARTITION}).scalar())
+
+
+def _set_lock_timeout(db: Session):
+    """本事务内等待表锁的上限：拿不到锁就放弃，不排在长查询之后阻塞日志写入"""
+    db.execute(text("SELECT set_config('lock_timeout', :value, true)"), {"value": LOG_MAINTENANCE_LOCK_TIMEOUT})
+
+
+@contextmanager
+def maintenance_lock(db: Session):
+    """
+    跨进程互斥的分区维护：Web 与 Worker 进程各自运行维护任务，
+    用 pg_try_advisory_lock 保证同一时刻只有一个进程建分区/分离分区。
+    锁加在单独的连接上（会话提交后连接会归还连接池）；非 PostgreSQL 直接放行
+
+    Yields:
+        是否拿到锁
+    """
+    if db.get_bind().dialect.name != "postgresql":
+        yield True
+        return
+    with db.get_bind().connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        acquired = bool(conn.execute(
+            text("SELECT pg_try_advisory_lock(:key)"), {"key": LOG_MAINTENANCE_LOCK_KEY}
+        ).scalar())
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": LOG_MAINTENANCE_LOCK_KEY})
+
+
+def ensure_partitions(db: Session, now: Optional[datetime] = None, ahead: int = LOG_PARTITIONS_AHEAD) -> List[str]:
+    """
+    创建当前及未来 ahead 个周期的分区
+
+    提前建好分区使默认分区保持为空，建分区时对默认分区的校验扫描几乎无代价；
+    默认分区从不摘下。若默认分区中已有落入某个新分区范围的行（维护长时间停止），
+    该分区无法创建，跳过并告警，这些日志留在默认分区中直到超出保留期被删除
+
+    Returns:
+        新建的分区名
+    """
+    if not is_partitioned(db):
+        return []
+    now = now or datetime.utcnow()
+    existing = {name for name, _, _ in list_partitions(db)}
+    missing = [(name, start, end) for name, start, end in partition_ranges(now, partitions_until(now, ahead))
+               if name not in existing]
+    if not missing:
+        return []
+
+    default = has_default_partition(db)
+    _set_lock_timeout(db)
+    created, blocked = [], []
+    for name, start, end in missing:
+        if default and db.execute(text(
+            f"SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} WHERE created_at >= :start AND created_at < :end)"
+        ), {"start": start, "end": end}).scalar():
+            blocked.append(name)
+            continue
+        db.execute(text(create_partition_sql(name, start, end)))
+        created.append(name)
+    db.commit()
+
+    if created:
+        logger.info(f"创建日志分区: {created}")
+    if blocked:
+        logger.warning(f"默认分区中已有落入 {blocked} 范围的日志，未创建这些分区")
+    return created
+
+
+def drop_expired_logs(db: Session, retention_days: int,
+                      now: Optional[datetime] = None) -> Dict[str, object]:
+    """
+    清理保留期以外的日志
+
+    分区表：只删除整个分区都早于截止时间的分区（DETACH 后 DROP），
+    跨越截止时间的分区保留到下一次维护；默认分区中的过期行直接删除；
+    非分区表：按主键分批删除并逐批提交。
+    其他进程正在维护分区时跳过本次清理
+
+    Returns:
+        {'cutoff_time', 'deleted_count'（分区表为统计估算值）, 'dropped_partitions'}
+    """
+    cutoff = (now or datetime.utcnow()) - timedelta(days=retention_days)
+    with maintenance_lock(db) as acquired:
+        if not acquired:
+            logger.info("其他进程正在维护日志分区，跳过本次清理")
+            return {"cutoff_time": cutoff, "deleted_count": 0, "dropped_partitions": []}
+        return _drop_expired_logs(db, cutoff)
+
+
+def _drop_expired_logs(db: Session, cutoff: datetime) -> Dict[str, object]:
+    if not is_partitioned(db):
+        return {
+            "cutoff_time": cutoff,
+            "deleted_count": _delete_in_batches(db, cutoff),
+            "dropped_partitions": []
+        }
+
+    deleted = 0
+    if has_default_partition(db):
+        deleted = db.execute(
+            text(f"DELETE FROM {DEFAULT_PARTITION} WHERE created_at < :cutoff"), {"cutoff": cutoff}
+        ).rowcount or 0
+        db.commit()
+
+    dropped = []
+    for name in [name for name, _, end in list_partitions(db) if end <= cutoff]:
+        deleted += _detach_and_drop(db, name)
+        dropped.append(name)
+    if dropped:
+        logger.info(f"删除过期日志分区: {dropped}")
+    return {"cutoff_time": cutoff, "deleted_count": deleted, "dropped_partitions": dropped}
+
+
+def _detach_and_drop(db: Session, name: str) -> int:
+    """
+    分离并删除一个分区，返回其行数估算
+
+    父表挂有默认分区时 PostgreSQL 不允许 DETACH ... CONCURRENTLY，这里用普通 DETACH：
+    只修改目录、不扫描数据，父表上的 ACCESS EXCLUSIVE 锁只持有到提交为止；
+    配合 lock_timeout，拿不到锁时本次维护失败、下次重试，而不是阻塞日志写入
+    """
+    estimate = int(db.execute(
+        text("SELECT GREATEST(reltuples, 0) FROM pg_class WHERE relname = :name"), {"name": name}
+    ).scalar() or 0)
+    _set_lock_timeout(db)
+    db.execute(text(f"ALTER TABLE {LOG_TABLE} DETACH PARTITION {name}"))
+    db.execute(text(f"DROP TABLE {name}"))
+    db.commit()
+    return estimate
+
+
+def _delete_in_batches(db: Session, cutoff: datetime) -> int:
+    deleted = 0
+    while True:
+        ids = [row.id for row in db.query(SystemLog.id)
+               .filter(SystemLog.created_at < cutoff)
+               .limit(LOG_DELETE_BATCH_SIZE).all()]
+        if not ids:
+            return deleted
+        deleted += db.query(SystemLog).filter(SystemLog.id.in_(ids)).delete(synchronize_session=False)
+        db.commit()
+
+
+def run_log_maintenance(db: Session) -> Dict[str, object]:
+    """建好未来分区并清理过期日志；其他进程持有维护锁时跳过"""
+    with maintenance_lock(db) as acquired:
+        if not acquired:
+            logger.debug("其他进程正在维护日志分区，跳过本轮维护")
+            return {"skipped": True}
+        result = {"created_partitions": ensure_partitions(db)}
+        if LOG_RETENTION_DAYS > 0:
+            result.update(_drop_expired_logs(db, datetime.utcnow() - timedelta(days=LOG_RETENTION_DAYS)))
+        return result
+
+
+async def run_log_maintenance_loop(interval: int = LOG_MAINTENANCE_INTERVAL):
+    """后台定期维护日志分区"""
+    from ..database import SessionLocal
+
+    while True:
+        db = SessionLocal()
+        try:
+            await asyncio.to_thread(run_log_maintenance, db)
+        except Exception as e:
+            db.rollback()
+            logger.error(f"日志分区维护失败: {e}")
+        finally:
+            db.close()
+        await asyncio.sleep(interval)
+
+
+# ==================== 查询 ====================
+
+def keyword_condition(keyword: str, include_details: bool = False):
+    """关键词过滤：message ILIKE（pg_trgm 索引），可选同时搜索 details（无索引，较慢）"""
+    escaped = keyword.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    pattern = f"%{escaped}%"
+    condition = SystemLog.message.ilike(pattern, escape="\\")
+    if include_details:
+        condition = or_(condition, SystemLog.details.ilike(pattern, escape="\\"))
+    return condition
+
+
+def encode_cursor(log: SystemLog) -> str:
+    raw = f"{log.created_at.isoformat()}|{log.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """解析游标；格式无效时抛出 ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, log_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(log_id)
+    except Exception as e:
+        raise ValueError(f"无效的分页游标: {cursor}") from e
+
+
+def keyset_page(query, page_size: int, cursor: Optional[str] = None) -> Tuple[List[SystemLog], Optional[str]]:
+    """
+    按 (created_at, id) 降序取一页
+
+    Returns:
+        (日志列表, 下一页游标；没有更多时为 None)
+    """
+    if cursor:
+        created_at, log_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            SystemLog.created_at < created_at,
+            and_(SystemLog.created_at == created_at, SystemLog.id < log_id)
+        ))
+    logs = query.order_by(SystemLog.created_at.desc(), SystemLog.id.desc()).limit(page_size + 1).all()
+    next_cursor = encode_cursor(logs[page_size - 1]) if len(logs) > page_size else None
+    return logs[:page_size], next_cursor
@@ -6,7 +6,6 @@ TangoFlux环境音生成服务
 
 import logging
 import asyncio
-import aiohttp
 import json
 import os
 import time
@@ -16,6 +15,11 @@ from pathlib import Path
 
 from app.models.environment_sound import EnvironmentSound
 from app.models.environment_generation import EnvironmentGenerationSession
+from app.services.environment_sound_cache import (
+    get_environment_sound_cache, index_environment_sound, find_environment_sound_by_keyword
+)
+from app.services.ambience_tiler import get_ambience_tiler, seed_for
+from app.clients.tangoflux_client import get_tangoflux_client
 from sqlalchemy.orm import Session
 try:
     from app.config.environment import get_environment_config
@@ -40,6 +44,9 @@ class GenerationTask:
         self.error_message = None
         self.start_time = None
         self.end_time = None
+        self.cache_key = None
+        self.from_cache = False
+        self.environment_sound_id = None  # 缓存条目已入库时对应的环境音ID
         
     def to_dict(self) -> Dict[str, Any]:
         return {
@@ -53,7 +60,8 @@ class GenerationTask:
             'result_path': self.result_path,
             'error_message': self.error_message,
             'start_time': self.start_time.isoformat() if self.start_time else None,
-            'end_time': self.end_time.isoformat() if self.end_time else None
+            'end_time': self.end_time.isoformat() if self.end_time else None,
+            'from_cache': self.from_cache
         }
 
 class TangoFluxEnvironmentGenerator:
@@ -120,21 +128,12 @@ class TangoFluxEnvironmentGenerator:
     
     async def check_service_health(self) -> bool:
         """检查TangoFlux服务健康状态"""
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(
-                    f"{self.tangoflux_url}/health",
-                    timeout=aiohttp.ClientTimeout(total=10)
-                ) as response:
-                    if response.status == 200:
-                        logger.info("[TANGOFLUX_GEN] TangoFlux服务健康检查通过")
-                        return True
-                    else:
-                        logger.warning(f"[TANGOFLUX_GEN] TangoFlux服务状态异常: {response.status}")
-                        return False
-        except Exception as e:
-            logger.error(f"[TANGOFLUX_GEN] TangoFlux服务健康检查失败: {str(e)}")
-            return False
+        health = await get_tangoflux_client().check_health()
+        if health['status'] == 'healthy':
+            logger.info("[TANGOFLUX_GEN] TangoFlux服务健康检查通过")
+            return True
+        logger.warning(f"[TANGOFLUX_GEN] TangoFlux服务状态异常: {health.get('error')}")
+        return False
     
     def _generate_task_id(self) -> str:
         """生成任务ID"""
@@ -213,8 +212,28 @@ class TangoFluxEnvironmentGenerator:
             
             task.progress = 0.2
             
-            # 调用TangoFlux API
-            result_path = await self._call_tangoflux_api(task_id, generation_params, task)
+            # 通过生成缓存调用TangoFlux API：相同提示词/时长档位/参数只生成一次
+            async def generate(bucket_duration: float) -> Optional[bytes]:
+                return await self._call_tangoflux_api(
+                    task_id, {**generation_params, 'audio_length_in_s': bucket_duration}, task
+                )
+            
+            # 长时间背景只生成短种子，再循环拼接到目标时长
+            tiler = get_ambience_tiler()
+            cached = await get_environment_sound_cache().get_or_generate(
+                prompt, tiler.generation_duration(duration), generate,
+                steps=generation_params['num_inference_steps'],
+                guidance_scale=generation_params['guidance_scale'],
+                max_duration=30.0
+            )
+            result_path = cached.file_path if cached else None
+            if cached:
+                task.from_cache = not cached.generated
+                if duration > cached.duration_bucket:
+                    result_path = await self._tile_to_duration(cached, duration, prompt)
+                else:
+                    task.cache_key = cached.cache_key
+                    task.environment_sound_id = cached.environment_sound_id
             
             if result_path:
                 task.status = 'completed'
@@ -235,59 +254,68 @@ class TangoFluxEnvironmentGenerator:
         
         return task
     
-    async def _call_tangoflux_api(self, task_id: str, params: Dict[str, Any], task: GenerationTask) -> Optional[str]:
-        """调用TangoFlux API生成音频"""
-        try:
-            async with aiohttp.ClientSession() as session:
-                # 构建请求数据
-                request_data = {
-                    'prompt': params['prompt'],
-                    'num_inference_steps': params['num_inference_steps'],
-                    'guidance_scale': params['guidance_scale'],
-                    'audio_length_in_s': params['audio_length_in_s'],
-                    'num_waveforms_per_prompt': params['num_waveforms_per_prompt']
-                }
-                
-                task.progress = 0.3
-                
-                # 发送生成请求
-                async with session.post(
-                    f"{self.tangoflux_url}/api/v1/audio/generate",
-                    json=request_data,
-                    timeout=aiohttp.ClientTimeout(total=self.tangoflux_timeout)
-                ) as response:
-                    
-                    task.progress = 0.7
-                    
-                    if response.status == 200:
-                        # 获取音频数据
-                        audio_data = await response.read()
-                        
-                        # 保存文件
-                        timestamp = int(time.time())
-                        filename = f"{task.keyword}_{timestamp}.wav"
-                        output_path = self.output_dir / filename
-                        
-                        with open(output_path, 'wb') as f:
-                            f.write(audio_data)
-                        
-                        task.progress = 0.9
-                        
-                        logger.info(f"[TANGOFLUX_GEN] 音频文件已保存: {output_path}")
-                        return str(output_path)
-                    else:
-                        error_text = await response.text()
-                        logger.error(f"[TANGOFLUX_GEN] TangoFlux API错误: {response.status} - {error_text}")
-                        return None
-                        
-        except asyncio.TimeoutError:
-            logger.error(f"[TANGOFLUX_GEN] 生成超时: {task_id}")
-            task.error_message = "生成超时"
-            return None
-        except Exception as e:
-            logger.error(f"[TANGOFLUX_GEN] API调用失败: {str(e)}")
-            task.error_message = f"API调用失败: {str(e)}"
+    async def _tile_to_duration(self, cached: Any, duration: float, prompt: str) -> str:
+        """
+        把缓存的种子拼接到目标时长，结果按 种子缓存键 + 时长 命名，相同请求直接复用
+        （拼接结果是独立的音频，不与种子的缓存条目关联）
+        """
+        target_path = self.output_dir / f"ambience_{cached.cache_key[:16]}_{int(round(duration * 1000))}ms.wav"
+        if not target_path.exists():
+            await asyncio.to_thread(
+                get_ambience_tiler().extend_file, cached.file_path, str(target_path), duration, seed_for(prompt)
+            )
+        return str(target_path)
+    
+    async def _call_tangoflux_api(self, task_id: str, params: Dict[str, Any], task: GenerationTask) -> Optional[bytes]:
+        """调用TangoFlux API生成音频，返回WAV数据（由生成缓存负责落盘）"""
+        task.progress = 0.3
+        result = await get_tangoflux_client().generate_environment_sound(
+            params['prompt'],
+            duration=params['audio_length_in_s'],
+            steps=params['num_inference_steps'],
+            cfg_scale=params['guidance_scale'],
+            return_type='file',
+            timeout=self.tangoflux_timeout
+        )
+        task.progress = 0.9
+        
+        if not result['success']:
+            logger.error(f"[TANGOFLUX_GEN] TangoFlux API错误: {task_id} - {result.get('error')}")
+            task.error_message = f"API调用失败: {result.get('error')}"
             return None
+        
+        logger.info(f"[TANGOFLUX_GEN] 音频生成完成: {task.keyword} ({result['size_bytes']} 字节)")
+        return result['audio_data']
+    
+    async def _prefill_generation_cache(self, generation_requests: List[Dict[str, Any]]):
+        """批量生成缓存未命中的种子：服务支持批量端点时多条提示词合并为一次请求"""
+        tiler = get_ambience_tiler()
+        cache_requests = []
+        for request in generation_requests:
+            intensity = request.get('intensity', 'medium')
+            intensity_config = self.INTENSITY_CONFIGS.get(intensity, self.INTENSITY_CONFIGS['medium'])
+            cache_requests.append({
+                'prompt': self._build_generation_prompt(request.get('keyword', ''), request.get('description', ''), intensity),
+                'duration': tiler.generation_duration(request.get('duration', 30.0)),
+                'steps': self.DEFAULT_GENERATION_PARAMS['num_inference_steps'],
+                'guidance_scale': intensity_config['guidance_scale']
+            })
+        
+        async def generate_many(items: List[Dict[str, Any]]) -> List[Optional[bytes]]:
+            results = await get_tangoflux_client().generate_batch([
+                {
+                    'prompt': item['prompt'],
+                    'duration': item['duration'],
+                    'steps': item['steps'],
+                    'cfg_scale': item['guidance_scale']
+                }
+                for item in items
+            ], timeout=self.tangoflux_timeout)
+            return [result['audio_data'] if result['success'] else None for result in results]
+        
+        generated = await get_environment_sound_cache().prefill(cache_requests, generate_many, max_duration=30.0)
+        if generated:
+            logger.info(f"[TANGOFLUX_GEN] 批量预生成{generated}个环境音种子")
     
     async def batch_generate_environment_sounds(self, 
                                               generation_requests: List[Dict[str, Any]],
@@ -309,6 +337,9 @@ class TangoFluxEnvironmentGenerator:
             logger.error("[TANGOFLUX_GEN] TangoFlux服务不可用，批量生成取消")
             return []
         
+        # 未命中缓存的种子先批量生成，之后每个任务直接命中缓存
+        await self._prefill_generation_cache(generation_requests)
+        
         # 创建任务队列
         tasks = []
         semaphore = asyncio.Semaphore(max_concurrent)
@@ -375,6 +406,19 @@ class TangoFluxEnvironmentGenerator:
         for task in generation_tasks:
             if task.status != 'completed' or not task.result_path:
                 continue
+            
+            # 缓存命中且已入库的音频直接复用已有记录
+            if task.environment_sound_id:
+                existing_sound = db.query(EnvironmentSound).filter(
+                    EnvironmentSound.id == task.environment_sound_id,
+                    EnvironmentSound.is_active == True
+                ).first()
+                if existing_sound and existing_sound not in saved_sounds:
+                    saved_sounds.append(existing_sound)
+                    logger.info(f"[TANGOFLUX_GEN] 复用已入库的环境音: {existing_sound.name} (ID: {existing_sound.id})")
+                    continue
+                if existing_sound:
+                    continue
                 
             try:
                 # 创建EnvironmentSound实体
@@ -406,9 +450,16 @@ class TangoFluxEnvironmentGenerator:
                 
                 db.add(environment_sound)
                 db.flush()  # 获取ID但不提交
+                index_environment_sound(db, environment_sound)
                 
                 saved_sounds.append(environment_sound)
                 
+                # 同一批次中相同缓存键的其他任务复用这条记录
+                if task.cache_key:
+                    for other in generation_tasks:
+                        if other.cache_key == task.cache_key and not other.environment_sound_id:
+                            other.environment_sound_id = environment_sound.id
+                
                 logger.info(f"[TANGOFLUX_GEN] 环境音已保存到数据库: {environment_sound.name} (ID: {environment_sound.id})")
                 
             except Exception as e:
@@ -419,6 +470,14 @@ class TangoFluxEnvironmentGenerator:
         try:
             db.commit()
             logger.info(f"[TANGOFLUX_GEN] 成功保存{len(saved_sounds)}个环境音到数据库")
+            
+            # 记录缓存条目对应的环境音，之后命中时不再重复入库
+            cache = get_environment_sound_cache()
+            attached = set()
+            for task in generation_tasks:
+                if task.cache_key and task.environment_sound_id and task.cache_key not in attached:
+                    cache.attach_sound(task.cache_key, task.environment_sound_id)
+                    attached.add(task.cache_key)
         except Exception as e:
             db.rollback()
             logger.error(f"[TANGOFLUX_GEN] 数据库提交失败: {str(e)}")
@@ -442,29 +501,11 @@ class TangoFluxEnvironmentGenerator:
             如果找到匹配的环境音则返回EnvironmentSound对象，否则返回None
         """
         try:
-            from app.models.environment_sound import EnvironmentSound
-            
-            # 查找包含该关键词的环境音
-            existing_sounds = db.query(EnvironmentSound).filter(
-                EnvironmentSound.is_active == True,
-                EnvironmentSound.generation_status == 'completed'
-            ).all()
-            
-            for sound in existing_sounds:
-                # 检查标签中是否包含该关键词
-                if sound.tags and keyword in sound.tags:
-                    logger.info(f"[REUSE_CHECK] 找到已存在的环境音: {sound.name} (ID: {sound.id})")
-                    return sound
-                
-                # 检查名称中是否包含关键词
-                if keyword in sound.name:
-                    logger.info(f"[REUSE_CHECK] 通过名称匹配找到环境音: {sound.name} (ID: {sound.id})")
-                    return sound
-                    
-                # 检查提示词中是否包含关键词
-                if sound.prompt and keyword in sound.prompt:
-                    logger.info(f"[REUSE_CHECK] 通过提示词匹配找到环境音: {sound.name} (ID: {sound.id})")
-                    return sound
+            # 通过关键词索引表查找（标签、名称、提示词拆分出的词）
+            sound = find_environment_sound_by_keyword(db, keyword)
+            if sound:
+                logger.info(f"[REUSE_CHECK] 找到已存在的环境音: {sound.name} (ID: {sound.id})")
+                return sound
             
             logger.info(f"[REUSE_CHECK] 未找到匹配的环境音: {keyword}")
             return None
@@ -8,6 +8,7 @@ from sqlalchemy import and_, or_, func
 from app.models.auth import User, Role
 from app.schemas.user import UserCreate, UserUpdate
 from app.core.auth import auth_manager
+from app.core.permission_cache import get_permission_cache
 from app.utils.logger import get_logger
 
 logger = get_logger(__name__)
@@ -131,6 +132,7 @@ class UserService:
                 db_user.roles = roles
             
             self.db.commit()
+            get_permission_cache().invalidate_user(user_id)
             self.db.refresh(db_user)
             
             logger.info(f"用户更新成功: {db_user.username}")
@@ -149,6 +151,7 @@ class UserService:
             
             self.db.delete(db_user)
             self.db.commit()
+            get_permission_cache().invalidate_user(user_id)
             
             logger.info(f"用户删除成功: {db_user.username}")
             return True
@@ -166,6 +169,7 @@ class UserService:
             
             db_user.hashed_password = auth_manager.get_password_hash(new_password)
             self.db.commit()
+            get_permission_cache().invalidate_user(user_id)
             
             logger.info(f"用户密码重置成功: {db_user.username}")
             return True
@@ -183,6 +187,7 @@ class UserService:
             
             db_user.status = status
             self.db.commit()
+            get_permission_cache().invalidate_user(user_id)
             self.db.refresh(db_user)
             
             logger.info(f"用户状态更新成功: {db_user.username} -> {status}")
@@ -206,6 +211,7 @@ class UserService:
             if role not in db_user.roles:
                 db_user.roles.append(role)
                 self.db.commit()
+                get_permission_cache().invalidate_user(user_id)
                 logger.info(f"角色分配成功: {db_user.username} -> {role.name}")
             
             return True
@@ -228,6 +234,7 @@ class UserService:
             if role in db_user.roles:
                 db_user.roles.remove(role)
                 self.db.commit()
+                get_permission_cache().invalidate_user(user_id)
                 logger.info(f"角色移除成功: {db_user.username} -> {role.name}")
             
             return True
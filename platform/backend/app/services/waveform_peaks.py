@@ -0,0 +1,325 @@
+"""
+波形峰值金字塔服务
+每个音频文件只解码一次，计算多分辨率 min/max 峰值并写入紧凑二进制侧车文件，
+编辑器按当前缩放级别只取所需的一层，避免在浏览器端解码整段WAV
+"""
+
+import hashlib
+import logging
+import os
+import struct
+import threading
+import wave
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+WAVEFORM_CACHE_DIR = os.getenv("WAVEFORM_CACHE_DIR", "data/waveforms")
+BASE_SAMPLES_PER_PEAK = int(os.getenv("WAVEFORM_BASE_SAMPLES_PER_PEAK", "256"))
+MIN_LEVEL_PEAKS = 256
+READ_BLOCK_PEAKS = 4096
+
+# 侧车格式：头部 + 层索引 + 各层 int8 交错 (min, max)
+PEAKS_MAGIC = b"AIPK"
+PEAKS_VERSION = 1
+_HEADER = struct.Struct("<4sHHIQqQIH")   # magic, version, bits, sample_rate, total_frames, mtime_ns, size, base_spp, levels
+_LEVEL = struct.Struct("<IIQ")           # samples_per_peak, peak_count, data_offset
+
+
+@dataclass
+class PeakLevel:
+    """金字塔中的一层"""
+    samples_per_peak: int
+    peaks: np.ndarray   # shape (N, 2)，int8 的 min/max
+
+
+@dataclass
+class PeakPyramid:
+    """一个音频文件的完整峰值金字塔"""
+    sample_rate: int
+    total_frames: int
+    levels: List[PeakLevel]
+    source_mtime_ns: int = 0
+    source_size: int = 0
+
+    @property
+    def duration(self) -> float:
+        return self.total_frames / self.sample_rate if self.sample_rate else 0.0
+
+    def select_level(self, samples_per_peak: Optional[int] = None, pixels: Optional[int] = None,
+                     level: Optional[int] = None) -> PeakLevel:
+        """
+        选择层级：显式 level 优先；否则取不粗于目标分辨率的最粗一层
+        pixels 表示整段音频在画布上的宽度
+        """
+        if level is not None:
+            return self.levels[max(0, min(level, len(self.levels) - 1))]
+        if samples_per_peak is None and pixels:
+            samples_per_peak = max(1, self.total_frames // pixels)
+        if samples_per_peak is None:
+            return self.levels[-1]
+        chosen = self.levels[0]
+        for candidate in self.levels:
+            if candidate.samples_per_peak <= samples_per_peak:
+                chosen = candidate
+        return chosen
+
+
+def _to_int8(samples: np.ndarray) -> np.ndarray:
+    return np.clip(np.round(samples * 127.0), -127, 127).astype(np.int8)
+
+
+def _reduce_block(samples: np.ndarray, samples_per_peak: int) -> np.ndarray:
+    """samples: (frames, channels) float32；多声道取各声道的包络"""
+    frames = samples.shape[0]
+    count = -(-frames // samples_per_peak)
+    pad = count * samples_per_peak - frames
+    if pad:
+        edge = samples[-1:].repeat(pad, axis=0)
+        samples = np.concatenate([samples, edge])
+    blocks = samples.reshape(count, samples_per_peak * samples.shape[1])
+    return np.stack([blocks.min(axis=1), blocks.max(axis=1)], axis=1)
+
+
+def _pcm_to_float(raw: bytes, sample_width: int, channels: int) -> np.ndarray:
+    if sample_width == 1:
+        data = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif sample_width == 2:
+        data = np.frombuffer(raw, dtype="<i2").astype(np.float32) / 32768.0
+    elif sample_width == 3:
+        b = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        ints = b[:, 0] | (b[:, 1] << 8) | (b[:, 2] << 16)
+        ints = np.where(ints & 0x800000, ints - 0x1000000, ints)
+        data = ints.astype(np.float32) / 8388608.0
+    elif sample_width == 4:
+        data = np.frombuffer(raw, dtype="<i4").astype(np.float32) / 2147483648.0
+    else:
+        raise ValueError(f"不支持的采样位宽: {sample_width}")
+    return data.reshape(-1, channels)
+
+
+def _build_levels(base: np.ndarray) -> List[PeakLevel]:
+    """由基础层逐级两两合并得到更粗的层"""
+    levels = [PeakLevel(BASE_SAMPLES_PER_PEAK, _to_int8(base))]
+    current = base
+    spp = BASE_SAMPLES_PER_PEAK
+    while len(current) > MIN_LEVEL_PEAKS:
+        if len(current) % 2:
+            current = np.concatenate([current, current[-1:]])
+        pairs = current.reshape(-1, 2, 2)
+        current = np.stack([pairs[:, :, 0].min(axis=1), pairs[:, :, 1].max(axis=1)], axis=1)
+        spp *= 2
+        levels.append(PeakLevel(spp, _to_int8(current)))
+    return levels
+
+
+def compute_peak_pyramid(path: str) -> PeakPyramid:
+    """分块读取音频计算峰值金字塔；WAV 直接流式读取，其它格式经 pydub 解码"""
+    stat = os.stat(path)
+    try:
+        with wave.open(path, "rb") as wf:
+            channels = wf.getnchannels()
+            sample_width = wf.getsampwidth()
+            sample_rate = wf.getframerate()
+            total_frames = wf.getnframes()
+            block_frames = BASE_SAMPLES_PER_PEAK * READ_BLOCK_PEAKS
+            chunks = []
+            while True:
+                raw = wf.readframes(block_frames)
+                if not raw:
+                    break
+                chunks.append(_reduce_block(_pcm_to_float(raw, sample_width, channels), BASE_SAMPLES_PER_PEAK))
+    except (wave.Error, EOFError):
+        from pydub import AudioSegment
+        audio = AudioSegment.from_file(path)
+        channels = audio.channels
+        sample_rate = audio.frame_rate
+        samples = _pcm_to_float(audio.raw_data, audio.sample_width, channels)
+        total_frames = samples.shape[0]
+        chunks = [_reduce_block(samples, BASE_SAMPLES_PER_PEAK)] if total_frames else []
+
+    base = np.concatenate(chunks) if chunks else np.zeros((1, 2), dtype=np.float32)
+    return PeakPyramid(
+        sample_rate=sample_rate,
+        total_frames=total_frames,
+        levels=_build_levels(base),
+        source_mtime_ns=stat.st_mtime_ns,
+        source_size=stat.st_size
+    )
+
+
+def write_peak_file(pyramid: PeakPyramid, target: str):
+    """原子写入侧车文件"""
+    offset = _HEADER.size + _LEVEL.size * len(pyramid.levels)
+    index = []
+    for level in pyramid.levels:
+        index.append(_LEVEL.pack(level.samples_per_peak, len(level.peaks), offset))
+        offset += level.peaks.nbytes
+
+    tmp_path = f"{target}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(
+            PEAKS_MAGIC, PEAKS_VERSION, 8, pyramid.sample_rate, pyramid.total_frames,
+            pyramid.source_mtime_ns, pyramid.source_size, BASE_SAMPLES_PER_PEAK, len(pyramid.levels)
+        ))
+        for entry in index:
+            f.write(entry)
+        for level in pyramid.levels:
+            f.write(level.peaks.tobytes())
+    os.replace(tmp_path, target)
+
+
+def read_peak_file(path: str) -> PeakPyramid:
+    with open(path, "rb") as f:
+        data = f.read()
+    magic, version, bits, sample_rate, total_frames, mtime_ns, size, _, level_count = _HEADER.unpack_from(data, 0)
+    if magic != PEAKS_MAGIC or version != PEAKS_VERSION or bits != 8:
+        raise ValueError("无效的峰值文件")
+    levels = []
+    for i in range(level_count):
+        spp, count, offset = _LEVEL.unpack_from(data, _HEADER.size + i * _LEVEL.size)
+        peaks = np.frombuffer(data, dtype=np.int8, count=count * 2, offset=offset).reshape(count, 2)
+        levels.append(PeakLevel(spp, peaks))
+    return PeakPyramid(sample_rate, total_frames, levels, mtime_ns, size)
+
+
+class WaveformPeakService:
+    """峰值金字塔的缓存与读取：源文件未变化时直接复用侧车文件"""
+
+    def __init__(self, cache_dir: str = WAVEFORM_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+
+    def sidecar_path(self, audio_path: str) -> str:
+        key = hashlib.sha1(os.path.abspath(audio_path).encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, key[:2], f"{key}.peaks")
+
+    def _lock_for(self, key: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def get_pyramid(self, audio_path: str) -> PeakPyramid:
+        """获取峰值金字塔；同一文件并发请求只计算一次"""
+        if not os.path.exists(audio_path):
+            raise FileNotFoundError(audio_path)
+        sidecar = self.sidecar_path(audio_path)
+
+        with self._lock_for(sidecar):
+            stat = os.stat(audio_path)
+            if os.path.exists(sidecar):
+                try:
+                    pyramid = read_peak_file(sidecar)
+                    if pyramid.source_mtime_ns == stat.st_mtime_ns and pyramid.source_size == stat.st_size:
+                        return pyramid
+                except (ValueError, struct.error) as e:
+                    logger.warning(f"峰值文件损坏，重新生成: {sidecar} - {e}")
+
+            pyramid = compute_peak_pyramid(audio_path)
+            os.makedirs(os.path.dirname(sidecar), exist_ok=True)
+            write_peak_file(pyramid, sidecar)
+            logger.info(f"生成波形峰值: {audio_path} -> {sidecar} ({len(pyramid.levels)} 层)")
+            return pyramid
+
+    def ensure_peaks(self, audio_path: str) -> bool:
+        """预生成峰值（失败不影响主流程）"""
+        try:
+            self.get_pyramid(audio_path)
+            return True
+        except Exception as e:
+            logger.warning(f"预生成波形峰值失败: {audio_path} - {e}")
+            return False
+
+    def get_peaks(self, audio_path: str, samples_per_peak: Optional[int] = None, pixels: Optional[int] = None,
+                  level: Optional[int] = None, start: Optional[float] = None,
+                  end: Optional[float] = None) -> Dict:
+        """
+        取某一层（可选时间窗口）的峰值
+        返回 peaks 为 int8 的 (N, 2) 数组，及解释数据所需的元信息
+        """
+        pyramid = self.get_pyramid(audio_path)
+        if pixels and (start is not None or end is not None):
+            # 按可见窗口宽度换算分辨率
+            window = (end if end is not None else pyramid.duration) - (start or 0.0)
+            samples_per_peak = max(1, int(window * pyramid.sample_rate) // pixels)
+            pixels = None
+        chosen = pyramid.select_level(samples_per_peak, pixels, level)
+
+        first = 0
+        last = len(chosen.peaks)
+        if start is not None:
+            first = min(last, max(0, int(start * pyramid.sample_rate) // chosen.samples_per_peak))
+        if end is not None:
+            last = min(last, max(first, -(-int(end * pyramid.sample_rate) // chosen.samples_per_peak)))
+
+        return {
+            "sample_rate": pyramid.sample_rate,
+            "total_frames": pyramid.total_frames,
+            "duration": pyramid.duration,
+            "samples_per_peak": chosen.samples_per_peak,
+            "level": pyramid.levels.index(chosen),
+            "levels": [lv.samples_per_peak for lv in pyramid.levels],
+            "bits": 8,
+            "start_index": first,
+            "source_mtime_ns": pyramid.source_mtime_ns,
+            "source_size": pyramid.source_size,
+            "peaks": chosen.peaks[first:last],
+        }
+
+
+waveform_peak_service = WaveformPeakService()
+
+
+def get_waveform_peak_service() -> WaveformPeakService:
+    return waveform_peak_service
+
+
+async def waveform_peaks_response(audio_path: str, format: str = "binary", samples_per_peak: Optional[int] = None,
+                                  pixels: Optional[int] = None, level: Optional[int] = None,
+                                  start: Optional[float] = None, end: Optional[float] = None,
+                                  request=None):
+    """
+    峰值接口的统一响应
+    binary: application/octet-stream，int8 交错 min/max，元信息放在 X-Peaks-* 响应头
+    json: 同样内容的JSON形式
+    ETag / Last-Modified 由源音频的 mtime 与大小派生，传入 request 时条件请求命中直接返回 304
+    """
+    from fastapi.concurrency import run_in_threadpool
+    from fastapi.responses import JSONResponse, Response
+
+    from ..utils.range_response import file_validators, is_not_modified, stat_validators
+
+    variant = f"pk{PEAKS_VERSION}"
+    headers = {"Cache-Control": "private, no-cache"}
+    if request is not None:
+        etag, last_modified = file_validators(audio_path, variant)
+        if is_not_modified(request, etag, last_modified):
+            headers.update({"ETag": etag, "Last-Modified": last_modified})
+            return Response(status_code=304, headers=headers)
+
+    result = await run_in_threadpool(
+        waveform_peak_service.get_peaks, audio_path, samples_per_peak, pixels, level, start, end
+    )
+    peaks = result.pop("peaks")
+    # 以实际读取的金字塔对应的源文件状态生成校验值，避免文件在请求期间被替换
+    etag, last_modified = stat_validators(result.pop("source_mtime_ns"), result.pop("source_size"), variant)
+    headers.update({"ETag": etag, "Last-Modified": last_modified})
+
+    if format == "json":
+        result["length"] = len(peaks)
+        result["data"] = peaks.reshape(-1).tolist()
+        return JSONResponse(content=result, headers=headers)
+
+    headers.update({
+        "X-Peaks-Sample-Rate": str(result["sample_rate"]),
+        "X-Peaks-Total-Frames": str(result["total_frames"]),
+        "X-Peaks-Samples-Per-Peak": str(result["samples_per_peak"]),
+        "X-Peaks-Level": str(result["level"]),
+        "X-Peaks-Levels": ",".join(str(spp) for spp in result["levels"]),
+        "X-Peaks-Start-Index": str(result["start_index"]),
+        "X-Peaks-Bits": "8",
+    })
+    return Response(content=peaks.tobytes(), media_type="application/octet-stream", headers=headers)
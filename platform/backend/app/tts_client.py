@@ -14,6 +14,8 @@ from dataclasses import dataclass
 import asyncio
 import json
 
+from app.tts_pool import TTSEndpointPool, NoHealthyEndpointError, create_pool_from_env, parse_endpoint_urls
+
 logger = logging.getLogger(__name__)
 
 @dataclass
@@ -41,11 +43,15 @@ class MegaTTS3Client:
     MegaTTS3 HTTP 客户端 - 简化版
     """
     
-    def __init__(self, base_url: str = None):
-        # MegaTTS3 运行在7929端口
-        if base_url is None:
-            base_url = os.getenv("MEGATTS3_URL", "http://localhost:7929")
-        self.base_url = base_url.rstrip('/')
+    def __init__(self, base_url: str = None, pool: Optional[TTSEndpointPool] = None):
+        # MegaTTS3 运行在7929端口；多节点时由节点池负载均衡
+        if pool is None:
+            if base_url is None:
+                pool = create_pool_from_env()
+            else:
+                pool = TTSEndpointPool(parse_endpoint_urls(base_url))
+        self.pool = pool
+        self.base_url = pool.endpoints[0].url
         self.timeout = aiohttp.ClientTimeout(
             total=300,    # 总超时5分钟
             connect=30,   # 连接超时30秒
@@ -245,39 +251,28 @@ class MegaTTS3Client:
             return ''
         
     async def health_check(self) -> Dict[str, Any]:
-        """检查MegaTTS3服务健康状态"""
+        """检查MegaTTS3服务健康状态（多节点时探测全部节点，并让恢复的节点重新加入）"""
         try:
-            # 检查7929端口的健康状态
-            health_url = self.base_url
-            # 强制禁用SSL，避免端口变化
-            connector = aiohttp.TCPConnector(ssl=False)
-            async with aiohttp.ClientSession(
-                timeout=self.timeout,
-                connector=connector,
-                connector_owner=True
-            ) as session:
-                async with session.get(f"{health_url}/health") as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        return {"status": "healthy", "data": data}
-                    else:
-                        return {"status": "unhealthy", "error": f"HTTP {response.status}"}
+            return await self.pool.health_check(timeout=self.timeout.connect or 30)
         except Exception as e:
             logger.error(f"健康检查失败: {str(e)}")
             return {"status": "error", "error": str(e)}
     
     async def synthesize_speech(self, request: TTSRequest) -> TTSResponse:
-        """语音合成 - 唯一的核心功能，带重试机制"""
+        """语音合成 - 唯一的核心功能，带重试机制；每次尝试路由到最空闲的健康节点"""
         max_retries = 2  # 最多重试2次
+        failed_nodes = set()  # 本次请求中失败过的节点，重试时优先避开
         
         for attempt in range(max_retries + 1):
             start_time = time.time()
+            node_url = None
             
             try:
                 if attempt > 0:
                     logger.info(f"[RETRY] TTS合成重试第 {attempt} 次: {request.text[:30]}...")
-                    # 重试前等待一下
-                    await asyncio.sleep(2 * attempt)
+                    # 还有未尝试的节点时立即切换，否则等待后重试
+                    if len(failed_nodes) >= len(self.pool.endpoints):
+                        await asyncio.sleep(2 * attempt)
                 
                 # 验证文件
                 if not os.path.exists(request.reference_audio_path):
@@ -312,113 +307,138 @@ class MegaTTS3Client:
                         latent_content = f.read()
                         latent_filename = os.path.basename(request.latent_file_path)
                 
-
-                
-                # 🚨 详细请求参数日志
-                logger.info(f"=== TTS请求参数详情 ===")
-                logger.info(f"目标URL: {self.base_url}/api/v1/tts/synthesize_file")
-                logger.info(f"文本内容: '{clean_text}' (长度: {len(clean_text)})")
-                logger.info(f"time_step: {request.time_step} (类型: {type(request.time_step)})")
-                logger.info(f"p_w: {request.p_weight} (类型: {type(request.p_weight)})")
-                logger.info(f"t_w: {request.t_weight} (类型: {type(request.t_weight)})")
-                logger.info(f"参考音频: {audio_filename} (大小: {len(audio_content)} bytes)")
-                if latent_content:
-                    logger.info(f"Latent文件: {latent_filename} (大小: {len(latent_content)} bytes)")
-                else:
-                    logger.info(f"Latent文件: 无")
-                logger.info(f"输出路径: {request.output_audio_path}")
-                logger.info(f"=== 请求参数结束 ===")
-                
-                # 构建REST API表单数据
-                form_data = aiohttp.FormData()
-                form_data.add_field('text', clean_text)
-                form_data.add_field('time_step', str(request.time_step))
-                form_data.add_field('p_w', str(request.p_weight))
-                form_data.add_field('t_w', str(request.t_weight))
-                form_data.add_field('audio_file', audio_content, filename=audio_filename, content_type='audio/wav')
-                if latent_content:
-                    form_data.add_field('latent_file', latent_content, filename=latent_filename, content_type='application/octet-stream')
-                
-                # 发送请求到REST API
-                # 强制禁用SSL和自动重定向，避免7929->7930的端口变化
-                connector = aiohttp.TCPConnector(ssl=False)
-                async with aiohttp.ClientSession(
-                    timeout=self.timeout,
-                    connector=connector,
-                    connector_owner=True
-                ) as session:
-                    async with session.post(
-                        f"{self.base_url}/api/v1/tts/synthesize_file",
-                        data=form_data
-                    ) as response:
-                        
-                        processing_time = time.time() - start_time
-                        
-                        # 🚨 详细响应日志
-                        logger.info(f"=== TTS响应详情 ===")
-                        logger.info(f"HTTP状态码: {response.status}")
-                        logger.info(f"响应头: {dict(response.headers)}")
-                        logger.info(f"处理时间: {processing_time:.2f}秒")
-                        
-                        if response.status == 200:
-                            # 成功 - 保存音频
-                            audio_content = await response.read()
-                            
-                            # 🚨 详细音频调试信息
-                            logger.info(f"=== 音频文件调试 ===")
-                            logger.info(f"音频内容大小: {len(audio_content)} bytes")
-                            logger.info(f"音频内容前16字节: {audio_content[:16] if len(audio_content) >= 16 else audio_content}")
-                            logger.info(f"是否以RIFF开头: {audio_content.startswith(b'RIFF')}")
-                            logger.info(f"输出路径: {request.output_audio_path}")
+                async with self.pool.lease(exclude=failed_nodes) as node:
+                    node_url = node.url
+                    
+                    # 🚨 详细请求参数日志
+                    logger.info(f"=== TTS请求参数详情 ===")
+                    logger.info(f"目标URL: {node_url}/api/v1/tts/synthesize_file")
+                    logger.info(f"文本内容: '{clean_text}' (长度: {len(clean_text)})")
+                    logger.info(f"time_step: {request.time_step} (类型: {type(request.time_step)})")
+                    logger.info(f"p_w: {request.p_weight} (类型: {type(request.p_weight)})")
+                    logger.info(f"t_w: {request.t_weight} (类型: {type(request.t_weight)})")
+                    logger.info(f"参考音频: {audio_filename} (大小: {len(audio_content)} bytes)")
+                    if latent_content:
+                        logger.info(f"Latent文件: {latent_filename} (大小: {len(latent_content)} bytes)")
+                    else:
+                        logger.info(f"Latent文件: 无")
+                    logger.info(f"输出路径: {request.output_audio_path}")
+                    logger.info(f"=== 请求参数结束 ===")
+                    
+                    # 构建REST API表单数据
+                    form_data = aiohttp.FormData()
+                    form_data.add_field('text', clean_text)
+                    form_data.add_field('time_step', str(request.time_step))
+                    form_data.add_field('p_w', str(request.p_weight))
+                    form_data.add_field('t_w', str(request.t_weight))
+                    form_data.add_field('audio_file', audio_content, filename=audio_filename, content_type='audio/wav')
+                    if latent_content:
+                        form_data.add_field('latent_file', latent_content, filename=latent_filename, content_type='application/octet-stream')
+                    
+                    # 发送请求到REST API
+                    # 强制禁用SSL和自动重定向，避免7929->7930的端口变化
+                    connector = aiohttp.TCPConnector(ssl=False)
+                    async with aiohttp.ClientSession(
+                        timeout=self.timeout,
+                        connector=connector,
+                        connector_owner=True
+                    ) as session:
+                        async with session.post(
+                            f"{node_url}/api/v1/tts/synthesize_file",
+                            data=form_data
+                        ) as response:
                             
-                            os.makedirs(os.path.dirname(request.output_audio_path), exist_ok=True)
+                            processing_time = time.time() - start_time
                             
-                            with open(request.output_audio_path, 'wb') as output_f:
-                                output_f.write(audio_content)
+                            # 🚨 详细响应日志
+                            logger.info(f"=== TTS响应详情 ===")
+                            logger.info(f"HTTP状态码: {response.status}")
+                            logger.info(f"响应头: {dict(response.headers)}")
+                            logger.info(f"处理时间: {processing_time:.2f}秒")
                             
-                            # 验证保存后的文件
-                            if os.path.exists(request.output_audio_path):
-                                saved_size = os.path.getsize(request.output_audio_path)
-                                logger.info(f"保存后文件大小: {saved_size} bytes")
-                                logger.info(f"文件保存成功: {saved_size == len(audio_content)}")
+                            if response.status == 200:
+                                # 成功 - 保存音频
+                                audio_content = await response.read()
+                                
+                                # 🚨 详细音频调试信息
+                                logger.info(f"=== 音频文件调试 ===")
+                                logger.info(f"音频内容大小: {len(audio_content)} bytes")
+                                logger.info(f"音频内容前16字节: {audio_content[:16] if len(audio_content) >= 16 else audio_content}")
+                                logger.info(f"是否以RIFF开头: {audio_content.startswith(b'RIFF')}")
+                                logger.info(f"输出路径: {request.output_audio_path}")
+                                
+                                os.makedirs(os.path.dirname(request.output_audio_path), exist_ok=True)
+                                
+                                with open(request.output_audio_path, 'wb') as output_f:
+                                    output_f.write(audio_content)
+                                
+                                # 验证保存后的文件
+                                if os.path.exists(request.output_audio_path):
+                                    saved_size = os.path.getsize(request.output_audio_path)
+                                    logger.info(f"保存后文件大小: {saved_size} bytes")
+                                    logger.info(f"文件保存成功: {saved_size == len(audio_content)}")
+                                else:
+                                    logger.error(f"文件保存失败: {request.output_audio_path}")
+                                
+                                logger.info(f"=== 音频调试结束 ===")
+                                
+                                logger.info(f"TTS合成成功: {request.output_audio_path} (节点: {node_url}, 耗时: {processing_time:.2f}s)")
+                                
+                                return TTSResponse(
+                                    success=True,
+                                    message="合成完成",
+                                    audio_path=request.output_audio_path,
+                                    processing_time=processing_time
+                                )
                             else:
-                                logger.error(f"文件保存失败: {request.output_audio_path}")
-                            
-                            logger.info(f"=== 音频调试结束 ===")
-                            
-                            logger.info(f"TTS合成成功: {request.output_audio_path} (耗时: {processing_time:.2f}s)")
-                            
-                            return TTSResponse(
-                                success=True,
-                                message="合成完成",
-                                audio_path=request.output_audio_path,
-                                processing_time=processing_time
-                            )
-                        else:
-                            # 失败
-                            error_text = await response.text()
-                            logger.error(f"=== TTS合成失败详情 ===")
-                            logger.error(f"HTTP状态码: {response.status}")
-                            logger.error(f"错误响应: {error_text}")
-                            logger.error(f"请求URL: {self.base_url}/api/v1/tts/synthesize_file")
-                            logger.error(f"发送的参数:")
-                            logger.error(f"  - text: '{clean_text[:50]}...' (长度: {len(clean_text)})")
-                            logger.error(f"  - time_step: {request.time_step}")
-                            logger.error(f"  - p_w: {request.p_weight}")
-                            logger.error(f"  - t_w: {request.t_weight}")
-                            logger.error(f"  - audio_file: {audio_filename}")
-                            logger.error(f"=== 失败详情结束 ===")
-                            
-                            return TTSResponse(
-                                success=False,
-                                message=f"合成失败: {error_text}",
-                                processing_time=processing_time,
-                                error_code=f"HTTP_{response.status}"
-                            )
+                                # 失败
+                                error_text = await response.text()
+                                logger.error(f"=== TTS合成失败详情 ===")
+                                logger.error(f"HTTP状态码: {response.status}")
+                                logger.error(f"错误响应: {error_text}")
+                                logger.error(f"请求URL: {node_url}/api/v1/tts/synthesize_file")
+                                logger.error(f"发送的参数:")
+                                logger.error(f"  - text: '{clean_text[:50]}...' (长度: {len(clean_text)})")
+                                logger.error(f"  - time_step: {request.time_step}")
+                                logger.error(f"  - p_w: {request.p_weight}")
+                                logger.error(f"  - t_w: {request.t_weight}")
+                                logger.error(f"  - audio_file: {audio_filename}")
+                                logger.error(f"=== 失败详情结束 ===")
+                                
+                                # 5xx视为节点故障，换节点重试；4xx是请求本身的问题，直接返回
+                                if response.status >= 500:
+                                    node.mark_failure(f"HTTP {response.status}")
+                                    failed_nodes.add(node_url)
+                                    if attempt < max_retries:
+                                        continue
+                                
+                                return TTSResponse(
+                                    success=False,
+                                    message=f"合成失败: {error_text}",
+                                    processing_time=processing_time,
+                                    error_code=f"HTTP_{response.status}"
+                                )
+            
+            except NoHealthyEndpointError as e:
+                processing_time = time.time() - start_time
+                logger.warning(f"[RETRY] 没有可用的TTS节点 (尝试 {attempt + 1}/{max_retries + 1})")
+                
+                if attempt < max_retries:
+                    await asyncio.sleep(2 * (attempt + 1))
+                    continue
+                
+                return TTSResponse(
+                    success=False,
+                    message=f"所有TTS节点均不可用: {str(e)}",
+                    processing_time=processing_time,
+                    error_code="NO_HEALTHY_NODE"
+                )
             
             except (aiohttp.ClientError, asyncio.TimeoutError) as e:
                 processing_time = time.time() - start_time
-                logger.warning(f"[RETRY] TTS合成网络错误 (尝试 {attempt + 1}/{max_retries + 1}): {str(e)}")
+                if node_url:
+                    failed_nodes.add(node_url)
+                logger.warning(f"[RETRY] TTS合成网络错误 (节点 {node_url}, 尝试 {attempt + 1}/{max_retries + 1}): {str(e)}")
                 
                 # 如果还有重试机会，继续重试
                 if attempt < max_retries:
@@ -435,6 +455,8 @@ class MegaTTS3Client:
                 
             except Exception as e:
                 processing_time = time.time() - start_time
+                if node_url:
+                    failed_nodes.add(node_url)
                 logger.warning(f"[RETRY] TTS合成异常 (尝试 {attempt + 1}/{max_retries + 1}): {str(e)}")
                 
                 # 如果还有重试机会，继续重试
@@ -504,10 +526,9 @@ def get_tts_client() -> MegaTTS3Client:
     """获取TTS客户端单例"""
     global _tts_client
     if _tts_client is None:
-        import os
-        megatts3_url = os.getenv("MEGATTS3_URL", "http://localhost:7929")
-        logger.info(f"创建TTS客户端，URL: {megatts3_url}，当前实例ID: {id(_tts_client)}")
-        _tts_client = MegaTTS3Client(base_url=megatts3_url)
+        pool = create_pool_from_env()
+        logger.info(f"创建TTS客户端，节点: {[e.url for e in pool.endpoints]}，当前实例ID: {id(_tts_client)}")
+        _tts_client = MegaTTS3Client(pool=pool)
     else:
         logger.debug(f"复用TTS客户端，实例ID: {id(_tts_client)}")
     return _tts_client 
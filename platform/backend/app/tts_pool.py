@@ -0,0 +1,301 @@
+"""
+MegaTTS3 多节点负载均衡
+按节点健康度加权路由：跟踪在途请求数、延迟EWMA与失败次数，
+连续失败的节点由熔断器摘除，冷却后经 health_check 探测重新加入
+"""
+
+import asyncio
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+# 熔断器状态
+CIRCUIT_CLOSED = "closed"        # 正常接流
+CIRCUIT_OPEN = "open"            # 已摘除
+CIRCUIT_HALF_OPEN = "half_open"  # 试探：只放行一个请求
+
+
+class NoHealthyEndpointError(Exception):
+    """所有TTS节点均不可用"""
+    pass
+
+
+@dataclass
+class TTSEndpoint:
+    """单个MegaTTS3节点的运行时状态"""
+    url: str
+    weight: float = 1.0
+    in_flight: int = 0
+    ewma_latency: Optional[float] = None
+    consecutive_failures: int = 0
+    total_requests: int = 0
+    total_failures: int = 0
+    state: str = CIRCUIT_CLOSED
+    opened_at: float = 0.0
+    half_open_probe: bool = False
+    last_error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "weight": self.weight,
+            "state": self.state,
+            "in_flight": self.in_flight,
+            "ewma_latency": round(self.ewma_latency, 3) if self.ewma_latency is not None else None,
+            "consecutive_failures": self.consecutive_failures,
+            "total_requests": self.total_requests,
+            "total_failures": self.total_failures,
+            "last_error": self.last_error,
+        }
+
+
+def parse_endpoint_urls(value: Optional[str]) -> List[Dict[str, Any]]:
+    """
+    解析节点配置：逗号分隔，可用 url|weight 指定权重
+    例如 "http://gpu1:7929|2,http://gpu2:7929"
+    """
+    endpoints = []
+    for item in (value or "").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        url, _, weight = item.partition("|")
+        endpoints.append({"url": url.strip().rstrip('/'), "weight": float(weight) if weight else 1.0})
+    return endpoints
+
+
+class TTSEndpointPool:
+    """健康加权的TTS节点池"""
+
+    def __init__(
+        self,
+        endpoints: List[Dict[str, Any]],
+        failure_threshold: int = 3,
+        reset_timeout: float = 30.0,
+        ewma_alpha: float = 0.3,
+        default_latency: float = 5.0
+    ):
+        if not endpoints:
+            raise ValueError("TTS节点列表不能为空")
+        self.endpoints = [TTSEndpoint(url=e["url"].rstrip('/'), weight=e.get("weight", 1.0)) for e in endpoints]
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.ewma_alpha = ewma_alpha
+        self.default_latency = default_latency
+        self._lock = asyncio.Lock()
+
+    # ------------------------------------------------------------------
+    # 路由
+    # ------------------------------------------------------------------
+
+    def _score(self, endpoint: TTSEndpoint) -> float:
+        """预计排队耗时：(在途+1) × 延迟EWMA ÷ 权重，越小越优"""
+        latency = endpoint.ewma_latency if endpoint.ewma_latency is not None else self.default_latency
+        return (endpoint.in_flight + 1) * latency / max(endpoint.weight, 1e-6)
+
+    def _is_available(self, endpoint: TTSEndpoint, now: float) -> bool:
+        if endpoint.state == CIRCUIT_CLOSED:
+            return True
+        if endpoint.state == CIRCUIT_OPEN and now - endpoint.opened_at >= self.reset_timeout:
+            endpoint.state = CIRCUIT_HALF_OPEN
+            endpoint.half_open_probe = False
+            logger.info(f"[TTS_POOL] 节点 {endpoint.url} 冷却结束，进入半开试探")
+        return endpoint.state == CIRCUIT_HALF_OPEN and not endpoint.half_open_probe
+
+    async def acquire(self, exclude: Optional[Set[str]] = None) -> TTSEndpoint:
+        """选择最空闲的可用节点并计入在途请求"""
+        async with self._lock:
+            now = time.monotonic()
+            candidates = [
+                e for e in self.endpoints
+                if self._is_available(e, now) and (not exclude or e.url not in exclude)
+            ]
+            if not candidates and exclude:
+                # 排除集合耗尽时允许回到之前失败过的节点
+                candidates = [e for e in self.endpoints if self._is_available(e, now)]
+            if not candidates:
+                raise NoHealthyEndpointError("没有可用的MegaTTS3节点")
+
+            endpoint = min(candidates, key=self._score)
+            if endpoint.state == CIRCUIT_HALF_OPEN:
+                endpoint.half_open_probe = True
+            endpoint.in_flight += 1
+            endpoint.total_requests += 1
+            return endpoint
+
+    async def release(self, endpoint: TTSEndpoint, success: Optional[bool], latency: Optional[float] = None,
+                      error: Optional[str] = None):
+        """归还节点并更新延迟与熔断状态；success 为 None（请求被取消）时只归还，不计成功或失败"""
+        async with self._lock:
+            endpoint.in_flight = max(0, endpoint.in_flight - 1)
+            endpoint.half_open_probe = False
+
+            if success is None:
+                return
+            if success:
+                if latency is not None:
+                    if endpoint.ewma_latency is None:
+                        endpoint.ewma_latency = latency
+                    else:
+                        endpoint.ewma_latency = self.ewma_alpha * latency + (1 - self.ewma_alpha) * endpoint.ewma_latency
+                if endpoint.state != CIRCUIT_CLOSED:
+                    logger.info(f"[TTS_POOL] 节点 {endpoint.url} 恢复正常")
+                endpoint.state = CIRCUIT_CLOSED
+                endpoint.consecutive_failures = 0
+                endpoint.last_error = None
+                return
+
+            endpoint.consecutive_failures += 1
+            endpoint.total_failures += 1
+            endpoint.last_error = error
+            if endpoint.state == CIRCUIT_HALF_OPEN or endpoint.consecutive_failures >= self.failure_threshold:
+                self._open(endpoint)
+
+    def _open(self, endpoint: TTSEndpoint):
+        if endpoint.state != CIRCUIT_OPEN:
+            logger.warning(f"[TTS_POOL] 节点 {endpoint.url} 连续失败 {endpoint.consecutive_failures} 次，熔断摘除")
+        endpoint.state = CIRCUIT_OPEN
+        endpoint.opened_at = time.monotonic()
+
+    @asynccontextmanager
+    async def lease(self, exclude: Optional[Set[str]] = None):
+        """
+        借用一个节点；调用方通过 lease.mark_failure() 标记失败，
+        否则正常退出即视为成功并记录耗时
+        """
+        endpoint = await self.acquire(exclude)
+        lease = _EndpointLease(endpoint)
+        start = time.monotonic()
+        cancelled = False
+        try:
+            yield lease
+        except (asyncio.CancelledError, GeneratorExit):
+            # 调用方被取消（如任务租约丢失）不代表节点故障，也不应计入延迟
+            cancelled = True
+            raise
+        except Exception as e:
+            if lease.success is None:
+                lease.mark_failure(str(e) or e.__class__.__name__)
+            raise
+        finally:
+            await self.release(
+                endpoint,
+                success=None if (cancelled and lease.success is None) else lease.success is not False,
+                latency=time.monotonic() - start,
+                error=lease.error
+            )
+
+    # ------------------------------------------------------------------
+    # 健康检查
+    # ------------------------------------------------------------------
+
+    async def probe(self, session: aiohttp.ClientSession, endpoint: TTSEndpoint) -> Dict[str, Any]:
+        """探测单个节点 /health，健康则重新纳入负载"""
+        try:
+            async with session.get(f"{endpoint.url}/health") as response:
+                if response.status == 200:
+                    data = await response.json(content_type=None)
+                    async with self._lock:
+                        if endpoint.state != CIRCUIT_CLOSED:
+                            logger.info(f"[TTS_POOL] 节点 {endpoint.url} 健康检查通过，重新加入")
+                        endpoint.state = CIRCUIT_CLOSED
+                        endpoint.consecutive_failures = 0
+                        endpoint.half_open_probe = False
+                    return {"url": endpoint.url, "status": "healthy", "data": data}
+                error = f"HTTP {response.status}"
+        except Exception as e:
+            error = str(e) or e.__class__.__name__
+
+        async with self._lock:
+            endpoint.last_error = error
+            self._open(endpoint)
+        return {"url": endpoint.url, "status": "unhealthy", "error": error}
+
+    async def health_check(self, timeout: float = 10.0) -> Dict[str, Any]:
+        """并发探测所有节点；至少一个节点健康即整体健康"""
+        connector = aiohttp.TCPConnector(ssl=False)
+        async with aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(total=timeout),
+            connector=connector,
+            connector_owner=True
+        ) as session:
+            results = await asyncio.gather(*(self.probe(session, e) for e in self.endpoints))
+
+        healthy = [r for r in results if r["status"] == "healthy"]
+        if healthy:
+            return {
+                "status": "healthy",
+                "data": healthy[0].get("data"),
+                "healthy_nodes": len(healthy),
+                "total_nodes": len(results),
+                "nodes": results
+            }
+        return {
+            "status": "unhealthy",
+            "error": "; ".join(f"{r['url']}: {r.get('error')}" for r in results),
+            "healthy_nodes": 0,
+            "total_nodes": len(results),
+            "nodes": results
+        }
+
+    async def run_health_probe(self, interval: float = 15.0):
+        """后台循环：只探测被摘除的节点，使其尽快重新加入"""
+        while True:
+            await asyncio.sleep(interval)
+            ejected = [e for e in self.endpoints if e.state != CIRCUIT_CLOSED]
+            if not ejected:
+                continue
+            connector = aiohttp.TCPConnector(ssl=False)
+            async with aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=10),
+                connector=connector,
+                connector_owner=True
+            ) as session:
+                await asyncio.gather(*(self.probe(session, e) for e in ejected))
+
+    def get_status(self) -> Dict[str, Any]:
+        """节点池状态快照"""
+        return {
+            "total_nodes": len(self.endpoints),
+            "available_nodes": sum(1 for e in self.endpoints if e.state == CIRCUIT_CLOSED),
+            "nodes": [e.to_dict() for e in self.endpoints]
+        }
+
+
+class _EndpointLease:
+    """lease() 上下文中的节点句柄"""
+
+    def __init__(self, endpoint: TTSEndpoint):
+        self.endpoint = endpoint
+        self.success: Optional[bool] = None
+        self.error: Optional[str] = None
+
+    @property
+    def url(self) -> str:
+        return self.endpoint.url
+
+    def mark_failure(self, error: str):
+        self.success = False
+        self.error = error
+
+    def mark_success(self):
+        self.success = True
+
+
+def create_pool_from_env() -> TTSEndpointPool:
+    """从环境变量创建节点池：优先 MEGATTS3_URLS，兼容单节点 MEGATTS3_URL"""
+    endpoints = parse_endpoint_urls(os.getenv("MEGATTS3_URLS"))
+    if not endpoints:
+        endpoints = parse_endpoint_urls(os.getenv("MEGATTS3_URL", "http://localhost:7929"))
+    return TTSEndpointPool(
+        endpoints,
+        failure_threshold=int(os.getenv("MEGATTS3_FAILURE_THRESHOLD", "3")),
+        reset_timeout=float(os.getenv("MEGATTS3_RESET_TIMEOUT", "30"))
+    )
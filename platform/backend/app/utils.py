@@ -214,7 +214,7 @@ def validate_audio_file(file_path: str) -> Dict[str, Any]:
 def get_audio_duration(file_path: str) -> Optional[float]:
         """
         获取音频文件时长（可选功能）
-        需要安装 librosa 或 pydub
+        只读取文件头，结果按 路径+mtime+大小 缓存
         
         Args:
                 file_path: 音频文件路径
@@ -227,27 +227,8 @@ def get_audio_duration(file_path: str) -> Optional[float]:
                 return None
                 
         try:
-                # 尝试使用 librosa
-                try:
-                        import librosa
-                        duration = librosa.get_duration(filename=file_path)
-                        return duration
-                except ImportError:
-                        pass
-                
-                # 尝试使用 pydub
-                try:
-                        from pydub import AudioSegment
-                        audio = AudioSegment.from_file(file_path)
-                        return len(audio) / 1000.0  # 转换为秒
-                except ImportError:
-                        pass
-                
-                # 避免重复警告
-                if not hasattr(get_audio_duration, '_warning_shown'):
-                        logger.warning("无法获取音频时长-缺少 librosa 或 pydub")
-                        get_audio_duration._warning_shown = True
-                return None
+                from app.services.audio_metadata_service import get_audio_metadata_service
+                return get_audio_metadata_service().get_duration(file_path)
                 
         except Exception as e:
                 logger.error(f"获取音频时长失败: {str(e)}")
@@ -77,10 +77,13 @@ async def log_system_event(*args, **kwargs):
 
 # 其他工具函数（为兼容性保留）
 def get_audio_duration(file_path: str) -> float:
-    """获取音频文件时长"""
+    """获取音频文件时长（只读文件头，结果按 路径+mtime+大小 缓存）"""
     try:
-        import librosa
-        duration = librosa.get_duration(filename=file_path)
+        from app.services.audio_metadata_service import get_audio_metadata_service
+        duration = get_audio_metadata_service().get_duration(file_path)
+        if duration is None:
+            log_error("获取音频时长失败: 无法识别的音频文件", details={"file_path": file_path})
+            return 0.0
         return duration
     except Exception as e:
         log_error(f"获取音频时长失败: {e}", details={"file_path": file_path})
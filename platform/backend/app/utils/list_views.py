@@ -0,0 +1,220 @@
+"""
+列表端点的字段视图与游标分页
+- view=summary：只返回轻量字段，正文与大 JSON 列不进入 SELECT（load_only 延迟加载）
+- fields=id,title：返回任意字段子集，只查询这些字段依赖的列
+- 关联对象（如章节所属书籍）随列表一次预加载，不逐行懒加载
+- cursor：按 (排序列, id) 游标翻页，代价与页码无关
+未指定 view / fields 时返回完整 to_dict，兼容旧客户端
+"""
+
+import base64
+import json
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import and_, asc, desc, or_
+from sqlalchemy.orm import load_only
+
+VIEW_SUMMARY = "summary"
+VIEW_DETAIL = "detail"
+VIEWS = (VIEW_SUMMARY, VIEW_DETAIL)
+
+
+def _plain(value: Any) -> Any:
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+class FieldSet:
+    """
+    模型在列表端点上可选择的字段
+
+    普通列字段自动生成；derived 声明需要额外处理的字段：
+        名称 -> (依赖的列, 取值函数, 预加载选项)
+    取值函数为 None 的字段由端点自行填充（如项目进度）；
+    detail_options 为完整视图（to_dict）所需的预加载选项
+    """
+
+    def __init__(self, model, summary: Sequence[str],
+                 derived: Optional[Dict[str, Tuple[Sequence[str], Optional[Callable], Optional[Callable]]]] = None,
+                 detail_extras: Sequence[str] = (), detail_options: Sequence[Callable] = (),
+                 hidden: Sequence[str] = ()):
+        self.model = model
+        self.columns = {
+            attr.key: attr for attr in model.__mapper__.column_attrs if attr.key not in hidden
+        }
+        self.fields: Dict[str, Tuple[Tuple[str, ...], Optional[Callable], Optional[Callable]]] = {
+            key: ((key,), lambda obj, key=key: _plain(getattr(obj, key)), None) for key in self.columns
+        }
+        for name, (columns, getter, eager) in (derived or {}).items():
+            self.fields[name] = (tuple(columns), getter, eager)
+        self.summary = list(summary)
+        # 完整视图在 to_dict 之外追加的字段
+        self.detail_extras = list(detail_extras)
+        self.detail_options = list(detail_options)
+
+    def resolve(self, fields: Optional[str] = None, view: Optional[str] = None) -> Optional[List[str]]:
+        """
+        解析请求的字段
+
+        Returns:
+            输出字段列表；None 表示完整视图（to_dict + detail_extras）
+
+        Raises:
+            ValueError: 视图或字段名无效
+        """
+        if fields:
+            names = [name.strip() for name in fields.split(",") if name.strip()]
+            unknown = [name for name in names if name not in self.fields]
+            if unknown:
+                raise ValueError(f"未知字段: {', '.join(unknown)}；可选字段: {', '.join(self.fields)}")
+            return list(dict.fromkeys(["id"] + names))
+        if view and view not in VIEWS:
+            raise ValueError(f"未知视图: {view}；可选视图: {', '.join(VIEWS)}")
+        if view == VIEW_SUMMARY:
+            return list(self.summary)
+        return None
+
+    def includes(self, names: Optional[List[str]], field: str) -> bool:
+        """是否需要输出该字段"""
+        return field in self.detail_extras if names is None else field in names
+
+    def query_options(self, names: Optional[List[str]], extra_columns: Iterable[str] = ()) -> list:
+        """
+        查询选项：字段子集只加载依赖的列（extra_columns 如游标排序列一并加载），
+        并预加载所需的关联对象
+        """
+        wanted = self.detail_extras if names is None else names
+        options = [eager() for _, _, eager in (self.fields[name] for name in wanted) if eager is not None]
+        if names is None:
+            options.extend(option() for option in self.detail_options)
+        else:
+            keys = {"id", *extra_columns}
+            for name in names:
+                keys.update(self.fields[name][0])
+            options.append(load_only(*[self.columns[key].class_attribute for key in keys if key in self.columns]))
+        return options
+
+    def serialize(self, obj, names: Optional[List[str]], **to_dict_kwargs) -> Dict[str, Any]:
+        """按字段输出；完整视图沿用模型的 to_dict"""
+        if names is None:
+            data = obj.to_dict(**to_dict_kwargs)
+            names = self.detail_extras
+        else:
+            data = {}
+        for name in names:
+            getter = self.fields[name][1]
+            if getter is not None:
+                data[name] = getter(obj)
+        return data
+
+
+# ==================== 游标分页 ====================
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    raw = json.dumps([{"$dt": v.isoformat()} if isinstance(v, datetime) else v for v in values],
+                     ensure_ascii=False, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> List[Any]:
+    """解析游标；格式无效时抛出 ValueError"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode())
+        return [datetime.fromisoformat(v["$dt"]) if isinstance(v, dict) else v for v in values]
+    except Exception as e:
+        raise ValueError(f"无效的分页游标: {cursor}") from e
+
+
+def keyset_column(field_set: FieldSet, sort_by: str):
+    """
+    可用于游标分页的排序列：只允许非空列（NULL 在各数据库中的排序位置不一致）
+
+    Raises:
+        ValueError: 排序字段不支持游标分页
+    """
+    attr = field_set.columns.get(sort_by)
+    column = attr.columns[0] if attr is not None else None
+    if column is None or (column.nullable and not column.primary_key):
+        raise ValueError(f"排序字段 {sort_by} 不支持游标分页")
+    return attr.class_attribute
+
+
+def keyset_page(query, sort_column, id_column, descending: bool, page_size: int,
+                cursor: Optional[str] = None) -> Tuple[list, Optional[str]]:
+    """
+    按 (排序列, id) 取一页
+
+    Returns:
+        (对象列表, 下一页游标；没有更多时为 None)
+    """
+    if cursor:
+        values = decode_cursor(cursor)
+        if len(values) != 2:
+            raise ValueError(f"无效的分页游标: {cursor}")
+        sort_value, last_id = values
+        if descending:
+            query = query.filter(or_(sort_column < sort_value,
+                                     and_(sort_column == sort_value, id_column < last_id)))
+        else:
+            query = query.filter(or_(sort_column > sort_value,
+                                     and_(sort_column == sort_value, id_column > last_id)))
+    order = desc if descending else asc
+    rows = query.order_by(order(sort_column), order(id_column)).limit(page_size + 1).all()
+    next_cursor = None
+    if len(rows) > page_size:
+        next_cursor = cursor_after(rows[page_size - 1], sort_column, id_column)
+    return rows[:page_size], next_cursor
+
+
+def cursor_after(obj, sort_column, id_column) -> str:
+    """指向 obj 之后的游标"""
+    return encode_cursor([getattr(obj, sort_column.key), getattr(obj, id_column.key)])
+
+
+def paginate(query, field_set: FieldSet, names: Optional[List[str]], sort_by: str, default_sort,
+             sort_order: str, page: int, page_size: int, cursor: Optional[str] = None,
+             include_total: bool = False) -> Tuple[list, Dict[str, Any]]:
+    """
+    列表查询：应用字段视图的查询选项，带 cursor 时游标翻页，否则按页码 OFFSET 分页；
+    排序列支持游标时两种方式都返回 nextCursor
+
+    Returns:
+        (对象列表, 分页信息)
+
+    Raises:
+        ValueError: 游标无效或排序字段不支持游标分页
+    """
+    model = field_set.model
+    descending = sort_order != "asc"
+    try:
+        sort_column = keyset_column(field_set, sort_by)
+    except ValueError:
+        if cursor:
+            raise
+        sort_column = None
+    id_column = field_set.columns["id"].class_attribute
+
+    # 总数需全量计数，游标翻页时默认不统计
+    total = query.count() if (not cursor or include_total) else None
+    extra_columns = [sort_column.key] if sort_column is not None else []
+    query = query.options(*field_set.query_options(names, extra_columns))
+
+    if cursor:
+        rows, next_cursor = keyset_page(query, sort_column, id_column, descending, page_size, cursor)
+        has_more = next_cursor is not None
+    else:
+        sort_field = sort_column if sort_column is not None else getattr(model, sort_by, default_sort)
+        order = desc if descending else asc
+        rows = query.order_by(order(sort_field), order(id_column)) \
+                    .offset((page - 1) * page_size).limit(page_size).all()
+        has_more = page * page_size < total
+        next_cursor = cursor_after(rows[-1], sort_column, id_column) if (has_more and rows and sort_column is not None) else None
+
+    return rows, {
+        "page": page,
+        "pageSize": page_size,
+        "total": total,
+        "totalPages": (total + page_size - 1) // page_size if total is not None else None,
+        "hasMore": has_more,
+        "nextCursor": next_cursor
+    }
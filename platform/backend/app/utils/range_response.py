@@ -0,0 +1,138 @@
+"""
+HTTP Range 文件响应
+支持 Range / If-Range，播放器拖动进度时只传输所需字节
+"""
+
+import os
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Iterator, Optional, Tuple
+from urllib.parse import quote
+
+from fastapi import Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+
+RANGE_CHUNK_SIZE = 64 * 1024
+
+
+def file_validators(path: str, variant: str = "") -> Tuple[str, str]:
+    """根据mtime与大小生成 ETag / Last-Modified；由文件派生的内容（如波形峰值）用 variant 区分"""
+    stat = os.stat(path)
+    return stat_validators(stat.st_mtime_ns, stat.st_size, variant)
+
+
+def stat_validators(mtime_ns: int, size: int, variant: str = "") -> Tuple[str, str]:
+    etag = f'"{mtime_ns:x}-{size:x}{"-" + variant if variant else ""}"'
+    last_modified = formatdate(mtime_ns / 1e9, usegmt=True)
+    return etag, last_modified
+
+
+def is_not_modified(request: Request, etag: str, last_modified: str) -> bool:
+    """
+    条件请求判断：If-None-Match 优先（弱比较），没有时才看 If-Modified-Since
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or etag in [tag[2:] if tag.startswith("W/") else tag for tag in tags]
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if not if_modified_since:
+        return False
+    try:
+        return parsedate_to_datetime(last_modified) <= parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+
+
+def parse_range_header(range_header: str, file_size: int) -> Optional[Tuple[int, int]]:
+    """
+    解析单段 bytes Range，返回闭区间 (start, end)
+    多段Range返回None（按完整文件响应）；不可满足时抛出ValueError
+    """
+    unit, _, ranges = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or not ranges:
+        raise ValueError("不支持的Range单位")
+    if "," in ranges:
+        return None
+
+    start_text, _, end_text = ranges.strip().partition("-")
+    if start_text == "":
+        # 后缀形式：bytes=-N 表示最后N字节
+        length = int(end_text)
+        if length <= 0:
+            raise ValueError("无效的Range")
+        start = max(file_size - length, 0)
+        end = file_size - 1
+    else:
+        start = int(start_text)
+        end = int(end_text) if end_text else file_size - 1
+        end = min(end, file_size - 1)
+
+    if start > end or start >= file_size:
+        raise ValueError("Range超出文件范围")
+    return start, end
+
+
+def _iter_file_range(path: str, start: int, end: int, chunk_size: int = RANGE_CHUNK_SIZE) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def range_file_response(
+    request: Request,
+    path: str,
+    media_type: str = "audio/wav",
+    filename: Optional[str] = None,
+    inline: bool = False
+) -> Response:
+    """
+    返回支持Range的文件响应
+
+    无Range头时与FileResponse一致（附带 Accept-Ranges）；
+    单段Range返回206；不可满足的Range返回416。
+    """
+    file_size = os.path.getsize(path)
+    etag, last_modified = file_validators(path)
+    headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": etag,
+        "Last-Modified": last_modified,
+    }
+    if filename:
+        disposition = "inline" if inline else "attachment"
+        headers["Content-Disposition"] = f"{disposition}; filename*=utf-8''{quote(filename)}"
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and if_range and if_range not in (etag, last_modified):
+        # 文件已变化，忽略Range返回完整内容
+        range_header = None
+
+    byte_range = None
+    if range_header:
+        try:
+            byte_range = parse_range_header(range_header, file_size)
+        except ValueError:
+            return Response(status_code=416, headers={"Content-Range": f"bytes */{file_size}", "Accept-Ranges": "bytes"})
+
+    if byte_range is None:
+        return FileResponse(path=path, media_type=media_type, headers=headers)
+
+    start, end = byte_range
+    headers.update({
+        "Content-Range": f"bytes {start}-{end}/{file_size}",
+        "Content-Length": str(end - start + 1),
+    })
+    return StreamingResponse(
+        _iter_file_range(path, start, end),
+        status_code=206,
+        media_type=media_type,
+        headers=headers
+    )
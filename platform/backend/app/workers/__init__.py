@@ -0,0 +1,13 @@
+"""
+后台Worker模块
+从持久化任务队列领取并执行合成、混音任务
+"""
+
+from .synthesis_worker import SynthesisWorker
+from .handlers import JOB_HANDLERS, JobCancelledError
+
+__all__ = [
+    'SynthesisWorker',
+    'JOB_HANDLERS',
+    'JobCancelledError',
+]
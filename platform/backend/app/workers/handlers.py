@@ -0,0 +1,231 @@
+"""
+任务处理器
+每种任务类型对应一个 async handler(db, job) -> dict
+handler抛出异常即视为本次尝试失败，由队列负责退避重试
+"""
+
+import asyncio
+import os
+import logging
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.models import (
+    AudioFile, BookChapter, NovelProject, SynthesisJob, JobStatus, JobType
+)
+
+logger = logging.getLogger(__name__)
+
+
+class JobCancelledError(Exception):
+    """项目已取消/暂停，任务不应重试"""
+    pass
+
+
+JobHandler = Callable[[Session, SynthesisJob], Awaitable[Dict[str, Any]]]
+JOB_HANDLERS: Dict[str, JobHandler] = {}
+
+
+def register_handler(job_type: str):
+    """注册任务处理器"""
+    def decorator(func: JobHandler) -> JobHandler:
+        JOB_HANDLERS[job_type] = func
+        return func
+    return decorator
+
+
+async def _publish_progress(db: Session, project_id: int, message: str):
+    """推送项目进度（Worker与Web进程同进程时生效，独立Worker依赖前端轮询）"""
+    try:
+        from app.websocket.manager import websocket_manager
+
+        completed = db.query(func.count(SynthesisJob.id)).filter(
+            SynthesisJob.project_id == project_id,
+            SynthesisJob.job_type == JobType.SEGMENT_SYNTHESIS,
+            SynthesisJob.status == JobStatus.SUCCEEDED
+        ).scalar()
+        total = db.query(func.count(SynthesisJob.id)).filter(
+            SynthesisJob.project_id == project_id,
+            SynthesisJob.job_type == JobType.SEGMENT_SYNTHESIS,
+            SynthesisJob.status != JobStatus.CANCELLED
+        ).scalar()
+        failed = db.query(func.count(SynthesisJob.id)).filter(
+            SynthesisJob.project_id == project_id,
+            SynthesisJob.job_type == JobType.SEGMENT_SYNTHESIS,
+            SynthesisJob.status == JobStatus.FAILED
+        ).scalar()
+
+        await websocket_manager.publish_to_topic(
+            f"synthesis_{project_id}",
+            {
+                "type": "progress_update",
+                "data": {
+                    "type": "synthesis",
+                    "project_id": project_id,
+                    "status": "running",
+                    "progress": round(completed / total * 100) if total else 0,
+                    "completed_segments": completed,
+                    "total_segments": total,
+                    "failed_segments": failed,
+                    "current_processing": message,
+                    "timestamp": datetime.utcnow().isoformat()
+                }
+            }
+        )
+    except Exception as e:
+        logger.debug(f"[JOB_WORKER] 进度推送失败: {e}")
+
+
+@register_handler(JobType.SEGMENT_SYNTHESIS)
+async def handle_segment_synthesis(db: Session, job: SynthesisJob) -> Dict[str, Any]:
+    """合成单个段落"""
+    from app.novel_reader import synthesize_plan_segment
+    from app.tts_client import get_tts_client
+
+    project = db.query(NovelProject).filter(NovelProject.id == job.project_id).first()
+    if not project:
+        raise JobCancelledError(f"项目 {job.project_id} 不存在")
+    if project.status in ('cancelled', 'paused'):
+        raise JobCancelledError(f"项目 {job.project_id} 状态为 {project.status}")
+
+    # 幂等：段落已有音频（例如上次执行在落库后、提交任务状态前中断）则直接复用
+    existing = db.query(AudioFile).filter(
+        AudioFile.project_id == job.project_id,
+        AudioFile.chapter_id == job.chapter_id,
+        AudioFile.paragraph_index == job.segment_id,
+        AudioFile.audio_type == 'segment'
+    ).first()
+    if existing and existing.file_path and os.path.exists(existing.file_path):
+        logger.info(f"[JOB_WORKER] 段落 {job.segment_id} 已存在音频，跳过合成")
+        return {
+            "segment_id": job.segment_id,
+            "audio_file_id": existing.id,
+            "file_path": existing.file_path,
+            "chapter_id": job.chapter_id,
+            "reused": True
+        }
+
+    project_output_dir = f"outputs/projects/{job.project_id}"
+    os.makedirs(project_output_dir, exist_ok=True)
+
+    payload = job.payload or {}
+    result = await synthesize_plan_segment(
+        db,
+        get_tts_client(),
+        job.project_id,
+        payload.get('segment', {}),
+        payload.get('segment_index', 0),
+        project_output_dir
+    )
+
+    if result is None:
+        return {"segment_id": job.segment_id, "skipped": True}
+    if "error" in result:
+        raise RuntimeError(result["error"])
+
+    await _publish_progress(db, job.project_id, f"已完成段落 {job.segment_id} - {result.get('speaker', '')}")
+    return result
+
+
+@register_handler(JobType.CHAPTER_FINALIZE)
+async def handle_chapter_finalize(db: Session, job: SynthesisJob) -> Dict[str, Any]:
+    """章节段落全部结束后：合并章节音频、更新章节与项目状态"""
+    from app.novel_reader import merge_chapter_audio_files, generate_detailed_error_summary
+
+    failed_children = db.query(SynthesisJob).filter(
+        SynthesisJob.parent_id == job.id,
+        SynthesisJob.status == JobStatus.FAILED
+    ).all()
+
+    segment_files = db.query(AudioFile).filter(
+        AudioFile.project_id == job.project_id,
+        AudioFile.chapter_id == job.chapter_id,
+        AudioFile.audio_type == 'segment'
+    ).order_by(AudioFile.paragraph_index.asc()).all()
+
+    audio_files = [
+        {
+            "segment_id": audio.paragraph_index,
+            "file_path": audio.file_path,
+            "chapter_id": audio.chapter_id
+        }
+        for audio in segment_files
+    ]
+
+    chapter_audio_path = None
+    if job.chapter_id and audio_files:
+        # 重试时替换上次生成的章节音频记录
+        db.query(AudioFile).filter(
+            AudioFile.project_id == job.project_id,
+            AudioFile.chapter_id == job.chapter_id,
+            AudioFile.audio_type == 'chapter'
+        ).delete(synchronize_session=False)
+        db.commit()
+
+        chapter_audio_path = await merge_chapter_audio_files(job.project_id, job.chapter_id, audio_files, db)
+        if not chapter_audio_path:
+            raise RuntimeError(f"章节 {job.chapter_id} 音频合并失败")
+
+        # 章节音频通常很长，合并后立即预生成波形峰值，编辑器打开时无需再解码
+        from app.services.waveform_peaks import waveform_peak_service
+        await asyncio.to_thread(waveform_peak_service.ensure_peaks, chapter_audio_path)
+        # 同时在后台预热压缩播放副本
+        from app.services.audio_rendition_service import audio_rendition_service
+        audio_rendition_service.prewarm(chapter_audio_path)
+
+    if job.chapter_id:
+        chapter = db.query(BookChapter).filter(BookChapter.id == job.chapter_id).first()
+        if chapter:
+            chapter.synthesis_status = 'completed' if chapter_audio_path and not failed_children else 'failed'
+
+    # 项目下没有其他活跃任务时收尾项目状态
+    project = db.query(NovelProject).filter(NovelProject.id == job.project_id).first()
+    remaining = db.query(func.count(SynthesisJob.id)).filter(
+        SynthesisJob.project_id == job.project_id,
+        SynthesisJob.id != job.id,
+        SynthesisJob.status.in_(JobStatus.ACTIVE)
+    ).scalar()
+    if project and not remaining and project.status == 'processing':
+        project_failed = db.query(SynthesisJob).filter(
+            SynthesisJob.project_id == job.project_id,
+            SynthesisJob.job_type == JobType.SEGMENT_SYNTHESIS,
+            SynthesisJob.status == JobStatus.FAILED
+        ).all()
+        if project_failed:
+            project.status = 'failed'
+            project.error_message = generate_detailed_error_summary(
+                [{"segment_index": j.segment_id, "error": j.last_error or ""} for j in project_failed],
+                db.query(func.count(SynthesisJob.id)).filter(
+                    SynthesisJob.project_id == job.project_id,
+                    SynthesisJob.job_type == JobType.SEGMENT_SYNTHESIS
+                ).scalar()
+            )
+        else:
+            project.status = 'completed'
+            project.error_message = None
+        project.completed_at = datetime.utcnow()
+    db.commit()
+
+    await _publish_progress(db, job.project_id, f"章节 {job.chapter_id} 合成结束")
+    return {
+        "chapter_id": job.chapter_id,
+        "chapter_audio_path": chapter_audio_path,
+        "merged_segments": len(audio_files),
+        "failed_segments": len(failed_children)
+    }
+
+
+@register_handler(JobType.ENVIRONMENT_MIXING)
+async def handle_environment_mixing(db: Session, job: SynthesisJob) -> Dict[str, Any]:
+    """执行环境音混音任务"""
+    from app.api.v1.environment_mixing import process_environment_mixing
+
+    mixing_job_id = (job.payload or {}).get('mixing_job_id')
+    if not mixing_job_id:
+        raise JobCancelledError("缺少 mixing_job_id")
+
+    await process_environment_mixing(mixing_job_id)
+    return {"mixing_job_id": mixing_job_id}
@@ -0,0 +1,188 @@
+"""
+合成任务Worker
+可嵌入Web进程运行，也可独立部署多实例：
+
+    python -m app.workers.synthesis_worker --concurrency 1
+
+Worker崩溃或重启时，其持有的任务在租约过期后自动被其他Worker接管。
+续租在独立线程中进行：处理器中的阻塞调用占住事件循环时租约也不会过期。
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import threading
+from typing import Iterable, Optional, Set
+
+from app.database import SessionLocal
+from app.models import SynthesisJob
+from app.services.job_queue import JobQueue, get_job_queue, make_worker_id
+from app.workers.handlers import JOB_HANDLERS, JobCancelledError
+
+logger = logging.getLogger(__name__)
+
+WORKER_POLL_INTERVAL = float(os.getenv("WORKER_POLL_INTERVAL", "2"))
+
+
+class SynthesisWorker:
+    """持久化队列消费者"""
+
+    def __init__(
+        self,
+        worker_id: Optional[str] = None,
+        concurrency: int = 1,
+        job_types: Optional[Iterable[str]] = None,
+        poll_interval: float = WORKER_POLL_INTERVAL,
+        queue: Optional[JobQueue] = None
+    ):
+        self.worker_id = worker_id or make_worker_id()
+        self.concurrency = max(1, concurrency)
+        self.job_types = list(job_types) if job_types else list(JOB_HANDLERS.keys())
+        self.poll_interval = poll_interval
+        self.queue = queue or get_job_queue()
+        self._running_tasks: Set[asyncio.Task] = set()
+        self._stopping = asyncio.Event()
+
+    async def run(self):
+        """主循环：在并发上限内持续领取任务"""
+        logger.info(f"[JOB_WORKER] Worker {self.worker_id} 启动，并发 {self.concurrency}，任务类型 {self.job_types}")
+
+        while not self._stopping.is_set():
+            if len(self._running_tasks) >= self.concurrency:
+                await asyncio.wait(self._running_tasks, return_when=asyncio.FIRST_COMPLETED)
+                continue
+
+            job_id = await asyncio.to_thread(self._claim_one)
+            if job_id is None:
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            task = asyncio.create_task(self._execute(job_id))
+            self._running_tasks.add(task)
+            task.add_done_callback(self._running_tasks.discard)
+
+        if self._running_tasks:
+            await asyncio.gather(*self._running_tasks, return_exceptions=True)
+        logger.info(f"[JOB_WORKER] Worker {self.worker_id} 已停止")
+
+    def stop(self):
+        """请求停止：不再领取新任务，等待执行中的任务结束"""
+        self._stopping.set()
+
+    def _claim_one(self) -> Optional[int]:
+        db = SessionLocal()
+        try:
+            job = self.queue.claim(db, self.worker_id, self.job_types)
+            return job.id if job else None
+        except Exception as e:
+            logger.error(f"[JOB_WORKER] 领取任务失败: {e}")
+            db.rollback()
+            return None
+        finally:
+            db.close()
+
+    def _heartbeat_thread(self, job_id: int, handler_task: asyncio.Task,
+                          loop: asyncio.AbstractEventLoop, stopped: threading.Event):
+        """
+        定期续租（独立线程，不受事件循环阻塞影响）；
+        租约丢失（被暂停/取消/接管）时通过事件循环中止处理器
+        """
+        interval = max(self.queue.lease_seconds / 3, 1)
+        while not stopped.wait(interval):
+            db = SessionLocal()
+            try:
+                alive = self.queue.heartbeat(db, job_id, self.worker_id)
+            except Exception as e:
+                logger.warning(f"[JOB_WORKER] 任务 {job_id} 心跳失败: {e}")
+                alive = True
+            finally:
+                db.close()
+            if not alive:
+                logger.warning(f"[JOB_WORKER] 任务 {job_id} 租约已丢失，中止执行")
+                loop.call_soon_threadsafe(handler_task.cancel)
+                break
+
+    async def _execute(self, job_id: int):
+        db = SessionLocal()
+        try:
+            job = db.query(SynthesisJob).filter(SynthesisJob.id == job_id).first()
+            if not job:
+                return
+
+            handler = JOB_HANDLERS.get(job.job_type)
+            if handler is None:
+                self.queue.fail(db, job, f"未注册的任务类型: {job.job_type}", retryable=False,
+                                worker_id=self.worker_id)
+                return
+
+            logger.info(f"[JOB_WORKER] 执行任务 {job.id} ({job.job_type}) 第{job.attempts}次尝试")
+            handler_task = asyncio.create_task(handler(db, job))
+            heartbeat_stopped = threading.Event()
+            threading.Thread(
+                target=self._heartbeat_thread,
+                args=(job.id, handler_task, asyncio.get_running_loop(), heartbeat_stopped),
+                name=f"job-heartbeat-{job.id}", daemon=True
+            ).start()
+
+            try:
+                result = await handler_task
+            except asyncio.CancelledError:
+                # 租约丢失：任务已被暂停/取消/接管，状态由持有方维护
+                db.rollback()
+                return
+            except JobCancelledError as e:
+                db.rollback()
+                self.queue.fail(db, job, str(e), retryable=False, worker_id=self.worker_id)
+                return
+            except Exception as e:
+                logger.error(f"[JOB_WORKER] 任务 {job.id} 执行失败: {e}", exc_info=True)
+                db.rollback()
+                self.queue.fail(db, job, str(e), worker_id=self.worker_id)
+                return
+            finally:
+                heartbeat_stopped.set()
+
+            # 工作已完成，即使期间被暂停也记录成功，避免恢复后重复合成；
+            # 租约已被其他Worker接管时由对方记录结果
+            if not self.queue.complete(db, job, result, worker_id=self.worker_id):
+                logger.warning(f"[JOB_WORKER] 任务 {job_id} 租约已丢失，丢弃本次执行结果")
+        except Exception as e:
+            logger.error(f"[JOB_WORKER] 任务 {job_id} 调度异常: {e}", exc_info=True)
+        finally:
+            db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AI-Sound 持久化任务Worker")
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("WORKER_CONCURRENCY", "1")),
+                        help="同时执行的任务数")
+    parser.add_argument("--job-types", default=os.getenv("WORKER_JOB_TYPES", ""),
+                        help="只处理指定任务类型，逗号分隔；默认全部")
+    args = parser.parse_args()
+
+    from app.config.logging_config import init_logging
+    init_logging(level=os.getenv("LOG_LEVEL", "INFO").upper())
+
+    job_types = [t.strip() for t in args.job_types.split(",") if t.strip()] or None
+
+    async def _run():
+        worker = SynthesisWorker(concurrency=args.concurrency, job_types=job_types)
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, worker.stop)
+            except NotImplementedError:
+                # Windows不支持add_signal_handler，依赖KeyboardInterrupt退出
+                pass
+        await worker.run()
+
+    asyncio.run(_run())
+
+
+if __name__ == "__main__":
+    main()
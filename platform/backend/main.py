@@ -23,10 +23,12 @@ from app.database import init_database, health_check as db_health_check
 from app.api import api_router
 from app.tts_client import get_tts_client
 from app.clients.audio_processor import audio_processor
+from app.clients.tangoflux_client import get_tangoflux_client
 from app.clients.file_manager import file_manager
 from app.websocket.manager import websocket_manager
 from app.utils.logger import log_system_event, LogModule
 from app.middleware.logging_middleware import LoggingMiddleware
+from app.middleware.conditional_get import ConditionalGetMiddleware
 from app.config.log_config import log_config
 from app.exceptions import (
     AIServiceException,
@@ -192,6 +194,25 @@ async def lifespan(app: FastAPI):
         await websocket_manager.start()
         logger.info("✅ WebSocket管理器启动完成")
         
+        # 多个MegaTTS3节点时，后台探测被熔断摘除的节点
+        tts_pool = get_tts_client().pool
+        if len(tts_pool.endpoints) > 1:
+            app.state.tts_probe_task = asyncio.create_task(tts_pool.run_health_probe())
+            logger.info(f"✅ MegaTTS3节点池: {[e.url for e in tts_pool.endpoints]}")
+        
+        # 启动内嵌任务Worker（独立部署Worker时设置 SYNTHESIS_EMBEDDED_WORKERS=0）
+        embedded_workers = int(os.getenv("SYNTHESIS_EMBEDDED_WORKERS", "1"))
+        if embedded_workers > 0:
+            from app.workers import SynthesisWorker
+            app.state.synthesis_worker = SynthesisWorker(concurrency=embedded_workers)
+            app.state.synthesis_worker_task = asyncio.create_task(app.state.synthesis_worker.run())
+            logger.info(f"✅ 内嵌合成任务Worker已启动 (并发 {embedded_workers})")
+        
+        # 日志分区维护：提前建好分区，按 LOG_RETENTION_DAYS 删除过期分区
+        from app.services.system_log_service import LOG_MAINTENANCE_INTERVAL, run_log_maintenance_loop
+        if LOG_MAINTENANCE_INTERVAL > 0:
+            app.state.log_maintenance_task = asyncio.create_task(run_log_maintenance_loop())
+        
         logger.info("✅ AI-Sound平台后端启动完成!")
         
     except Exception as e:
@@ -204,10 +225,28 @@ async def lifespan(app: FastAPI):
     logger.info("🛑 AI-Sound平台后端关闭中...")
     
     try:
+        # 停止内嵌任务Worker，未完成任务的租约过期后由其他Worker接管
+        worker = getattr(app.state, "synthesis_worker", None)
+        if worker:
+            worker.stop()
+            await app.state.synthesis_worker_task
+            logger.info("✅ 内嵌合成任务Worker已停止")
+        
+        probe_task = getattr(app.state, "tts_probe_task", None)
+        if probe_task:
+            probe_task.cancel()
+        
+        maintenance_task = getattr(app.state, "log_maintenance_task", None)
+        if maintenance_task:
+            maintenance_task.cancel()
+        
         # 关闭音频处理器
         await audio_processor.close()
         logger.info("✅ 音频处理器已关闭")
         
+        # 关闭TangoFlux连接池
+        await get_tangoflux_client().close()
+        
         # 关闭WebSocket管理器
         await websocket_manager.stop()
         logger.info("✅ WebSocket管理器已关闭")
@@ -229,6 +268,9 @@ app = FastAPI(
 )
 
 # 添加中间件
+# 轮询端点的 ETag / 304 与短时响应缓存：先注册即位于 CORS 之内，304 响应同样带 CORS 头
+app.add_middleware(ConditionalGetMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # 生产环境应该限制具体域名
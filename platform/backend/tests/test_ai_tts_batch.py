@@ -0,0 +1,108 @@
+"""
+批量TTS参数推断测试
+整章合并为少量LLM调用、按特征签名记忆、批量结果缺项时逐段回退、并发准备时各自的优化模式互不影响
+"""
+
+import asyncio
+import json
+import re
+
+import pytest
+
+from app.services import ai_tts_optimizer
+from app.services.ai_tts_optimizer import AITTSOptimizer
+
+
+@pytest.fixture
+def optimizer(monkeypatch):
+    monkeypatch.setattr(AITTSOptimizer, "_memo", type(AITTSOptimizer._memo)())
+    optimizer = AITTSOptimizer()
+    optimizer.prompts = []
+
+    def fake_llm(prompt):
+        optimizer.prompts.append(prompt)
+        ids = [int(n) for n in re.findall(r"^(\d+)\. 角色", prompt, re.M)]
+        if not ids:
+            return '{"timeStep": 25, "pWeight": 1.5, "tWeight": 3.2, "reason": "单条"}'
+        return json.dumps([{"id": i, "timeStep": 28, "pWeight": 1.6, "tWeight": 3.5} for i in ids])
+
+    monkeypatch.setattr(optimizer, "_call_ollama_for_tts", fake_llm)
+    return optimizer
+
+
+def _chapter(count):
+    speakers = ["张三", "李四", "王五", "赵六", "旁白"]
+    emotions = ["angry", "sad", "happy"]
+    segments = []
+    for i in range(count):
+        text = ("这是一段足够长需要分析语气的对话内容，" * (1 + i % 4)) + ("！" if i % 2 else "？")
+        segments.append({"speaker": speakers[i % 5], "emotion": emotions[i % 3], "text": text})
+    return segments
+
+
+def test_chapter_is_inferred_in_a_handful_of_calls(optimizer, monkeypatch):
+    monkeypatch.setattr(ai_tts_optimizer, "TTS_PARAM_BATCH_SIZE", 20)
+    segments = _chapter(300)
+    params = optimizer.get_smart_tts_params_batch(segments, [{"name": "张三", "gender": "male"}])
+
+    assert len(params) == 300
+    assert params[4].get("narrator_mode") and params[4]["timeStep"] == 32
+    assert params[0]["timeStep"] == 28 and params[0]["ai_reasoning"] == "AI分析"
+    assert 1 <= len(optimizer.prompts) <= 5
+
+    # 同一签名的再次请求全部命中记忆
+    optimizer.prompts.clear()
+    assert optimizer.get_smart_tts_params_batch(segments, [{"name": "张三", "gender": "male"}]) == params
+    assert optimizer.get_smart_tts_params(segments[1], [])["timeStep"] == 28
+    assert optimizer.prompts == []
+
+
+def test_results_are_independent_copies(optimizer):
+    segments = _chapter(10)
+    params = optimizer.get_smart_tts_params_batch(segments, [])
+    params[0]["timeStep"] = 99
+    assert optimizer.get_smart_tts_params_batch(segments, [])[0]["timeStep"] == 28
+
+
+def test_missing_batch_items_fall_back_per_segment(optimizer, monkeypatch):
+    def partial(prompt):
+        optimizer.prompts.append(prompt)
+        if "只输出JSON数组" in prompt:
+            return '[{"id": 1, "timeStep": 28, "pWeight": 1.6, "tWeight": 3.5}, {"id": 2, "timeStep": "快"}]'
+        return '{"timeStep": 25, "pWeight": 1.5, "tWeight": 3.2}'
+
+    monkeypatch.setattr(optimizer, "_call_ollama_for_tts", partial)
+    segments = _chapter(3)[:2] + [_chapter(4)[3]]
+    params = optimizer.get_smart_tts_params_batch(segments, [])
+    assert [p["timeStep"] for p in params] == [28, 25, 25]
+    assert len(optimizer.prompts) == 3  # 1 次批量 + 2 次逐段回退
+
+
+def test_unreachable_llm_and_fast_mode_use_defaults(optimizer, monkeypatch):
+    monkeypatch.setattr(optimizer, "_call_ollama_for_tts", lambda prompt: None)
+    params = optimizer.get_smart_tts_params_batch(_chapter(6), [])
+    assert params[0] == AITTSOptimizer.CHARACTER_DEFAULT_PARAMS
+    assert AITTSOptimizer._memo == {}
+
+    optimizer.set_enable_ai_analysis(False)
+    monkeypatch.setattr(optimizer, "_call_ollama_for_tts", pytest.fail)
+    assert optimizer.get_smart_tts_params_batch(_chapter(6), [])[1] == AITTSOptimizer.CHARACTER_DEFAULT_PARAMS
+
+
+def test_concurrent_preparations_keep_their_own_mode(optimizer, monkeypatch):
+    from app.services.content_preparation_service import ContentPreparationService
+
+    service = ContentPreparationService.__new__(ContentPreparationService)
+    service.tts_optimizer = optimizer
+
+    async def prepare_both():
+        return await asyncio.gather(
+            service._get_optimized_tts_params_batch(_chapter(6), "fast", []),
+            service._get_optimized_tts_params_batch(_chapter(6), "quality", []),
+        )
+
+    fast, quality = asyncio.run(prepare_both())
+    assert fast[1] == AITTSOptimizer.CHARACTER_DEFAULT_PARAMS
+    assert quality[1]["timeStep"] == 28
+    # 模式按调用传入，不改写共享优化器的设置
+    assert optimizer.enable_ai_analysis is True
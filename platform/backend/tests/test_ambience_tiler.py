@@ -0,0 +1,83 @@
+"""
+环境音循环拼接测试
+循环点检测、等功率接缝、随机片段顺序、WAV 往返
+"""
+
+import io
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+from app.services.ambience_tiler import AmbienceTiler, equal_power_curves, find_loop_point, tile_ambience
+
+SAMPLE_RATE = 8000
+
+
+def _noise(seconds, seed=0):
+    return np.random.default_rng(seed).normal(0, 0.1, (int(seconds * SAMPLE_RATE), 2)).astype("float32")
+
+
+def test_equal_power_curves():
+    fade_in, fade_out = equal_power_curves(1000)
+    assert np.allclose(fade_in ** 2 + fade_out ** 2, 1.0, atol=1e-6)
+    assert fade_in[0] < 0.01 and fade_out[-1] < 0.01
+
+
+def test_loop_point_lands_on_period():
+    period = 331
+    t = np.arange(SAMPLE_RATE * 4)
+    tone = (0.5 * np.sin(2 * np.pi * t / period) + 0.2 * np.sin(6 * np.pi * t / period)).astype("float32")
+    end = find_loop_point(tone[:, None], 400)
+    assert end >= len(tone) // 2 and end + 400 <= len(tone)
+    assert min(end % period, period - end % period) <= 1
+
+
+def test_tiled_length_and_seam_level():
+    seed = _noise(4.0)
+    target = SAMPLE_RATE * 30
+    tiled = tile_ambience(seed, SAMPLE_RATE, target, crossfade=0.5)
+    assert tiled.shape == (target, 2) and tiled.dtype == np.float32
+    # 等功率交叉淡化：每 0.25 秒窗口的 RMS 都接近种子
+    rms = np.sqrt((tiled.reshape(-1, SAMPLE_RATE // 4, 2) ** 2).mean(axis=(1, 2)))
+    assert np.all(np.abs(rms / 0.1 - 1.0) < 0.2)
+    # 开头就是种子本身
+    assert np.array_equal(tiled[:SAMPLE_RATE], seed[:SAMPLE_RATE])
+
+
+def test_shorter_target_is_truncated():
+    seed = _noise(4.0)
+    assert np.array_equal(tile_ambience(seed, SAMPLE_RATE, 1000), seed[:1000])
+
+
+def test_randomized_order_is_seeded():
+    seed = _noise(9.0, seed=3)
+    target = SAMPLE_RATE * 60
+    kwargs = dict(crossfade=0.25, randomize=True, segment_seconds=1.0)
+    first = tile_ambience(seed, SAMPLE_RATE, target, seed=7, **kwargs)
+    again = tile_ambience(seed, SAMPLE_RATE, target, seed=7, **kwargs)
+    other = tile_ambience(seed, SAMPLE_RATE, target, seed=8, **kwargs)
+    plain = tile_ambience(seed, SAMPLE_RATE, target, crossfade=0.25)
+    assert np.array_equal(first, again)
+    assert not np.array_equal(first, other)
+    assert not np.array_equal(first, plain)
+
+
+def test_wav_bytes_roundtrip():
+    buffer = io.BytesIO()
+    sf.write(buffer, _noise(3.0), SAMPLE_RATE, subtype="PCM_16", format="WAV")
+    tiler = AmbienceTiler(seed_duration=3.0, crossfade=0.5, randomize=False)
+    assert tiler.generation_duration(45.0) == 3.0
+    assert tiler.generation_duration(2.0) == 2.0
+
+    data = buffer.getvalue()
+    assert tiler.extend_wav_bytes(data, 2.0) is data
+
+    info = sf.info(io.BytesIO(tiler.extend_wav_bytes(data, 12.5)))
+    assert info.frames == int(12.5 * SAMPLE_RATE)
+    assert (info.samplerate, info.channels, info.subtype) == (SAMPLE_RATE, 2, "PCM_16")
+
+
+@pytest.mark.parametrize("enabled,expected", [(True, 10.0), (False, 90.0)])
+def test_generation_duration_respects_switch(enabled, expected):
+    assert AmbienceTiler(enabled=enabled, seed_duration=10.0).generation_duration(90.0) == expected
@@ -0,0 +1,103 @@
+"""
+音频元数据探测测试
+文件头解析结果与解码得到的时长一致，缓存按 路径+mtime+大小 失效
+"""
+
+import os
+import struct
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+from app.services.audio_metadata_service import AudioMetadataService, probe_file
+
+
+def _tone(seconds: float, sample_rate: int, channels: int) -> np.ndarray:
+    frames = int(seconds * sample_rate) + 123
+    return (np.random.default_rng(0).standard_normal((frames, channels)) * 0.1).astype("float32")
+
+
+@pytest.mark.parametrize("name,sample_rate,channels,subtype,codec", [
+    ("pcm16.wav", 44100, 2, "PCM_16", "pcm_s16le"),
+    ("float.wav", 22050, 1, "FLOAT", "pcm_f32le"),
+    ("pcm24.flac", 48000, 2, "PCM_24", "flac"),
+])
+def test_header_matches_decoded_length(tmp_path, name, sample_rate, channels, subtype, codec):
+    path = str(tmp_path / name)
+    data = _tone(2.5, sample_rate, channels)
+    sf.write(path, data, sample_rate, subtype=subtype)
+
+    metadata = probe_file(path)
+    assert metadata.codec == codec
+    assert metadata.sample_rate == sample_rate
+    assert metadata.channels == channels
+    assert metadata.frames == len(data)
+    assert metadata.duration == pytest.approx(len(data) / sample_rate)
+
+
+def test_streamed_wav_with_unknown_sizes(tmp_path):
+    """流式写入的WAV（RIFF/data长度为0xFFFFFFFF）按文件大小计算时长"""
+    sample_rate = 48000
+    pcm = (_tone(1.0, sample_rate, 2) * 32767).astype("<i2").tobytes()
+    header = (b"RIFF" + struct.pack("<I", 0xFFFFFFFF) + b"WAVE"
+              + b"fmt " + struct.pack("<IHHIIHH", 16, 1, 2, sample_rate, sample_rate * 4, 4, 16)
+              + b"data" + struct.pack("<I", 0xFFFFFFFF))
+    path = tmp_path / "stream.wav"
+    path.write_bytes(header + pcm)
+
+    metadata = probe_file(str(path))
+    assert metadata.frames == len(pcm) // 4
+
+
+def test_mp3_with_lame_tag(tmp_path):
+    av = pytest.importorskip("av")
+    path = str(tmp_path / "tone.mp3")
+    sample_rate = 44100
+    with av.open(path, "w") as container:
+        stream = container.add_stream("mp3", rate=sample_rate)
+        stream.layout = "stereo"
+        stream.bit_rate = 128000
+        samples = np.ascontiguousarray(_tone(3.0, sample_rate, 2).T)
+        if stream.format.name.startswith("s32"):
+            samples = (samples * 2 ** 31).astype("int32")
+        if not stream.format.is_planar:
+            samples = samples.T.reshape(1, -1)
+        frame = av.AudioFrame.from_ndarray(samples, format=stream.format.name, layout="stereo")
+        frame.sample_rate = sample_rate
+        for packet in stream.encode(frame):
+            container.mux(packet)
+        for packet in stream.encode(None):
+            container.mux(packet)
+    with av.open(path) as container:
+        decoded = sum(f.samples for f in container.decode(audio=0))
+
+    metadata = probe_file(path)
+    assert metadata.codec == "mp3"
+    assert metadata.sample_rate == sample_rate
+    assert metadata.channels == 2
+    assert metadata.frames == decoded
+
+
+def test_cache_persists_and_invalidates(tmp_path):
+    path = str(tmp_path / "a.wav")
+    sf.write(path, _tone(1.0, 16000, 1), 16000)
+    cache_path = str(tmp_path / "meta.db")
+
+    service = AudioMetadataService(cache_path=cache_path)
+    first = service.probe(path)
+    assert service.probe(path) == first
+    assert service.stats["probes"] == 1 and service.stats["memory_hits"] == 1
+
+    # 新进程（新实例）从SQLite命中
+    restarted = AudioMetadataService(cache_path=cache_path)
+    assert restarted.probe(path) == first
+    assert restarted.stats["disk_hits"] == 1 and restarted.stats["probes"] == 0
+
+    # 文件被重新生成后重新探测
+    sf.write(path, _tone(2.0, 16000, 1), 16000)
+    os.utime(path, ns=(os.stat(path).st_atime_ns, os.stat(path).st_mtime_ns + 1_000_000))
+    assert restarted.probe(path).duration > first.duration
+    assert restarted.stats["probes"] == 1
+
+    assert service.probe(str(tmp_path / "missing.wav")) is None
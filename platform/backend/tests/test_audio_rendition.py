@@ -0,0 +1,139 @@
+"""
+音频压缩副本服务测试
+转码失败/超时回退原始音频、多进程共享缓存目录时按磁盘实际占用淘汰、并发请求合并
+"""
+
+import asyncio
+import os
+import subprocess
+import threading
+import time
+
+import pytest
+from starlette.requests import Request
+
+from app.services import audio_rendition_service as rendition_module
+from app.services.audio_rendition_service import AudioRenditionService, resolve_profile
+
+
+def _request():
+    return Request({"type": "http", "method": "GET", "path": "/", "query_string": b"", "headers": []})
+
+
+@pytest.fixture
+def source(tmp_path):
+    paths = []
+    for i in range(4):
+        path = tmp_path / f"src{i}.wav"
+        path.write_bytes(b"RIFF" + bytes([i]) * 1000)
+        paths.append(str(path))
+    return paths
+
+
+def _fake_transcode(size=400, calls=None):
+    def transcode(self, source_path, target, profile):
+        if calls is not None:
+            calls.append(source_path)
+        time.sleep(0.02)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, "wb") as f:
+            f.write(b"O" * size)
+    return transcode
+
+
+def test_resolve_profile():
+    assert resolve_profile("opus-32").name == "opus-32k"
+    assert resolve_profile("mp3").media_type == "audio/mpeg"
+    with pytest.raises(ValueError):
+        resolve_profile("flac")
+    with pytest.raises(ValueError):
+        resolve_profile("mp3-1000k")
+
+
+@pytest.mark.parametrize("error", [
+    RuntimeError("转码失败"),
+    subprocess.TimeoutExpired(["ffmpeg"], 1),
+    FileNotFoundError("ffmpeg"),
+])
+def test_playback_falls_back_to_original(source, tmp_path, monkeypatch, error):
+    def broken(self, source_path, target, profile):
+        raise error
+
+    monkeypatch.setattr(AudioRenditionService, "_transcode", broken)
+    monkeypatch.setattr(rendition_module, "audio_rendition_service", AudioRenditionService(str(tmp_path / "cache")))
+    response = asyncio.run(rendition_module.audio_playback_response(
+        _request(), source[0], filename="第一章.wav", rendition="opus"
+    ))
+    assert response.status_code == 200
+    assert response.path == source[0]
+    assert response.media_type == "audio/wav"
+    assert "wav" in response.headers["content-disposition"]
+
+
+def test_playback_serves_rendition(source, tmp_path, monkeypatch):
+    monkeypatch.setattr(AudioRenditionService, "_transcode", _fake_transcode())
+    monkeypatch.setattr(rendition_module, "audio_rendition_service", AudioRenditionService(str(tmp_path / "cache")))
+    response = asyncio.run(rendition_module.audio_playback_response(
+        _request(), source[0], filename="第一章.wav", rendition="opus"
+    ))
+    assert response.media_type == "audio/ogg"
+    assert response.path.endswith(".opus") and os.path.exists(response.path)
+
+
+def test_cache_cap_counts_files_from_other_processes(source, tmp_path, monkeypatch):
+    monkeypatch.setattr(AudioRenditionService, "_transcode", _fake_transcode(size=400))
+    cache_dir = str(tmp_path / "cache")
+    # 两个实例模拟共享缓存目录的两个进程，容量只够两个副本
+    first = AudioRenditionService(cache_dir, max_bytes=1000)
+    second = AudioRenditionService(cache_dir, max_bytes=1000)
+    opus = resolve_profile("opus")
+
+    a = first.submit(source[0], opus).result()
+    b = second.submit(source[1], opus).result()
+    # 第一个进程命中另一个进程生成的副本，不重复转码
+    assert first.submit(source[1], opus).result() == b
+
+    old = time.time() - 100
+    os.utime(a, (old, old))
+    c = first.submit(source[2], opus).result()
+    assert not os.path.exists(a)
+    assert os.path.exists(b) and os.path.exists(c)
+    total = sum(os.path.getsize(os.path.join(root, name))
+                for root, _, files in os.walk(cache_dir) for name in files)
+    assert total <= 1000
+    assert first.get_stats()["entries"] == 2
+
+
+def test_concurrent_requests_share_one_transcode(source, tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(AudioRenditionService, "_transcode", _fake_transcode(calls=calls))
+    service = AudioRenditionService(str(tmp_path / "cache"))
+    opus = resolve_profile("opus")
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(service.submit(source[0], opus).result()))
+               for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(set(results)) == 1 and len(calls) == 1
+
+
+def test_cache_dir_scanned_only_at_startup(source, tmp_path, monkeypatch):
+    monkeypatch.setattr(AudioRenditionService, "_transcode", _fake_transcode(size=400))
+    cache_dir = str(tmp_path / "cache")
+    opus = resolve_profile("opus")
+    # 启动前已有的副本在首次使用时计入占用
+    existing = AudioRenditionService(cache_dir).submit(source[0], opus).result()
+    service = AudioRenditionService(cache_dir, max_bytes=1000)
+    assert service.get_stats()["entries"] == 1
+
+    walks = []
+    real_walk = os.walk
+    monkeypatch.setattr(rendition_module.os, "walk", lambda *a, **k: walks.append(a) or real_walk(*a, **k))
+    service.submit(source[1], opus).result()
+    service.submit(source[2], opus).result()
+    assert walks == []
+    assert not os.path.exists(existing)
+    assert service.get_stats()["entries"] == 2
+    assert service.get_stats()["total_mb"] == round(800 / (1024 * 1024), 2)
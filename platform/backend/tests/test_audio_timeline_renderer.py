@@ -0,0 +1,112 @@
+"""
+时间轴渲染器测试
+与原 pydub overlay 链的输出逐样本比较（允许 1 LSB 的取整差异）
+"""
+
+import numpy as np
+import pytest
+import soundfile as sf
+from pydub import AudioSegment
+
+from app.services.audio_timeline_renderer import TimelineClip, TimelineRenderer, write_rendered_sequence
+
+
+def _write(path, seconds, sample_rate=24000, channels=1, amplitude=0.3, seed=0):
+    frames = int(seconds * sample_rate)
+    data = np.random.default_rng(seed).uniform(-amplitude, amplitude, (frames, channels)).astype("float32")
+    sf.write(str(path), data, sample_rate, subtype="PCM_16")
+    return str(path)
+
+
+def _pydub_reference(dialogue_paths, environment_files):
+    """原 SequentialSynthesisCoordinator 的 pydub 实现"""
+    dialogue = AudioSegment.empty()
+    for path in dialogue_paths:
+        try:
+            dialogue += AudioSegment.from_wav(path)
+        except Exception:
+            dialogue += AudioSegment.silent(duration=3000)
+
+    track = AudioSegment.silent(duration=int(dialogue.duration_seconds * 1000))
+    for env in environment_files:
+        audio = AudioSegment.from_wav(env["file_path"])
+        audio = audio + (20 * np.log10(env["volume_level"]))
+        start_ms = int(env["start_time"] * 1000)
+        end_ms = int(env["end_time"] * 1000)
+        if start_ms < len(track):
+            audio = audio[:min(end_ms - start_ms, len(audio))]
+            track = track.overlay(audio, position=start_ms)
+    return dialogue.overlay(track)
+
+
+def _render(tmp_path, dialogue_paths, environment_files):
+    clips = [TimelineClip(file_path=env["file_path"], start_time=env["start_time"],
+                          end_time=env["end_time"], gain=env["volume_level"]) for env in environment_files]
+    rendered = TimelineRenderer().render(dialogue_paths, clips)
+    out = str(tmp_path / "rendered.wav")
+    rendered.write(out)
+    data, sample_rate = sf.read(out, dtype="int16", always_2d=True)
+    return data, sample_rate
+
+
+def test_matches_pydub_mix(tmp_path):
+    dialogue = [_write(tmp_path / f"d{i}.wav", 1.3 + 0.4 * i, seed=i) for i in range(4)]
+    environment = [
+        {"file_path": _write(tmp_path / "e0.wav", 10.0, amplitude=0.5, seed=10),
+         "start_time": 0.0, "end_time": 2.5, "volume_level": 0.25},
+        {"file_path": _write(tmp_path / "e1.wav", 1.0, amplitude=0.5, seed=11),
+         "start_time": 2.5, "end_time": 6.1234, "volume_level": 0.4},
+        {"file_path": _write(tmp_path / "e2.wav", 30.0, amplitude=0.5, seed=12),
+         "start_time": 6.1234, "end_time": 12.0, "volume_level": 0.3},
+    ]
+
+    reference = _pydub_reference(dialogue, environment)
+    expected = np.array(reference.get_array_of_samples(), dtype=np.int32).reshape(-1, reference.channels)
+    data, sample_rate = _render(tmp_path, dialogue, environment)
+
+    assert sample_rate == reference.frame_rate
+    assert data.shape == expected.shape
+    assert np.abs(data.astype(np.int32) - expected).max() <= 1
+
+
+def test_unreadable_dialogue_becomes_placeholder(tmp_path):
+    dialogue = [_write(tmp_path / "a.wav", 1.0), str(tmp_path / "missing.wav"), _write(tmp_path / "b.wav", 1.0, seed=1)]
+    rendered = TimelineRenderer().render(dialogue)
+    assert len(rendered.samples) == 24000 * 5
+    assert not rendered.samples[24000:96000].any()
+    assert np.array_equal(rendered.samples[96000:, 0], sf.read(dialogue[2], dtype="float32")[0])
+
+
+def test_output_format_is_the_widest_input(tmp_path):
+    dialogue = [_write(tmp_path / "mono.wav", 1.0, sample_rate=16000),
+                _write(tmp_path / "stereo.wav", 1.0, sample_rate=16000, channels=2)]
+    rendered = TimelineRenderer().render(dialogue)
+    assert (rendered.sample_rate, rendered.channels, rendered.sample_width) == (16000, 2, 2)
+    assert len(rendered.samples) == 32000
+    # 单声道片段复制到两个声道
+    assert np.array_equal(rendered.samples[:16000, 0], rendered.samples[:16000, 1])
+
+
+def test_loop_and_fades(tmp_path):
+    base = _write(tmp_path / "base.wav", 4.0, amplitude=0.0)
+    loop = str(tmp_path / "loop.wav")
+    sf.write(loop, np.full(24000, 0.5, dtype="float32"), 24000, subtype="PCM_16")
+
+    rendered = TimelineRenderer().render(
+        [base], [TimelineClip(file_path=loop, start_time=0.5, end_time=3.5, loop=True, fade_in=0.5, fade_out=0.5)]
+    )
+    samples = rendered.samples[:, 0]
+    assert np.all(samples[:12000] == 0) and np.all(samples[12000 + 72000:] == 0)
+    assert samples[12000] == 0.0 and samples[12000 + 36000] == pytest.approx(0.5)
+    assert samples[12000 + 71999] == pytest.approx(0.5 / 12000, abs=1e-4)
+
+
+def test_sequence_writer_concatenates_in_order(tmp_path):
+    renderer = TimelineRenderer()
+    first = renderer.render([_write(tmp_path / "a.wav", 1.0, seed=1)])
+    second = renderer.render([_write(tmp_path / "b.wav", 0.5, seed=2)])
+    out = str(tmp_path / "joined.wav")
+    write_rendered_sequence([first, second], out)
+
+    data, _ = sf.read(out, dtype="float32", always_2d=True)
+    assert np.array_equal(data, np.concatenate([first.samples, second.samples]))
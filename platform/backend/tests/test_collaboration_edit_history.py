@@ -0,0 +1,117 @@
+"""
+协作服务编辑历史测试
+save_edit_history 按关键帧+增量写入、get_edit_history / revert_to_version 重建快照、
+缓存失效后从数据库重建基准、旧版本压缩后保留区仍可回滚
+"""
+
+import sys
+import types
+from datetime import datetime
+
+import pytest
+from sqlalchemy import JSON, Column, DateTime, Integer, String, create_engine
+from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.services.collaboration_service import CollaborationService
+from app.services.edit_history_delta import EditHistoryCodec, is_delta
+
+Base = declarative_base()
+
+
+class EditHistoryModel(Base):
+    """与 app.models.audio_editor.EditHistoryModel 字段一致的测试模型"""
+    __tablename__ = "edit_history"
+
+    id = Column(Integer, primary_key=True)
+    project_id = Column(Integer, nullable=False, index=True)
+    version_number = Column(Integer, nullable=False)
+    operation_type = Column(String(50), nullable=False)
+    operation_data = Column(JSON, nullable=False)
+    snapshot_data = Column(JSON)
+    user_id = Column(Integer)
+    created_at = Column(DateTime, default=datetime.now)
+
+
+@pytest.fixture
+def db(monkeypatch):
+    module = types.ModuleType("app.models.audio_editor")
+    module.EditHistoryModel = EditHistoryModel
+    monkeypatch.setitem(sys.modules, "app.models.audio_editor", module)
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    service = CollaborationService()
+    service.history_codec = EditHistoryCodec(keyframe_interval=4)
+    return service
+
+
+def _project(step):
+    return {
+        "name": "测试工程",
+        "tracks": [{"id": 1, "clips": [{"id": i, "start": i * 1.5, "volume": 1.0} for i in range(30)]}],
+        "cursor": step,
+    }
+
+
+def _stored(db):
+    return [row.snapshot_data for row in db.query(EditHistoryModel).order_by(EditHistoryModel.version_number)]
+
+
+def test_saves_deltas_between_keyframes_and_rebuilds_versions(db, service):
+    for step in range(10):
+        service.save_edit_history(db, 1, "move", {"step": step}, _project(step))
+    service.save_edit_history(db, 1, "rename", {"name": "新名"})
+
+    stored = _stored(db)
+    assert [is_delta(data) for data in stored[:10]] == [False, True, True, True] * 2 + [False, True]
+    assert stored[10] is None
+
+    history = service.get_edit_history(db, 1, limit=6)
+    assert [h.version_number for h in history] == [11, 10, 9, 8, 7, 6]
+    assert history[0].snapshot_data is None
+    assert [h.snapshot_data for h in history[1:]] == [_project(step) for step in (9, 8, 7, 6, 5)]
+
+    assert service.revert_to_version(db, 1, 7) == _project(6)
+    latest = db.query(EditHistoryModel).order_by(EditHistoryModel.version_number.desc()).first()
+    assert latest.operation_type == "revert" and is_delta(latest.snapshot_data)
+    assert service.reconstruct_version(db, 1, 12) == _project(6)
+
+
+def test_rebuilds_base_from_database_when_cache_is_cold(db, service):
+    for step in range(3):
+        service.save_edit_history(db, 1, "move", {"step": step}, _project(step))
+
+    # 另一进程（没有本进程的缓存）继续写入
+    other = CollaborationService()
+    other.history_codec = EditHistoryCodec(keyframe_interval=4)
+    other.save_edit_history(db, 1, "move", {"step": 3}, _project(3))
+    service.save_edit_history(db, 1, "move", {"step": 4}, _project(4))
+
+    # 两个实例都从数据库重建出完整的增量链，第5个版本按间隔写成关键帧
+    assert [is_delta(data) for data in _stored(db)] == [False, True, True, True, False]
+    assert service.revert_to_version(db, 1, 5) == _project(4)
+    assert other.reconstruct_version(db, 1, 3) == _project(2)
+
+
+def test_compaction_keeps_retained_versions_restorable(db, service):
+    service.history_retain_versions = 3
+    for step in range(9):
+        service.save_edit_history(db, 1, "move", {"step": step}, _project(step))
+
+    # 写入关键帧（第9个版本）时压缩：只保留最近3个版本的快照，保留区首个快照改写为关键帧，操作记录全部保留
+    stored = _stored(db)
+    assert len(stored) == 9
+    assert stored[:6] == [None] * 6
+    assert [is_delta(data) for data in stored[6:]] == [False, True, False]
+    assert service.compact_edit_history(db, 1) == 0
+    assert service.revert_to_version(db, 1, 2) is None
+    assert service.revert_to_version(db, 1, 8) == _project(7)
@@ -0,0 +1,188 @@
+"""
+条件 GET 中间件测试
+ETag / 304 不执行端点、匿名短时响应缓存、本进程提交即时失效、跨进程写入由校验查询发现、带凭据请求不共享响应体，
+以及生产应用（main:app）在 CORS 之内注册中间件
+"""
+
+import asyncio
+import json
+import shutil
+
+import pytest
+from fastapi import FastAPI
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.middleware.conditional_get import ConditionalGetMiddleware, ConditionalRule, etag_matches, make_etag
+from app.models import Book
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Book.metadata.create_all(engine, tables=[Book.__table__])
+    return engine
+
+
+@pytest.fixture
+def session_factory(engine):
+    return sessionmaker(bind=engine)
+
+
+def _build_app(session_factory, cache_ttl):
+    app = FastAPI()
+    calls = []
+
+    @app.get("/books")
+    def list_books():
+        db = session_factory()
+        try:
+            calls.append(1)
+            return {"titles": [book.title for book in db.query(Book).order_by(Book.id)]}
+        finally:
+            db.close()
+
+    @app.get("/missing")
+    def missing():
+        calls.append(1)
+        return {"ok": False}
+
+    app.add_middleware(
+        ConditionalGetMiddleware,
+        rules=[ConditionalRule(r"/books", [Book.__tablename__]), ConditionalRule(r"/other", ["books"])],
+        session_factory=session_factory, cache_ttl=cache_ttl, enabled=True
+    )
+    return app, calls
+
+
+def _get(app, path, headers=None):
+    """直接以 ASGI 调用，返回 (状态码, 响应头, 响应体)"""
+    path, _, query = path.partition("?")
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": query.encode(),
+        "root_path": "", "server": ("test", 80), "client": ("test", 1234),
+        "headers": [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()],
+    }
+    messages = []
+    received = []
+
+    async def receive():
+        # 请求体只有一帧；之后像真实服务器一样阻塞，直到响应结束被取消
+        if received:
+            await asyncio.Event().wait()
+        received.append(1)
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    start = next(m for m in messages if m["type"] == "http.response.start")
+    body = b"".join(m.get("body", b"") for m in messages if m["type"] == "http.response.body")
+    response_headers = {k.decode(): v.decode() for k, v in start["headers"]}
+    return start["status"], response_headers, body
+
+
+def _add_book(session_factory, title):
+    db = session_factory()
+    db.add(Book(title=title))
+    db.commit()
+    db.close()
+
+
+def test_if_none_match_returns_304_without_running_endpoint(session_factory):
+    _add_book(session_factory, "甲")
+    app, calls = _build_app(session_factory, cache_ttl=0)
+
+    status, headers, body = _get(app, "/books")
+    assert status == 200 and json.loads(body) == {"titles": ["甲"]}
+    etag = headers["etag"]
+    assert etag.startswith('W/"') and headers["cache-control"] == "no-cache"
+
+    status, headers, body = _get(app, "/books", {"If-None-Match": etag})
+    assert status == 304 and body == b"" and headers["etag"] == etag
+    assert len(calls) == 1
+
+    # 查询参数不同则 ETag 不同
+    _, other, _ = _get(app, "/books?page=2")
+    assert other["etag"] != etag
+    assert etag_matches(etag, f'"abc", {etag[2:]}') and etag_matches(etag, "*")
+
+
+def test_anonymous_cache_skips_validation_until_local_commit(session_factory, engine):
+    _add_book(session_factory, "甲")
+    app, calls = _build_app(session_factory, cache_ttl=60)
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    first = _get(app, "/books")
+    issued = len(statements)
+    second = _get(app, "/books?")
+    assert second[2] == first[2] and second[1]["etag"] == first[1]["etag"]
+    assert len(calls) == 1 and len(statements) == issued
+
+    # 本进程提交 books 后立即失效
+    _add_book(session_factory, "乙")
+    status, headers, body = _get(app, "/books", {"If-None-Match": first[1]["etag"]})
+    assert status == 200 and json.loads(body) == {"titles": ["甲", "乙"]}
+    assert headers["etag"] != first[1]["etag"] and len(calls) == 2
+
+
+def test_external_writes_change_the_validator(session_factory, engine):
+    _add_book(session_factory, "甲")
+    app, calls = _build_app(session_factory, cache_ttl=0)
+    _, headers, _ = _get(app, "/books")
+
+    # 绕过 ORM 的写入（如其他进程）：本进程版本号不变，由行数 / updated_at 校验发现
+    with engine.begin() as connection:
+        connection.execute(text("DELETE FROM books"))
+    status, changed, body = _get(app, "/books", {"If-None-Match": headers["etag"]})
+    assert status == 200 and json.loads(body) == {"titles": []}
+    assert changed["etag"] != headers["etag"]
+
+
+def test_credentials_are_not_shared_and_other_routes_pass_through(session_factory):
+    _add_book(session_factory, "甲")
+    app, calls = _build_app(session_factory, cache_ttl=60)
+
+    _, anonymous, _ = _get(app, "/books")
+    _, first, _ = _get(app, "/books", {"Authorization": "Bearer a"})
+    _get(app, "/books", {"Authorization": "Bearer a"})
+    assert len(calls) == 3
+    assert first["cache-control"] == "private, no-cache" and first["etag"] != anonymous["etag"]
+    status, _, _ = _get(app, "/books", {"Authorization": "Bearer a", "If-None-Match": first["etag"]})
+    assert status == 304 and len(calls) == 3
+
+    status, headers, _ = _get(app, "/missing")
+    assert status == 200 and "etag" not in headers
+    status, headers, _ = _get(app, "/other")
+    assert status == 404 and "etag" not in headers
+
+
+@pytest.fixture
+def production_app(tmp_path, monkeypatch):
+    """uvicorn main:app 使用的应用；导入时挂载的静态目录与日志文件放在临时目录"""
+    # 导入 main 会加载音频编辑路由，其 FFmpegService 在导入时即要求 FFmpeg 可用
+    if not (shutil.which("ffmpeg") or shutil.which("ffmpeg.exe")):
+        pytest.skip("FFmpeg未安装，无法导入 main")
+    for name in ("audio", "uploads", "voice_profiles", "avatars", "environment_sounds", "outputs"):
+        (tmp_path / "data" / name).mkdir(parents=True)
+    monkeypatch.chdir(tmp_path)
+    import main
+    return main.app
+
+
+def test_production_app_answers_304_inside_cors(production_app, monkeypatch):
+    names = [middleware.cls.__name__ for middleware in production_app.user_middleware]
+    # user_middleware 由外到内
+    assert names.index("CORSMiddleware") < names.index("ConditionalGetMiddleware")
+
+    # 校验值查询不依赖真实数据库
+    monkeypatch.setattr(ConditionalGetMiddleware, "_fingerprint", lambda self, tables: (1, "2025-07-25"))
+    path = "/api/v1/environment-sounds/categories"
+    etag = make_etag(f"{path}?", (1, "2025-07-25"), 0)
+    status, headers, body = _get(production_app, path, {"Origin": "http://localhost:3000", "If-None-Match": etag})
+    assert status == 304 and body == b""
+    assert headers["etag"] == etag and headers["access-control-allow-origin"]
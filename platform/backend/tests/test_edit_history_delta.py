@@ -0,0 +1,121 @@
+"""
+编辑历史增量编码测试
+差异往返、关键帧间隔与体积阈值、版本链重建与批量物化
+"""
+
+import copy
+
+import pytest
+
+from app.services.edit_history_delta import DELTA_KEY, EditHistoryCodec, apply, diff, is_delta
+
+
+def _project(clips=3):
+    return {
+        "name": "测试工程",
+        "settings": {"sample_rate": 44100, "channels": 2},
+        "tracks": [
+            {"id": 1, "clips": [{"id": i, "start": i * 1.5, "volume": 1.0} for i in range(clips)]}
+        ]
+    }
+
+
+@pytest.mark.parametrize("mutate", [
+    lambda p: p["settings"].update(sample_rate=48000),
+    lambda p: p["settings"].pop("channels"),
+    lambda p: p["tracks"][0]["clips"].insert(1, {"id": 99, "start": 0.2}),
+    lambda p: p["tracks"][0]["clips"].pop(0),
+    lambda p: p["tracks"][0]["clips"].append({"id": 100}),
+    lambda p: p["tracks"][0]["clips"][2].update(volume=0.5),
+    lambda p: p.update(settings=None),
+    lambda p: p.update(tracks=[]),
+])
+def test_diff_apply_roundtrip(mutate):
+    old = _project()
+    new = copy.deepcopy(old)
+    mutate(new)
+    ops = diff(old, new)
+    assert apply(old, ops) == new
+    assert old == _project()  # 默认不修改原文档
+
+
+def test_single_field_change_is_small():
+    old = _project(clips=200)
+    new = copy.deepcopy(old)
+    new["tracks"][0]["clips"][150]["volume"] = 0.3
+    assert diff(old, new) == [["set", ["tracks", 0, "clips", 150, "volume"], 0.3]]
+
+
+def _encode_versions(codec, snapshots):
+    """按顺序编码，返回降序版本链所需的 {版本号: snapshot_data}"""
+    stored = {}
+    base = None
+    for version, snapshot in enumerate(snapshots, start=1):
+        data, chain_length = codec.encode(snapshot, base)
+        stored[version] = data
+        base = (version, snapshot, chain_length)
+    return stored
+
+
+def _edits(count):
+    snapshots = []
+    project = _project()
+    for i in range(count):
+        project = copy.deepcopy(project)
+        project["tracks"][0]["clips"][i % 3]["volume"] = round(0.1 * i, 2)
+        snapshots.append(project)
+    return snapshots
+
+
+def test_keyframe_interval():
+    codec = EditHistoryCodec(keyframe_interval=4)
+    stored = _encode_versions(codec, _edits(9))
+    assert [v for v, data in stored.items() if not is_delta(data)] == [1, 5, 9]
+    assert stored[3][DELTA_KEY]["base"] == 2
+
+
+def test_large_delta_falls_back_to_keyframe():
+    codec = EditHistoryCodec(keyframe_interval=10, max_delta_ratio=0.5)
+    first = _project()
+    data, chain_length = codec.encode({"name": "全新工程"}, (1, first, 0))
+    assert not is_delta(data) and chain_length == 0
+
+
+def test_reconstruct_every_version():
+    snapshots = _edits(12)
+    codec = EditHistoryCodec(keyframe_interval=5)
+    stored = _encode_versions(codec, snapshots)
+    for version in stored:
+        chain = [(v, stored[v]) for v in sorted(stored, reverse=True) if v <= version]
+        snapshot, chain_length = codec.reconstruct(chain, version)
+        assert snapshot == snapshots[version - 1]
+        assert chain_length == (version - 1) % 5
+
+
+def test_reconstruct_skips_versions_without_snapshot():
+    codec = EditHistoryCodec(keyframe_interval=10)
+    snapshots = _edits(3)
+    stored = _encode_versions(codec, snapshots)
+    # 版本 3 只有操作记录（snapshot_data 为空）
+    chain = [(4, None), (3, None)] + [(v, stored[v]) for v in (2, 1)]
+    assert codec.reconstruct(chain, 2)[0] == snapshots[1]
+    assert codec.reconstruct(chain, 4) == (None, 0)
+    assert codec.reconstruct([(2, stored[2])], 2) == (None, 0)  # 基准版本缺失
+
+
+def test_materialize_matches_reconstruct():
+    snapshots = _edits(15)
+    codec = EditHistoryCodec(keyframe_interval=6)
+    stored = _encode_versions(codec, snapshots)
+    wanted = [14, 10, 8, 7]
+    result = codec.materialize(sorted(stored.items()), wanted)
+    assert sorted(result) == [7, 8, 10, 14]
+    for version in result:
+        assert result[version] == snapshots[version - 1]
+    # 返回的快照彼此独立
+    result[7]["name"] = "改"
+    assert result[8]["name"] == "测试工程"
+
+    # 链断裂：版本 9 的基准缺失，直到下一个关键帧（13）前都不可重建
+    stored[8] = None
+    assert sorted(codec.materialize(sorted(stored.items()), wanted)) == [7, 14]
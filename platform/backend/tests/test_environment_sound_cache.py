@@ -0,0 +1,176 @@
+"""
+环境音生成缓存测试
+规范化提示词/时长档位寻址、并发去重、跨实例命中、关键词索引查找
+"""
+
+import asyncio
+import threading
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.models.environment_sound import EnvironmentSound, EnvironmentSoundCacheEntry, EnvironmentSoundKeyword
+from app.services.environment_sound_cache import (
+    EnvironmentSoundCache, duration_bucket, find_environment_sound_by_keyword, index_environment_sound,
+    normalize_prompt, rebuild_environment_sound_index,
+)
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    tables = [EnvironmentSound.__table__, EnvironmentSoundKeyword.__table__, EnvironmentSoundCacheEntry.__table__]
+    EnvironmentSound.metadata.create_all(engine, tables=tables)
+    return sessionmaker(bind=engine)
+
+
+class CountingGenerator:
+    def __init__(self, delay: float = 0.05):
+        self.delay = delay
+        self.calls = []
+
+    async def __call__(self, duration: float):
+        self.calls.append(duration)
+        await asyncio.sleep(self.delay)
+        return f"RIFF-{len(self.calls)}-{duration}".encode()
+
+
+def test_prompt_normalization_and_buckets():
+    assert normalize_prompt("  Heavy Rain，  thunder ;distant  ") == normalize_prompt("heavy rain, thunder, distant.")
+    assert duration_bucket(0.4) == 5.0
+    assert duration_bucket(10.0) == 10.0
+    assert duration_bucket(10.2) == 15.0
+    assert duration_bucket(42.0, max_duration=30) == 30.0
+
+
+def test_concurrent_requests_share_one_generation(tmp_path, session_factory):
+    cache = EnvironmentSoundCache(cache_dir=str(tmp_path), session_factory=session_factory)
+    generate = CountingGenerator()
+
+    async def run():
+        return await asyncio.gather(*[
+            cache.get_or_generate(prompt, duration, generate, steps=50, guidance_scale=3.5)
+            for prompt, duration in [("Rain falling", 7.0), ("rain falling.", 9.5), ("RAIN  FALLING", 8.0)]
+        ])
+
+    results = asyncio.run(run())
+    assert generate.calls == [10.0]
+    assert len({r.file_path for r in results}) == 1
+    assert [r.generated for r in results].count(True) == 1
+    assert cache.stats["shared"] == 2
+
+    # 不同参数是不同的缓存键
+    other = asyncio.run(cache.get_or_generate("rain falling", 8.0, generate, steps=100, guidance_scale=3.5))
+    assert other.cache_key != results[0].cache_key and len(generate.calls) == 2
+
+
+def test_cache_survives_restart_and_missing_files(tmp_path, session_factory):
+    generate = CountingGenerator(delay=0)
+    first = asyncio.run(EnvironmentSoundCache(cache_dir=str(tmp_path), session_factory=session_factory)
+                        .get_or_generate("footsteps", 3.0, generate, steps=50))
+    assert first.read_bytes() == b"RIFF-1-5.0"
+
+    restarted = EnvironmentSoundCache(cache_dir=str(tmp_path), session_factory=session_factory)
+    hit = asyncio.run(restarted.get_or_generate("Footsteps", 4.0, generate, steps=50))
+    assert hit.file_path == first.file_path and not hit.generated
+    assert restarted.stats["index_hits"] == 1 and len(generate.calls) == 1
+
+    # 缓存文件被删除后重新生成
+    import os
+    os.remove(first.file_path)
+    again = asyncio.run(EnvironmentSoundCache(cache_dir=str(tmp_path), session_factory=session_factory)
+                        .get_or_generate("footsteps", 5.0, generate, steps=50))
+    assert again.generated and len(generate.calls) == 2
+
+
+def test_index_lookup_runs_off_the_event_loop(tmp_path, session_factory):
+    threads = []
+
+    def recording_factory():
+        threads.append(threading.get_ident())
+        return session_factory()
+
+    cache = EnvironmentSoundCache(cache_dir=str(tmp_path), session_factory=recording_factory)
+    asyncio.run(cache.get_or_generate("wind", 5.0, CountingGenerator(delay=0)))
+    assert threads and threading.get_ident() not in threads
+
+
+def test_failed_generation_is_not_cached(tmp_path, session_factory):
+    cache = EnvironmentSoundCache(cache_dir=str(tmp_path), session_factory=session_factory)
+
+    async def fail(duration):
+        return None
+
+    assert asyncio.run(cache.get_or_generate("crowd", 5.0, fail)) is None
+    assert cache.lookup(cache.key_for("crowd", 5.0)) is None
+
+
+def test_keyword_index_lookup(session_factory):
+    db = session_factory()
+    sounds = [
+        EnvironmentSound(name="雨声_1721000000", prompt="Heavy rain falling on leaves", duration=10,
+                         tags=["雨声", "AI生成"], generation_status="completed", is_active=True),
+        EnvironmentSound(name="脚步声_1721000001", prompt="Footsteps on wooden floor", duration=10,
+                         tags=["脚步声"], generation_status="completed", is_active=True),
+        EnvironmentSound(name="人群_1721000002", prompt="Crowd murmuring", duration=10,
+                         tags=["人群"], generation_status="failed", is_active=True),
+    ]
+    db.add_all(sounds)
+    db.flush()
+    for sound in sounds:
+        index_environment_sound(db, sound)
+    db.commit()
+
+    assert find_environment_sound_by_keyword(db, "雨声").id == sounds[0].id
+    assert find_environment_sound_by_keyword(db, "footsteps").id == sounds[1].id
+    assert find_environment_sound_by_keyword(db, "人群") is None  # 未生成完成
+    assert find_environment_sound_by_keyword(db, "海浪声") is None
+
+    assert rebuild_environment_sound_index(db) == 3
+    assert find_environment_sound_by_keyword(db, "Rain").id == sounds[0].id
+
+
+def test_keyword_lookup_matches_cjk_substrings(session_factory):
+    db = session_factory()
+    sounds = [
+        EnvironmentSound(name="下雨声", prompt="夜晚下雨了，雨雷交加", duration=10, tags=["天气"],
+                         generation_status="completed", is_active=True),
+        EnvironmentSound(name="城市夜晚", prompt="远处下雨雷声隆隆", duration=10, tags=["Ambience"],
+                         generation_status="completed", is_active=True),
+    ]
+    db.add_all(sounds)
+    db.flush()
+    for sound in sounds:
+        index_environment_sound(db, sound)
+    db.commit()
+
+    # 单字与多字关键词都按子串匹配，不要求分词
+    assert find_environment_sound_by_keyword(db, "雨").id == sounds[0].id
+    assert find_environment_sound_by_keyword(db, "雨声").id == sounds[0].id
+    assert find_environment_sound_by_keyword(db, "雷声").id == sounds[1].id
+    # 第一条包含"下雨"与"雨雷"两个片段但不连续，核对后排除
+    assert find_environment_sound_by_keyword(db, "下雨雷").id == sounds[1].id
+    assert find_environment_sound_by_keyword(db, "ambience").id == sounds[1].id
+    assert find_environment_sound_by_keyword(db, "ambi") is None  # 标签需完整匹配
+    assert find_environment_sound_by_keyword(db, "海浪") is None
+
+
+def test_prefill_generates_misses_in_one_batch(tmp_path, session_factory):
+    cache = EnvironmentSoundCache(cache_dir=str(tmp_path), session_factory=session_factory)
+    generate = CountingGenerator(delay=0)
+    asyncio.run(cache.get_or_generate("thunder", 5.0, generate, steps=50))
+    batches = []
+
+    async def generate_many(items):
+        batches.append([(item["prompt"], item["duration"]) for item in items])
+        return [f"RIFF-{item['prompt']}".encode() if item["prompt"] != "fail" else None for item in items]
+
+    requests = [{"prompt": p, "duration": d, "steps": 50}
+                for p, d in [("thunder", 4.0), ("wind", 7.0), ("Wind.", 8.0), ("fail", 3.0), ("birds", 42.0)]]
+    assert asyncio.run(cache.prefill(requests, generate_many, max_duration=30)) == 2
+    assert batches == [[("wind", 10.0), ("fail", 5.0), ("birds", 30.0)]]
+
+    hit = asyncio.run(cache.get_or_generate("wind", 9.0, generate, steps=50))
+    assert hit.read_bytes() == b"RIFF-wind" and len(generate.calls) == 1
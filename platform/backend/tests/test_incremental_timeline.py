@@ -0,0 +1,77 @@
+"""
+增量时间轴测试
+逐段追加得到的场景与一次性 generate_timeline 的环境音轨道一致
+"""
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+from app.services import audio_metadata_service as metadata_module
+from app.services.audio_metadata_service import AudioMetadataService
+from app.services.sequential_timeline_generator import SequentialTimelineGenerator
+
+
+TEXTS = [
+    "他走进房间，关上了门。",
+    "房间里很安静。",
+    "窗外下起了雨，雨声越来越大。",
+    "雨一直下到深夜。",
+    "第二天早上，他来到森林。",
+    "森林里鸟儿在歌唱。",
+    "突然，一阵紧张的脚步声传来。",
+]
+
+
+@pytest.fixture(autouse=True)
+def metadata_cache(tmp_path, monkeypatch):
+    # 时长探测走全局元数据服务，缓存写到临时目录而不是源码树下的 data/
+    monkeypatch.setattr(metadata_module, "audio_metadata_service",
+                        AudioMetadataService(str(tmp_path / "audio_metadata.db")))
+
+
+@pytest.fixture
+def audio_files(tmp_path):
+    files = []
+    for i, text in enumerate(TEXTS):
+        path = str(tmp_path / f"segment_{i}.wav")
+        sf.write(path, np.zeros(int(16000 * (1.0 + 0.25 * i)), dtype="float32"), 16000)
+        files.append({"file_path": path, "text_content": text, "speaker": "旁白"})
+    return files
+
+
+def test_scenes_match_full_timeline(audio_files):
+    generator = SequentialTimelineGenerator()
+    expected = generator.generate_timeline(audio_files)
+
+    builder = generator.create_incremental_builder()
+    scenes = [scene for scene in (builder.add(f) for f in audio_files) if scene]
+    last = builder.finish()
+    if last:
+        scenes.append(last)
+
+    assert len(scenes) == len(expected.environment_tracks) > 1
+    for index, (scene, track) in enumerate(zip(scenes, expected.environment_tracks)):
+        assert scene.index == index
+        assert scene.track == track
+        assert scene.duration == pytest.approx(track.duration)
+        assert scene.dialogue_segments[0].start_time == pytest.approx(track.start_time)
+
+    # 每个段落恰好属于一个场景，顺序不变
+    assert [f for scene in scenes for f in scene.audio_files] == audio_files
+    assert builder.build_timeline().total_duration == pytest.approx(expected.total_duration)
+
+
+def test_scene_is_closed_when_next_scene_starts(audio_files):
+    builder = SequentialTimelineGenerator().create_incremental_builder()
+    assert builder.add(audio_files[0]) is None
+    assert builder.add(audio_files[1]) is None
+
+    # 第三段切换到雨天场景，前两段组成的场景立即闭合
+    closed = builder.add(audio_files[2])
+    assert closed is not None and len(closed.audio_files) == 2
+    assert closed.end_time == pytest.approx(builder.dialogue_segments[2].start_time)
+
+    assert builder.finish().audio_files == [audio_files[2]]
+    with pytest.raises(RuntimeError):
+        builder.add(audio_files[3])
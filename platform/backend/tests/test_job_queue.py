@@ -0,0 +1,156 @@
+"""
+持久化任务队列测试
+完成/失败只在当前Worker仍持有租约时生效，租约丢失后不覆盖新持有方的状态；
+反复过期的租约不再续租；执行中的章节任务不被重置；处理器阻塞事件循环时心跳照常续租
+"""
+
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.models import JobStatus, JobType, NovelProject, ProjectProgress, SynthesisJob
+from app.services.job_queue import JobQueue
+from app.workers import synthesis_worker
+from app.workers.synthesis_worker import SynthesisWorker
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SynthesisJob.metadata.create_all(engine, tables=[
+        SynthesisJob.__table__, NovelProject.__table__, ProjectProgress.__table__
+    ])
+    return sessionmaker(bind=engine)
+
+
+@pytest.fixture
+def db(session_factory):
+    session = session_factory()
+    yield session
+    session.close()
+
+
+def _claimed(db, queue, worker_id, **kwargs):
+    queue.enqueue(db, JobType.SEGMENT_SYNTHESIS, project_id=1, chapter_id=1, segment_id=1, **kwargs)
+    return queue.claim(db, worker_id)
+
+
+def _in_flight(db):
+    return db.query(ProjectProgress.in_flight_segments).filter_by(project_id=1, chapter_id=1).scalar()
+
+
+def test_complete_requires_lease_owner(db):
+    queue = JobQueue()
+    job = _claimed(db, queue, "worker-a")
+
+    # 租约过期后被 worker-b 接管，worker-a 的迟到结果不生效
+    job.lease_expires_at = datetime.utcnow() - timedelta(seconds=1)
+    db.commit()
+    assert queue.claim(db, "worker-b").id == job.id
+    assert queue.complete(db, job, {"ok": "a"}, worker_id="worker-a") is False
+    db.refresh(job)
+    assert (job.status, job.lease_owner, job.result) == (JobStatus.LEASED, "worker-b", None)
+
+    assert queue.complete(db, job, {"ok": "b"}, worker_id="worker-b") is True
+    db.refresh(job)
+    assert (job.status, job.lease_owner, job.result) == (JobStatus.SUCCEEDED, None, {"ok": "b"})
+    assert _in_flight(db) == 0
+
+
+def test_complete_after_pause_and_fail_after_cancel(db):
+    queue = JobQueue()
+    job = _claimed(db, queue, "worker-a")
+    queue.pause_project(db, 1)
+    assert queue.complete(db, job, worker_id="worker-a") is True
+    db.refresh(job)
+    assert job.status == JobStatus.SUCCEEDED
+
+    job = _claimed(db, queue, "worker-a")
+    queue.cancel_project(db, 1)
+    assert queue.fail(db, job, "超时", worker_id="worker-a") is False
+    db.refresh(job)
+    assert (job.status, job.last_error) == (JobStatus.CANCELLED, None)
+
+
+def test_fail_retries_or_finishes(db):
+    queue = JobQueue()
+    job = _claimed(db, queue, "worker-a", max_attempts=2)
+    assert _in_flight(db) == 1
+    assert queue.fail(db, job, "超时", worker_id="worker-a") is True
+    db.refresh(job)
+    assert (job.status, job.lease_owner, job.last_error) == (JobStatus.QUEUED, None, "超时")
+    assert _in_flight(db) == 1
+
+    job.available_at = datetime.utcnow()
+    db.commit()
+    assert queue.claim(db, "worker-a").id == job.id
+    assert queue.fail(db, job, "再次超时", worker_id="worker-a") is True
+    db.refresh(job)
+    assert job.status == JobStatus.FAILED and job.completed_at is not None
+    assert _in_flight(db) == 0
+
+
+def _expire(db, job):
+    job.lease_expires_at = datetime.utcnow() - timedelta(seconds=1)
+    db.commit()
+
+
+def test_expired_lease_is_failed_after_max_attempts(db):
+    queue = JobQueue()
+    finalize = queue.enqueue(db, JobType.CHAPTER_FINALIZE, project_id=1, chapter_id=1, status=JobStatus.WAITING)
+    job = _claimed(db, queue, "worker-a", max_attempts=2, parent_id=finalize.id)
+
+    # 第一次租约过期：由其他Worker接管
+    _expire(db, job)
+    assert queue.claim(db, "worker-b", [JobType.SEGMENT_SYNTHESIS]).id == job.id
+    # 第二次过期：次数已用尽，标记失败而不是再次领取，并放行章节任务
+    _expire(db, job)
+    assert queue.claim(db, "worker-c", [JobType.SEGMENT_SYNTHESIS]) is None
+    db.refresh(job)
+    db.refresh(finalize)
+    assert (job.status, job.lease_owner, job.attempts) == (JobStatus.FAILED, None, 2)
+    assert job.completed_at is not None and "租约过期" in job.last_error
+    assert finalize.status == JobStatus.QUEUED
+    assert _in_flight(db) == 0
+
+
+def test_enqueue_does_not_reset_leased_finalize_job(db):
+    queue = JobQueue()
+    plan = [{"segment_id": 1, "chapter_id": 1, "text": "甲"}]
+    first = queue.enqueue_synthesis_plan(db, 1, plan)["chapter_jobs"][0]
+    segment = queue.claim(db, "worker-a", [JobType.SEGMENT_SYNTHESIS])
+    queue.complete(db, segment, worker_id="worker-a")
+    assert queue.claim(db, "worker-a", [JobType.CHAPTER_FINALIZE]).id == first
+
+    second = queue.enqueue_synthesis_plan(db, 1, plan)["chapter_jobs"][0]
+    assert second != first
+    statuses = dict(db.query(SynthesisJob.id, SynthesisJob.status).filter(
+        SynthesisJob.id.in_([first, second])).all())
+    assert statuses == {first: JobStatus.LEASED, second: JobStatus.WAITING}
+
+
+def test_heartbeat_renews_while_handler_blocks_event_loop(session_factory, monkeypatch):
+    monkeypatch.setattr(synthesis_worker, "SessionLocal", session_factory)
+    queue = JobQueue(lease_seconds=3)
+    db = session_factory()
+    job = _claimed(db, queue, "worker-a")
+    leased_until = job.lease_expires_at
+
+    async def blocking_handler(handler_db, handler_job):
+        time.sleep(2.5)  # 同步阻塞调用占住事件循环
+        return {"ok": True}
+
+    monkeypatch.setitem(synthesis_worker.JOB_HANDLERS, JobType.SEGMENT_SYNTHESIS, blocking_handler)
+    worker = SynthesisWorker(worker_id="worker-a", queue=queue)
+    asyncio.run(worker._execute(job.id))
+
+    db.expire_all()
+    job = db.get(SynthesisJob, job.id)
+    assert job.status == JobStatus.SUCCEEDED
+    assert job.heartbeat_at > leased_until - timedelta(seconds=3)
+    db.close()
@@ -0,0 +1,199 @@
+"""
+列表字段视图测试
+summary / fields 只查询所需列、关联对象一次预加载、完整视图与 to_dict 一致、(排序列, id) 游标翻页，
+以及前端项目列表端点 /novel-reader/projects 的字段视图与游标翻页
+"""
+
+import asyncio
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import joinedload, sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.models import (
+    AnalysisResult, AudioFile, Book, BookChapter, NovelProject, ProjectProgress, SynthesisJob, SynthesisPlanSegment
+)
+from app.utils.list_views import FieldSet, decode_cursor, encode_cursor, paginate
+
+
+def _chapter_book(chapter):
+    return {"id": chapter.book.id, "title": chapter.book.title, "author": chapter.book.author}
+
+
+CHAPTER_FIELDS = FieldSet(
+    BookChapter,
+    summary=['id', 'book_id', 'chapter_number', 'chapter_title', 'word_count', 'book'],
+    derived={
+        'book': (('book_id',), _chapter_book,
+                 lambda: joinedload(BookChapter.book).load_only(Book.id, Book.title, Book.author)),
+    },
+    detail_extras=['book']
+)
+
+BOOK_FIELDS = FieldSet(
+    Book,
+    summary=['id', 'title', 'tags', 'chapter_count'],
+    derived={'tags': (('tags',), Book.get_tags, None)}
+)
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    tables = [Book.__table__, BookChapter.__table__, NovelProject.__table__, ProjectProgress.__table__,
+              # 新建项目时进度投影重建所读的表
+              AnalysisResult.__table__, SynthesisPlanSegment.__table__, AudioFile.__table__, SynthesisJob.__table__]
+    Book.metadata.create_all(engine, tables=tables)
+    return engine
+
+
+@pytest.fixture
+def db(engine):
+    session = sessionmaker(bind=engine)()
+    session.add_all([
+        Book(id=1, title="长篇", author="甲", tags='["武侠"]', content="全文" * 1000, chapter_count=6),
+        Book(id=2, title="短篇", author="乙", chapter_count=3),
+    ])
+    session.flush()
+    for book_id, count in ((1, 6), (2, 3)):
+        for number in range(1, count + 1):
+            session.add(BookChapter(book_id=book_id, chapter_number=number, chapter_title=f"第{number}章",
+                                    content="正文" * 5000, word_count=10000))
+    session.commit()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def statements(engine):
+    executed = []
+    event.listen(engine, "before_cursor_execute", lambda *args: executed.append(args[2]))
+    return executed
+
+
+def test_summary_view_skips_heavy_columns_in_one_query(db, statements):
+    names = CHAPTER_FIELDS.resolve(view="summary")
+    chapters, pagination = paginate(db.query(BookChapter).filter(BookChapter.book_id == 1), CHAPTER_FIELDS,
+                                    names, "chapter_number", BookChapter.chapter_number, "asc", 1, 4)
+    data = [CHAPTER_FIELDS.serialize(chapter, names) for chapter in chapters]
+
+    # 一次计数 + 一次取行（书籍随行 JOIN），序列化不再触发查询
+    assert len(statements) == 2
+    assert "book_chapters.content" not in statements[1] and "books.content" not in statements[1]
+    assert [item["chapter_number"] for item in data] == [1, 2, 3, 4]
+    assert data[0] == {"id": 1, "book_id": 1, "chapter_number": 1, "chapter_title": "第1章",
+                       "word_count": 10000, "book": {"id": 1, "title": "长篇", "author": "甲"}}
+    assert pagination["total"] == 6 and pagination["hasMore"] and pagination["nextCursor"]
+
+
+def test_fields_subset_and_validation(db, statements):
+    names = CHAPTER_FIELDS.resolve(fields="chapter_title, word_count")
+    assert names == ["id", "chapter_title", "word_count"]
+    chapters, _ = paginate(db.query(BookChapter), CHAPTER_FIELDS, names, "id", BookChapter.id, "asc", 1, 2)
+    assert CHAPTER_FIELDS.serialize(chapters[0], names) == {"id": 1, "chapter_title": "第1章", "word_count": 10000}
+    assert "content" not in statements[-1] and "JOIN" not in statements[-1]
+
+    with pytest.raises(ValueError):
+        CHAPTER_FIELDS.resolve(fields="chapter_title,secret")
+    with pytest.raises(ValueError):
+        CHAPTER_FIELDS.resolve(view="everything")
+
+    books, _ = paginate(db.query(Book), BOOK_FIELDS, BOOK_FIELDS.resolve(view="summary"),
+                        "id", Book.id, "asc", 1, 10)
+    assert BOOK_FIELDS.serialize(books[0], BOOK_FIELDS.resolve(view="summary")) == {
+        "id": 1, "title": "长篇", "tags": ["武侠"], "chapter_count": 6
+    }
+
+
+def test_detail_view_matches_to_dict(db, statements):
+    assert CHAPTER_FIELDS.resolve() is None
+    chapters, _ = paginate(db.query(BookChapter), CHAPTER_FIELDS, None, "chapter_number",
+                           BookChapter.chapter_number, "asc", 1, 3)
+    issued = len(statements)
+    data = CHAPTER_FIELDS.serialize(chapters[0], None)
+    assert len(statements) == issued
+    assert data == {**chapters[0].to_dict(), "book": _chapter_book(chapters[0])}
+
+
+@pytest.mark.parametrize("sort_order", ["asc", "desc"])
+def test_cursor_pages_cover_ordering_with_ties(db, sort_order):
+    names = CHAPTER_FIELDS.resolve(view="summary")
+    query = db.query(BookChapter)
+    # chapter_number 在两本书间重复，依靠 id 打破平局
+    expected = [c.id for c in query.order_by(BookChapter.chapter_number, BookChapter.id).all()]
+    if sort_order == "desc":
+        expected.reverse()
+
+    seen, cursor = [], None
+    while True:
+        chapters, pagination = paginate(query, CHAPTER_FIELDS, names, "chapter_number",
+                                        BookChapter.chapter_number, sort_order, 1, 4, cursor=cursor)
+        seen.extend(c.id for c in chapters)
+        # 带游标翻页时不计总数
+        assert (pagination["total"] is None) == (cursor is not None)
+        cursor = pagination["nextCursor"]
+        if not cursor:
+            break
+    assert seen == expected
+
+    # 页码分页返回的游标与游标翻页衔接
+    first, pagination = paginate(query, CHAPTER_FIELDS, names, "chapter_number",
+                                 BookChapter.chapter_number, sort_order, 1, 4)
+    second, _ = paginate(query, CHAPTER_FIELDS, names, "chapter_number", BookChapter.chapter_number,
+                         sort_order, 1, 4, cursor=pagination["nextCursor"])
+    assert [c.id for c in first + second] == expected[:8]
+
+
+def test_cursor_rejects_nullable_sort_and_bad_tokens(db):
+    with pytest.raises(ValueError):
+        paginate(db.query(BookChapter), CHAPTER_FIELDS, None, "chapter_title", BookChapter.id, "asc", 1, 5,
+                 cursor=encode_cursor(["第1章", 1]))
+    with pytest.raises(ValueError):
+        paginate(db.query(BookChapter), CHAPTER_FIELDS, None, "id", BookChapter.id, "asc", 1, 5, cursor="@@@")
+
+    # 可空排序字段仍可按页码分页，只是不返回游标
+    _, pagination = paginate(db.query(BookChapter), CHAPTER_FIELDS, None, "chapter_title", BookChapter.id,
+                             "asc", 1, 5)
+    assert pagination["nextCursor"] is None and pagination["hasMore"]
+
+    moment = datetime(2025, 7, 25, 8, 30)
+    assert decode_cursor(encode_cursor([moment, 7])) == [moment, 7]
+
+
+def test_novel_reader_projects_views_and_cursor(db, statements):
+    from app.api.v1.novel_reader import get_projects
+
+    db.add_all([NovelProject(book_id=1 + i % 2, name=f"项目{i}", config={"voices": "x" * 1000}) for i in range(5)])
+    db.commit()
+
+    def call(**kwargs):
+        params = dict(page=1, page_size=2, search="", status="", book_id=None, sort_by="id", sort_order="asc",
+                      view=None, fields=None, cursor=None, include_total=False)
+        params.update(kwargs)
+        return asyncio.run(get_projects(db=db, **params))["data"]
+
+    # 默认完整视图兼容旧响应：to_dict + 进度
+    data = call()
+    assert data["total"] == 5 and data["total_pages"] == 3 and data["has_more"]
+    assert data["projects"][0]["config"] == {"voices": "x" * 1000}
+    assert data["projects"][0]["segment_stats"]["total"] == 0
+
+    del statements[:]
+    data = call(view="summary")
+    assert "config" not in data["projects"][0] and "progress" in data["projects"][0]
+    project_select = next(sql for sql in statements if "FROM novel_projects" in sql and "LIMIT" in sql)
+    assert "novel_projects.config" not in project_select
+
+    seen, cursor = [], None
+    while True:
+        data = call(fields="name", cursor=cursor)
+        seen.extend(project["id"] for project in data["projects"])
+        assert all(set(project) == {"id", "name"} for project in data["projects"])
+        cursor = data["next_cursor"]
+        if not cursor:
+            break
+    assert seen == [project.id for project in db.query(NovelProject).order_by(NovelProject.id)]
+
+    assert [p["name"] for p in call(book_id=2, page_size=10)["projects"]] == ["项目1", "项目3"]
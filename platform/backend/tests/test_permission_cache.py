@@ -0,0 +1,132 @@
+"""
+用户权限快照缓存测试
+命中零查询、角色/用户变更失效、TTL 过期、请求级记忆
+"""
+
+import asyncio
+import time
+
+import pytest
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from starlette.requests import Request
+
+from app.core import auth as core_auth
+from app.core.permission_cache import PermissionCache
+from app.models.auth import Permission, Role, User, role_permissions, user_roles
+from app.services.role_service import RoleService
+from app.services.user_service import UserService
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    tables = [User.__table__, Role.__table__, Permission.__table__, user_roles, role_permissions]
+    User.metadata.create_all(engine, tables=tables)
+    return engine
+
+
+@pytest.fixture
+def db(engine):
+    session = sessionmaker(bind=engine)()
+    view = Permission(code="project.view", name="查看项目", module="project")
+    edit = Permission(code="project.edit", name="编辑项目", module="project")
+    role = Role(name="user", display_name="普通用户", permissions=[view])
+    session.add_all([edit, User(username="alice", email="a@example.com", hashed_password="x", roles=[role])])
+    session.commit()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = PermissionCache(ttl=60)
+    monkeypatch.setattr("app.core.permission_cache.permission_cache", cache)
+    return cache
+
+
+def _count_queries(engine):
+    executed = []
+    event.listen(engine, "before_cursor_execute", lambda *args: executed.append(args[2]))
+    return executed
+
+
+def test_hit_costs_no_queries(db, engine, cache):
+    first = cache.resolve(db, 1)
+    assert first.has_permission("project.view") and first.has_role("user")
+    assert not first.has_permission("project.edit")
+
+    executed = _count_queries(engine)
+    assert cache.resolve(db, 1) is first
+    assert executed == []
+    assert cache.stats["hits"] == 1 and cache.stats["misses"] == 1
+
+
+def test_role_permission_change_invalidates(db, cache):
+    permission_ids = {p.code: p.id for p in db.query(Permission).all()}
+    assert not cache.resolve(db, 1).has_permission("project.edit")
+    RoleService(db).assign_permission(1, permission_ids["project.edit"])
+    assert cache.resolve(db, 1).has_permission("project.edit")
+
+    RoleService(db).remove_permission(1, permission_ids["project.view"])
+    assert not cache.resolve(db, 1).has_permission("project.view")
+
+
+def test_user_role_change_invalidates(db, cache):
+    admin = Role(name="admin", display_name="管理员")
+    db.add(admin)
+    db.commit()
+    assert not cache.resolve(db, 1).has_role("admin")
+    UserService(db).assign_role(1, admin.id)
+    assert cache.resolve(db, 1).has_role("admin")
+
+
+def test_ttl_expiry(db):
+    cache = PermissionCache(ttl=0.05)
+    first = cache.resolve(db, 1)
+    assert cache.resolve(db, 1) is first
+    time.sleep(0.06)
+    assert cache.resolve(db, 1) is not first
+
+
+def test_invalidation_during_load_is_not_cached(db, cache, monkeypatch):
+    original = cache._lock
+
+    class InvalidateBeforeStore:
+        """在读取代数之后、写入缓存之前模拟一次并发失效"""
+        calls = 0
+
+        def __enter__(self):
+            original.acquire()
+            InvalidateBeforeStore.calls += 1
+            if InvalidateBeforeStore.calls == 3:
+                cache._generation += 1
+
+        def __exit__(self, *exc):
+            original.release()
+
+    monkeypatch.setattr(cache, "_lock", InvalidateBeforeStore())
+    assert cache.resolve(db, 1) is not None
+    assert cache.get(1) is None
+
+
+def test_get_current_user_memo_and_status(db, engine, cache):
+    token = core_auth.auth_manager.create_access_token(1, "sid")
+    credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+    request = Request({"type": "http", "headers": []})
+
+    user = asyncio.run(core_auth.get_current_user(request, credentials, db))
+    assert user.id == 1 and user.username == "alice"
+
+    # 同一请求再次解析：不验证令牌、不查缓存
+    executed = _count_queries(engine)
+    assert asyncio.run(core_auth.get_current_user(request, credentials, db)) is user
+    assert executed == [] and cache.stats["hits"] == 0
+
+    UserService(db).update_user_status(1, "suspended")
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(core_auth.get_current_user(Request({"type": "http", "headers": []}), credentials, db))
+    assert error.value.status_code == 403
@@ -0,0 +1,176 @@
+"""
+项目进度投影测试
+flush 时增量维护完成/失败/进行中计数、章节段落总数重算、项目新建重建、偏差修复与单次查询汇总，
+以及项目列表端点读取投影
+"""
+
+import asyncio
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.models import (
+    AnalysisResult, AnalysisSession, AudioFile, BookChapter, JobStatus, JobType, MusicGenerationBatch,
+    MusicGenerationTask, NovelProject, ProjectProgress, SynthesisJob, SynthesisPlanSegment, SynthesisTask,
+    TextSegment
+)
+from app.services.job_queue import JobQueue
+from app.services.project_progress_service import get_projects_progress, rebuild_progress
+from app.services.synthesis_plan_service import mark_segment_status
+
+
+def _plan(chapter_id, count):
+    return {"synthesis_plan": [
+        {"segment_id": chapter_id * 100 + i, "speaker": "旁白", "text": f"第{i}段", "chapter_id": chapter_id}
+        for i in range(count)
+    ]}
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    tables = [BookChapter.__table__, AnalysisResult.__table__, SynthesisPlanSegment.__table__, AudioFile.__table__,
+              NovelProject.__table__, ProjectProgress.__table__, SynthesisJob.__table__,
+              # 删除项目时级联加载的关联表
+              AnalysisSession.__table__, SynthesisTask.__table__, MusicGenerationTask.__table__,
+              MusicGenerationBatch.__table__, TextSegment.__table__]
+    BookChapter.metadata.create_all(engine, tables=tables)
+    return engine
+
+
+@pytest.fixture
+def db(engine):
+    session = sessionmaker(bind=engine)()
+    session.add_all([
+        BookChapter(id=1, book_id=1, chapter_number=1, content="..."),
+        BookChapter(id=2, book_id=1, chapter_number=2, content="..."),
+        NovelProject(id=1, book_id=1, name="项目一"),
+    ])
+    session.commit()
+    session.add_all([
+        AnalysisResult(chapter_id=1, status='completed', synthesis_plan=_plan(1, 3)),
+        AnalysisResult(chapter_id=2, status='completed', synthesis_plan=_plan(2, 2)),
+    ])
+    session.commit()
+    yield session
+    session.close()
+
+
+def _rows(db, project_id=1):
+    return {
+        row.chapter_id: (row.total_segments, row.completed_segments, row.failed_segments, row.in_flight_segments)
+        for row in db.query(ProjectProgress).filter_by(project_id=project_id)
+    }
+
+
+def _audio(chapter_id, segment_id, audio_type='segment', project_id=1):
+    return AudioFile(filename=f"{segment_id}.wav", file_path=f"{segment_id}.wav", project_id=project_id,
+                     chapter_id=chapter_id, paragraph_index=segment_id, audio_type=audio_type)
+
+
+def test_totals_follow_plans_and_analysis_status(db):
+    assert _rows(db) == {1: (3, 0, 0, 0), 2: (2, 0, 0, 0)}
+
+    result = db.query(AnalysisResult).filter_by(chapter_id=2).one()
+    result.status = 'failed'
+    db.commit()
+    assert _rows(db)[2][0] == 0
+
+    result.status = 'completed'
+    plan = result.synthesis_plan
+    plan["synthesis_plan"].append({"segment_id": 299, "text": "新增"})
+    result.synthesis_plan = plan
+    db.commit()
+    assert _rows(db)[2][0] == 3
+
+
+def test_audio_files_update_completed_counts(db):
+    audio = _audio(1, 100)
+    db.add_all([audio, _audio(1, 101), _audio(None, 7), _audio(1, 0, audio_type='final')])
+    db.commit()
+    assert _rows(db) == {0: (0, 1, 0, 0), 1: (3, 2, 0, 0), 2: (2, 0, 0, 0)}
+
+    audio.chapter_id = 2
+    db.commit()
+    db.delete(db.query(AudioFile).filter_by(paragraph_index=101).one())
+    db.commit()
+    assert _rows(db)[1][1] == 0 and _rows(db)[2][1] == 1
+
+
+def test_failed_segments_and_in_flight_jobs(db):
+    mark_segment_status(db, 1, 100, 'failed', project_id=1, error_message="超时")
+    mark_segment_status(db, 1, 101, 'failed', project_id=1)
+    db.commit()
+    assert _rows(db)[1][2] == 2
+    mark_segment_status(db, 1, 101, 'completed', project_id=1)
+    db.commit()
+    assert _rows(db)[1][2] == 1
+
+    job = SynthesisJob(job_type=JobType.SEGMENT_SYNTHESIS, project_id=1, chapter_id=1, segment_id=100,
+                       status=JobStatus.QUEUED)
+    db.add_all([job, SynthesisJob(job_type=JobType.CHAPTER_FINALIZE, project_id=1, chapter_id=1,
+                                  status=JobStatus.WAITING)])
+    db.commit()
+    assert _rows(db)[1][3] == 1
+
+    job.status = JobStatus.LEASED
+    db.commit()
+    assert _rows(db)[1][3] == 1
+
+    JobQueue().pause_project(db, 1)
+    assert _rows(db)[1][3] == 0
+    JobQueue().resume_project(db, 1)
+    assert _rows(db)[1][3] == 1
+
+
+def test_new_project_is_built_and_deleted_project_removed(db):
+    db.add(_audio(1, 100))
+    db.commit()
+    project = NovelProject(book_id=1, name="项目二")
+    db.add(project)
+    db.commit()
+    assert _rows(db, project.id) == {1: (3, 0, 0, 0), 2: (2, 0, 0, 0)}
+
+    db.delete(project)
+    db.commit()
+    assert _rows(db, project.id) == {}
+
+
+def test_rebuild_repairs_drift_and_summary_is_one_query(db, engine):
+    db.add_all([_audio(1, 100), _audio(1, 101)])
+    db.commit()
+    # 批量删除绕过 ORM 事件，投影产生偏差
+    db.query(AudioFile).filter(AudioFile.paragraph_index == 101).delete()
+    db.commit()
+    assert _rows(db)[1][1] == 2
+
+    assert rebuild_progress(db) == 1
+    assert _rows(db) == {1: (3, 1, 0, 0), 2: (2, 0, 0, 0)}
+
+    executed = []
+    event.listen(engine, "before_cursor_execute", lambda *args: executed.append(args[2]))
+    summary = get_projects_progress(db, [1, 99])
+    assert len(executed) == 1
+    assert summary[1] == {'total': 5, 'completed': 1, 'failed': 0, 'in_flight': 0, 'progress': 20.0}
+    assert summary[99]['progress'] == 0
+
+
+def test_novel_reader_project_list_reads_projection(db, engine):
+    """前端项目列表实际调用的 /novel-reader/projects：进度取自投影，不逐项目统计"""
+    from app.api.v1.novel_reader import get_projects
+
+    db.add(_audio(1, 100))
+    mark_segment_status(db, 1, 101, 'failed', project_id=1)
+    db.commit()
+
+    executed = []
+    event.listen(engine, "before_cursor_execute", lambda *args: executed.append(args[2]))
+    response = asyncio.run(get_projects(page=1, page_size=20, search="", status="", book_id=None,
+                                        sort_by="created_at", sort_order="desc", view=None, fields=None,
+                                        cursor=None, include_total=False, db=db))
+    project = response["data"]["projects"][0]
+    assert project["progress"] == 20.0
+    assert project["segment_stats"] == {'total': 5, 'completed': 1, 'failed': 1, 'in_flight': 0}
+    assert not any("audio_files" in sql or "synthesis_plan_segments" in sql for sql in executed)
@@ -0,0 +1,80 @@
+"""
+Range 文件响应测试
+单段/后缀/开放区间解析、多段回退为完整响应、不可满足返回 416、If-Range 与条件请求
+"""
+
+import os
+
+import pytest
+from fastapi.responses import FileResponse
+from starlette.requests import Request
+
+from app.utils.range_response import (
+    _iter_file_range, file_validators, is_not_modified, parse_range_header, range_file_response
+)
+
+
+def _request(**headers):
+    return Request({
+        "type": "http", "method": "GET", "path": "/", "query_string": b"",
+        "headers": [(name.replace("_", "-").encode(), value.encode()) for name, value in headers.items()]
+    })
+
+
+@pytest.fixture
+def audio(tmp_path):
+    path = tmp_path / "a.wav"
+    path.write_bytes(bytes(range(100)))
+    return str(path)
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-9", (0, 9)),
+    ("bytes=90-", (90, 99)),
+    ("bytes=95-200", (95, 99)),
+    ("bytes=-10", (90, 99)),
+    ("bytes=-500", (0, 99)),
+    ("BYTES = 5-5", (5, 5)),
+    ("bytes=0-9,20-29", None),
+])
+def test_parse_range_header(header, expected):
+    assert parse_range_header(header, 100) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=100-", "bytes=50-10", "bytes=-0", "items=0-9", "bytes="])
+def test_parse_range_header_unsatisfiable(header):
+    with pytest.raises(ValueError):
+        parse_range_header(header, 100)
+
+
+def test_range_file_response(audio):
+    response = range_file_response(_request(range="bytes=-10"), audio)
+    assert response.status_code == 206
+    assert response.headers["content-range"] == "bytes 90-99/100"
+    assert response.headers["content-length"] == "10"
+    assert b"".join(_iter_file_range(audio, 90, 99, chunk_size=3)) == bytes(range(90, 100))
+
+    response = range_file_response(_request(range="bytes=100-"), audio)
+    assert response.status_code == 416
+    assert response.headers["content-range"] == "bytes */100"
+
+    # 多段 Range 与 If-Range 不匹配时都返回完整文件
+    assert isinstance(range_file_response(_request(range="bytes=0-1,5-6"), audio), FileResponse)
+    assert isinstance(range_file_response(_request(range="bytes=0-1", if_range='"stale"'), audio), FileResponse)
+    etag, _ = file_validators(audio)
+    assert range_file_response(_request(range="bytes=0-1", if_range=etag), audio).status_code == 206
+
+
+def test_conditional_validators(audio):
+    etag, last_modified = file_validators(audio)
+    assert is_not_modified(_request(if_none_match=f'W/{etag}, "other"'), etag, last_modified)
+    assert not is_not_modified(_request(if_none_match='"other"'), etag, last_modified)
+    assert is_not_modified(_request(if_modified_since=last_modified), etag, last_modified)
+    # If-None-Match 存在时忽略 If-Modified-Since
+    assert not is_not_modified(_request(if_none_match='"other"', if_modified_since=last_modified),
+                               etag, last_modified)
+
+    stat = os.stat(audio)
+    os.utime(audio, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert file_validators(audio)[0] != etag
+    assert file_validators(audio, "pk1")[0] != file_validators(audio)[0]
@@ -0,0 +1,200 @@
+"""
+合成计划段落表测试
+兼容视图往返、按行比对写入、局部更新、状态标记与缺失段落筛选
+"""
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.models import AnalysisResult, AudioFile, BookChapter, NovelProject, ProjectProgress, SynthesisPlanSegment
+from app.services.synthesis_plan_service import (
+    count_book_segments, fix_segment_chapter_numbers, mark_segment_status,
+    missing_audio_segments, update_plan_segments
+)
+
+
+def _plan(count=4, **extra):
+    return {
+        "project_info": {"title": "测试"},
+        "characters": [{"name": "旁白"}],
+        "synthesis_plan": [
+            {"segment_id": i + 1, "speaker": "旁白", "text": f"第{i + 1}段", "chapter_id": 1,
+             "chapter_number": 1, "parameters": {"timeStep": 20}}
+            for i in range(count)
+        ],
+        **extra
+    }
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    tables = [BookChapter.__table__, AnalysisResult.__table__, SynthesisPlanSegment.__table__, AudioFile.__table__,
+              NovelProject.__table__, ProjectProgress.__table__]
+    BookChapter.metadata.create_all(engine, tables=tables)
+    return engine
+
+
+@pytest.fixture
+def db(engine):
+    session = sessionmaker(bind=engine)()
+    session.add(BookChapter(id=1, book_id=1, chapter_number=1, content="..."))
+    session.commit()
+    yield session
+    session.close()
+
+
+def _statements(engine):
+    executed = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def record(conn, cursor, statement, parameters, context, executemany):
+        executed.append((statement.split()[0], statement, executemany))
+    return executed
+
+
+def _create(db, plan):
+    result = AnalysisResult(chapter_id=1, status='completed', synthesis_plan=plan)
+    db.add(result)
+    db.commit()
+    return result
+
+
+def test_roundtrip_and_header_storage(db):
+    plan = _plan()
+    result = _create(db, plan)
+    db.expire_all()
+
+    assert result.synthesis_plan == plan
+    assert "synthesis_plan" not in result.synthesis_plan_header
+    rows = db.query(SynthesisPlanSegment).order_by(SynthesisPlanSegment.segment_index).all()
+    assert [(r.chapter_id, r.segment_id, r.speaker) for r in rows] == [(1, i + 1, "旁白") for i in range(4)]
+    assert db.query(AnalysisResult).filter(AnalysisResult.synthesis_plan.isnot(None)).count() == 1
+
+    # 视图与行数据不共享对象，原地修改不影响存储
+    view = result.synthesis_plan
+    view["synthesis_plan"][0]["text"] = "改"
+    assert rows[0].data["text"] == "第1段"
+    db.expire_all()
+    assert result.synthesis_plan["synthesis_plan"][0]["text"] == "第1段"
+
+
+def test_reassign_writes_only_changed_rows(db, engine):
+    result = _create(db, _plan(count=50))
+    plan = result.synthesis_plan
+    plan["synthesis_plan"][10]["text"] = "修改后的文本"
+    plan["synthesis_plan"].append({"segment_id": 51, "speaker": "甲", "text": "新增"})
+
+    executed = _statements(engine)
+    result.synthesis_plan = plan
+    db.commit()
+
+    writes = [(verb, sql) for verb, sql, _ in executed if verb in ("INSERT", "UPDATE", "DELETE")]
+    assert len([w for w in writes if w[0] == "UPDATE"]) == 1
+    assert len([w for w in writes if w[0] == "INSERT"]) == 1
+    assert all("analysis_results" not in sql for _, sql in writes)  # 头部未变化
+    db.expire_all()
+    assert result.synthesis_plan == plan
+
+
+def test_plan_view_is_cached_until_changed(db, engine, monkeypatch):
+    from app.models import analysis_result as analysis_result_module
+    assembled = []
+    assemble = analysis_result_module.assemble_synthesis_plan
+    monkeypatch.setattr(analysis_result_module, "assemble_synthesis_plan",
+                        lambda header, segments: assembled.append(1) or assemble(header, segments))
+    result = _create(db, _plan(count=20))
+    result.synthesis_plan  # 首次读取加载行并组装
+
+    executed = _statements(engine)
+    views = {id(result.synthesis_plan) for _ in range(100)}
+    assert len(views) == 1 and len(assembled) == 1 and not executed
+
+    # 段落行局部更新（不经过 synthesis_plan 赋值）
+    update_plan_segments(db, result.id, {2: {"text": "新文本"}}, commit=False)
+    assert result.synthesis_plan["synthesis_plan"][1]["text"] == "新文本"
+
+    # 原地修改后重新赋值
+    plan = result.synthesis_plan
+    plan["synthesis_plan"].pop()
+    plan["characters"].append({"name": "甲"})
+    result.synthesis_plan = plan
+    assert len(result.synthesis_plan["synthesis_plan"]) == 19
+    assert result.synthesis_plan["characters"][-1] == {"name": "甲"}
+    db.commit()
+
+    # 其他会话的写入在刷新后可见
+    other = sessionmaker(bind=engine)()
+    other.query(SynthesisPlanSegment).filter_by(segment_id=1).one().set_data({"segment_id": 1, "text": "外部"})
+    other.commit()
+    other.close()
+    count = len(assembled)
+    db.refresh(result)
+    assert result.synthesis_plan["synthesis_plan"][0]["text"] == "外部"
+    assert len(assembled) == count + 1
+
+
+def test_segment_status_survives_reorder_by_segment_id(db):
+    result = _create(db, _plan())
+    mark_segment_status(db, 1, 3, 'failed', error_message="TTS超时")
+    db.commit()
+
+    plan = result.synthesis_plan
+    plan["synthesis_plan"].reverse()
+    del plan["synthesis_plan"][0]  # 删除 segment_id=4
+    result.synthesis_plan = plan
+    db.commit()
+    db.expire_all()
+
+    rows = {r.segment_id: r for r in db.query(SynthesisPlanSegment).all()}
+    assert sorted(rows) == [1, 2, 3]
+    assert rows[3].status == 'failed' and rows[3].error_message == "TTS超时"
+    assert [s["segment_id"] for s in result.synthesis_plan["synthesis_plan"]] == [3, 2, 1]
+
+
+def test_nonstandard_and_cleared_plans(db):
+    result = _create(db, {"segments": [1, 2]})
+    assert result.synthesis_plan == {"segments": [1, 2]}
+    assert db.query(SynthesisPlanSegment).count() == 0
+
+    result.synthesis_plan = _plan()
+    db.commit()
+    result.synthesis_plan = None
+    db.commit()
+    assert result.synthesis_plan is None
+    assert db.query(SynthesisPlanSegment).count() == 0
+
+
+def test_partial_update_and_chapter_number_fix(db):
+    result = _create(db, _plan())
+    outcome = update_plan_segments(db, result.id, {2: {"text": "新文本"}, 3: {"text": "第3段"}, 99: {"text": "x"}})
+    assert outcome == {"updated": [2], "not_found": [99]}
+
+    db.expire_all()
+    assert result.synthesis_plan["synthesis_plan"][1]["text"] == "新文本"
+    assert fix_segment_chapter_numbers(db, {1: 1}) == 0
+    assert fix_segment_chapter_numbers(db, {1: 7}) == 4
+    db.commit()
+    assert {s["chapter_number"] for s in result.synthesis_plan["synthesis_plan"]} == {7}
+
+
+def test_missing_audio_segments_anti_join(db):
+    _create(db, _plan())
+    db.add_all([
+        AudioFile(filename="a.wav", file_path="a.wav", project_id=5, paragraph_index=1, audio_type='segment'),
+        AudioFile(filename="b.wav", file_path="b.wav", project_id=6, paragraph_index=2, audio_type='segment'),
+    ])
+    db.commit()
+
+    assert count_book_segments(db, 1) == 4
+    missing = missing_audio_segments(db, 5, 1)
+    assert [row.segment_id for row in missing] == [2, 3, 4]
+    assert missing[0].analysis_result.chapter.chapter_number == 1
+
+    assert mark_segment_status(db, 1, 2, 'completed', project_id=5) == 1
+    assert mark_segment_status(db, "unknown", 2, 'completed') == 0
+    db.commit()
+    row = db.query(SynthesisPlanSegment).filter_by(segment_id=2).one()
+    assert row.status == 'completed' and row.project_id == 5 and row.synthesized_at is not None
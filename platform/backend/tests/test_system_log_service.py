@@ -0,0 +1,212 @@
+"""
+系统日志存储服务测试
+分区命名与范围、游标分页（含同一时间戳）、关键词转义、非分区环境的分批清理、
+PostgreSQL 上提前建分区（不摘下默认分区）、分离过期分区的语句顺序与跨进程维护锁
+"""
+
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.models.system import LogLevel, LogModule, SystemLog
+from app.services import system_log_service
+from app.services.system_log_service import (
+    DEFAULT_PARTITION, decode_cursor, drop_expired_logs, ensure_partitions, keyset_page, keyword_condition,
+    parse_partition_name, partition_name, partition_ranges, partitions_until, run_log_maintenance
+)
+
+NOW = datetime(2025, 7, 23, 12, 0, 0)
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SystemLog.metadata.create_all(engine, tables=[SystemLog.__table__])
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+def _log(db, minutes_ago, message="日志", count=1):
+    for _ in range(count):
+        db.add(SystemLog(level=LogLevel.INFO, module=LogModule.SYSTEM, message=message,
+                         created_at=NOW - timedelta(minutes=minutes_ago)))
+    db.commit()
+
+
+def test_partition_names_and_ranges():
+    assert partition_name(datetime(2025, 7, 3), "day") == "system_logs_p20250703"
+    assert partition_name(datetime(2025, 7, 3), "month") == "system_logs_p202507"
+    assert parse_partition_name("system_logs_p20250703") == (datetime(2025, 7, 3), datetime(2025, 7, 4))
+    assert parse_partition_name("system_logs_p202512") == (datetime(2025, 12, 1), datetime(2026, 1, 1))
+    assert parse_partition_name("system_logs_default") is None
+
+    months = partition_ranges(datetime(2025, 11, 15), datetime(2026, 1, 2), "month")
+    assert [name for name, _, _ in months] == ["system_logs_p202511", "system_logs_p202512", "system_logs_p202601"]
+    assert all(end == nxt for (_, _, end), (_, nxt, _) in zip(months, months[1:]))
+
+    assert partitions_until(NOW, 7, "day") == datetime(2025, 7, 30)
+    assert partitions_until(NOW, 2, "month") == datetime(2025, 9, 1)
+
+
+def test_keyset_pagination_walks_every_row_once(db):
+    _log(db, 5, count=3)  # 同一时间戳，靠 id 区分
+    for minutes in range(4):
+        _log(db, minutes)
+
+    seen, cursor = [], None
+    while True:
+        logs, cursor = keyset_page(db.query(SystemLog), 2, cursor)
+        seen.extend(log.id for log in logs)
+        if cursor is None:
+            break
+    expected = [log.id for log in db.query(SystemLog).order_by(
+        SystemLog.created_at.desc(), SystemLog.id.desc()).all()]
+    assert seen == expected and len(seen) == 7
+
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
+
+
+def test_keyword_is_case_insensitive_and_escaped(db):
+    _log(db, 1, "TTS 合成失败: 100% timeout")
+    _log(db, 2, "tts ok")
+    _log(db, 3, "磁盘 1000 timeout")
+
+    def search(keyword):
+        return [log.message for log in db.query(SystemLog).filter(keyword_condition(keyword))]
+
+    assert len(search("tts")) == 2
+    assert search("100%") == ["TTS 合成失败: 100% timeout"]
+    assert search("_") == []
+
+
+def test_retention_without_partitions_deletes_in_batches(db, monkeypatch):
+    monkeypatch.setattr(system_log_service, "LOG_DELETE_BATCH_SIZE", 2)
+    _log(db, 60 * 24 * 40, count=5)
+    _log(db, 60)
+
+    assert ensure_partitions(db, NOW) == []
+    result = drop_expired_logs(db, 30, now=NOW)
+    assert result["deleted_count"] == 5 and result["dropped_partitions"] == []
+    assert db.query(SystemLog).count() == 1
+
+
+class _Result:
+    def __init__(self, value=None, rowcount=0):
+        self.value, self.rowcount = value, rowcount
+
+    def scalar(self):
+        return self.value
+
+
+class _PostgresRecorder:
+    """记录分区维护在 PostgreSQL 上执行的语句（会话与加锁连接共用）"""
+
+    dialect = SimpleNamespace(name="postgresql")
+
+    def __init__(self, default_rows=(), lock_free=True):
+        self.default_rows = set(default_rows)
+        self.lock_free = lock_free
+        self.statements = []
+
+    def execute(self, clause, params=None):
+        sql = " ".join(str(clause).split())
+        if "pg_try_advisory_lock" in sql:
+            self.statements.append("LOCK")
+            return _Result(self.lock_free)
+        if "pg_advisory_unlock" in sql:
+            self.statements.append("UNLOCK")
+            return _Result(True)
+        if "FROM pg_inherits" in sql:
+            return _Result(True)
+        if sql.startswith(f"SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION}"):
+            return _Result(params["start"] in self.default_rows)
+        if "reltuples" in sql:
+            return _Result(10)
+        if "set_config('lock_timeout'" in sql:
+            sql = f"SET lock_timeout {params['value']}"
+        self.statements.append(sql)
+        return _Result(rowcount=3 if sql.startswith("DELETE") else 0)
+
+    def commit(self):
+        self.statements.append("COMMIT")
+
+    def get_bind(self):
+        return self
+
+    def connect(self):
+        return self
+
+    def execution_options(self, **options):
+        assert options == {"isolation_level": "AUTOCOMMIT"}
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+@pytest.fixture
+def partitioned(monkeypatch):
+    monkeypatch.setattr(system_log_service, "is_partitioned", lambda db: True)
+    partitions = []
+    monkeypatch.setattr(system_log_service, "list_partitions", lambda db: list(partitions))
+    return partitions
+
+
+def test_partitions_are_created_ahead_without_detaching_default(partitioned):
+    partitioned.extend(partition_ranges(NOW, NOW, "day"))
+    # 维护停止过久，已有日志落入默认分区的周期不能建分区
+    db = _PostgresRecorder(default_rows={datetime(2025, 7, 25)})
+    created = ensure_partitions(db, NOW, ahead=3)
+
+    assert created == ["system_logs_p20250724", "system_logs_p20250726"]
+    assert db.statements[0] == "SET lock_timeout 5s"
+    assert [s.split()[0] for s in db.statements[1:]] == ["CREATE", "CREATE", "COMMIT"]
+    assert not any("DETACH" in s or "ATTACH" in s for s in db.statements)
+
+
+def test_expired_partitions_detach_under_lock_timeout(partitioned):
+    partitioned.extend(partition_ranges(NOW - timedelta(days=4), NOW, "day"))
+    db = _PostgresRecorder()
+    result = drop_expired_logs(db, 2, now=NOW)
+
+    assert result["dropped_partitions"] == ["system_logs_p20250719", "system_logs_p20250720"]
+    assert result["deleted_count"] == 3 + 10 * 2  # 默认分区删除的行 + 分区统计估算
+    assert db.statements == [
+        "LOCK",
+        "DELETE FROM system_logs_default WHERE created_at < :cutoff",
+        "COMMIT",
+        "SET lock_timeout 5s",
+        "ALTER TABLE system_logs DETACH PARTITION system_logs_p20250719",
+        "DROP TABLE system_logs_p20250719",
+        "COMMIT",
+        "SET lock_timeout 5s",
+        "ALTER TABLE system_logs DETACH PARTITION system_logs_p20250720",
+        "DROP TABLE system_logs_p20250720",
+        "COMMIT",
+        "UNLOCK",
+    ]
+
+
+def test_maintenance_is_skipped_while_another_process_holds_the_lock(partitioned, monkeypatch):
+    monkeypatch.setattr(system_log_service, "LOG_RETENTION_DAYS", 2)
+    partitioned.extend(partition_ranges(NOW - timedelta(days=4), NOW, "day"))
+
+    db = _PostgresRecorder(lock_free=False)
+    assert run_log_maintenance(db) == {"skipped": True}
+    assert drop_expired_logs(db, 2, now=NOW)["dropped_partitions"] == []
+    assert db.statements == ["LOCK", "LOCK"]
+
+    db = _PostgresRecorder()
+    result = run_log_maintenance(db)
+    assert result["created_partitions"] and result["dropped_partitions"]
+    # 同一把锁覆盖建分区与清理，不在维护中途重复加锁
+    assert db.statements.count("LOCK") == 1 and db.statements[-1] == "UNLOCK"
@@ -0,0 +1,145 @@
+"""
+TangoFlux异步客户端测试
+使用本地aiohttp桩服务模拟生成端点、批量端点与瞬时故障
+"""
+
+import asyncio
+import base64
+
+from aiohttp import web
+
+from app.clients.tangoflux_client import RetryBudget, TangoFluxClient
+
+
+class StubTangoFlux:
+    """最小TangoFlux桩：/health、/api/v1/audio/generate_file，可选 /api/v1/audio/generate_batch"""
+
+    def __init__(self, batch: bool = False, failures: int = 0, delay: float = 0.0):
+        self.batch = batch
+        self.failures = failures
+        self.delay = delay
+        self.single_requests = []
+        self.batch_requests = []
+        self.runner = None
+        self.url = None
+
+    async def _health(self, request):
+        return web.json_response({"status": "ok"})
+
+    async def _generate_file(self, request):
+        payload = await request.json()
+        self.single_requests.append(payload)
+        if self.failures > 0:
+            self.failures -= 1
+            return web.Response(status=503, text="busy")
+        await asyncio.sleep(self.delay)
+        return web.Response(body=f"RIFF:{payload['prompt']}".encode(), content_type="audio/wav")
+
+    async def _generate_batch(self, request):
+        payload = await request.json()
+        self.batch_requests.append(payload["requests"])
+        return web.json_response({"success": True, "results": [
+            {"success": True, "audio_base64": base64.b64encode(f"RIFF:{item['prompt']}".encode()).decode()}
+            for item in payload["requests"]
+        ]})
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/health", self._health)
+        app.router.add_post("/api/v1/audio/generate_file", self._generate_file)
+        if self.batch:
+            app.router.add_post("/api/v1/audio/generate_batch", self._generate_batch)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}"
+        return self
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+
+def _run(stub, scenario, **client_kwargs):
+    async def main():
+        await stub.start()
+        client = TangoFluxClient(base_url=stub.url, **client_kwargs)
+        try:
+            return await scenario(client)
+        finally:
+            await client.close()
+            await stub.stop()
+    return asyncio.run(main())
+
+
+def test_generate_file_and_health():
+    stub = StubTangoFlux()
+
+    async def scenario(client):
+        health = await client.check_health()
+        result = await client.generate_environment_sound("rain", duration=5, return_type="file")
+        invalid = await client.generate_environment_sound("rain", duration=45)
+        return health, result, invalid
+
+    health, result, invalid = _run(stub, scenario)
+    assert health["status"] == "healthy"
+    assert result["success"] and result["audio_data"] == b"RIFF:rain"
+    assert not invalid["success"] and len(stub.single_requests) == 1
+
+
+def test_retries_transient_errors_within_budget():
+    stub = StubTangoFlux(failures=1)
+    result = _run(stub, lambda c: c.generate_environment_sound("wind", return_type="file"), max_retries=2)
+    assert result["success"] and len(stub.single_requests) == 2
+
+    # 预算耗尽后不再重试
+    stub = StubTangoFlux(failures=5)
+    budget = RetryBudget(ratio=0.0, initial=1.0)
+    result = _run(stub, lambda c: c.generate_environment_sound("wind", return_type="file"),
+                  max_retries=3, retry_budget=budget)
+    assert not result["success"] and len(stub.single_requests) == 2
+
+
+def test_batch_endpoint_groups_prompts():
+    stub = StubTangoFlux(batch=True)
+    prompts = [f"prompt {i}" for i in range(5)]
+
+    async def scenario(client):
+        return await client.generate_batch([{"prompt": p, "duration": 5} for p in prompts] + [{"prompt": ""}])
+
+    results = _run(stub, scenario, max_batch=2)
+    assert [r["audio_data"] for r in results[:5]] == [f"RIFF:{p}".encode() for p in prompts]
+    assert not results[5]["success"]
+    assert [len(group) for group in stub.batch_requests] == [2, 2, 1]
+    assert stub.single_requests == []
+
+
+def test_batch_falls_back_to_concurrent_singles():
+    stub = StubTangoFlux(delay=0.2)
+
+    async def scenario(client):
+        started = asyncio.get_running_loop().time()
+        results = await client.generate_batch([{"prompt": f"p{i}"} for i in range(4)])
+        return results, asyncio.get_running_loop().time() - started, client.batch_supported
+
+    results, elapsed, batch_supported = _run(stub, scenario)
+    assert all(r["success"] for r in results) and batch_supported is False
+    assert len(stub.single_requests) == 4
+    assert elapsed < 0.6  # 并发而非串行
+
+
+def test_cancellation_propagates():
+    stub = StubTangoFlux(delay=5.0)
+
+    async def scenario(client):
+        task = asyncio.create_task(client.generate_environment_sound("slow", return_type="file"))
+        await asyncio.sleep(0.2)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            return True
+        return False
+
+    assert _run(stub, scenario)
@@ -0,0 +1,199 @@
+"""
+MegaTTS3节点池测试
+使用本地aiohttp桩服务模拟多个TTS节点
+"""
+
+import asyncio
+import os
+import tempfile
+
+import pytest
+from aiohttp import web
+
+from app.tts_client import MegaTTS3Client, TTSRequest
+from app.tts_pool import (
+    TTSEndpointPool, NoHealthyEndpointError, CIRCUIT_CLOSED, CIRCUIT_OPEN, parse_endpoint_urls
+)
+
+
+class StubTTSNode:
+    """最小MegaTTS3桩：/health 与 /api/v1/tts/synthesize_file"""
+
+    def __init__(self, status: int = 200, delay: float = 0.0):
+        self.status = status
+        self.delay = delay
+        self.requests = 0
+        self.runner = None
+        self.url = None
+
+    async def _health(self, request):
+        if self.status != 200:
+            return web.Response(status=self.status)
+        return web.json_response({"status": "ok"})
+
+    async def _synthesize(self, request):
+        self.requests += 1
+        await request.post()
+        await asyncio.sleep(self.delay)
+        if self.status != 200:
+            return web.Response(status=self.status, text="node error")
+        return web.Response(body=b"RIFF" + b"\x00" * 40, content_type="audio/wav")
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/health", self._health)
+        app.router.add_post("/api/v1/tts/synthesize_file", self._synthesize)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}"
+        return self
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+
+@pytest.fixture
+def workdir():
+    with tempfile.TemporaryDirectory() as tmp:
+        reference = os.path.join(tmp, "ref.wav")
+        with open(reference, "wb") as f:
+            f.write(b"RIFF" + b"\x00" * 40)
+        yield tmp, reference
+
+
+def _request(tmp, reference, name):
+    return TTSRequest(text="你好世界", reference_audio_path=reference,
+                      output_audio_path=os.path.join(tmp, f"{name}.wav"))
+
+
+def test_parse_endpoint_urls():
+    endpoints = parse_endpoint_urls("http://a:7929|2, http://b:7929/")
+    assert endpoints == [{"url": "http://a:7929", "weight": 2.0}, {"url": "http://b:7929", "weight": 1.0}]
+
+
+def test_routes_to_least_loaded_node():
+    async def scenario():
+        pool = TTSEndpointPool([{"url": "http://a"}, {"url": "http://b"}])
+        first = await pool.acquire()
+        second = await pool.acquire()
+        assert {first.url, second.url} == {"http://a", "http://b"}
+
+        await pool.release(first, success=True, latency=0.1)
+        await pool.release(second, success=True, latency=2.0)
+        # a延迟更低，两个节点都空闲时优先a
+        third = await pool.acquire()
+        assert third.url == "http://a"
+
+    asyncio.run(scenario())
+
+
+def test_circuit_breaker_ejects_and_readmits():
+    async def scenario():
+        pool = TTSEndpointPool([{"url": "http://a"}, {"url": "http://b"}], failure_threshold=2, reset_timeout=0.05)
+        a = pool.endpoints[0]
+        for _ in range(2):
+            endpoint = await pool.acquire(exclude={"http://b"})
+            await pool.release(endpoint, success=False, error="boom")
+        assert a.state == CIRCUIT_OPEN
+
+        for _ in range(3):
+            endpoint = await pool.acquire()
+            assert endpoint.url == "http://b"
+            await pool.release(endpoint, success=True, latency=0.1)
+
+        await asyncio.sleep(0.06)
+        # 冷却后半开，只放行一个试探请求
+        probe = await pool.acquire(exclude={"http://b"})
+        assert probe.url == "http://a"
+        await pool.release(probe, success=True, latency=0.1)
+        assert a.state == CIRCUIT_CLOSED
+
+        pool.endpoints[1].state = CIRCUIT_OPEN
+        pool.endpoints[1].opened_at = float("inf")
+        pool.endpoints[0].state = CIRCUIT_OPEN
+        pool.endpoints[0].opened_at = float("inf")
+        with pytest.raises(NoHealthyEndpointError):
+            await pool.acquire()
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_lease_is_not_a_node_failure():
+    async def scenario():
+        pool = TTSEndpointPool([{"url": "http://a"}], failure_threshold=1)
+        endpoint = pool.endpoints[0]
+        started = asyncio.Event()
+
+        async def request():
+            async with pool.lease():
+                started.set()
+                await asyncio.sleep(10)
+
+        task = asyncio.create_task(request())
+        await started.wait()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        # 取消只归还节点：不熔断、不计失败、不记录延迟
+        assert (endpoint.state, endpoint.total_failures, endpoint.in_flight) == (CIRCUIT_CLOSED, 0, 0)
+        assert endpoint.ewma_latency is None
+
+        with pytest.raises(RuntimeError):
+            async with pool.lease():
+                raise RuntimeError("boom")
+        assert endpoint.state == CIRCUIT_OPEN and endpoint.last_error == "boom"
+
+    asyncio.run(scenario())
+
+
+def test_client_fails_over_to_healthy_node(workdir):
+    tmp, reference = workdir
+
+    async def scenario():
+        bad = await StubTTSNode(status=503).start()
+        good = await StubTTSNode().start()
+        try:
+            pool = TTSEndpointPool([{"url": bad.url}, {"url": good.url}], failure_threshold=1, reset_timeout=60)
+            client = MegaTTS3Client(pool=pool)
+
+            responses = [await client.synthesize_speech(_request(tmp, reference, i)) for i in range(4)]
+            assert all(r.success for r in responses)
+            # 坏节点第一次失败后即被熔断，后续请求全部落在好节点
+            assert bad.requests == 1
+            assert good.requests == 4
+            assert pool.endpoints[0].state == CIRCUIT_OPEN
+
+            # 坏节点恢复后，健康检查将其重新加入
+            bad.status = 200
+            health = await client.health_check()
+            assert health["status"] == "healthy"
+            assert health["healthy_nodes"] == 2
+            assert pool.endpoints[0].state == CIRCUIT_CLOSED
+        finally:
+            await bad.stop()
+            await good.stop()
+
+    asyncio.run(scenario())
+
+
+def test_concurrent_requests_spread_across_nodes(workdir):
+    tmp, reference = workdir
+
+    async def scenario():
+        nodes = [await StubTTSNode(delay=0.05).start() for _ in range(3)]
+        try:
+            client = MegaTTS3Client(pool=TTSEndpointPool([{"url": n.url} for n in nodes]))
+            results = await asyncio.gather(*(
+                client.synthesize_speech(_request(tmp, reference, i)) for i in range(9)
+            ))
+            assert all(r.success for r in results)
+            assert [n.requests for n in nodes] == [3, 3, 3]
+            assert all(e.in_flight == 0 for e in client.pool.endpoints)
+        finally:
+            for node in nodes:
+                await node.stop()
+
+    asyncio.run(scenario())
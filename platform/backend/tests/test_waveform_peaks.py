@@ -0,0 +1,129 @@
+"""
+波形峰值金字塔测试
+逐级合并的包络正确性、侧车文件读写与复用、时间窗口取层、峰值响应的 ETag / 304
+"""
+
+import asyncio
+import os
+import wave
+
+import numpy as np
+import pytest
+from starlette.requests import Request
+
+from app.services import waveform_peaks
+from app.services.waveform_peaks import (
+    BASE_SAMPLES_PER_PEAK, MIN_LEVEL_PEAKS, WaveformPeakService, compute_peak_pyramid, read_peak_file,
+    write_peak_file
+)
+
+SAMPLE_RATE = 8000
+
+
+def _write_wav(path, samples, channels=1):
+    pcm = np.clip(np.round(samples * 32767), -32768, 32767).astype("<i2")
+    with wave.open(str(path), "wb") as wf:
+        wf.setnchannels(channels)
+        wf.setsampwidth(2)
+        wf.setframerate(SAMPLE_RATE)
+        wf.writeframes(pcm.tobytes())
+
+
+@pytest.fixture
+def audio(tmp_path):
+    frames = BASE_SAMPLES_PER_PEAK * MIN_LEVEL_PEAKS * 4 + 100
+    t = np.arange(frames) / SAMPLE_RATE
+    samples = 0.5 * np.sin(2 * np.pi * 440 * t) * np.linspace(0, 1, frames)
+    path = tmp_path / "tone.wav"
+    _write_wav(path, samples)
+    return str(path), samples
+
+
+def test_pyramid_levels_bound_the_signal(audio):
+    path, samples = audio
+    pyramid = compute_peak_pyramid(path)
+    assert pyramid.total_frames == len(samples)
+    assert pyramid.duration == pytest.approx(len(samples) / SAMPLE_RATE)
+
+    spps = [level.samples_per_peak for level in pyramid.levels]
+    assert spps == [BASE_SAMPLES_PER_PEAK * 2 ** i for i in range(len(spps))]
+    assert len(pyramid.levels[-1].peaks) <= MIN_LEVEL_PEAKS < len(pyramid.levels[-2].peaks)
+
+    base = pyramid.levels[0].peaks.astype(np.int16)
+    assert len(base) == -(-len(samples) // BASE_SAMPLES_PER_PEAK)
+    block = samples[:BASE_SAMPLES_PER_PEAK * 100].reshape(100, -1)
+    np.testing.assert_allclose(base[:100, 0], np.round(block.min(axis=1) * 127), atol=1)
+    np.testing.assert_allclose(base[:100, 1], np.round(block.max(axis=1) * 127), atol=1)
+
+    # 每一层是上一层相邻两项的包络
+    for fine, coarse in zip(pyramid.levels, pyramid.levels[1:]):
+        peaks = fine.peaks
+        if len(peaks) % 2:
+            peaks = np.concatenate([peaks, peaks[-1:]])
+        pairs = peaks.reshape(-1, 2, 2)
+        np.testing.assert_array_equal(coarse.peaks[:, 0], pairs[:, :, 0].min(axis=1))
+        np.testing.assert_array_equal(coarse.peaks[:, 1], pairs[:, :, 1].max(axis=1))
+
+
+def test_select_level(audio):
+    pyramid = compute_peak_pyramid(audio[0])
+    assert pyramid.select_level() is pyramid.levels[-1]
+    assert pyramid.select_level(level=99) is pyramid.levels[-1]
+    assert pyramid.select_level(samples_per_peak=1) is pyramid.levels[0]
+    assert pyramid.select_level(samples_per_peak=BASE_SAMPLES_PER_PEAK * 3).samples_per_peak == BASE_SAMPLES_PER_PEAK * 2
+    assert pyramid.select_level(pixels=pyramid.total_frames // (BASE_SAMPLES_PER_PEAK * 4)).samples_per_peak \
+        == BASE_SAMPLES_PER_PEAK * 4
+
+
+def test_sidecar_roundtrip_and_reuse(audio, tmp_path):
+    path, samples = audio
+    pyramid = compute_peak_pyramid(path)
+    target = tmp_path / "x.peaks"
+    write_peak_file(pyramid, str(target))
+    loaded = read_peak_file(str(target))
+    assert (loaded.sample_rate, loaded.total_frames, loaded.source_size) == \
+        (pyramid.sample_rate, pyramid.total_frames, pyramid.source_size)
+    for a, b in zip(loaded.levels, pyramid.levels):
+        np.testing.assert_array_equal(a.peaks, b.peaks)
+
+    service = WaveformPeakService(cache_dir=str(tmp_path / "cache"))
+    service.get_pyramid(path)
+    sidecar = service.sidecar_path(path)
+    built_at = os.stat(sidecar).st_mtime_ns
+    service.get_pyramid(path)
+    assert os.stat(sidecar).st_mtime_ns == built_at
+
+    # 源文件变化后重新生成
+    _write_wav(path, samples[:BASE_SAMPLES_PER_PEAK * 10])
+    assert service.get_pyramid(path).total_frames == BASE_SAMPLES_PER_PEAK * 10
+
+    window = service.get_peaks(path, samples_per_peak=1, start=BASE_SAMPLES_PER_PEAK * 2 / SAMPLE_RATE,
+                               end=BASE_SAMPLES_PER_PEAK * 5 / SAMPLE_RATE)
+    assert (window["start_index"], len(window["peaks"])) == (2, 3)
+
+
+def test_peaks_response_validators(audio, tmp_path, monkeypatch):
+    path, _ = audio
+    monkeypatch.setattr(waveform_peaks, "waveform_peak_service", WaveformPeakService(str(tmp_path / "cache")))
+
+    def request(**headers):
+        return Request({"type": "http", "method": "GET", "path": "/", "query_string": b"",
+                        "headers": [(k.replace("_", "-").encode(), v.encode()) for k, v in headers.items()]})
+
+    response = asyncio.run(waveform_peaks.waveform_peaks_response(path, request=request()))
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+    assert response.headers["last-modified"]
+    assert response.headers["cache-control"] == "private, no-cache"
+
+    response = asyncio.run(waveform_peaks.waveform_peaks_response(path, request=request(if_none_match=etag)))
+    assert response.status_code == 304 and response.body == b""
+
+    json_response = asyncio.run(waveform_peaks.waveform_peaks_response(path, "json", request=request()))
+    assert json_response.headers["etag"] == etag
+    assert b"source_mtime_ns" not in json_response.body
+
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    response = asyncio.run(waveform_peaks.waveform_peaks_response(path, request=request(if_none_match=etag)))
+    assert response.status_code == 200 and response.headers["etag"] != etag